@@ -0,0 +1,95 @@
+"""
+Benchmark số request/giây khi gọi API qua connection pool dùng chung so với `requests.post` trần.
+
+Script dựng một stub server HTTP/1.1 (keep-alive) cục bộ giả lập endpoint /chat/completions,
+sau đó gọi `sinh_phan_hoi_tro_chuyen` nhiều lần từ nhiều thread theo hai chế độ:
+    - không pool: mỗi request mở kết nối mới (hành vi cũ của btc_api_client).
+    - có pool: đi qua `ThucChienHttpClient` dùng chung.
+
+Cách chạy:
+    python scripts/benchmark_http_pool.py --requests 2000 --threads 8
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+from src.api_services import btc_api_client
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+
+STUB_RESPONSE = json.dumps({
+    "id": "stub",
+    "choices": [{"message": {"role": "assistant", "content": "ok"}}],
+}).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Tránh trễ delayed-ACK khi giữ kết nối keep-alive
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run(total_requests: int, threads: int) -> float:
+    messages = [{"role": "user", "content": "ping"}]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: btc_api_client.sinh_phan_hoi_tro_chuyen(messages), range(total_requests)))
+    return total_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="Tổng số request mỗi chế độ.")
+    parser.add_argument("--threads", type=int, default=8, help="Số thread gọi song song.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("THUCCHIEN_AI_API_KEY", "benchmark_key")
+    btc_api_client.logger.setLevel(logging.WARNING)  # Không đo chi phí ghi log
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    pooled_client = ThucChienHttpClient(base_url=base_url, pool_maxsize=args.threads)
+    set_http_client(pooled_client)
+
+    # Chế độ không pool: mỗi lời gọi dùng requests.request trần như trước đây
+    def unpooled_request(method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+    with patch.object(pooled_client, "request", side_effect=unpooled_request):
+        _run(min(50, args.requests), args.threads)  # warm-up
+        unpooled_rps = _run(args.requests, args.threads)
+
+    _run(min(50, args.requests), args.threads)  # warm-up
+    pooled_rps = _run(args.requests, args.threads)
+
+    server.shutdown()
+    print(f"Không pool : {unpooled_rps:10.1f} req/s")
+    print(f"Có pool    : {pooled_rps:10.1f} req/s")
+    print(f"Tăng tốc   : {pooled_rps / unpooled_rps:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark thời gian import `src.api_services.btc_api_client` bằng `python -X importtime`.
+
+Script chạy `--runs` tiến trình Python mới, mỗi tiến trình chỉ import module cần đo, rồi đọc báo cáo
+`-X importtime` (stderr) để lấy thời gian cộng dồn của module và các import tốn thời gian nhất.
+Lấy giá trị nhỏ nhất qua các lần chạy để giảm nhiễu của máy. Script cũng kiểm tra việc import không kéo theo
+các phụ thuộc nặng (requests, pydub, dotenv), không tạo thư mục log và không gắn handler cho logger.
+Thoát với mã 1 nếu vượt ngân sách `--budget-ms` hoặc có phụ thuộc nặng bị import sớm.
+
+Cách chạy:
+    python scripts/benchmark_import_time.py --runs 10 --budget-ms 100
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(__file__, "../.."))
+MODULE = "src.api_services.btc_api_client"
+DEFAULT_BUDGET_MS = 100.0
+# Các module chỉ được import ở lần gọi API đầu tiên (hoặc khi thật sự cần)
+HEAVY_MODULES = ["requests", "urllib3", "pydub", "dotenv", "sqlite3", "asyncio"]
+
+CHILD_SCRIPT = f"""
+import json, logging, os, sys
+sys.path.insert(0, {ROOT!r})
+import {MODULE} as module
+print(json.dumps({{
+    "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+    "handlers": len(module.logger.handlers),
+    "log_dir_created": os.path.exists(module.LOG_DIR),
+}}))
+"""
+
+
+def _phan_tich_importtime(stderr: str, module: str = MODULE) -> dict:
+    """
+    Đọc các dòng `import time: self | cumulative | name` và trả về {tên module: thời gian cộng dồn (µs)}
+    của `module` cùng các module được import lần đầu bên trong nó (bỏ qua phần khởi động trình thông dịch).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            depth = (len(name) - len(name.lstrip())) // 2
+            entries.append((name.strip(), int(cumulative), depth))
+    # importtime in module con trước module cha, con thụt lề sâu hơn cha
+    index = next(i for i, (name, _, _) in enumerate(entries) if name == module)
+    root_depth = entries[index][2]
+    timings = {module: entries[index][1]}
+    for name, cumulative, depth in reversed(entries[:index]):
+        if depth <= root_depth:
+            break
+        timings[name] = cumulative
+    return timings
+
+
+def _chay_mot_lan(workdir: str) -> tuple:
+    """Import module trong một tiến trình mới; trả về (thời gian cộng dồn theo module, thông tin kiểm tra)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+        cwd=workdir, capture_output=True, text=True, check=True,
+    )
+    return _phan_tich_importtime(completed.stderr), json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Số tiến trình import để đo.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Ngân sách thời gian import (ms, mặc định {DEFAULT_BUDGET_MS:g}).")
+    parser.add_argument("--top", type=int, default=10, help="Số import tốn thời gian nhất được in ra.")
+    args = parser.parse_args()
+
+    totals, runs = [], []
+    with tempfile.TemporaryDirectory() as workdir:  # Thư mục log tương đối được tạo (nếu có) trong thư mục tạm
+        for _ in range(args.runs):
+            timings, check = _chay_mot_lan(workdir)
+            totals.append(timings[MODULE] / 1000)
+            runs.append((timings, check))
+
+    best = min(totals)
+    timings, check = runs[totals.index(best)]
+    print(f"Import {MODULE}: min {best:.1f} ms | median {statistics.median(totals):.1f} ms "
+          f"| max {max(totals):.1f} ms ({args.runs} lần)")
+    print(f"Ngân sách  : {args.budget_ms:.1f} ms")
+    print(f"Top {args.top} import bên trong (cộng dồn, lần nhanh nhất):")
+    for name, micros in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"    {micros / 1000:8.1f} ms  {name}")
+
+    problems = []
+    if best > args.budget_ms:
+        problems.append(f"vượt ngân sách ({best:.1f} ms > {args.budget_ms:.1f} ms)")
+    if check["loaded"]:
+        problems.append(f"import sớm: {', '.join(check['loaded'])}")
+    if check["handlers"]:
+        problems.append("logger đã được gắn handler khi import")
+    if check["log_dir_created"]:
+        problems.append("thư mục log được tạo khi import")
+    if problems:
+        print("THẤT BẠI: " + "; ".join(problems))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
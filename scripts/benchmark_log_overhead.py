@@ -0,0 +1,90 @@
+"""
+Benchmark chi phí ghi log của `log_api_call` cho mỗi lời gọi trả về ảnh base64 lớn.
+
+Hàm API giả trả về ngay một kết quả sinh ảnh có `response_data` chứa `--images` ảnh base64 `--image-mb` MB,
+nên thời gian đo được gần như hoàn toàn là chi phí của decorator. So sánh hai cách:
+    - cũ: sao chép sâu response_data bằng json.loads(json.dumps(...)), rút gọn base64, rồi json.dumps
+      toàn bộ bản ghi và ghi file ngay trên thread gọi (hành vi trước đây).
+    - mới: `log_api_call` hiện tại (rút gọn một lần, ghi qua QueueHandler/QueueListener ở thread nền).
+
+Cách chạy:
+    python scripts/benchmark_log_overhead.py --calls 50 --image-mb 4
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import base64
+import datetime
+import json
+import logging
+import tempfile
+import time
+import uuid
+
+from src.api_services import btc_api_client
+
+
+def _log_cu(result: dict, logger: logging.Logger):
+    """Tái hiện đường ghi log trước đây để làm mốc so sánh."""
+    log_data_for_response = {"status": "success", "result": result}
+    response_data_for_log = json.loads(json.dumps(result["response_data"]))  # Deep copy for modification
+    for idx, item in enumerate(response_data_for_log["data"]):
+        if "b64_json" in item:
+            response_data_for_log["data"][idx]["b64_json"] = "..." + item["b64_json"][-50:] + " (truncated)"
+    log_data_for_response["result"]["response_data"] = response_data_for_log
+    log_entry = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "interaction_id": str(uuid.uuid4()),
+        "type": "response",
+        "api_function": "sinh_hinh_anh",
+        "data": log_data_for_response,
+    }
+    logger.info(json.dumps(log_entry, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="Số lời gọi mỗi chế độ.")
+    parser.add_argument("--image-mb", type=float, default=4.0, help="Kích thước mỗi ảnh (MB, trước khi mã hoá).")
+    parser.add_argument("--images", type=int, default=1, help="Số ảnh trong response_data.")
+    args = parser.parse_args()
+
+    image_b64 = base64.b64encode(os.urandom(int(args.image_mb * 1024 * 1024))).decode()
+
+    def make_result():
+        return {"success": True, "message": "ok", "file_path": "out.png",
+                "response_data": {"created": 0, "data": [{"b64_json": image_b64} for _ in range(args.images)]}}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Mốc cũ: FileHandler đồng bộ trên thread gọi
+        legacy_logger = logging.getLogger("benchmark_log_overhead.legacy")
+        legacy_logger.propagate = False
+        legacy_logger.setLevel(logging.INFO)
+        legacy_handler = logging.FileHandler(os.path.join(tmp_dir, "legacy.log"), encoding="utf-8")
+        legacy_logger.addHandler(legacy_handler)
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            _log_cu(make_result(), legacy_logger)
+        legacy_ms = (time.perf_counter() - start) / args.calls * 1000
+        legacy_handler.close()
+
+        @btc_api_client.log_api_call
+        def sinh_hinh_anh(prompt: str, file_path: str) -> dict:
+            return make_result()
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            sinh_hinh_anh("benchmark", "out.png")
+        new_ms = (time.perf_counter() - start) / args.calls * 1000
+
+    print(f"Mỗi lời gọi: {args.images} ảnh x {args.image_mb} MB")
+    print(f"Cũ  (deep copy + ghi đồng bộ): {legacy_ms:8.3f} ms/lời gọi")
+    print(f"Mới (rút gọn một lần + hàng đợi): {new_ms:8.3f} ms/lời gọi")
+    print(f"Giảm chi phí: {legacy_ms / max(new_ms, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
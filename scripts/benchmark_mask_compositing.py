@@ -0,0 +1,82 @@
+"""
+Benchmark tô nhiều vùng màu lên một ảnh: cách cũ của edit_image_with_svg_mask so với SvgMaskEditor.
+
+    - cũ: mỗi vùng một lượt: mở lại ảnh gốc/mask từ PNG, lọc ngưỡng bằng `mask.point(lambda ...)`,
+      `Image.composite` một màu (như mỗi lần gọi edit_image_with_svg_mask, không tính rasterize SVG);
+    - mới: `SvgMaskEditor.apply` tô mọi vùng trong một lượt trên mảng NumPy, ảnh gốc và alpha được giữ lại.
+Ảnh gốc là data/images/input.png, các mask là data/images/mask.png dịch đi một chút cho từng vùng.
+
+Cách chạy:
+    python scripts/benchmark_mask_compositing.py --masks 8 --repeat 20
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageChops
+
+from src.image_processing.svg_mask_editor import MaskEdit, SvgMaskEditor
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--masks", type=int, default=8, help="Số vùng/màu tô trên mỗi ảnh.")
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần chỉnh sửa cùng ảnh gốc.")
+    args = parser.parse_args()
+
+    with open(os.path.join(IMAGE_DIR, "input.png"), "rb") as f:
+        base_png = f.read()
+    mask = Image.open(os.path.join(IMAGE_DIR, "mask.png")).convert("L")
+    mask_pngs = []
+    for i in range(args.masks):
+        buf = io.BytesIO()
+        ImageChops.offset(mask, 7 * i, 5 * i).save(buf, format="PNG")
+        mask_pngs.append(buf.getvalue())
+    colors = [((37 * i) % 256, (91 * i) % 256, (53 * i + 70) % 256) for i in range(args.masks)]
+
+    def legacy():
+        image = Image.open(io.BytesIO(base_png)).convert("RGB")
+        for mask_png, color in zip(mask_pngs, colors):
+            mask_img = Image.open(io.BytesIO(mask_png)).convert("L")
+            color_layer = Image.new("RGB", image.size, color)
+            image = Image.composite(color_layer, image, mask_img.point(lambda p: 255 if p > 128 else 0))
+        return np.asarray(image)
+
+    editor = SvgMaskEditor(Image.open(io.BytesIO(base_png)))
+    edits = [MaskEdit(np.asarray(Image.open(io.BytesIO(mask_png)).convert("L")), color)
+             for mask_png, color in zip(mask_pngs, colors)]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        expected = legacy()
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        result = editor.apply(edits)
+    new_seconds = time.perf_counter() - start
+
+    print(f"{args.repeat} lần x {args.masks} vùng trên ảnh {editor.width}x{editor.height}:")
+    print(f"  cũ : {legacy_seconds:7.3f} s | {1000 * legacy_seconds / args.repeat:7.2f} ms/ảnh")
+    print(f"  mới: {new_seconds:7.3f} s | {1000 * new_seconds / args.repeat:7.2f} ms/ảnh "
+          f"(nhanh hơn {legacy_seconds / new_seconds:.1f}x)")
+    print(f"  sai khác tối đa: {np.abs(result.astype(int) - expected.astype(int)).max()}")
+
+    # Alpha mềm (mép feather 2 px, opacity 0.7), tính sẵn một lần như khi mask SVG đã được nhớ trong editor
+    soft_edits = [MaskEdit(editor.alpha(MaskEdit(edit.mask, edit.color, feather=2)), edit.color, opacity=0.7)
+                  for edit in edits]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        editor.apply(soft_edits)
+    soft_seconds = time.perf_counter() - start
+    print(f"  mới, alpha mềm: {1000 * soft_seconds / args.repeat:7.2f} ms/ảnh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark throughput mã hoá PCM của TTS (L16, 24 kHz, mono) cho bài đọc dài.
+
+Sinh `--minutes` phút PCM tổng hợp (giọng giả lập bằng sóng sin điều biên + nhiễu) ghi ra file tạm,
+rồi so sánh:
+    - cũ: `AudioSegment.from_file(format="raw")` rồi `export(format="mp3")` bằng pydub (nạp cả waveform);
+    - mới: `pcm_encoder.encode_pcm` đọc file theo khối và đẩy vào bộ mã hoá (WAV, MP3, Opus).
+In thời gian, tốc độ so với thời gian thực (x realtime) và bộ nhớ Python cấp phát đỉnh (tracemalloc).
+
+Cách chạy:
+    python scripts/benchmark_pcm_encoder.py --minutes 10
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import math
+import random
+import struct
+import tempfile
+import time
+import tracemalloc
+
+from src.audio_processing.pcm_encoder import PcmFormat, doc_file_theo_khoi, encode_pcm, ffmpeg_exe
+
+PCM_FORMAT = PcmFormat(24000, 1, 2)
+
+
+def _tao_pcm(path: str, minutes: float):
+    """Ghi PCM giả lập giọng đọc theo từng giây để không giữ cả file trong bộ nhớ."""
+    rng = random.Random(0)
+    rate = PCM_FORMAT.sample_rate
+    with open(path, "wb") as f:
+        for second in range(int(minutes * 60)):
+            pitch = 120 + 80 * rng.random()
+            samples = [
+                int(6000 * math.sin(2 * math.pi * pitch * i / rate) * (0.5 + 0.5 * math.sin(2 * math.pi * 3 * i / rate))
+                    + rng.randint(-300, 300))
+                for i in range(rate)
+            ]
+            f.write(struct.pack(f"<{rate}h", *samples))
+
+
+def _do(label: str, audio_seconds: float, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<14}: {elapsed:7.2f} s | {audio_seconds / elapsed:7.1f}x realtime | bộ nhớ đỉnh {peak / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10, help="Độ dài bài đọc giả lập (phút).")
+    parser.add_argument("--skip-pydub", action="store_true", help="Bỏ qua cách cũ (pydub).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        pcm_path = os.path.join(work_dir, "narration.pcm")
+        _tao_pcm(pcm_path, args.minutes)
+        audio_seconds = os.path.getsize(pcm_path) / PCM_FORMAT.bytes_per_second
+        print(f"PCM: {audio_seconds:.0f} s audio, {os.path.getsize(pcm_path) / 1e6:.1f} MB")
+
+        if not args.skip_pydub:
+            from pydub import AudioSegment
+            AudioSegment.converter = ffmpeg_exe()
+
+            def pydub_mp3():
+                segment = AudioSegment.from_file(pcm_path, format="raw", frame_rate=24000, channels=1, sample_width=2)
+                segment.export(os.path.join(work_dir, "pydub.mp3"), format="mp3")
+
+            _do("pydub mp3", audio_seconds, pydub_mp3)
+
+        for extension in (".wav", ".mp3", ".opus"):
+            output = os.path.join(work_dir, "stream" + extension)
+            _do(f"stream {extension[1:]}", audio_seconds,
+                lambda: encode_pcm(doc_file_theo_khoi(pcm_path), output, PCM_FORMAT))
+            print(f"{'':<14}  -> {os.path.getsize(output) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
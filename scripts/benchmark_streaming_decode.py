@@ -0,0 +1,105 @@
+"""
+Benchmark bộ nhớ đỉnh khi lưu ảnh từ phản hồi base64 lớn: đọc cả phản hồi (cách cũ) so với giải mã theo luồng.
+
+Script dựng một stub server cục bộ trả về phản hồi /images/generations gồm `--images` ảnh, mỗi ảnh
+`--image-mb` MB (đã mã hoá base64), rồi lưu ảnh đầu tiên theo hai cách:
+    - cũ: `response.json()` + `base64.b64decode` cả chuỗi (hành vi trước đây của sinh_hinh_anh).
+    - mới: `sinh_hinh_anh` hiện tại, giải mã theo luồng thẳng xuống file.
+Bộ nhớ đỉnh được đo bằng tracemalloc (các bộ đệm bytes/str của Python).
+
+Cách chạy:
+    python scripts/benchmark_streaming_decode.py --image-mb 8 --images 4
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import base64
+import logging
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.api_services import btc_api_client
+from src.api_services.http_client import ThucChienHttpClient, get_http_client, set_http_client
+
+STUB_BODY = b""
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_BODY)))
+        self.end_headers()
+        # Gửi theo từng khối như một server thật
+        for i in range(0, len(STUB_BODY), 1024 * 1024):
+            self.wfile.write(STUB_BODY[i:i + 1024 * 1024])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _legacy_save(file_path: str) -> dict:
+    client = get_http_client()
+    response = client.post(client.url("/images/generations"), json={"model": "imagen-4", "prompt": "benchmark"})
+    response.raise_for_status()
+    return btc_api_client._xu_ly_phan_hoi_sinh_hinh_anh(response.json(), file_path)
+
+
+def _streaming_save(file_path: str) -> dict:
+    return btc_api_client.sinh_hinh_anh("benchmark", file_path)
+
+
+def _measure(fn, file_path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(file_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert result.get("success"), result
+    return peak, elapsed
+
+
+def main():
+    global STUB_BODY
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-mb", type=float, default=8.0, help="Kích thước mỗi ảnh (MB, trước khi mã hoá base64).")
+    parser.add_argument("--images", type=int, default=2, help="Số ảnh trong phản hồi (tham số n).")
+    args = parser.parse_args()
+
+    image_b64 = base64.b64encode(os.urandom(int(args.image_mb * 1024 * 1024))).decode()
+    items = ",".join('{"b64_json": "%s"}' % image_b64 for _ in range(args.images))
+    STUB_BODY = ('{"created": 0, "data": [%s]}' % items).encode()
+    del image_b64, items
+
+    os.environ.setdefault("THUCCHIEN_AI_API_KEY", "benchmark_key")
+    btc_api_client.logger.setLevel(logging.WARNING)  # Không đo chi phí ghi log
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    set_http_client(ThucChienHttpClient(base_url=f"http://127.0.0.1:{server.server_address[1]}"))
+
+    body_mb = len(STUB_BODY) / 1024 / 1024
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "image.png")
+        legacy_peak, legacy_seconds = _measure(_legacy_save, file_path)
+        streaming_peak, streaming_seconds = _measure(_streaming_save, file_path)
+
+    server.shutdown()
+    print(f"Phản hồi: {args.images} ảnh x {args.image_mb} MB ({body_mb:.1f} MB JSON)")
+    print(f"Cũ  (json + b64decode): đỉnh {legacy_peak / 1024 / 1024:8.1f} MB, {legacy_seconds:6.2f}s")
+    print(f"Mới (giải mã theo luồng): đỉnh {streaming_peak / 1024 / 1024:8.1f} MB, {streaming_seconds:6.2f}s")
+    print(f"Giảm bộ nhớ đỉnh: {legacy_peak / max(streaming_peak, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
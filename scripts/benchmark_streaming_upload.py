@@ -0,0 +1,65 @@
+"""
+Benchmark bộ nhớ đỉnh khi tạo body JSON chứa một file lớn: base64 cả file (cách cũ) so với StreamingJsonBody.
+
+    - cũ: đọc cả file, `base64.b64encode(...).decode()` rồi `json.dumps(payload)` (như `json=payload` của requests);
+    - mới: `StreamingJsonBody` với `FileInput`, đọc hết body theo khối 64 KiB như khi gửi xuống socket.
+Bộ nhớ đỉnh được đo bằng tracemalloc.
+
+Cách chạy:
+    python scripts/benchmark_streaming_upload.py --file-mb 50
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import base64
+import json
+import tempfile
+import time
+import tracemalloc
+
+from src.api_services.streaming_upload import FileInput, StreamingJsonBody
+
+
+def _do(label: str, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8}: {elapsed:6.2f} s | body {size / 1e6:7.1f} MB | bộ nhớ đỉnh {peak / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file-mb", type=float, default=50, help="Kích thước file đầu vào (MB).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "input.mp3")
+        with open(path, "wb") as f:
+            for _ in range(int(args.file_mb)):
+                f.write(os.urandom(1024 * 1024))
+
+        def legacy() -> int:
+            with open(path, "rb") as f:
+                audio_b64 = base64.b64encode(f.read()).decode("utf-8")
+            payload = {"model": "gemini-2.5-flash", "audio_url": {"url": f"data:audio/mp3;base64,{audio_b64}"}}
+            return len(json.dumps(payload).encode("utf-8"))
+
+        def streaming() -> int:
+            payload = {"model": "gemini-2.5-flash", "audio_url": {"url": FileInput(path, "audio/mp3", data_url=True)}}
+            body = StreamingJsonBody(payload)
+            size = 0
+            while chunk := body.read(64 * 1024):
+                size += len(chunk)
+            return size
+
+        _do("cũ", legacy)
+        _do("luồng", streaming)
+
+
+if __name__ == "__main__":
+    main()
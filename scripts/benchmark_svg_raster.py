@@ -0,0 +1,61 @@
+"""
+Benchmark thông lượng chuyển SVG sang PNG (trang/giây) của SvgRasterizer.
+
+    - tuần tự: một process, mỗi trang gọi backend trực tiếp (như svg_to_png_bytes trước đây, không tính phần
+      import lại cairosvg ở mỗi lần gọi);
+    - lô: `render_batch` trên process pool đã khởi động sẵn (`--workers`);
+    - lô lặp lại: cùng các trang, lấy từ cache theo hash SVG.
+Các trang được sinh từ data/svg_templates/complex.svg với tiêu đề khác nhau.
+
+Cách chạy:
+    python scripts/benchmark_svg_raster.py --pages 200 --workers 4 --scale 1
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import time
+
+from src.image_processing.svg_rasterizer import RasterBackendUnavailable, SvgRasterizer, output_size
+from src.image_processing.svg_template import load_svg_template
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "svg_templates", "complex.svg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Số trang SVG khác nhau.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Số process của rasterizer.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Hệ số kích thước đầu ra.")
+    parser.add_argument("--backend", default=None, help="Backend bắt buộc dùng (mặc định tự chọn).")
+    args = parser.parse_args()
+
+    template = load_svg_template(TEMPLATE_PATH)
+    pages = [template.render(texts={"title": f"Trang {i}", "timeline1": str(1945 + i)}) for i in range(args.pages)]
+
+    try:
+        rasterizer = SvgRasterizer(backend=args.backend, max_workers=args.workers, cache_bytes=0)
+    except RasterBackendUnavailable as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"Backend: {rasterizer.backend.name}, {args.pages} trang, scale {args.scale:g}")
+    start = time.perf_counter()
+    for page in pages:
+        svg_bytes = page.encode("utf-8")
+        rasterizer.backend.render(svg_bytes, *output_size(svg_bytes, scale=args.scale))
+    sequential = time.perf_counter() - start
+    print(f"  tuần tự     : {sequential:7.2f} s | {args.pages / sequential:8.1f} trang/s")
+
+    with rasterizer:
+        rasterizer.cache_bytes = 256 * 1024 * 1024
+        print(f"  khởi động {rasterizer.warm_up()} worker")
+        report = rasterizer.render_batch(pages, scale=args.scale)
+        print(f"  lô          : {report['total_seconds']:7.2f} s | {report['pages_per_second']:8.1f} trang/s")
+        report = rasterizer.render_batch(pages, scale=args.scale)
+        print(f"  lô (cache)  : {report['total_seconds']:7.2f} s | {report['pages_per_second']:8.1f} trang/s")
+
+
+if __name__ == "__main__":
+    main()
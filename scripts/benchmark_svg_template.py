@@ -0,0 +1,113 @@
+"""
+Benchmark điền template SVG: parse lại + tìm placeholder + serialize cả cây (cách cũ) so với SvgTemplate biên dịch.
+
+    - cũ: `ET.parse` template, quét `findall(".//text")` để thay text, `ET.tostring` cả cây (như
+      `fill_complex_svg_with_data` trước đây, không tính phần đọc ảnh);
+    - mới: `load_svg_template(...).render(texts=...)` nối các đoạn đã serialize sẵn.
+
+Phần thứ hai đo render theo lô `--pages` trang complex.svg nhúng cùng ba ảnh trong data/images:
+    - cũ: mỗi trang parse template, đọc và base64 lại từng ảnh, ghi file tuần tự;
+    - mới: `render_svg_batch` (template biên dịch, ảnh mã hoá một lần mỗi worker, process pool).
+
+Phần cuối so sánh kích thước trang complex.svg khi nhúng ảnh gốc và khi thu nhỏ/mã hoá lại (EmbedOptions).
+
+Cách chạy:
+    python scripts/benchmark_svg_template.py --renders 10000 --pages 500
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import base64
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from src.image_processing.svg_handler import SvgRenderJob, render_svg_batch
+from src.image_processing.svg_template import SVG_NS, XLINK_NS, EmbedOptions, load_svg_template
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "svg_templates")
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "images")
+CASES = {
+    "zoo.svg": {"SỞ THÚ": "THẢO CẦM VIÊN", "ZOO": "SAIGON ZOO"},
+    "complex.svg": {"title": "80 năm Quốc khánh", "subtitle": "1945 - 2025",
+                    "timeline1": "1945", "timeline2": "1975", "timeline3": "2025"},
+}
+
+
+def _cach_cu(svg_path: str, texts: dict) -> str:
+    root = ET.parse(svg_path).getroot()
+    for elem in root.findall(f".//{{{SVG_NS}}}text"):
+        key = elem.get("id") or (elem.text or "").strip()
+        if key in texts:
+            elem.text = texts[key]
+    return ET.tostring(root, encoding="unicode")
+
+
+def _trang_cu(svg_path: str, output_svg_path: str, photos: list):
+    tree = ET.parse(svg_path)
+    root = tree.getroot()
+    for i, image_path in enumerate(photos, start=1):
+        for rect in root.findall(f".//{{{SVG_NS}}}rect"):
+            if rect.get("id") == f"photo{i}":
+                with open(image_path, "rb") as img_file:
+                    img_data = base64.b64encode(img_file.read()).decode()
+                root.remove(rect)
+                root.append(ET.Element(f"{{{SVG_NS}}}image", {
+                    **{name: rect.get(name) for name in ("x", "y", "width", "height")},
+                    f"{{{XLINK_NS}}}href": f"data:image/png;base64,{img_data}",
+                }))
+                break
+    tree.write(output_svg_path, encoding="utf-8", xml_declaration=True)
+
+
+def _do(label: str, renders: int, fn, repeat: bool = True) -> float:
+    """Đo `fn` gọi `renders` lần (hoặc một lần nếu repeat=False, khi fn tự render cả lô)."""
+    start = time.perf_counter()
+    for _ in range(renders if repeat else 1):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<6}: {elapsed:7.3f} s | {renders / elapsed:9.0f} lần/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=10000, help="Số lần điền template cho mỗi file.")
+    parser.add_argument("--pages", type=int, default=500, help="Số trang của lô nhúng ảnh.")
+    parser.add_argument("--workers", type=int, default=None, help="Số process của render_svg_batch (mặc định số CPU).")
+    args = parser.parse_args()
+
+    for name, texts in CASES.items():
+        svg_path = os.path.join(TEMPLATE_DIR, name)
+        print(f"{name} ({args.renders} lần):")
+        legacy = _do("cũ", args.renders, lambda: _cach_cu(svg_path, texts))
+        compiled = _do("mới", args.renders, lambda: load_svg_template(svg_path).render(texts=texts))
+        print(f"  nhanh hơn {legacy / compiled:.1f}x")
+
+    svg_path = os.path.join(TEMPLATE_DIR, "complex.svg")
+    photos = [os.path.join(IMAGE_DIR, name) for name in ("1.jpg", "2.jpg", "3.jpg")]
+    print(f"Lô {args.pages} trang complex.svg nhúng {len(photos)} ảnh:")
+    with tempfile.TemporaryDirectory() as work_dir:
+        pages = iter(range(args.pages))
+        legacy = _do("cũ", args.pages,
+                     lambda: _trang_cu(svg_path, os.path.join(work_dir, f"cu_{next(pages)}.svg"), photos))
+        jobs = [SvgRenderJob.from_complex_data(svg_path, os.path.join(work_dir, f"moi_{i}.svg"), {"photos": photos})
+                for i in range(args.pages)]
+        batch = _do("lô", args.pages, lambda: render_svg_batch(jobs, max_workers=args.workers), repeat=False)
+        print(f"  nhanh hơn {legacy / batch:.1f}x")
+
+    print("Kích thước trang complex.svg theo cách nhúng ảnh:")
+    template = load_svg_template(svg_path)
+    images = {f"photo{i}": path for i, path in enumerate(photos, start=1)}
+    for label, embed in [("gốc", None), ("webp q80 x2", EmbedOptions()), ("jpeg q80 x2", EmbedOptions("jpeg")),
+                         ("png x1", EmbedOptions("png", scale=1))]:
+        template.render(images=images, embed=embed)  # làm nóng cache
+        start = time.perf_counter()
+        svg_text = template.render(images=images, embed=embed)
+        print(f"  {label:<12}: {len(svg_text) / 1e6:6.2f} MB | render (cache nóng) {1000 * (time.perf_counter() - start):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Báo cáo từ log tương tác API (logs/api_interactions): độ trễ p50/p95/p99, tỉ lệ lỗi, số lời gọi theo giờ
+và chi phí ước tính theo model.
+
+Log được đọc tăng dần vào chỉ mục sqlite (xem src/api_services/log_analytics.py), lần chạy sau chỉ đọc phần
+log mới ghi thêm.
+
+Cách chạy:
+    python scripts/phan_tich_log_api.py
+    python scripts/phan_tich_log_api.py --report latency --since 2025-10-01 --until 2025-11-01
+    python scripts/phan_tich_log_api.py --prices config/api_prices.json --json > report.json
+"""
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import argparse
+import datetime
+import json
+import time
+
+from src.api_services.api_logging import LOG_DIR
+from src.api_services.log_analytics import DEFAULT_PRICES_PATH, LogIndex, load_prices
+
+REPORTS = ("all", "latency", "errors", "throughput", "spend")
+
+
+def _doc_ngay(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
+
+
+def _giay(value) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def _in_bang(title: str, headers: list, rows: list):
+    print(f"\n== {title} ==")
+    if not rows:
+        print("(không có dữ liệu)")
+        return
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log-dir", default=LOG_DIR, help="Thư mục chứa log tương tác API.")
+    parser.add_argument("--index", default=None, help="File sqlite của chỉ mục (mặc định nằm trong --log-dir).")
+    parser.add_argument("--prices", default=DEFAULT_PRICES_PATH, help="Bảng giá theo model (JSON).")
+    parser.add_argument("--since", type=_doc_ngay, help="Chỉ tính lời gọi kết thúc từ thời điểm này (ISO, ví dụ 2025-10-01).")
+    parser.add_argument("--until", type=_doc_ngay, help="Chỉ tính lời gọi kết thúc trước thời điểm này.")
+    parser.add_argument("--report", choices=REPORTS, default="all", help="Báo cáo cần in.")
+    parser.add_argument("--no-update", action="store_true", help="Không đọc log mới, chỉ truy vấn chỉ mục hiện có.")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON.")
+    args = parser.parse_args()
+
+    prices = load_prices(args.prices) if os.path.exists(args.prices) else {}
+    with LogIndex(index_path=args.index, log_dir=args.log_dir) as index:
+        if not args.no_update:
+            start = time.perf_counter()
+            stats = index.update()
+            print(f"Đã đọc {stats['lines']} dòng mới từ {stats['files']} file, ghép {stats['calls']} lời gọi "
+                  f"({time.perf_counter() - start:.2f}s)", file=sys.stderr)
+        report = index.report(prices, args.since, args.until)
+
+    if args.json:
+        selected = report if args.report == "all" else {args.report: report[args.report]}
+        print(json.dumps(selected, ensure_ascii=False, indent=2))
+        return
+
+    show = lambda name: args.report in ("all", name)
+    if show("latency"):
+        _in_bang("Độ trễ (giây)", ["api_function", "model", "count", "p50", "p95", "p99", "max"],
+                 [[r["api_function"], r["model"] or "-", r["count"], _giay(r["p50"]), _giay(r["p95"]),
+                   _giay(r["p99"]), _giay(r["max"])] for r in report["latency"]])
+    if show("errors"):
+        _in_bang("Tỉ lệ lỗi", ["api_function", "model", "total", "errors", "rate", "http", "exception", "result", "retries"],
+                 [[r["api_function"], r["model"] or "-", r["total"], r["errors"], f"{r['error_rate']:.1%}",
+                   r["http_errors"], r["exceptions"], r["result_errors"], r["retries"]] for r in report["errors"]])
+    if show("throughput"):
+        _in_bang("Số lời gọi theo giờ", ["hour", "calls", "errors", "mean_latency"],
+                 [[r["hour"], r["calls"], r["errors"], _giay(r["mean_latency"])] for r in report["throughput"]])
+    if show("spend"):
+        _in_bang("Chi phí ước tính theo model (USD)",
+                 ["model", "calls", "input_tokens", "output_tokens", "images", "video_s", "characters", "cost"],
+                 [[r["model"] or "-", r["calls"], r["input_tokens"], r["output_tokens"], r["images"],
+                   f"{r['video_seconds']:g}", r["characters"],
+                   "không có giá" if r["cost"] is None else f"{r['cost']:.4f}"] for r in report["spend"]])
+        total = sum(r["cost"] or 0 for r in report["spend"])
+        print(f"Tổng: {total:.4f} USD")
+
+
+if __name__ == "__main__":
+    main()
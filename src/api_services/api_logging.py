@@ -0,0 +1,110 @@
+"""
+Ghi log tương tác API với chi phí thấp cho luồng gọi API.
+
+- `rut_gon_cho_log` đi qua dữ liệu một lần, tạo cấu trúc mới chỉ gồm dict/list (không sao chép chuỗi),
+  rút gọn chuỗi quá dài (base64 của ảnh/âm thanh) và che các trường bí mật (API key). Dữ liệu gốc
+  không bị sửa.
+- Bản ghi log được đẩy vào hàng đợi qua `QueueHandler`; một thread nền (`QueueListener`) mới
+  chuyển thành JSON và ghi ra file/console, nên I/O không chặn hàm gọi API.
+- File log được xoay vòng theo ngày/kích thước và nén ở thread nền (xem log_rotation).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+from src.api_services.log_rotation import RotatingCompressedFileHandler
+
+LOG_DIR = "logs/api_interactions"
+# Chuỗi dài hơn ngưỡng này (thường là base64) được rút gọn thành "...<50 ký tự cuối> (truncated)"
+LOG_MAX_STRING_LENGTH = 8192
+LOG_TAIL_CHARS = 50
+SENSITIVE_KEYS = {"authorization", "x-goog-api-key", "api_key", "apikey", "api-key"}
+REDACTED = "***"
+
+
+def _rut_gon_chuoi(value: str) -> str:
+    tail = "..." + value[-LOG_TAIL_CHARS:] + " (truncated)"
+    if value.startswith("data:"):
+        header_end = value.find(";base64,", 0, 256)
+        if header_end >= 0:
+            return value[:header_end + len(";base64,")] + tail
+    return tail
+
+
+def rut_gon_cho_log(value):
+    """
+    Trả về bản "an toàn để log" của `value` trong một lần duyệt: rút gọn chuỗi dài, che khoá bí mật,
+    bytes được thay bằng kích thước. Chỉ dict/list được tạo mới, chuỗi không bị sao chép.
+    """
+    if isinstance(value, str):
+        return _rut_gon_chuoi(value) if len(value) > LOG_MAX_STRING_LENGTH else value
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and key.lower() in SENSITIVE_KEYS else rut_gon_cho_log(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [rut_gon_cho_log(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    text = str(value)
+    return _rut_gon_chuoi(text) if len(text) > LOG_MAX_STRING_LENGTH else text
+
+
+class JsonMessageFormatter(logging.Formatter):
+    """Formatter chuyển `record.msg` dạng dict thành JSON ngay lúc ghi (trong thread nền)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.msg, dict):
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = json.dumps(record.msg, ensure_ascii=False, default=str)
+            record.args = None
+        return super().format(record)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler không định dạng bản ghi ở thread gọi: `msg` (dict đã được rút gọn, không dùng chung
+    với dữ liệu của hàm gọi) được giữ nguyên và chỉ được chuyển thành JSON ở QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Traceback phải được định dạng trước khi đưa sang thread khác
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def tao_file_handler(log_dir: str = LOG_DIR, **rotation_kwargs) -> logging.Handler:
+    """
+    File handler ghi log theo ngày, xoay vòng theo kích thước, nén và giữ log có giới hạn
+    (xem RotatingCompressedFileHandler; `rotation_kwargs` ví dụ max_bytes, compression, retention_days).
+    """
+    file_handler = RotatingCompressedFileHandler(log_dir, **rotation_kwargs)
+    file_handler.setFormatter(JsonMessageFormatter('%(message)s'))
+    return file_handler
+
+
+def tao_console_handler() -> logging.Handler:
+    """Console handler để hiển thị log ra màn hình."""
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(JsonMessageFormatter('[%(asctime)s] %(levelname)s - %(message)s'))
+    return console_handler
+
+
+def cau_hinh_logger_qua_hang_doi(logger: logging.Logger, handlers: list) -> logging.handlers.QueueListener:
+    """
+    Gắn `handlers` vào `logger` thông qua hàng đợi: logger chỉ có một DeferredQueueHandler,
+    các handler thật chạy trong thread nền. Listener được dừng (và xả hết hàng đợi) khi thoát chương trình.
+    """
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
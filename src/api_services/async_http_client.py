@@ -0,0 +1,239 @@
+import asyncio
+import json
+import os
+import time
+import threading
+import uuid
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from src.api_services.call_context import current_api_function
+from src.api_services.http_client import (
+    DEFAULT_BASE_URL,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_READ_TIMEOUT,
+    _ghi_nhan_cho_dieu_tiet,
+    _ghi_nhan_thu_lai,
+    _tua_lai_body,
+)
+from src.api_services.metrics import do_thoi_gian, ghi_nhan, tao_trace_config
+from src.api_services.rate_limiter import get_rate_limiter
+from src.api_services.retry_policy import ERROR_CONNECT, ERROR_TRANSPORT, get_retry_policy, parse_retry_after
+
+# Lỗi không mở được kết nối: request chắc chắn chưa tới server
+_CONNECT_ERRORS = (aiohttp.ClientConnectorError, getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError))
+
+# Số lời gọi đồng thời tối đa cho mỗi nhóm endpoint (xem ENDPOINT_FAMILIES trong call_context)
+DEFAULT_CONCURRENCY_LIMITS = {
+    "chat": 16,
+    "images": 8,
+    "video": 4,
+    "audio": 8,
+    "info": 2,
+}
+
+
+class AsyncHttpError(aiohttp.ClientResponseError):
+    """Lỗi HTTP (mã >= 400) từ gateway, kèm nội dung phản hồi để ghi log."""
+
+    def __init__(self, response: aiohttp.ClientResponse, response_text: str):
+        super().__init__(
+            response.request_info,
+            response.history,
+            status=response.status,
+            message=response.reason or "",
+            headers=response.headers,
+        )
+        self.response_text = response_text
+
+
+class AsyncThucChienHttpClient:
+    """
+    Client HTTP bất đồng bộ dùng chung cho ThucChien.AI gateway, xây trên `aiohttp`.
+
+    Mọi coroutine dùng chung một `aiohttp.ClientSession` (connection pool keep-alive).
+    Mỗi nhóm endpoint có một semaphore riêng để giới hạn số lời gọi đồng thời.
+    Khi một task bị huỷ (`task.cancel()`, `asyncio.timeout`...), request đang chạy bị huỷ theo,
+    kết nối được trả lại pool, slot của semaphore được giải phóng và file tải dở bị xoá.
+
+    Args:
+        base_url (str): Địa chỉ gốc của gateway (mặc định lấy từ 'THUCCHIEN_AI_BASE_URL').
+        pool_maxsize (int): Tổng số kết nối tối đa của pool.
+        connect_timeout (float): Timeout (giây) khi mở kết nối.
+        read_timeout (float): Timeout (giây) khi chờ dữ liệu từ server.
+        keepalive_timeout (float): Thời gian (giây) giữ kết nối rảnh trong pool.
+        concurrency_limits (dict): Giới hạn đồng thời theo nhóm endpoint, ghi đè DEFAULT_CONCURRENCY_LIMITS.
+        connector_kwargs (dict): Tham số bổ sung truyền thẳng vào `aiohttp.TCPConnector`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        keepalive_timeout: float = 30.0,
+        concurrency_limits: dict = None,
+        connector_kwargs: dict = None,
+    ):
+        self.base_url = (base_url or os.environ.get("THUCCHIEN_AI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        self.concurrency_limits = {**DEFAULT_CONCURRENCY_LIMITS, **(concurrency_limits or {})}
+        self.connector_kwargs = connector_kwargs or {}
+
+        self._session = None
+        self._loop = None
+        self._semaphores = {}
+
+    def url(self, path: str) -> str:
+        """Ghép đường dẫn endpoint (ví dụ "/chat/completions") với base_url."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        # Session và semaphore gắn với event loop; notebook gọi asyncio.run nhiều lần sẽ có loop mới
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout,
+                **self.connector_kwargs
+            )
+            # TraceConfig ghi nhận thời gian kết nối, TTFB và số byte cho metrics của lời gọi API hiện tại
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  trace_configs=[tao_trace_config()])
+            self._loop = loop
+            self._semaphores = {}
+        return self._session
+
+    def limit(self, family: str) -> asyncio.Semaphore:
+        """Semaphore giới hạn số lời gọi đồng thời của một nhóm endpoint."""
+        self._ensure_session()
+        if family not in self._semaphores:
+            self._semaphores[family] = asyncio.Semaphore(self.concurrency_limits.get(family, self.pool_maxsize))
+        return self._semaphores[family]
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, family: str = None, **kwargs):
+        """
+        Gửi request và trả về `aiohttp.ClientResponse` đã kiểm tra mã trạng thái (dùng với `async with`).
+        Lỗi tạm thời được thử lại theo RetryPolicy của endpoint đang gọi; slot đồng thời của nhóm
+        được giữ trong lúc chờ backoff để giảm tải cho gateway.
+
+        Raises:
+            AsyncHttpError: Khi server trả về mã trạng thái >= 400 và không (còn) được thử lại.
+        """
+        session = self._ensure_session()
+        api_function_name = current_api_function()
+        policy = get_retry_policy(api_function_name)
+
+        async with self.limit(family or "default"):
+            attempt = 0
+            while True:
+                attempt += 1
+                if api_function_name is not None:
+                    _ghi_nhan_cho_dieu_tiet(await get_rate_limiter().acquire_async(api_function_name, charge=attempt == 1))
+                if attempt > 1:
+                    _tua_lai_body(kwargs)
+                try:
+                    response = await session.request(method, url, **kwargs)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error_kind = ERROR_CONNECT if isinstance(e, _CONNECT_ERRORS) else ERROR_TRANSPORT
+                    if not policy.should_retry(method, attempt, error_kind=error_kind):
+                        raise
+                    delay = policy.compute_delay(attempt)
+                    reason = repr(e)
+                else:
+                    if response.status < 400:
+                        break
+                    retry_after = parse_retry_after(response.headers)
+                    if (not policy.should_retry(method, attempt, status_code=response.status)
+                            or policy.retry_after_too_long(retry_after)):
+                        try:
+                            raise AsyncHttpError(response, await response.text())
+                        finally:
+                            response.release()
+                    delay = policy.compute_delay(attempt, retry_after)
+                    reason = f"HTTP {response.status}"
+                    response.release()
+
+                _ghi_nhan_thu_lai(api_function_name or url, attempt, delay, reason)
+                await asyncio.sleep(delay)
+
+            try:
+                yield response
+            finally:
+                response.release()
+
+    async def request_json(self, method: str, url: str, family: str = None, **kwargs) -> dict:
+        async with self.request(method, url, family=family, **kwargs) as response:
+            body = await response.read()
+        # Tách thời gian giải mã JSON khỏi thời gian đọc phản hồi từ mạng
+        with do_thoi_gian("decode_seconds"):
+            return json.loads(body) if body.strip() else None
+
+    async def download(self, method: str, url: str, file_path: str, family: str = None,
+                       chunk_size: int = 64 * 1024, **kwargs):
+        """
+        Tải nội dung phản hồi xuống file tạm theo từng khối rồi đổi tên thành `file_path`; xoá file dở dang nếu lỗi
+        hoặc bị huỷ. Không ghi đè tại chỗ, nên một file đang được hard-link tới blob của response_cache không bị sửa.
+        """
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        try:
+            async with self.request(method, url, family=family, **kwargs) as response:
+                write_seconds = 0.0
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        start = time.perf_counter()
+                        f.write(chunk)
+                        write_seconds += time.perf_counter() - start
+                os.replace(tmp_path, file_path)
+                ghi_nhan("write_seconds", write_seconds)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+
+# --- Client async mặc định dùng chung cho module btc_api_client_async --- #
+_default_async_client = None
+_default_async_client_lock = threading.Lock()
+
+
+def get_async_http_client() -> AsyncThucChienHttpClient:
+    """Trả về client async dùng chung, tạo lười (lazy) ở lần gọi đầu tiên."""
+    global _default_async_client
+    if _default_async_client is None:
+        with _default_async_client_lock:
+            if _default_async_client is None:
+                _default_async_client = AsyncThucChienHttpClient()
+    return _default_async_client
+
+
+def set_async_http_client(client: AsyncThucChienHttpClient):
+    """Thay client async dùng chung. Client cũ cần được đóng bằng `await client.close()` bởi người gọi."""
+    global _default_async_client
+    with _default_async_client_lock:
+        _default_async_client = client
+
+
+def configure_async_http_client(**kwargs) -> AsyncThucChienHttpClient:
+    """Tạo client async mới với cấu hình pool/timeout/giới hạn đồng thời tuỳ chỉnh và đặt làm client dùng chung."""
+    client = AsyncThucChienHttpClient(**kwargs)
+    set_async_http_client(client)
+    return client
@@ -1,42 +1,71 @@
-from dotenv import load_dotenv
-
-load_dotenv()
-
-import requests
 import os
-import json
+import sys
 import base64
-import io
-from pydub import AudioSegment
+import binascii
 import logging
 import datetime
+import threading
 import uuid
 from functools import wraps
 import traceback
 import inspect # Thêm import
+import time
+
+from src.api_services import api_logging, metrics
+from src.api_services.call_context import api_call_context, current_call
+from src.api_services.response_cache import cache_response, khoa_theo_file_path
+from src.api_services.single_flight import single_flight
+from src.api_services.streaming_decode import STREAM_CHUNK_SIZE, StreamingBase64Extractor
+from src.api_services.streaming_upload import FileInput, json_body
 
 # --- Cấu hình Logger --- #
-LOG_DIR = "logs/api_interactions"
-os.makedirs(LOG_DIR, exist_ok=True)
+LOG_DIR = api_logging.LOG_DIR
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
+# Bản ghi mang msg dạng dict, chỉ handler của module (JsonMessageFormatter) mới chuyển thành JSON;
+# không đẩy lên root logger để handler của ứng dụng không in ra repr của dict.
+logger.propagate = False
 
-# Chỉ cấu hình handlers một lần để tránh trùng lặp
-if not logger.handlers:
-    # File handler để ghi log vào file hàng ngày
-    log_filename = datetime.datetime.now().strftime("api_interactions_%Y-%m-%d.log")
-    file_handler = logging.FileHandler(os.path.join(LOG_DIR, log_filename), encoding='utf-8')
-    file_handler.setFormatter(logging.Formatter('%(message)s'))
-    logger.addHandler(file_handler)
+_log_listener = None
+_da_khoi_tao = False
+_khoa_khoi_tao = threading.Lock()
 
-    # Console handler để hiển thị log ra màn hình
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s'))
-    logger.addHandler(console_handler)
+
+def _khoi_tao_lan_dau():
+    """
+    Nạp .env và gắn handler ghi log ở lời gọi API đầu tiên thay vì lúc import module.
+    Script chỉ import module (hoặc chỉ dùng hằng số, hàm tiện ích) không phải tạo thư mục log,
+    mở file log và khởi động thread nền.
+    """
+    global _da_khoi_tao, _log_listener
+    if _da_khoi_tao:
+        return
+    with _khoa_khoi_tao:
+        if _da_khoi_tao:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        # Chỉ cấu hình handlers một lần để tránh trùng lặp. File và console handler chạy trong thread nền
+        # (QueueListener) nên việc chuyển sang JSON và ghi file không chặn hàm gọi API.
+        if not logger.handlers:
+            _log_listener = api_logging.cau_hinh_logger_qua_hang_doi(
+                logger, [api_logging.tao_file_handler(LOG_DIR), api_logging.tao_console_handler()]
+            )
+        _da_khoi_tao = True
+
+
+def get_http_client():
+    """
+    HTTP client dùng chung (xem http_client.get_http_client). requests/urllib3 chiếm phần lớn thời gian
+    import nên chỉ được import ở lời gọi API đầu tiên.
+    """
+    from src.api_services.http_client import get_http_client as _get_http_client
+    return _get_http_client()
 
 # --- Hàm tiện ích ghi log --- #
 def log_api_interaction(interaction_type: str, api_function_name: str, data: dict, interaction_id: str, level=logging.INFO):
+    # `data` đã được rút gọn bằng rut_gon_cho_log; bản ghi được chuyển thành JSON ở thread nền
     log_entry = {
         "timestamp": datetime.datetime.now().isoformat(),
         "interaction_id": interaction_id,
@@ -44,150 +73,516 @@ def log_api_interaction(interaction_type: str, api_function_name: str, data: dic
         "api_function": api_function_name,
         "data": data
     }
-    log_message = json.dumps(log_entry, ensure_ascii=False)
-    logger.log(level, log_message)
+    logger.log(level, log_entry)
 
 # --- Decorator cho API calls --- #
-def log_api_call(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        interaction_id = str(uuid.uuid4())
-        api_function_name = func.__name__
-
-        # Lấy api_key từ os.environ.get để tránh lộ thông tin trong log
-        api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-
-        # Chuẩn bị headers cho log (loại bỏ API key)
-        log_headers = {}
-        if 'headers' in kwargs and isinstance(kwargs['headers'], dict):
-            log_headers = {k: v for k, v in kwargs['headers'].items() if k.lower() not in ['authorization', 'x-goog-api-key']}
-        # Đặc biệt cho 'kiem_tra_chi_tieu' và các hàm GET/download có headers đặc biệt
-        if api_function_name == "kiem_tra_chi_tieu" or api_function_name == "tai_xuong_video_hoan_thanh" or api_function_name == "kiem_tra_trang_thai_video":
-            # Đối với các hàm này, headers là một dict được tạo trong hàm, không phải từ kwargs
-            # Cần lấy headers từ logic bên trong hàm nếu cần log headers cụ thể.
-            pass # Sẽ xử lý trong từng hàm nếu cần log headers cụ thể
-
-        # --- Tái cấu trúc logic ghi log payload ---
-        log_payload = {}
-        try:
-            # Lấy chữ ký của hàm gốc
-            sig = inspect.signature(func)
-            # Liên kết các đối số đã truyền với chữ ký để lấy tên tham số
-            bound_args = sig.bind(*args, **kwargs).arguments
-            
-            # Tạo payload từ các đối số đã liên kết
-            log_payload = bound_args.copy()
-            
-            # Loại bỏ các tham số không phải là payload khỏi log
-            log_payload.pop('self', None) # Bỏ 'self' nếu là phương thức của class
-            log_payload.pop('file_path', None) # file_path được log riêng
-            
-            # Nếu hàm có **kwargs, gom các tham số phụ vào một mục
-            if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values()):
-                main_params = {p.name for p in sig.parameters.values() if p.kind != inspect.Parameter.VAR_KEYWORD}
-                additional_kwargs = {k: v for k, v in log_payload.items() if k not in main_params}
-                
-                # Giữ lại các tham số chính và gom phần còn lại
-                log_payload = {k: v for k, v in log_payload.items() if k in main_params}
-                if additional_kwargs:
-                    log_payload['additional_kwargs'] = additional_kwargs
-
-        except Exception as e:
-            # Nếu có lỗi trong quá trình inspect, quay lại phương pháp cũ hơn
-            if 'payload' in kwargs and isinstance(kwargs['payload'], dict):
-                log_payload = kwargs['payload']
-            elif 'json' in kwargs and isinstance(kwargs['json'], dict):
-                log_payload = kwargs['json']
-            log_payload['logging_error'] = f"Could not inspect args: {e}"
-
-
-        # Bổ sung file_path nếu có trong kwargs
-        log_data_for_request = {
-            "url": kwargs.get("url") if "url" in kwargs else "(URL not available for logging)",
-            "headers": log_headers,
-            "payload": log_payload,
+def _chuan_bi_log_request(sig: inspect.Signature, args, kwargs) -> dict:
+    # Chuẩn bị headers cho log (loại bỏ API key)
+    log_headers = {}
+    if 'headers' in kwargs and isinstance(kwargs['headers'], dict):
+        log_headers = {k: v for k, v in kwargs['headers'].items() if k.lower() not in ['authorization', 'x-goog-api-key']}
+
+    # --- Tái cấu trúc logic ghi log payload ---
+    log_payload = {}
+    try:
+        # Liên kết các đối số đã truyền với chữ ký của hàm gốc để lấy tên tham số
+        bound_args = sig.bind(*args, **kwargs).arguments
+
+        # Tạo payload từ các đối số đã liên kết
+        log_payload = dict(bound_args)
+
+        # Loại bỏ các tham số không phải là payload khỏi log
+        log_payload.pop('self', None) # Bỏ 'self' nếu là phương thức của class
+        log_payload.pop('file_path', None) # file_path được log riêng
+
+        # Nếu hàm có **kwargs, gom các tham số phụ vào một mục
+        if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values()):
+            main_params = {p.name for p in sig.parameters.values() if p.kind != inspect.Parameter.VAR_KEYWORD}
+            additional_kwargs = {k: v for k, v in log_payload.items() if k not in main_params}
+
+            # Giữ lại các tham số chính và gom phần còn lại
+            log_payload = {k: v for k, v in log_payload.items() if k in main_params}
+            if additional_kwargs:
+                log_payload['additional_kwargs'] = additional_kwargs
+
+    except Exception as e:
+        # Nếu có lỗi trong quá trình inspect, quay lại phương pháp cũ hơn
+        if 'payload' in kwargs and isinstance(kwargs['payload'], dict):
+            log_payload = dict(kwargs['payload'])
+        elif 'json' in kwargs and isinstance(kwargs['json'], dict):
+            log_payload = dict(kwargs['json'])
+        log_payload['logging_error'] = f"Could not inspect args: {e}"
+
+
+    # Bổ sung file_path nếu có trong kwargs
+    log_data_for_request = {
+        "url": kwargs.get("url") if "url" in kwargs else "(URL not available for logging)",
+        "headers": log_headers,
+        # Ảnh/âm thanh base64 trong tham số (ví dụ image của tao_video) cũng được rút gọn
+        "payload": api_logging.rut_gon_cho_log(log_payload),
+    }
+    if "file_path" in kwargs:
+        log_data_for_request["file_path"] = kwargs["file_path"]
+    elif 'file_path' in log_payload: # Xử lý trường hợp file_path là đối số vị trí
+         log_data_for_request["file_path"] = log_payload.get('file_path')
+    return log_data_for_request
+
+
+def _chuan_bi_log_response(result, kwargs) -> dict:
+    # Ghi log response thành công. Base64 trong response_data (b64_json, image_url data URL, inlineData)
+    # được rút gọn trong cùng một lần duyệt, không sao chép toàn bộ phản hồi và không sửa `result`.
+    log_data_for_response = {
+        "status": "success",
+        "result": api_logging.rut_gon_cho_log(result)
+    }
+
+    if "file_path" in kwargs and os.path.exists(kwargs["file_path"]):
+        log_data_for_response["saved_file"] = kwargs["file_path"]
+    return log_data_for_response
+
+
+def _chuan_bi_log_loi(e: Exception):
+    """Trả về (loại interaction, dữ liệu log, level) cho một exception phát sinh trong lời gọi API."""
+    # Lỗi HTTP của requests, hoặc lỗi HTTP từ client async (có thuộc tính 'status').
+    # Lỗi của requests chỉ có thể xảy ra khi requests đã được import, nên không import requests chỉ để kiểm tra.
+    requests = sys.modules.get("requests")
+    is_requests_error = requests is not None and isinstance(e, requests.exceptions.RequestException)
+    if is_requests_error or getattr(e, "status", None) is not None:
+        response = getattr(e, "response", None)
+        error_details = {
+            "status": "error",
+            "error_message": str(e),
+            "response_text": getattr(response, "text", getattr(e, "response_text", "N/A")),
+            "status_code": getattr(response, "status_code", getattr(e, "status", "N/A"))
         }
-        if "file_path" in kwargs:
-            log_data_for_request["file_path"] = kwargs["file_path"]
-        elif 'file_path' in log_payload: # Xử lý trường hợp file_path là đối số vị trí
-             log_data_for_request["file_path"] = log_payload.get('file_path')
-
-        # Ghi log request
-        log_api_interaction("request", api_function_name, log_data_for_request, interaction_id)
-
-        try:
-            result = func(*args, **kwargs)
-            # Ghi log response thành công
-            log_data_for_response = {
-                "status": "success",
-                "result": result
-            }
+        return "error_response", error_details, logging.ERROR
+    error_details = {
+        "status": "exception",
+        "error_message": str(e),
+        "traceback": traceback.format_exc()
+    }
+    return "exception", error_details, logging.CRITICAL
+
+
+def _tao_ham_lay_model(sig: inspect.Signature):
+    """Trả về hàm lấy giá trị tham số `model` từ (args, kwargs) của một lời gọi, dùng làm nhãn metrics."""
+    model_param = sig.parameters.get("model")
+    if model_param is None:
+        return lambda args, kwargs: None
+    model_index = list(sig.parameters).index("model")
+    default = None if model_param.default is inspect.Parameter.empty else model_param.default
+
+    def lay_model(args, kwargs):
+        if "model" in kwargs:
+            return kwargs["model"]
+        return args[model_index] if model_index < len(args) else default
+
+    return lay_model
+
 
-            # Cắt ngắn dữ liệu base64 trong log nếu có
-            if isinstance(result, dict):
-                # For sinh_hinh_anh, sinh_hinh_anh_voi_chat, sinh_sua_hinh_anh_voi_google_gemini
-                if "response_data" in result and isinstance(result["response_data"], dict):
-                    response_data_for_log = json.loads(json.dumps(result["response_data"])) # Deep copy for modification
-                    # Handle sinh_hinh_anh response structure
-                    if "data" in response_data_for_log and isinstance(response_data_for_log["data"], list) and response_data_for_log["data"]:
-                        for idx, item in enumerate(response_data_for_log["data"]):
-                            if "b64_json" in item:
-                                response_data_for_log["data"][idx]["b64_json"] = "..." + item["b64_json"][-50:] + " (truncated)"
-                    # Handle sinh_hinh_anh_voi_chat and sinh_sua_hinh_anh_voi_google_gemini response structure
-                    if "choices" in response_data_for_log and isinstance(response_data_for_log["choices"], list) and response_data_for_log["choices"]:
-                        for choice_idx, choice in enumerate(response_data_for_log["choices"]):
-                            if "message" in choice and "images" in choice["message"] and isinstance(choice["message"]["images"], list) and choice["message"]["images"]:
-                                for img_idx, image_data in enumerate(choice["message"]["images"]):
-                                    if "image_url" in image_data and "url" in image_data["image_url"] and image_data["image_url"]["url"].startswith("data:") and ";base64," in image_data["image_url"]["url"]:
-                                        full_url = image_data["image_url"]["url"]
-                                        parts = full_url.split(";base64,")
-                                        truncated_b64 = "..." + parts[1][-50:] + " (truncated)"
-                                        response_data_for_log["choices"][choice_idx]["message"]["images"][img_idx]["image_url"]["url"] = parts[0] + ";base64," + truncated_b64
-                            if "content" in choice and "parts" in choice["content"] and isinstance(choice["content"]["parts"], list) and choice["content"]["parts"]:
-                                 for part_idx, part in enumerate(choice["content"]["parts"]):
-                                    if "inlineData" in part and "data" in part["inlineData"] and isinstance(part["inlineData"]["data"], str):
-                                        if part["inlineData"]["data"].startswith("iVBORw") or part["inlineData"]["data"].startswith("UklGR"): # Common image/audio base64 starts
-                                            response_data_for_log["choices"][choice_idx]["content"]["parts"][part_idx]["inlineData"]["data"] = "..." + part["inlineData"]["data"][-50:] + " (truncated)"
-
-
-                    # For chuyen_van_ban_thanh_giong_noi_voi_google response structure
-                    # The actual base64 is not in `response_data` directly but processed into a file
-                    # However, if any base64 was passed as `contents` for other Gemini calls, it should be truncated in `log_payload`
-                    
-                    log_data_for_response["result"]["response_data"] = response_data_for_log
-                
-                # For chuyen_van_ban_thanh_giong_noi_voi_google, the base64 is handled internally before returning.
-                # The result itself is a success message. No direct base64 in `result`.
-
-            if "file_path" in kwargs and os.path.exists(kwargs["file_path"]):
-                log_data_for_response["saved_file"] = kwargs["file_path"]
+def _ket_thuc_metrics(call, start: float, result=None, error: Exception = None):
+    """Chốt số liệu của lời gọi và đưa vào histogram của registry metrics dùng chung."""
+    metrics.ket_thuc_lan_goi(call, time.perf_counter() - start)
+    metrics.get_metrics_registry().ghi_nhan_loi_goi(call, metrics.trang_thai_lan_goi(call, result, error))
 
+
+def _ket_thuc_khi_het_luong(stream, call, start: float, api_function_name: str, interaction_id: str,
+                            log_enabled: bool, kwargs):
+    """
+    Với kết quả dạng luồng (có `khi_ket_thuc`, xem chat_stream), metrics và log response được chốt khi luồng
+    kết thúc thay vì ngay khi hàm API trả về.
+    """
+    def ket_thuc(result, error):
+        _ket_thuc_metrics(call, start, result=result, error=error)
+        if error is not None:
+            interaction_type, error_details, level = _chuan_bi_log_loi(error)
+            error_details.update(call.as_log_dict())
+            log_api_interaction(interaction_type, api_function_name, error_details, interaction_id, level=level)
+        elif log_enabled:
+            log_data_for_response = _chuan_bi_log_response(result, kwargs)
+            log_data_for_response.update(call.as_log_dict())
             log_api_interaction("response", api_function_name, log_data_for_response, interaction_id)
+
+    stream.khi_ket_thuc(ket_thuc)
+
+
+def log_api_call(func):
+    """
+    Decorator ghi log request/response/lỗi cho mỗi lời gọi API. Hỗ trợ cả hàm đồng bộ và coroutine (async def).
+    Mỗi lời gọi cũng được đo (thời gian, kết nối, TTFB, số byte, giải mã, ghi file) và đưa vào metrics.
+    Hàm trả về phản hồi dạng luồng (ví dụ sinh_phan_hoi_tro_chuyen_theo_luong) được chốt khi luồng kết thúc.
+    """
+    api_function_name = func.__name__
+    sig = inspect.signature(func)
+    lay_model = _tao_ham_lay_model(sig)
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            _khoi_tao_lan_dau()
+            interaction_id = str(uuid.uuid4())
+            log_enabled = logger.isEnabledFor(logging.INFO)
+            if log_enabled:
+                log_api_interaction("request", api_function_name, _chuan_bi_log_request(sig, args, kwargs), interaction_id)
+            with api_call_context(api_function_name) as call:
+                call.model = lay_model(args, kwargs)
+                start = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    _ket_thuc_metrics(call, start, error=e)
+                    interaction_type, error_details, level = _chuan_bi_log_loi(e)
+                    error_details.update(call.as_log_dict())
+                    log_api_interaction(interaction_type, api_function_name, error_details, interaction_id, level=level)
+                    raise # Re-raise the exception after logging
+                if hasattr(result, "khi_ket_thuc"):
+                    _ket_thuc_khi_het_luong(result, call, start, api_function_name, interaction_id, log_enabled, kwargs)
+                    return result
+                _ket_thuc_metrics(call, start, result=result)
+            if log_enabled:
+                log_data_for_response = _chuan_bi_log_response(result, kwargs)
+                log_data_for_response.update(call.as_log_dict())
+                log_api_interaction("response", api_function_name, log_data_for_response, interaction_id)
             return result
-        except requests.exceptions.RequestException as e:
-            error_details = {
-                "status": "error",
-                "error_message": str(e),
-                "response_text": getattr(e.response, "text", "N/A"),
-                "status_code": getattr(e.response, "status_code", "N/A")
-            }
-            log_api_interaction("error_response", api_function_name, error_details, interaction_id, level=logging.ERROR)
-            raise # Re-raise the exception after logging
-        except Exception as e:
-            error_details = {
-                "status": "exception",
-                "error_message": str(e),
-                "traceback": traceback.format_exc()
-            }
-            log_api_interaction("exception", api_function_name, error_details, interaction_id, level=logging.CRITICAL)
-            raise # Re-raise the exception after logging
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        _khoi_tao_lan_dau()
+        interaction_id = str(uuid.uuid4())
+        # Ghi log request (bỏ qua hoàn toàn việc chuẩn bị dữ liệu log nếu level INFO bị tắt)
+        log_enabled = logger.isEnabledFor(logging.INFO)
+        if log_enabled:
+            log_api_interaction("request", api_function_name, _chuan_bi_log_request(sig, args, kwargs), interaction_id)
+        with api_call_context(api_function_name) as call:
+            call.model = lay_model(args, kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                _ket_thuc_metrics(call, start, error=e)
+                interaction_type, error_details, level = _chuan_bi_log_loi(e)
+                error_details.update(call.as_log_dict())
+                log_api_interaction(interaction_type, api_function_name, error_details, interaction_id, level=level)
+                raise # Re-raise the exception after logging
+            if hasattr(result, "khi_ket_thuc"):
+                _ket_thuc_khi_het_luong(result, call, start, api_function_name, interaction_id, log_enabled, kwargs)
+                return result
+            _ket_thuc_metrics(call, start, result=result)
+        # Ghi log response thành công, kèm số lần thử lại
+        if log_enabled:
+            log_data_for_response = _chuan_bi_log_response(result, kwargs)
+            log_data_for_response.update(call.as_log_dict())
+            log_api_interaction("response", api_function_name, log_data_for_response, interaction_id)
+        return result
 
     return wrapper
 
+# --- Hàm tiện ích dùng chung cho bản đồng bộ và bản async (btc_api_client_async) --- #
+def _lay_api_key() -> str:
+    _khoi_tao_lan_dau()
+    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
+    if not api_key:
+        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    return api_key
+
+
+def _doc_json(response) -> dict:
+    """`response.json()` có đo thời gian giải mã cho metrics."""
+    with metrics.do_thoi_gian("decode_seconds"):
+        return response.json()
+
+
+def _ghi_phan_hoi_xuong_file(response, file_path: str, chunk_size: int = 8192):
+    """
+    Ghi thân phản hồi (stream) xuống file theo từng khối; chỉ thời gian ghi đĩa được tính vào write_seconds.
+    Ghi vào file tạm rồi đổi tên, để không ghi đè tại chỗ một file đang được hard-link tới blob của response_cache.
+    """
+    write_seconds = 0.0
+    tmp_path = _file_tam(file_path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                start = time.perf_counter()
+                f.write(chunk)
+                write_seconds += time.perf_counter() - start
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    metrics.ghi_nhan("write_seconds", write_seconds)
+
+
+def _luu_bytes(file_path: str, data: bytes):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = _file_tam(file_path)
+    try:
+        with metrics.do_thoi_gian("write_seconds"):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _xu_ly_phan_hoi_sinh_hinh_anh(response_json: dict, file_path: str) -> dict:
+    if "data" in response_json and response_json["data"]:
+        first_image_data = response_json["data"][0]
+        if "b64_json" in first_image_data and first_image_data["b64_json"]:
+            image_b64 = first_image_data["b64_json"]
+            try:
+                _luu_bytes(file_path, base64.b64decode(image_b64))
+                return {"success": True, "message": f"Hình ảnh đã được lưu vào: {file_path}", "file_path": file_path, "response_data": response_json}
+            except Exception as e:
+                return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_json}
+        elif "url" in first_image_data and first_image_data["url"]:
+            # Trong trường hợp trả về URL, bạn có thể tải xuống ở đây hoặc chỉ trả về URL
+            # Để đơn giản, hiện tại tôi sẽ chỉ trả về URL và message.
+            return {"success": True, "message": f"Đã nhận được URL hình ảnh: {first_image_data['url']}. Bạn có thể tải từ đây.", "url": first_image_data['url'], "response_data": response_json}
+    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_json}
+
+
+def _xu_ly_phan_hoi_hinh_anh_chat(response_json: dict, file_path: str) -> dict:
+    if "choices" in response_json and response_json["choices"]:
+        for choice in response_json["choices"]:
+            if "message" in choice and "images" in choice["message"] and choice["message"]["images"]:
+                first_image_data_wrapper = choice["message"]["images"][0]
+                if "image_url" in first_image_data_wrapper and "url" in first_image_data_wrapper["image_url"]:
+                    full_image_data_url = first_image_data_wrapper["image_url"]["url"]
+
+                    if full_image_data_url.startswith("data:") and ";base64," in full_image_data_url:
+                        parts = full_image_data_url.split(";base64,")
+                        mime_type_part = parts[0]
+                        image_b64 = parts[1]
+                        mime_type = mime_type_part.split(":")[1] if ":" in mime_type_part else "image/png"
+
+                        try:
+                            extension = "." + mime_type.split('/')[-1] if '/' in mime_type else ".png"
+                            final_file_path = os.path.splitext(file_path)[0] + extension
+                            _luu_bytes(final_file_path, base64.b64decode(image_b64))
+                            return {"success": True, "message": f"Hình ảnh đã được lưu vào: {final_file_path}", "file_path": final_file_path, "response_data": response_json}
+                        except Exception as e:
+                            return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_json}
+                    else:
+                        return {"success": True, "message": f"Đã nhận được URL hình ảnh không phải base64: {full_image_data_url}. Bạn có thể tải từ đây.", "url": full_image_data_url, "response_data": response_json}
+    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_json}
+
+
+def _xu_ly_phan_hoi_hinh_anh_gemini(response_data: dict, file_path: str) -> dict:
+    if "candidates" in response_data and response_data["candidates"]:
+        for candidate in response_data["candidates"]:
+            if "content" in candidate and "parts" in candidate["content"]:
+                for part in candidate["content"]["parts"]:
+                    if "inlineData" in part and part["inlineData"] and "data" in part["inlineData"]:
+                        image_b64 = part["inlineData"]["data"]
+                        mime_type = part["inlineData"]["mimeType"]
+
+                        try:
+                            extension = "." + mime_type.split('/')[-1] if '/' in mime_type else ".png"
+                            final_file_path = os.path.splitext(file_path)[0] + extension
+                            _luu_bytes(final_file_path, base64.b64decode(image_b64))
+                            return {"success": True, "message": f"Hình ảnh đã được lưu vào: {final_file_path}", "file_path": final_file_path, "response_data": response_data}
+                        except Exception as e:
+                            return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_data}
+    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_data}
+
+
+def _xu_ly_phan_hoi_giong_noi_google(response_data: dict, file_path: str) -> dict:
+    # Trích xuất dữ liệu âm thanh base64 và mime_type
+    audio_part = response_data["candidates"][0]["content"]["parts"][0]["inlineData"]
+    audio_data_base64 = audio_part["data"]
+    mime_type = audio_part.get("mimeType")
+    decoded_audio_data = base64.b64decode(audio_data_base64)
+    return _ma_hoa_pcm([decoded_audio_data], mime_type, file_path)
+
+
+def _dinh_dang_am_thanh(file_path: str) -> str:
+    """Định dạng đầu ra (wav/mp3/opus) mà `_ma_hoa_pcm` chọn theo đuôi của `file_path`; là một phần của khoá cache."""
+    from src.audio_processing import pcm_encoder
+
+    return pcm_encoder.resolve_output_path(file_path)[1]
+
+
+def _ma_hoa_pcm(pcm_chunks, mime_type: str, file_path: str) -> dict:
+    """
+    Mã hoá PCM thô (theo từng khối) sang định dạng theo đuôi của `file_path`: .wav, .mp3, .opus/.ogg;
+    đuôi khác được đổi thành .mp3. Tần số lấy mẫu và số kênh được đọc từ `mime_type` (xem pcm_encoder).
+    """
+    from src.audio_processing import pcm_encoder
+
+    new_file_path, output_format = pcm_encoder.resolve_output_path(file_path)
+    try:
+        pcm_format = pcm_encoder.parse_pcm_mime_type(mime_type)
+        audio_info = pcm_encoder.encode_pcm(pcm_chunks, new_file_path, pcm_format, output_format)
+    except Exception as encode_err:
+        return {"error": f"Lỗi chuyển đổi định dạng âm thanh sang {output_format.upper()}", "details": str(encode_err)}
+    message = f"File âm thanh đã được tải về và chuyển đổi thành công sang {output_format.upper()} tại: {new_file_path}"
+    return {"success": True, "message": message, "file_path": new_file_path, "audio": audio_info}
+
+
+# --- Giải mã base64 theo luồng (xem streaming_decode) --- #
+def _file_tam(file_path: str) -> str:
+    return f"{file_path}.{uuid.uuid4().hex}.part"
+
+
+def _giai_ma_stream(chunks, file_path: str):
+    """
+    Đọc phản hồi JSON theo từng khối, giải mã chuỗi base64 đầu tiên vào file tạm.
+    Trả về (response_data đã rút gọn base64, thông tin artifact hoặc None, đường dẫn file tạm).
+    """
+    tmp_path = _file_tam(file_path)
+    extractor = StreamingBase64Extractor(tmp_path)
+    try:
+        for chunk in chunks:
+            extractor.feed(chunk)
+        return extractor.close(), extractor.artifact, tmp_path
+    except BaseException:
+        extractor.abort()
+        raise
+    finally:
+        _ghi_nhan_thoi_gian_giai_ma(extractor)
+
+
+def _ghi_nhan_thoi_gian_giai_ma(extractor: StreamingBase64Extractor):
+    metrics.ghi_nhan("decode_seconds", extractor.decode_seconds)
+    metrics.ghi_nhan("write_seconds", extractor.write_seconds)
+
+
+def _lay_mime_type(response_data: dict, artifact: dict, default: str = "image/png") -> str:
+    if artifact["mime_type"]:
+        return artifact["mime_type"]
+    parent = response_data
+    for key in artifact["path"][:-1]:
+        parent = parent[key]
+    return parent.get("mimeType", default)
+
+
+def _hoan_tat_hinh_anh_stream(response_data: dict, artifact: dict, tmp_path: str, file_path: str,
+                              xu_ly_du_phong, doi_duoi_theo_mime: bool) -> dict:
+    """
+    Đổi tên file tạm thành file kết quả. Nếu phản hồi không chứa base64 (ví dụ chỉ có URL),
+    dùng hàm xử lý dạng dict `xu_ly_du_phong` như trước.
+    """
+    if artifact is None:
+        return xu_ly_du_phong(response_data, file_path)
+    try:
+        final_file_path = file_path
+        if doi_duoi_theo_mime:
+            mime_type = _lay_mime_type(response_data, artifact)
+            extension = "." + mime_type.split('/')[-1] if '/' in mime_type else ".png"
+            final_file_path = os.path.splitext(file_path)[0] + extension
+        os.replace(tmp_path, final_file_path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_data}
+    return {"success": True, "message": f"Hình ảnh đã được lưu vào: {final_file_path}", "file_path": final_file_path, "response_data": response_data}
+
+
+def _xu_ly_hinh_anh_stream(response, file_path: str, xu_ly_du_phong, doi_duoi_theo_mime: bool) -> dict:
+    try:
+        response_data, artifact, tmp_path = _giai_ma_stream(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), file_path)
+    except (binascii.Error, OSError) as e:
+        return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}"}
+    return _hoan_tat_hinh_anh_stream(response_data, artifact, tmp_path, file_path, xu_ly_du_phong, doi_duoi_theo_mime)
+
+
+def _hoan_tat_giong_noi_google_stream(response_data: dict, artifact: dict, tmp_path: str, file_path: str) -> dict:
+    if artifact is None:
+        return _xu_ly_phan_hoi_giong_noi_google(response_data, file_path)
+    try:
+        # PCM đã giải mã nằm trong file tạm; đọc theo khối và đẩy thẳng vào bộ mã hoá
+        from src.audio_processing.pcm_encoder import doc_file_theo_khoi
+        mime_type = _lay_mime_type(response_data, artifact, default=None)
+        return _ma_hoa_pcm(doc_file_theo_khoi(tmp_path), mime_type, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _tao_payload_video(
+    prompt: str,
+    image: dict,
+    negative_prompt: str,
+    aspect_ratio: str,
+    duration_seconds: int,
+    sample_count: int,
+    resolution: str,
+    person_generation: str,
+    extra: dict
+) -> dict:
+    instances_payload = {"prompt": prompt}
+    if image:
+        instances_payload["image"] = image
+
+    parameters_payload = {}
+    if negative_prompt:
+        parameters_payload["negativePrompt"] = negative_prompt
+    if aspect_ratio:
+        parameters_payload["aspectRatio"] = aspect_ratio
+    if duration_seconds is not None:
+        parameters_payload["durationSeconds"] = duration_seconds
+    if sample_count is not None:
+        parameters_payload["sampleCount"] = sample_count
+    if resolution:
+        parameters_payload["resolution"] = resolution
+    if person_generation:
+        parameters_payload["personGeneration"] = person_generation
+
+    payload = {
+        "instances": [instances_payload]
+    }
+    if parameters_payload:
+        payload["parameters"] = parameters_payload
+
+    payload.update(extra)
+    return payload
+
+
+# Xác định mime_type dựa trên phần mở rộng của file
+AUDIO_MIME_TYPES = {
+    ".mp3": "audio/mp3",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+    ".m4a": "audio/m4a",
+}
+
+
+def _tao_payload_chuyen_am_thanh(audio_file_path: str, prompt: str, model: str, extra: dict) -> dict:
+    file_extension = os.path.splitext(audio_file_path)[1].lower()
+    mime_type = AUDIO_MIME_TYPES.get(file_extension, "application/octet-stream")
+
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "audio_url",
+                        "audio_url": {
+                            # File được base64 theo luồng khi gửi (xem streaming_upload)
+                            "url": FileInput(audio_file_path, mime_type, data_url=True)
+                        }
+                    }
+                ]
+            }
+        ],
+        **extra
+    }
+
 # --- Hàm API gốc (được sửa đổi để chấp nhận decorator) --- #
 
 
 @log_api_call
+@single_flight
+@cache_response
 def sinh_phan_hoi_tro_chuyen(
     messages: list[dict],
     model: str = "gemini-2.5-flash",
@@ -205,11 +600,9 @@ def sinh_phan_hoi_tro_chuyen(
     Returns:
         dict: Phản hồi JSON từ ThucChien.AI hoặc thông báo lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/chat/completions"
+    url = get_http_client().url("/chat/completions")
 
     headers = {
         "Content-Type": "application/json",
@@ -222,12 +615,66 @@ def sinh_phan_hoi_tro_chuyen(
         **kwargs # Unpack kwargs into the payload
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, headers=headers, json=payload)
     response.raise_for_status()
-    return response.json()
+    return _doc_json(response)
 
 
 @log_api_call
+def sinh_phan_hoi_tro_chuyen_theo_luong(
+    messages: list[dict],
+    model: str = "gemini-2.5-flash",
+    **kwargs
+):
+    """
+    Giống `sinh_phan_hoi_tro_chuyen` nhưng nhận phản hồi dạng luồng (SSE): hàm trả về ngay khi nhận header
+    phản hồi một `ChatStream`; duyệt nó để nhận từng đoạn văn bản ngay khi mô hình sinh ra.
+    Phản hồi đầy đủ (kèm `usage`) nằm trong `stream.response` sau khi đọc hết, và được ghi log cùng
+    thời gian tới token đầu tiên (ttft_seconds) khi luồng kết thúc. Không đi qua cache / gộp lời gọi.
+
+    Ví dụ:
+        stream = sinh_phan_hoi_tro_chuyen_theo_luong([{"role": "user", "content": "Viết kịch bản video"}])
+        for delta in stream:
+            print(delta, end="", flush=True)
+
+    Args:
+        messages (list[dict]): Danh sách các đối tượng tin nhắn, mỗi đối tượng có 'role' và 'content'.
+        model (str): Tên của mô hình AI muốn sử dụng (mặc định là "gemini-2.5-flash").
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        ChatStream: Luồng các delta (str). Dừng giữa chừng thì gọi `close()` hoặc dùng `with`.
+    """
+    from src.api_services.chat_stream import ChatStream
+
+    api_key = _lay_api_key()
+    start = time.perf_counter()
+
+    url = get_http_client().url("/chat/completions")
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        # Chunk cuối cùng mang số token đã dùng
+        "stream_options": {"include_usage": True},
+        **kwargs,
+        "stream": True,
+    }
+
+    response = get_http_client().post(url, headers=headers, json=payload, stream=True)
+    response.raise_for_status()
+    return ChatStream(response, call=current_call(), start=start)
+
+
+@log_api_call
+@single_flight
+@cache_response
 def sinh_hinh_anh(
     prompt: str,
     file_path: str,
@@ -249,11 +696,9 @@ def sinh_hinh_anh(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/images/generations"
+    url = get_http_client().url("/images/generations")
 
     headers = {
         "Content-Type": "application/json",
@@ -268,34 +713,14 @@ def sinh_hinh_anh(
         **kwargs  # Unpack kwargs into the payload
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        # print(f"[DEBUG ERROR] API Error Response: {e.response.text}") # Debug print removed
-        raise  # Re-raise the exception after printing debug info
-    response_json = response.json()
-
-    if "data" in response_json and response_json["data"]:
-        first_image_data = response_json["data"][0]
-        if "b64_json" in first_image_data and first_image_data["b64_json"]:
-            image_b64 = first_image_data["b64_json"]
-            try:
-                image_bytes = base64.b64decode(image_b64)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-                return {"success": True, "message": f"Hình ảnh đã được lưu vào: {file_path}", "response_data": response_json}
-            except Exception as e:
-                return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_json}
-        elif "url" in first_image_data and first_image_data["url"]:
-            # Trong trường hợp trả về URL, bạn có thể tải xuống ở đây hoặc chỉ trả về URL
-            # Để đơn giản, hiện tại tôi sẽ chỉ trả về URL và message.
-            return {"success": True, "message": f"Đã nhận được URL hình ảnh: {first_image_data['url']}. Bạn có thể tải từ đây.", "url": first_image_data['url'], "response_data": response_json}
-    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_json}
+    # Đọc phản hồi theo luồng để giải mã base64 thẳng xuống file, không giữ cả phản hồi trong bộ nhớ
+    response = get_http_client().post(url, headers=headers, json=payload, stream=True)
+    response.raise_for_status()
+    return _xu_ly_hinh_anh_stream(response, file_path, _xu_ly_phan_hoi_sinh_hinh_anh, doi_duoi_theo_mime=False)
 
 
 @log_api_call
+@single_flight
 def sinh_hinh_anh_voi_chat(
     messages: list[dict],
     file_path: str,
@@ -317,11 +742,9 @@ def sinh_hinh_anh_voi_chat(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/chat/completions"
+    url = get_http_client().url("/chat/completions")
 
     headers = {
         "Content-Type": "application/json",
@@ -335,36 +758,9 @@ def sinh_hinh_anh_voi_chat(
         **kwargs
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, headers=headers, json=payload, stream=True)
     response.raise_for_status()
-    response_json = response.json()
-
-    if "choices" in response_json and response_json["choices"]:
-        for choice in response_json["choices"]:
-            if "message" in choice and "images" in choice["message"] and choice["message"]["images"]:
-                first_image_data_wrapper = choice["message"]["images"][0]
-                if "image_url" in first_image_data_wrapper and "url" in first_image_data_wrapper["image_url"]:
-                    full_image_data_url = first_image_data_wrapper["image_url"]["url"]
-                    
-                    if full_image_data_url.startswith("data:") and ";base64," in full_image_data_url:
-                        parts = full_image_data_url.split(";base64,")
-                        mime_type_part = parts[0]
-                        image_b64 = parts[1]
-                        mime_type = mime_type_part.split(":")[1] if ":" in mime_type_part else "image/png"
-
-                        try:
-                            image_bytes = base64.b64decode(image_b64)
-                            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                            extension = "." + mime_type.split('/')[-1] if '/' in mime_type else ".png"
-                            final_file_path = os.path.splitext(file_path)[0] + extension
-                            with open(final_file_path, "wb") as f:
-                                f.write(image_bytes)
-                            return {"success": True, "message": f"Hình ảnh đã được lưu vào: {final_file_path}", "response_data": response_json}
-                        except Exception as e:
-                            return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_json}
-                    else:
-                        return {"success": True, "message": f"Đã nhận được URL hình ảnh không phải base64: {full_image_data_url}. Bạn có thể tải từ đây.", "url": full_image_data_url, "response_data": response_json}
-    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_json}
+    return _xu_ly_hinh_anh_stream(response, file_path, _xu_ly_phan_hoi_hinh_anh_chat, doi_duoi_theo_mime=True)
 
 
 @log_api_call
@@ -375,23 +771,22 @@ def kiem_tra_chi_tieu() -> dict:
     Returns:
         dict: Phản hồi JSON từ ThucChien.AI chứa thông tin chi tiết về API key và mức sử dụng, hoặc thông báo lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/key/info"
+    url = get_http_client().url("/key/info")
 
     headers = {
         "accept": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
-    response = requests.get(url, headers=headers)
+    response = get_http_client().get(url, headers=headers)
     response.raise_for_status()
-    return response.json()
+    return _doc_json(response)
 
 
 @log_api_call
+@single_flight
 def sinh_sua_hinh_anh_voi_google_gemini(
     contents: list[dict],
     file_path: str,
@@ -405,6 +800,7 @@ def sinh_sua_hinh_anh_voi_google_gemini(
         contents (list[dict]): Nội dung của yêu cầu, bao gồm prompt văn bản và tùy chọn dữ liệu hình ảnh base64.
                                 Ví dụ: [{"parts": [{"text": "A photo ..."}]}]
                                 Hoặc để chỉnh sửa ảnh: [{"parts": [{"text": "Remove background"}, {"inline_data": {"mime_type": "image/png", "data": "<base64_image_data>"}}]}]
+                                `data` có thể là `FileInput("input.png")` để ảnh được base64 theo luồng khi gửi.
         file_path (str): Đường dẫn đầy đủ để lưu file hình ảnh (ví dụ: "./output_images/my_image.png").
         generation_config (dict): Cấu hình cho việc sinh nội dung, bao gồm imageConfig với aspectRatio.
                                   Ví dụ: {"imageConfig": {"aspectRatio": "9:16"}}
@@ -413,11 +809,9 @@ def sinh_sua_hinh_anh_voi_google_gemini(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/gemini/v1beta/models/gemini-2.5-flash-image-preview:generateContent"
+    url = get_http_client().url("/gemini/v1beta/models/gemini-2.5-flash-image-preview:generateContent")
 
     headers = {
         "Content-Type": "application/json",
@@ -431,32 +825,13 @@ def sinh_sua_hinh_anh_voi_google_gemini(
         payload["generationConfig"] = generation_config
     payload.update(kwargs)
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, stream=True, **json_body(payload, headers))
     response.raise_for_status()
-    response_data = response.json()
-
-    if "candidates" in response_data and response_data["candidates"]:
-        for candidate in response_data["candidates"]:
-            if "content" in candidate and "parts" in candidate["content"]:
-                for part in candidate["content"]["parts"]:
-                    if "inlineData" in part and part["inlineData"] and "data" in part["inlineData"]:
-                        image_b64 = part["inlineData"]["data"]
-                        mime_type = part["inlineData"]["mimeType"]
-
-                        try:
-                            image_bytes = base64.b64decode(image_b64)
-                            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                            extension = "." + mime_type.split('/')[-1] if '/' in mime_type else ".png"
-                            final_file_path = os.path.splitext(file_path)[0] + extension
-                            with open(final_file_path, "wb") as f:
-                                f.write(image_bytes)
-                            return {"success": True, "message": f"Hình ảnh đã được lưu vào: {final_file_path}", "response_data": response_data}
-                        except Exception as e:
-                            return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}", "response_data": response_data}
-    return {"error": "Không nhận được dữ liệu hình ảnh hợp lệ từ phản hồi API.", "response_data": response_data}
+    return _xu_ly_hinh_anh_stream(response, file_path, _xu_ly_phan_hoi_hinh_anh_gemini, doi_duoi_theo_mime=True)
 
 
 @log_api_call
+@single_flight
 def tao_video(
     model: str,
     prompt: str,
@@ -476,6 +851,7 @@ def tao_video(
         model (str): Mô hình sẽ sử dụng để tạo video (ví dụ: "veo-3.0-generate-001").
         prompt (str): Mô tả chi tiết về video cần tạo.
         image (dict): Một hình ảnh ban đầu để tạo hiệu ứng hoạt hình. Bao gồm 'bytesBase64Encoded' và 'mimeType'.
+                      'bytesBase64Encoded' có thể là `FileInput(đường_dẫn_ảnh)` để không đọc cả ảnh vào bộ nhớ.
         negative_prompt (str): Mô tả những gì không nên có trong video.
         aspect_ratio (str): Tỷ lệ khung hình của video (mặc định "16:9").
         duration_seconds (int): Thời gian của video (từ 5-8 giây, chỉ cho Veo 2).
@@ -487,46 +863,21 @@ def tao_video(
     Returns:
         dict: Phản hồi JSON từ ThucChien.AI chứa `operation_name` để theo dõi trạng thái, hoặc thông báo lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = f"https://api.thucchien.ai/gemini/v1beta/models/{model}:predictLongRunning"
+    url = get_http_client().url(f"/gemini/v1beta/models/{model}:predictLongRunning")
 
     headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": api_key
     }
 
-    instances_payload = {"prompt": prompt}
-    if image:
-        instances_payload["image"] = image
-
-    parameters_payload = {}
-    if negative_prompt:
-        parameters_payload["negativePrompt"] = negative_prompt
-    if aspect_ratio:
-        parameters_payload["aspectRatio"] = aspect_ratio
-    if duration_seconds is not None:
-        parameters_payload["durationSeconds"] = duration_seconds
-    if sample_count is not None:
-        parameters_payload["sampleCount"] = sample_count
-    if resolution:
-        parameters_payload["resolution"] = resolution
-    if person_generation:
-        parameters_payload["personGeneration"] = person_generation
+    payload = _tao_payload_video(prompt, image, negative_prompt, aspect_ratio, duration_seconds,
+                                 sample_count, resolution, person_generation, kwargs)
 
-    payload = {
-        "instances": [instances_payload]
-    }
-    if parameters_payload:
-        payload["parameters"] = parameters_payload
-
-    payload.update(kwargs)
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, **json_body(payload, headers))
     response.raise_for_status()
-    return response.json()
+    return _doc_json(response)
 
 
 @log_api_call
@@ -542,19 +893,17 @@ def kiem_tra_trang_thai_video(
     Returns:
         dict: Phản hồi JSON từ ThucChien.AI chứa trạng thái của tác vụ, hoặc thông báo lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = f"https://api.thucchien.ai/gemini/v1beta/{operation_name}"
+    url = get_http_client().url(f"/gemini/v1beta/{operation_name}")
 
     headers = {
         "x-goog-api-key": api_key
     }
 
-    response = requests.get(url, headers=headers)
+    response = get_http_client().get(url, headers=headers)
     response.raise_for_status()
-    return response.json()
+    return _doc_json(response)
 
 
 @log_api_call
@@ -572,30 +921,28 @@ def tai_xuong_video_hoan_thanh(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = f"https://api.thucchien.ai/gemini/download/v1beta/files/{video_id}:download?alt=media"
+    url = get_http_client().url(f"/gemini/download/v1beta/files/{video_id}:download?alt=media")
 
     headers = {
         "x-goog-api-key": api_key
     }
 
-    response = requests.get(url, headers=headers, stream=True)
+    response = get_http_client().get(url, headers=headers, stream=True)
     response.raise_for_status()  # Nâng lỗi cho các mã trạng thái HTTP không thành công
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    with open(file_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):\
-            f.write(chunk)
+    _ghi_phan_hoi_xuong_file(response, file_path)
 
-    return {"success": True, "message": f"Video đã được tải về thành công tại: {file_path}"}
+    return {"success": True, "message": f"Video đã được tải về thành công tại: {file_path}", "file_path": file_path}
 
 
 @log_api_call
+@single_flight
+@cache_response
 def chuyen_van_ban_thanh_giong_noi(
     model: str,
     input_text: str,
@@ -616,11 +963,9 @@ def chuyen_van_ban_thanh_giong_noi(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/audio/speech"
+    url = get_http_client().url("/audio/speech")
 
     headers = {
         "Content-Type": "application/json",
@@ -634,20 +979,21 @@ def chuyen_van_ban_thanh_giong_noi(
         **kwargs
     }
 
-    response = requests.post(url, headers=headers, json=payload, stream=True)
+    response = get_http_client().post(url, headers=headers, json=payload, stream=True)
     response.raise_for_status()  # Nâng lỗi cho các mã trạng thái HTTP không thành công
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    with open(file_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    _ghi_phan_hoi_xuong_file(response, file_path)
 
-    return {"success": True, "message": f"File âm thanh đã được tải về thành công tại: {file_path}"}
+    return {"success": True, "message": f"File âm thanh đã được tải về thành công tại: {file_path}", "file_path": file_path}
 
 
 @log_api_call
+@single_flight
+@cache_response
+@khoa_theo_file_path(_dinh_dang_am_thanh)
 def chuyen_van_ban_thanh_giong_noi_voi_google(
     model: str,
     contents: list[dict],
@@ -664,6 +1010,7 @@ def chuyen_van_ban_thanh_giong_noi_voi_google(
                                 Ví dụ một người nói: [{"parts": [{"text": "Say cheerfully: Have a wonderful day!"}]}]
                                 Ví dụ nhiều người nói: [{"parts": [{"text": "Speaker1: So... what's on the agenda today? Speaker2: You're never going to guess!"}]}]
         file_path (str): Đường dẫn đầy đủ để lưu file âm thanh (ví dụ: "./audio_output/gemini_speech.mp3").
+                         Định dạng theo đuôi file: .mp3, .wav, .opus/.ogg; đuôi khác được đổi thành .mp3.
         generation_config (dict): Cấu hình cho việc sinh nội dung, bao gồm responseModalities và speechConfig.
                                   Ví dụ: {"responseModalities": ["AUDIO"], "speechConfig": {"voiceConfig": {"prebuiltVoiceConfig": {"voiceName": "Kore"}}}}
         **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
@@ -671,11 +1018,9 @@ def chuyen_van_ban_thanh_giong_noi_voi_google(
     Returns:
         dict: Một dictionary chứa thông báo thành công hoặc lỗi.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = f"https://api.thucchien.ai/gemini/v1beta/models/{model}:generateContent"
+    url = get_http_client().url(f"/gemini/v1beta/models/{model}:generateContent")
 
     headers = {
         "Content-Type": "application/json",
@@ -689,34 +1034,15 @@ def chuyen_van_ban_thanh_giong_noi_voi_google(
         payload["generationConfig"] = generation_config
     payload.update(kwargs)
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, headers=headers, json=payload, stream=True)
     response.raise_for_status()  # Nâng lỗi cho các mã trạng thái HTTP không thành công
 
-    response_data = response.json()
-    # Trích xuất dữ liệu âm thanh base64 và mime_type
-    audio_part = response_data["candidates"][0]["content"]["parts"][0]["inlineData"]
-    audio_data_base64 = audio_part["data"]
-    mime_type = audio_part["mimeType"]
-    decoded_audio_data = base64.b64decode(audio_data_base64)
-
-    # Chuyển đổi dữ liệu âm thanh sang MP3 bằng pydub
-    # Giả định: audio/L16;codec=pcm;rate=24000 -> raw PCM, 16-bit, 1 kênh, 24000Hz
-    # Nếu mime_type chỉ ra định dạng khác, cần điều chỉnh from_file hoặc from_wav/from_raw
-    try:
-        # Sử dụng BytesIO để pydub đọc dữ liệu nhị phân đã giải mã
-        audio_segment = AudioSegment.from_file(io.BytesIO(decoded_audio_data), format="raw",
-                                               frame_rate=24000, channels=1, sample_width=2)
-        # Lưu dưới dạng MP3
-        new_file_path = os.path.join(os.path.dirname(file_path), os.path.splitext(os.path.basename(file_path))[0] + ".mp3")
-        os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
-        audio_segment.export(new_file_path, format="mp3")
-        message = f"File âm thanh đã được tải về và chuyển đổi thành công sang MP3 tại: {new_file_path}"
-        return {"success": True, "message": message}
-    except Exception as pydub_err:
-        return {"error": "Lỗi chuyển đổi định dạng âm thanh sang MP3", "details": str(pydub_err)}
+    response_data, artifact, tmp_path = _giai_ma_stream(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), file_path)
+    return _hoan_tat_giong_noi_google_stream(response_data, artifact, tmp_path, file_path)
 
 
 @log_api_call
+@single_flight
 def chuyen_am_thanh_thanh_van_ban(
     audio_file_path: str,
     prompt: str = "Please transcribe the following audio.",
@@ -725,6 +1051,8 @@ def chuyen_am_thanh_thanh_van_ban(
 ) -> dict:
     """
     Chuyển đổi file âm thanh thành văn bản (transcript) sử dụng ThucChien.AI.
+    Với bản ghi dài, dùng `src.audio_processing.chunked_transcription.transcribe_long_audio` để cắt theo khoảng lặng
+    và gửi các đoạn song song.
 
     Args:
         audio_file_path (str): Đường dẫn đến file âm thanh cần chuyển đổi.
@@ -735,53 +1063,21 @@ def chuyen_am_thanh_thanh_van_ban(
     Returns:
         dict: Phản hồi JSON từ ThucChien.AI chứa transcript.
     """
-    api_key = os.environ.get("THUCCHIEN_AI_API_KEY")
-    if not api_key:
-        raise ValueError("Biến môi trường 'THUCCHIEN_AI_API_KEY' chưa được thiết lập.")
+    api_key = _lay_api_key()
 
-    url = "https://api.thucchien.ai/chat/completions"
+    url = get_http_client().url("/chat/completions")
 
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
+    payload = _tao_payload_chuyen_am_thanh(audio_file_path, prompt, model, kwargs)
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            audio_b64 = base64.b64encode(audio_file.read()).decode('utf-8')
+        body = json_body(payload, headers)
     except FileNotFoundError:
         return {"error": f"File not found at {audio_file_path}"}
-    
-    # Xác định mime_type dựa trên phần mở rộng của file
-    file_extension = os.path.splitext(audio_file_path)[1].lower()
-    mime_types = {
-        ".mp3": "audio/mp3",
-        ".wav": "audio/wav",
-        ".ogg": "audio/ogg",
-        ".flac": "audio/flac",
-        ".m4a": "audio/m4a",
-    }
-    mime_type = mime_types.get(file_extension, "application/octet-stream")
-
-    payload = {
-        "model": model,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "audio_url",
-                        "audio_url": {
-                            "url": f"data:{mime_type};base64,{audio_b64}"
-                        }
-                    }
-                ]
-            }
-        ],
-        **kwargs
-    }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_http_client().post(url, **body)
     response.raise_for_status()
-    return response.json()
+    return _doc_json(response)
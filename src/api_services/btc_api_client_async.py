@@ -0,0 +1,509 @@
+"""
+Phiên bản asyncio của các hàm trong btc_api_client.
+
+Mỗi hàm ở đây có cùng tên, tham số và giá trị trả về với hàm đồng bộ tương ứng, nhưng là coroutine
+chạy trên client `aiohttp` dùng chung (xem async_http_client). Nhờ đó có thể phát nhiều lời gọi cùng lúc:
+
+    results = await asyncio.gather(
+        sinh_hinh_anh(prompt_1, "out/1.png"),
+        sinh_hinh_anh(prompt_2, "out/2.png"),
+    )
+
+Giới hạn đồng thời được áp dụng theo nhóm endpoint (chat, images, video, audio, info).
+"""
+import asyncio
+import binascii
+import contextlib
+import time
+
+from src.api_services.async_http_client import get_async_http_client
+from src.api_services.btc_api_client import (
+    _dinh_dang_am_thanh,
+    _file_tam,
+    _ghi_nhan_thoi_gian_giai_ma,
+    _hoan_tat_giong_noi_google_stream,
+    _hoan_tat_hinh_anh_stream,
+    _lay_api_key,
+    _tao_payload_chuyen_am_thanh,
+    _tao_payload_video,
+    _xu_ly_phan_hoi_hinh_anh_chat,
+    _xu_ly_phan_hoi_hinh_anh_gemini,
+    _xu_ly_phan_hoi_sinh_hinh_anh,
+    log_api_call,
+)
+from src.api_services.call_context import ENDPOINT_FAMILIES, current_call
+from src.api_services.chat_stream import AsyncChatStream
+from src.api_services.response_cache import cache_response, khoa_theo_file_path
+from src.api_services.single_flight import single_flight
+from src.api_services.streaming_decode import STREAM_CHUNK_SIZE, StreamingBase64Extractor
+from src.api_services.streaming_upload import json_body
+
+
+async def _giai_ma_stream(client, url: str, family: str, file_path: str, **kwargs):
+    """
+    Bản async của `btc_api_client._giai_ma_stream`: đọc phản hồi theo từng khối, phân tích và ghi file
+    trong thread riêng để không chặn event loop.
+    """
+    tmp_path = _file_tam(file_path)
+    extractor = StreamingBase64Extractor(tmp_path)
+    try:
+        async with client.request("POST", url, family=family, **kwargs) as response:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                await asyncio.to_thread(extractor.feed, chunk)
+        return extractor.close(), extractor.artifact, tmp_path
+    except BaseException:
+        extractor.abort()
+        raise
+    finally:
+        _ghi_nhan_thoi_gian_giai_ma(extractor)
+
+
+async def _xu_ly_hinh_anh_stream(client, url: str, family: str, file_path: str, xu_ly_du_phong,
+                                 doi_duoi_theo_mime: bool, **kwargs) -> dict:
+    try:
+        response_data, artifact, tmp_path = await _giai_ma_stream(client, url, family, file_path, **kwargs)
+    except (binascii.Error, OSError) as e:
+        return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}"}
+    return await asyncio.to_thread(_hoan_tat_hinh_anh_stream, response_data, artifact, tmp_path, file_path,
+                                   xu_ly_du_phong, doi_duoi_theo_mime)
+
+
+@log_api_call
+@single_flight
+@cache_response
+async def sinh_phan_hoi_tro_chuyen(
+    messages: list[dict],
+    model: str = "gemini-2.5-flash",
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.sinh_phan_hoi_tro_chuyen`.
+
+    Args:
+        messages (list[dict]): Danh sách các đối tượng tin nhắn, mỗi đối tượng có 'role' và 'content'.
+        model (str): Tên của mô hình AI muốn sử dụng (mặc định là "gemini-2.5-flash").
+
+    Returns:
+        dict: Phản hồi JSON từ ThucChien.AI.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        **kwargs
+    }
+    return await client.request_json("POST", client.url("/chat/completions"),
+                                     family=ENDPOINT_FAMILIES["sinh_phan_hoi_tro_chuyen"],
+                                     headers=headers, json=payload)
+
+
+@log_api_call
+async def sinh_phan_hoi_tro_chuyen_theo_luong(
+    messages: list[dict],
+    model: str = "gemini-2.5-flash",
+    **kwargs
+):
+    """
+    Bản async của `btc_api_client.sinh_phan_hoi_tro_chuyen_theo_luong`: trả về `AsyncChatStream` khi nhận
+    header phản hồi; `async for delta in stream` nhận từng đoạn văn bản. Kết nối và slot đồng thời của nhóm
+    "chat" được giữ tới khi luồng kết thúc (đọc hết, lỗi, hoặc `await stream.aclose()` / `async with`).
+
+    Args:
+        messages (list[dict]): Danh sách các đối tượng tin nhắn, mỗi đối tượng có 'role' và 'content'.
+        model (str): Tên của mô hình AI muốn sử dụng (mặc định là "gemini-2.5-flash").
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        AsyncChatStream: Luồng các delta (str).
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+    start = time.perf_counter()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream_options": {"include_usage": True},
+        **kwargs,
+        "stream": True,
+    }
+
+    exit_stack = contextlib.AsyncExitStack()
+    response = await exit_stack.enter_async_context(
+        client.request("POST", client.url("/chat/completions"),
+                       family=ENDPOINT_FAMILIES["sinh_phan_hoi_tro_chuyen_theo_luong"], headers=headers, json=payload)
+    )
+    return AsyncChatStream(response, exit_stack.aclose, call=current_call(), start=start)
+
+
+@log_api_call
+@single_flight
+@cache_response
+async def sinh_hinh_anh(
+    prompt: str,
+    file_path: str,
+    model: str = "imagen-4",
+    n: int = 1,
+    aspect_ratio: str = "1:1",
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.sinh_hinh_anh`.
+
+    Args:
+        prompt (str): Mô tả văn bản để AI dựa vào đó sinh hình ảnh.
+        file_path (str): Đường dẫn đầy đủ để lưu file hình ảnh.
+        model (str): Tên của mô hình AI muốn sử dụng (mặc định là "imagen-4").
+        n (int): Số lượng hình ảnh muốn sinh (mặc định là 1).
+        aspect_ratio (str): Tỷ lệ khung hình của hình ảnh (ví dụ: "1:1", "16:9").
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "n": n,
+        "aspect_ratio": aspect_ratio,
+        **kwargs
+    }
+    # Giải mã base64 theo luồng thẳng xuống file, không giữ cả phản hồi trong bộ nhớ
+    return await _xu_ly_hinh_anh_stream(client, client.url("/images/generations"), ENDPOINT_FAMILIES["sinh_hinh_anh"],
+                                        file_path, _xu_ly_phan_hoi_sinh_hinh_anh, False, headers=headers, json=payload)
+
+
+@log_api_call
+@single_flight
+async def sinh_hinh_anh_voi_chat(
+    messages: list[dict],
+    file_path: str,
+    model: str = "gemini-2.5-flash-image-preview",
+    modalities: list[str] = ["image"],
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.sinh_hinh_anh_voi_chat`.
+
+    Args:
+        messages (list[dict]): Danh sách các đối tượng tin nhắn, message cuối cùng nên chứa prompt để tạo ảnh.
+        file_path (str): Đường dẫn đầy đủ để lưu file hình ảnh.
+        model (str): ID của mô hình đa phương thức sẽ sử dụng.
+        modalities (list[str]): Chỉ định ["image"] để yêu cầu trả về dữ liệu hình ảnh.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "modalities": modalities,
+        **kwargs
+    }
+    return await _xu_ly_hinh_anh_stream(client, client.url("/chat/completions"), ENDPOINT_FAMILIES["sinh_hinh_anh_voi_chat"],
+                                        file_path, _xu_ly_phan_hoi_hinh_anh_chat, True, headers=headers, json=payload)
+
+
+@log_api_call
+async def kiem_tra_chi_tieu() -> dict:
+    """
+    Bản async của `btc_api_client.kiem_tra_chi_tieu`.
+
+    Returns:
+        dict: Thông tin chi tiết về API key và mức sử dụng.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    return await client.request_json("GET", client.url("/key/info"),
+                                     family=ENDPOINT_FAMILIES["kiem_tra_chi_tieu"], headers=headers)
+
+
+@log_api_call
+@single_flight
+async def sinh_sua_hinh_anh_voi_google_gemini(
+    contents: list[dict],
+    file_path: str,
+    generation_config: dict = None,
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.sinh_sua_hinh_anh_voi_google_gemini`.
+
+    Args:
+        contents (list[dict]): Nội dung của yêu cầu, bao gồm prompt văn bản và tùy chọn dữ liệu hình ảnh base64.
+        file_path (str): Đường dẫn đầy đủ để lưu file hình ảnh.
+        generation_config (dict): Cấu hình cho việc sinh nội dung, bao gồm imageConfig với aspectRatio.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key
+    }
+    payload = {
+        "contents": contents,
+    }
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    payload.update(kwargs)
+
+    return await _xu_ly_hinh_anh_stream(
+        client, client.url("/gemini/v1beta/models/gemini-2.5-flash-image-preview:generateContent"),
+        ENDPOINT_FAMILIES["sinh_sua_hinh_anh_voi_google_gemini"], file_path, _xu_ly_phan_hoi_hinh_anh_gemini, True,
+        **json_body(payload, headers)
+    )
+
+
+@log_api_call
+@single_flight
+async def tao_video(
+    model: str,
+    prompt: str,
+    image: dict = None,
+    negative_prompt: str = None,
+    aspect_ratio: str = "16:9",
+    duration_seconds: int = None,
+    sample_count: int = None,
+    resolution: str = None,
+    person_generation: str = None,
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.tao_video`.
+
+    Args:
+        model (str): Mô hình sẽ sử dụng để tạo video (ví dụ: "veo-3.0-generate-001").
+        prompt (str): Mô tả chi tiết về video cần tạo.
+        image (dict): Một hình ảnh ban đầu, gồm 'bytesBase64Encoded' và 'mimeType'.
+        negative_prompt (str): Mô tả những gì không nên có trong video.
+        aspect_ratio (str): Tỷ lệ khung hình của video (mặc định "16:9").
+        duration_seconds (int): Thời gian của video (chỉ cho Veo 2).
+        sample_count (int): Số lượng mẫu video cần tạo (chỉ cho Veo 2).
+        resolution (str): Độ phân giải của video.
+        person_generation (str): Kiểm soát việc tạo ra hình ảnh con người.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Phản hồi JSON chứa tên operation để theo dõi trạng thái.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key
+    }
+    payload = _tao_payload_video(prompt, image, negative_prompt, aspect_ratio, duration_seconds,
+                                 sample_count, resolution, person_generation, kwargs)
+    return await client.request_json("POST", client.url(f"/gemini/v1beta/models/{model}:predictLongRunning"),
+                                     family=ENDPOINT_FAMILIES["tao_video"], **json_body(payload, headers))
+
+
+@log_api_call
+async def kiem_tra_trang_thai_video(
+    operation_name: str
+) -> dict:
+    """
+    Bản async của `btc_api_client.kiem_tra_trang_thai_video`.
+
+    Args:
+        operation_name (str): Tên của tác vụ (operation) cần kiểm tra.
+
+    Returns:
+        dict: Phản hồi JSON chứa trạng thái của tác vụ.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "x-goog-api-key": api_key
+    }
+    return await client.request_json("GET", client.url(f"/gemini/v1beta/{operation_name}"),
+                                     family=ENDPOINT_FAMILIES["kiem_tra_trang_thai_video"], headers=headers)
+
+
+@log_api_call
+async def tai_xuong_video_hoan_thanh(
+    video_id: str,
+    file_path: str
+) -> dict:
+    """
+    Bản async của `btc_api_client.tai_xuong_video_hoan_thanh`.
+
+    Args:
+        video_id (str): ID của video cần tải về. Ví dụ: "fw30jj2nse1z".
+        file_path (str): Đường dẫn đầy đủ để lưu file video.
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "x-goog-api-key": api_key
+    }
+    await client.download("GET", client.url(f"/gemini/download/v1beta/files/{video_id}:download?alt=media"),
+                          file_path, family=ENDPOINT_FAMILIES["tai_xuong_video_hoan_thanh"], headers=headers)
+    return {"success": True, "message": f"Video đã được tải về thành công tại: {file_path}", "file_path": file_path}
+
+
+@log_api_call
+@single_flight
+@cache_response
+async def chuyen_van_ban_thanh_giong_noi(
+    model: str,
+    input_text: str,
+    voice: str,
+    file_path: str,
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.chuyen_van_ban_thanh_giong_noi`.
+
+    Args:
+        model (str): ID của mô hình text-to-speech sẽ sử dụng.
+        input_text (str): Đoạn văn bản cần chuyển đổi thành giọng nói.
+        voice (str): Giọng nói sẽ sử dụng (ví dụ: "Zephyr", "Puck", "Charon").
+        file_path (str): Đường dẫn đầy đủ để lưu file âm thanh.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = {
+        "model": model,
+        "input": input_text,
+        "voice": voice,
+        **kwargs
+    }
+    await client.download("POST", client.url("/audio/speech"), file_path,
+                          family=ENDPOINT_FAMILIES["chuyen_van_ban_thanh_giong_noi"], headers=headers, json=payload)
+    return {"success": True, "message": f"File âm thanh đã được tải về thành công tại: {file_path}", "file_path": file_path}
+
+
+@log_api_call
+@single_flight
+@cache_response
+@khoa_theo_file_path(_dinh_dang_am_thanh)
+async def chuyen_van_ban_thanh_giong_noi_voi_google(
+    model: str,
+    contents: list[dict],
+    file_path: str,
+    generation_config: dict = None,
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.chuyen_van_ban_thanh_giong_noi_voi_google`.
+
+    Args:
+        model (str): ID của mô hình sẽ sử dụng (ví dụ: "gemini-2.5-flash-preview-tts").
+        contents (list[dict]): Nội dung của yêu cầu, bao gồm prompt văn bản.
+        file_path (str): Đường dẫn đầy đủ để lưu file âm thanh (.mp3, .wav, .opus/.ogg; đuôi khác được đổi thành .mp3).
+        generation_config (dict): Cấu hình cho việc sinh nội dung, bao gồm responseModalities và speechConfig.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Một dictionary chứa thông báo thành công hoặc lỗi.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key
+    }
+    payload = {
+        "contents": contents,
+    }
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    payload.update(kwargs)
+
+    response_data, artifact, tmp_path = await _giai_ma_stream(
+        client, client.url(f"/gemini/v1beta/models/{model}:generateContent"),
+        ENDPOINT_FAMILIES["chuyen_van_ban_thanh_giong_noi_voi_google"], file_path, headers=headers, json=payload
+    )
+    # Mã hoá âm thanh (ghi file, chờ ffmpeg) là tác vụ chặn nên chạy trong thread riêng
+    return await asyncio.to_thread(_hoan_tat_giong_noi_google_stream, response_data, artifact, tmp_path, file_path)
+
+
+@log_api_call
+@single_flight
+async def chuyen_am_thanh_thanh_van_ban(
+    audio_file_path: str,
+    prompt: str = "Please transcribe the following audio.",
+    model: str = "gemini-2.5-flash",
+    **kwargs
+) -> dict:
+    """
+    Bản async của `btc_api_client.chuyen_am_thanh_thanh_van_ban`.
+
+    Args:
+        audio_file_path (str): Đường dẫn đến file âm thanh cần chuyển đổi.
+        prompt (str): Prompt hướng dẫn cho mô hình (tùy chọn).
+        model (str): ID của mô hình sẽ sử dụng.
+        **kwargs: Các tham số bổ sung khác có thể truyền vào payload của API.
+
+    Returns:
+        dict: Phản hồi JSON từ ThucChien.AI chứa transcript.
+    """
+    api_key = _lay_api_key()
+    client = get_async_http_client()
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+    payload = _tao_payload_chuyen_am_thanh(audio_file_path, prompt, model, kwargs)
+    try:
+        body = json_body(payload, headers)
+    except FileNotFoundError:
+        return {"error": f"File not found at {audio_file_path}"}
+
+    # aiohttp đọc body dạng file trong executor, file âm thanh không bị đọc cả vào bộ nhớ
+    return await client.request_json("POST", client.url("/chat/completions"),
+                                     family=ENDPOINT_FAMILIES["chuyen_am_thanh_thanh_van_ban"], **body)
@@ -0,0 +1,95 @@
+import contextvars
+from contextlib import contextmanager
+
+# Nhóm endpoint theo loại tài nguyên, dùng để giới hạn đồng thời / điều tiết theo từng nhóm
+ENDPOINT_FAMILIES = {
+    "sinh_phan_hoi_tro_chuyen": "chat",
+    "sinh_phan_hoi_tro_chuyen_theo_luong": "chat",
+    "chuyen_am_thanh_thanh_van_ban": "chat",
+    "sinh_hinh_anh": "images",
+    "sinh_hinh_anh_voi_chat": "images",
+    "sinh_sua_hinh_anh_voi_google_gemini": "images",
+    "tao_video": "video",
+    "kiem_tra_trang_thai_video": "video",
+    "tai_xuong_video_hoan_thanh": "video",
+    "chuyen_van_ban_thanh_giong_noi": "audio",
+    "chuyen_van_ban_thanh_giong_noi_voi_google": "audio",
+    "kiem_tra_chi_tieu": "info",
+}
+
+
+class ApiCallContext:
+    """
+    Thông tin của lời gọi API đang chạy, do decorator `log_api_call` mở ra.
+
+    Tầng HTTP (http_client, async_http_client) đọc tên hàm để chọn chính sách theo endpoint
+    và ghi lại số lần thử lại, thời gian chờ bộ điều tiết, thời gian kết nối/TTFB, số byte; tầng giải mã ghi lại
+    thời gian giải mã và ghi file. Decorator đọc lại các con số này để đưa vào log và vào metrics (xem metrics.py).
+    """
+
+    def __init__(self, api_function_name: str):
+        self.api_function_name = api_function_name
+        self.family = ENDPOINT_FAMILIES.get(api_function_name, "default")
+        self.retries = 0
+        self.rate_limit_wait = 0.0
+        self.cache_status = None  # "hit" / "miss" khi cache phản hồi đang bật
+        self.coalesced = False  # True nếu lời gọi được gộp vào một lời gọi giống hệt đang chạy
+        self.model = None
+        # Số liệu hiệu năng (None: không đo được / không áp dụng cho lời gọi này)
+        self.duration = None
+        self.http_requests = 0
+        self.connect_seconds = 0.0
+        self.ttfb_seconds = None
+        self.ttft_seconds = None  # Thời gian tới token đầu tiên (chỉ với phản hồi dạng luồng)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.decode_seconds = None
+        self.write_seconds = None
+        self.pending_responses = []  # Phản hồi `requests` chờ đếm số byte khi lời gọi kết thúc
+
+    def as_log_dict(self) -> dict:
+        log_dict = {"retries": self.retries, "rate_limit_wait_seconds": round(self.rate_limit_wait, 4)}
+        if self.cache_status is not None:
+            log_dict["cache"] = self.cache_status
+        if self.coalesced:
+            log_dict["coalesced"] = True
+        if self.model is not None:
+            log_dict["model"] = self.model
+        if self.duration is not None:
+            log_dict["duration_seconds"] = round(self.duration, 4)
+        if self.http_requests:
+            log_dict["connect_seconds"] = round(self.connect_seconds, 4)
+            log_dict["ttfb_seconds"] = round(self.ttfb_seconds, 4) if self.ttfb_seconds is not None else None
+            log_dict["request_bytes"] = self.request_bytes
+            log_dict["response_bytes"] = self.response_bytes
+        if self.ttft_seconds is not None:
+            log_dict["ttft_seconds"] = round(self.ttft_seconds, 4)
+        if self.decode_seconds is not None:
+            log_dict["decode_seconds"] = round(self.decode_seconds, 4)
+        if self.write_seconds is not None:
+            log_dict["write_seconds"] = round(self.write_seconds, 4)
+        return log_dict
+
+
+_current_call = contextvars.ContextVar("current_api_call", default=None)
+
+
+def current_call() -> ApiCallContext:
+    """Trả về ngữ cảnh của lời gọi API hiện tại (None nếu gọi tầng HTTP trực tiếp)."""
+    return _current_call.get()
+
+
+def current_api_function(default: str = None) -> str:
+    call = _current_call.get()
+    return call.api_function_name if call is not None else default
+
+
+@contextmanager
+def api_call_context(api_function_name: str, call: ApiCallContext = None):
+    """Mở ngữ cảnh cho một lời gọi API mới, hoặc kích hoạt lại `call` (ví dụ khi đọc tiếp một phản hồi dạng luồng)."""
+    call = call or ApiCallContext(api_function_name)
+    token = _current_call.set(call)
+    try:
+        yield call
+    finally:
+        _current_call.reset(token)
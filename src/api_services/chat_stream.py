@@ -0,0 +1,260 @@
+"""
+Đọc phản hồi trò chuyện dạng luồng (Server-Sent Events, `"stream": true`) của endpoint /chat/completions.
+
+`sinh_phan_hoi_tro_chuyen_theo_luong` (bản đồng bộ và async) trả về ngay sau khi nhận header phản hồi một
+đối tượng luồng; duyệt đối tượng này nhận được từng đoạn văn bản (delta) ngay khi mô hình sinh ra:
+
+    stream = sinh_phan_hoi_tro_chuyen_theo_luong(messages)
+    for delta in stream:
+        print(delta, end="", flush=True)
+    print(stream.response["usage"])
+
+    # async
+    async with await btc_api_client_async.sinh_phan_hoi_tro_chuyen_theo_luong(messages) as stream:
+        async for delta in stream:
+            ...
+
+Các chunk được gộp lại thành phản hồi cùng dạng với `sinh_phan_hoi_tro_chuyen` (`choices[i].message.content`,
+`finish_reason`, `usage`) trong `stream.response`. Khi luồng kết thúc (đọc hết, lỗi, hoặc bị đóng giữa chừng)
+`log_api_call` mới ghi log response và chốt metrics của lời gọi, kèm thời gian tới token đầu tiên (TTFT).
+"""
+import contextlib
+import json
+import time
+
+from src.api_services.call_context import api_call_context
+from src.api_services.metrics import ghi_nhan
+
+DONE_MARKER = "[DONE]"
+READ_CHUNK_SIZE = 8192
+
+
+class SseDecoder:
+    """Tách luồng bytes SSE thành dữ liệu (`data:`) của từng sự kiện; chịu được dòng bị cắt giữa hai khối."""
+
+    def __init__(self):
+        self._buffer = b""
+        self._data = []
+
+    def feed(self, chunk: bytes) -> list:
+        """Nạp thêm một khối bytes, trả về danh sách chuỗi dữ liệu của các sự kiện đã trọn vẹn."""
+        events = []
+        lines = (self._buffer + chunk).split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            line = line.rstrip(b"\r").decode("utf-8")
+            if not line:
+                # Dòng trống kết thúc một sự kiện
+                if self._data:
+                    events.append("\n".join(self._data))
+                    self._data = []
+            elif line.startswith("data:"):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(" ") else value)
+            # Dòng chú thích (":") và các trường event/id/retry không dùng tới
+        return events
+
+    def flush(self) -> list:
+        """Sự kiện cuối cùng khi luồng đóng mà không có dòng trống kết thúc."""
+        return self.feed(b"\n\n")
+
+
+class ChatStreamAccumulator:
+    """Gộp các chunk `chat.completion.chunk` thành một phản hồi `chat.completion` hoàn chỉnh."""
+
+    def __init__(self):
+        self.meta = {}
+        self.choices = {}
+        self.usage = None
+
+    def add(self, chunk: dict) -> str:
+        """Gộp một chunk; trả về đoạn văn bản mới của choice đầu tiên (chuỗi rỗng nếu không có)."""
+        for key in ("id", "created", "model", "system_fingerprint"):
+            if chunk.get(key) is not None:
+                self.meta.setdefault(key, chunk[key])
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+
+        text = ""
+        for choice in chunk.get("choices") or []:
+            index = choice.get("index", 0)
+            state = self.choices.setdefault(index, {"role": "assistant", "parts": [], "finish_reason": None})
+            delta = choice.get("delta") or {}
+            if delta.get("role"):
+                state["role"] = delta["role"]
+            if delta.get("content"):
+                state["parts"].append(delta["content"])
+                if index == 0:
+                    text += delta["content"]
+            if choice.get("finish_reason"):
+                state["finish_reason"] = choice["finish_reason"]
+        return text
+
+    def response(self) -> dict:
+        result = {**self.meta, "object": "chat.completion", "choices": [
+            {
+                "index": index,
+                "message": {"role": state["role"], "content": "".join(state["parts"])},
+                "finish_reason": state["finish_reason"],
+            }
+            for index, state in sorted(self.choices.items())
+        ]}
+        if self.usage is not None:
+            result["usage"] = self.usage
+        return result
+
+
+class _ChatStreamBase:
+    """Phần chung của bản đồng bộ và async: gộp chunk, đo TTFT, gọi callback khi kết thúc."""
+
+    def __init__(self, call=None, start: float = None):
+        self.response = None
+        self.time_to_first_token = None
+        self._start = start if start is not None else time.perf_counter()
+        self._call = call
+        self._decoder = SseDecoder()
+        self._accumulator = ChatStreamAccumulator()
+        self._callbacks = []
+        self._finished = False
+
+    def khi_ket_thuc(self, callback):
+        """Đăng ký `callback(response, error)` được gọi một lần khi luồng kết thúc (dùng bởi `log_api_call`)."""
+        self._callbacks.append(callback)
+
+    def _kich_hoat_lan_goi(self):
+        # Đọc luồng trong ngữ cảnh của lời gọi API đã mở nó, để tầng HTTP ghi số liệu vào đúng lời gọi
+        if self._call is None:
+            return contextlib.nullcontext()
+        return api_call_context(self._call.api_function_name, call=self._call)
+
+    def _xu_ly_khoi(self, chunk: bytes, final: bool = False):
+        """Trả về (danh sách delta, đã gặp [DONE] hay chưa)."""
+        events = self._decoder.feed(chunk)
+        if final:
+            events += self._decoder.flush()
+        deltas = []
+        for data in events:
+            if data.strip() == DONE_MARKER:
+                return deltas, True
+            text = self._accumulator.add(json.loads(data))
+            if text:
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - self._start
+                    if self._call is not None:
+                        self._call.ttft_seconds = self.time_to_first_token
+                deltas.append(text)
+        return deltas, False
+
+    def _ket_thuc(self, error: BaseException = None, incomplete: bool = False):
+        if self._finished:
+            return
+        self._finished = True
+        self.response = self._accumulator.response()
+        if incomplete:
+            self.response["incomplete"] = True
+        for callback in self._callbacks:
+            callback(self.response, error)
+
+    @property
+    def text(self) -> str:
+        """Toàn bộ văn bản của choice đầu tiên đã nhận được tới thời điểm hiện tại."""
+        state = self._accumulator.choices.get(0)
+        return "".join(state["parts"]) if state else ""
+
+
+class ChatStream(_ChatStreamBase):
+    """
+    Luồng phản hồi trò chuyện trên một `requests.Response` (`stream=True`). Duyệt để nhận từng delta (str).
+    Dừng giữa chừng thì gọi `close()` (hoặc dùng `with`) để trả kết nối về pool.
+    """
+
+    def __init__(self, response, call=None, start: float = None):
+        super().__init__(call, start)
+        self._response = response
+
+    def _doc_cac_khoi(self):
+        raw = self._response.raw
+        # read1 trả về ngay phần dữ liệu đã tới, không chờ đủ READ_CHUNK_SIZE byte
+        if hasattr(raw, "read1"):
+            return iter(lambda: raw.read1(READ_CHUNK_SIZE, decode_content=True), b"")
+        return self._response.iter_content(chunk_size=None)
+
+    def __iter__(self):
+        if self._finished:
+            return
+        chunks = self._doc_cac_khoi()
+        try:
+            while True:
+                with self._kich_hoat_lan_goi():
+                    chunk = next(chunks, None)
+                deltas, done = self._xu_ly_khoi(chunk or b"", final=chunk is None)
+                yield from deltas
+                if done or chunk is None:
+                    break
+        except GeneratorExit:
+            self.close()
+            raise
+        except Exception as e:
+            self._response.close()
+            self._ket_thuc(error=e, incomplete=True)
+            raise
+        self._response.close()
+        self._ket_thuc()
+
+    def close(self):
+        """Đóng kết nối; nếu luồng chưa đọc hết, phản hồi được đánh dấu "incomplete"."""
+        self._response.close()
+        self._ket_thuc(incomplete=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class AsyncChatStream(_ChatStreamBase):
+    """
+    Bản async của ChatStream trên một `aiohttp.ClientResponse`; `release` là coroutine trả kết nối
+    (và slot đồng thời của nhóm endpoint) khi luồng kết thúc.
+    """
+
+    def __init__(self, response, release, call=None, start: float = None):
+        super().__init__(call, start)
+        self._response = response
+        self._release = release
+
+    async def __aiter__(self):
+        if self._finished:
+            return
+        try:
+            while True:
+                with self._kich_hoat_lan_goi():
+                    chunk = await self._response.content.readany()
+                    # TraceConfig của aiohttp chỉ đếm byte khi đọc cả thân phản hồi bằng read()
+                    ghi_nhan("response_bytes", len(chunk))
+                deltas, done = self._xu_ly_khoi(chunk, final=not chunk)
+                for delta in deltas:
+                    yield delta
+                if done or not chunk:
+                    break
+        except GeneratorExit:
+            await self.aclose()
+            raise
+        except BaseException as e:
+            await self._release()
+            self._ket_thuc(error=e if isinstance(e, Exception) else None, incomplete=True)
+            raise
+        await self._release()
+        self._ket_thuc()
+
+    async def aclose(self):
+        """Đóng kết nối; nếu luồng chưa đọc hết, phản hồi được đánh dấu "incomplete"."""
+        await self._release()
+        self._ket_thuc(incomplete=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.aclose()
@@ -0,0 +1,221 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from src.api_services.call_context import current_api_function, current_call
+from src.api_services.metrics import ghi_nhan, ghi_nhan_phan_hoi_http
+from src.api_services.rate_limiter import get_rate_limiter
+from src.api_services.retry_policy import ERROR_CONNECT, ERROR_TRANSPORT, get_retry_policy, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# --- Cấu hình mặc định --- #
+DEFAULT_BASE_URL = "https://api.thucchien.ai"
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+
+
+# --- Đo thời gian mở kết nối (TCP + TLS) cho metrics --- #
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            ghi_nhan("connect_seconds", time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            ghi_nhan("connect_seconds", time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter có pool dùng kết nối đo thời gian `connect()`; kết nối keep-alive dùng lại không tốn thời gian này."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class ThucChienHttpClient:
+    """
+    Client HTTP dùng chung cho mọi lời gọi tới ThucChien.AI gateway.
+
+    Client giữ một `requests.Session` với connection pool keep-alive, nhờ vậy các lời gọi
+    liên tiếp (kể cả từ nhiều thread) tái sử dụng kết nối TCP/TLS thay vì bắt tay lại mỗi lần.
+
+    Args:
+        base_url (str): Địa chỉ gốc của gateway (mặc định lấy từ biến môi trường
+                        'THUCCHIEN_AI_BASE_URL', nếu không có thì là "https://api.thucchien.ai").
+        pool_connections (int): Số pool (theo host) được cache trong adapter.
+        pool_maxsize (int): Số kết nối tối đa giữ lại trong mỗi pool. Nên >= số thread gọi song song.
+        pool_block (bool): Nếu True, chờ khi pool đã hết kết nối thay vì mở kết nối tạm thời.
+        connect_timeout (float): Timeout (giây) khi mở kết nối.
+        read_timeout (float): Timeout (giây) khi chờ dữ liệu từ server.
+        adapter_kwargs (dict): Tham số bổ sung truyền thẳng vào `HTTPAdapter`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = False,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        adapter_kwargs: dict = None,
+    ):
+        self.base_url = (base_url or os.environ.get("THUCCHIEN_AI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = self._create_adapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            **(adapter_kwargs or {})
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _create_adapter(self, **adapter_kwargs) -> HTTPAdapter:
+        return TimedHTTPAdapter(**adapter_kwargs)
+
+    def url(self, path: str) -> str:
+        """Ghép đường dẫn endpoint (ví dụ "/chat/completions") với base_url."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Gửi request qua session dùng chung. Mỗi lần gửi đều đi qua bộ điều tiết (rate_limiter) và
+        được thử lại theo RetryPolicy của endpoint đang gọi (xác định qua ngữ cảnh do `log_api_call` mở).
+        Phản hồi lỗi cuối cùng được trả về để hàm gọi xử lý bằng `raise_for_status()` như trước.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        api_function_name = current_api_function()
+        policy = get_retry_policy(api_function_name)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if api_function_name is not None:
+                _ghi_nhan_cho_dieu_tiet(get_rate_limiter().acquire(api_function_name, charge=attempt == 1))
+            if attempt > 1:
+                _tua_lai_body(kwargs)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not policy.should_retry(method, attempt, error_kind=_phan_loai_loi_ket_noi(e)):
+                    raise
+                delay = policy.compute_delay(attempt)
+                reason = str(e)
+            else:
+                ghi_nhan_phan_hoi_http(response)
+                if response.status_code < 400 or not policy.should_retry(method, attempt, status_code=response.status_code):
+                    return response
+                retry_after = parse_retry_after(response.headers)
+                if policy.retry_after_too_long(retry_after):
+                    return response
+                delay = policy.compute_delay(attempt, retry_after)
+                reason = f"HTTP {response.status_code}"
+                response.close()
+
+            _ghi_nhan_thu_lai(api_function_name or url, attempt, delay, reason)
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def _phan_loai_loi_ket_noi(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return ERROR_CONNECT
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    if isinstance(reason, urllib3.exceptions.NewConnectionError):
+        return ERROR_CONNECT
+    return ERROR_TRANSPORT
+
+
+def _tua_lai_body(kwargs: dict):
+    # Body dạng file (ví dụ StreamingJsonBody) đã bị đọc hết ở lần gửi trước
+    body = kwargs.get("data")
+    if hasattr(body, "seek"):
+        body.seek(0)
+
+
+def _ghi_nhan_cho_dieu_tiet(wait: float):
+    call = current_call()
+    if call is not None:
+        call.rate_limit_wait += wait
+
+
+def _ghi_nhan_thu_lai(target: str, attempt: int, delay: float, reason: str):
+    call = current_call()
+    if call is not None:
+        call.retries += 1
+    logger.warning("Thử lại %s sau lần thử %d (%s), chờ %.2fs", target, attempt, reason, delay)
+
+
+# --- Client mặc định dùng chung cho module btc_api_client --- #
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client() -> ThucChienHttpClient:
+    """Trả về client dùng chung, tạo lười (lazy) ở lần gọi đầu tiên."""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = ThucChienHttpClient()
+    return _default_client
+
+
+def set_http_client(client: ThucChienHttpClient):
+    """Thay client dùng chung (ví dụ trỏ sang stub server khi benchmark/test). Client cũ sẽ được đóng."""
+    global _default_client
+    with _default_client_lock:
+        old_client, _default_client = _default_client, client
+    if old_client is not None and old_client is not client:
+        old_client.close()
+
+
+def configure_http_client(**kwargs) -> ThucChienHttpClient:
+    """Tạo client mới với cấu hình pool/timeout/adapter tuỳ chỉnh và đặt làm client dùng chung."""
+    client = ThucChienHttpClient(**kwargs)
+    set_http_client(client)
+    return client
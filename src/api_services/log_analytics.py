@@ -0,0 +1,497 @@
+"""
+Phân tích log tương tác API (logs/api_interactions/api_interactions_YYYY-MM-DD.log*).
+
+Mỗi dòng log là một bản ghi JSON do `log_api_call` ghi ra: "request", rồi "response" / "error_response" /
+"exception" có cùng `interaction_id`. `LogIndex` đọc các file log theo từng dòng (không nạp cả file vào bộ nhớ),
+ghép request với kết quả của nó và lưu mỗi lời gọi thành một dòng trong chỉ mục sqlite:
+
+- chỉ mục lưu vị trí đã đọc của từng file, lần cập nhật sau chỉ đọc phần mới ghi thêm. File được nhận ra theo
+  nội dung (băm phần đầu đã giải nén), không theo đường dẫn: segment bị đổi tên/nén (.log -> .log.N -> .log.N.gz)
+  được đọc tiếp từ vị trí cũ thay vì quét lại; file bị ghi đè bằng nội dung khác thì được đọc lại từ đầu
+  (việc ghi lời gọi là idempotent theo interaction_id);
+- request chưa có kết quả được giữ trong bảng chờ, nên cặp request/response nằm ở hai file khác nhau vẫn ghép được;
+- segment đã nén (.gz, .zst — xem log_rotation) được đọc một lần như file đã đóng.
+
+Các báo cáo (độ trễ p50/p95/p99, tỉ lệ lỗi, số lời gọi theo giờ, chi phí theo model) chạy bằng SQL trên chỉ mục
+nên các lần truy vấn sau không phải quét lại log. Chi phí được tính lúc truy vấn từ bảng giá (config/api_prices.json),
+đổi bảng giá không cần lập lại chỉ mục.
+
+Ví dụ:
+    index = LogIndex()
+    index.update()
+    for row in index.latency_percentiles():
+        print(row)
+"""
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+
+from src.api_services.api_logging import LOG_DIR
+from src.api_services.call_context import ENDPOINT_FAMILIES
+
+DEFAULT_INDEX_PATH = os.path.join(LOG_DIR, "analytics_index.sqlite")
+DEFAULT_PRICES_PATH = "config/api_prices.json"
+# Cùng họ file với RotatingCompressedFileHandler (log_rotation): file đang ghi, segment .log.N và bản nén;
+# không khớp file tạm (*.tmp) của bước nén
+LOG_FILE_PATTERN = re.compile(r"^api_interactions_.*\.log(\.\d+)?(\.gz|\.zst)?$")
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+# Số byte đầu file (tối đa) dùng để nhận ra file đã bị thay bằng file khác cùng tên
+HEAD_BYTES = 4096
+COMMIT_EVERY_LINES = 5000
+
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+RESULT_TYPES = ("response", "error_response", "exception")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    head_length INTEGER,
+    head_hash TEXT,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+    interaction_id TEXT PRIMARY KEY,
+    started REAL,
+    api_function TEXT,
+    model TEXT,
+    images INTEGER,
+    video_clips INTEGER,
+    video_seconds REAL,
+    characters INTEGER
+);
+CREATE TABLE IF NOT EXISTS calls (
+    interaction_id TEXT PRIMARY KEY,
+    api_function TEXT NOT NULL,
+    model TEXT NOT NULL,
+    started REAL,
+    finished REAL NOT NULL,
+    hour TEXT NOT NULL,
+    latency REAL,
+    status TEXT NOT NULL,
+    error_kind TEXT,
+    status_code TEXT,
+    retries INTEGER,
+    cache TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    images INTEGER,
+    video_clips INTEGER,
+    video_seconds REAL,
+    characters INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_calls_latency ON calls(api_function, model, latency);
+CREATE INDEX IF NOT EXISTS idx_calls_finished ON calls(finished);
+"""
+
+
+def _doc_thoi_gian(timestamp: str) -> float:
+    return datetime.datetime.fromisoformat(timestamp).timestamp()
+
+
+def _so_ky_tu(payload: dict) -> int:
+    """Số ký tự văn bản cần đọc của lời gọi TTS (input_text hoặc các phần text trong contents)."""
+    if isinstance(payload.get("input_text"), str):
+        return len(payload["input_text"])
+    total = 0
+    for content in payload.get("contents") or []:
+        for part in content.get("parts", []) if isinstance(content, dict) else []:
+            if isinstance(part, dict) and isinstance(part.get("text"), str):
+                total += len(part["text"])
+    return total or None
+
+
+def _don_vi_tu_request(api_function: str, payload: dict) -> dict:
+    """Các đơn vị tính phí suy ra từ tham số của request: số ảnh, số/giây video, số ký tự TTS."""
+    family = ENDPOINT_FAMILIES.get(api_function)
+    units = {"images": None, "video_clips": None, "video_seconds": None, "characters": None}
+    if family == "images":
+        units["images"] = payload.get("n") or 1
+    elif api_function == "tao_video":
+        clips = payload.get("sample_count") or 1
+        units["video_clips"] = clips
+        if payload.get("duration_seconds"):
+            units["video_seconds"] = payload["duration_seconds"] * clips
+    elif family == "audio":
+        units["characters"] = _so_ky_tu(payload)
+    return units
+
+
+def _tim_usage(result) -> tuple:
+    """(input_tokens, output_tokens) từ "usage" (OpenAI) hoặc "usageMetadata" (Gemini), ở gốc hoặc trong response_data."""
+    if not isinstance(result, dict):
+        return None, None
+    for container in (result, result.get("response_data")):
+        if not isinstance(container, dict):
+            continue
+        usage = container.get("usage")
+        if isinstance(usage, dict):
+            return usage.get("prompt_tokens"), usage.get("completion_tokens")
+        usage = container.get("usageMetadata")
+        if isinstance(usage, dict):
+            return usage.get("promptTokenCount"), usage.get("candidatesTokenCount")
+    return None, None
+
+
+def _thoi_diem_sua(path: str) -> tuple:
+    try:
+        return os.path.getmtime(path), path
+    except OSError:
+        return 0, path
+
+
+def _mo_file_log(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        import zstandard
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def _tinh_phan_vi(conn: sqlite3.Connection, where: str, params: list, count: int, q: float) -> float:
+    # Phân vị theo hạng gần nhất (nearest-rank), đọc thẳng từ chỉ mục (api_function, model, latency)
+    offset = max(0, math.ceil(q * count) - 1)
+    row = conn.execute(
+        f"SELECT latency FROM calls WHERE {where} AND latency IS NOT NULL ORDER BY latency LIMIT 1 OFFSET ?",
+        params + [offset],
+    ).fetchone()
+    return row[0] if row else None
+
+
+def load_prices(path: str = DEFAULT_PRICES_PATH) -> dict:
+    """Đọc bảng giá theo model (bỏ qua các khoá bắt đầu bằng "_")."""
+    with open(path, encoding="utf-8") as f:
+        prices = json.load(f)
+    return {model: price for model, price in prices.items() if not model.startswith("_")}
+
+
+class LogIndex:
+    """
+    Chỉ mục sqlite của log tương tác API, cập nhật tăng dần.
+
+    Args:
+        index_path (str): File sqlite của chỉ mục (mặc định: logs/api_interactions/analytics_index.sqlite).
+        log_dir (str): Thư mục chứa log (mặc định: LOG_DIR của api_logging).
+    """
+
+    def __init__(self, index_path: str = None, log_dir: str = LOG_DIR):
+        self.log_dir = log_dir
+        self.index_path = index_path or os.path.join(log_dir, os.path.basename(DEFAULT_INDEX_PATH))
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.index_path)
+        self._conn.executescript(_SCHEMA)
+        # Bộ đệm ghi theo lô giữa hai lần commit: request đang chờ kết quả và các lời gọi đã ghép xong
+        self._pending_buffer = {}
+        self._calls_buffer = []
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    # --- Cập nhật chỉ mục --- #
+    def update(self) -> dict:
+        """
+        Đọc phần log mới kể từ lần cập nhật trước.
+
+        Returns:
+            dict: {"files": số file có dữ liệu mới, "lines": số dòng đã đọc, "calls": số lời gọi mới được ghép}.
+        """
+        stats = {"files": 0, "lines": 0, "calls": 0}
+        # Đọc file cũ trước để request thường được đọc trước kết quả của nó
+        paths = [os.path.join(self.log_dir, name) for name in os.listdir(self.log_dir) if LOG_FILE_PATTERN.match(name)]
+        for path in sorted(paths, key=_thoi_diem_sua):
+            lines, calls = self._doc_file(path)
+            if lines:
+                stats["files"] += 1
+                stats["lines"] += lines
+                stats["calls"] += calls
+        self._xoa_muc_file_cu()
+        return stats
+
+    @staticmethod
+    def _bam_dau_file(path: str, length: int) -> str:
+        """Băm `length` byte đầu của nội dung (đã giải nén), nên không đổi khi segment bị đổi tên hoặc nén."""
+        try:
+            with _mo_file_log(path) as f:
+                return hashlib.sha1(f.read(length)).hexdigest()
+        except (OSError, EOFError):
+            return None  # File bị xoá, hoặc bản nén hỏng/đang ghi dở
+
+    def _tim_muc_file(self, path: str) -> tuple:
+        """
+        (inode, head_length, head_hash, offset) đã lưu cho dữ liệu của `path`, None nếu là dữ liệu mới. Nếu `path` chưa có
+        trong chỉ mục, tìm mục có cùng phần đầu mà file cũ của nó đã biến mất hoặc đã là file khác (segment vừa
+        bị đổi tên/nén), rồi chuyển mục đó sang `path`.
+        """
+        row = self._conn.execute("SELECT inode, head_length, head_hash, offset FROM files WHERE path = ?",
+                                 (path,)).fetchone()
+        if row is not None and self._bam_dau_file(path, row[1]) == row[2]:
+            return row
+        for old_path, inode, head_length, head_hash, offset in self._conn.execute(
+                "SELECT path, inode, head_length, head_hash, offset FROM files WHERE path != ?", (path,)).fetchall():
+            if self._bam_dau_file(path, head_length) != head_hash:
+                continue
+            if os.path.exists(old_path) and self._bam_dau_file(old_path, head_length) == head_hash:
+                continue  # File cũ vẫn còn nguyên: đây là bản sao, không phải đổi tên
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.execute("UPDATE files SET path = ? WHERE path = ?", (path, old_path))
+            self._conn.commit()
+            return inode, head_length, head_hash, offset
+        return None
+
+    def _vi_tri_bat_dau(self, path: str, stat: os.stat_result) -> int:
+        """Vị trí đọc tiếp theo (trong nội dung đã giải nén); -1 nếu không có gì mới, 0 nếu là dữ liệu mới."""
+        row = self._tim_muc_file(path)
+        if row is None:
+            return 0  # File mới, hoặc bị ghi đè bằng nội dung khác: đọc lại từ đầu
+        inode, _, _, offset = row
+        if path.endswith((".gz", ".zst")):
+            # Bản nén đã đọc hết thì không bao giờ được ghi thêm; bản nén vừa thay segment đã đọc một phần thì
+            # đọc nốt phần được ghi sau lần cập nhật trước
+            return -1 if inode == stat.st_ino else offset
+        if stat.st_size < offset:
+            return 0
+        return offset if stat.st_size > offset else -1
+
+    def _xoa_muc_file_cu(self):
+        """Xoá mục của các file không còn tồn tại (bị xoá theo chính sách giữ log)."""
+        stale = [(path,) for (path,) in self._conn.execute("SELECT path FROM files") if not os.path.exists(path)]
+        if stale:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", stale)
+            self._conn.commit()
+
+    def _doc_file(self, path: str) -> tuple:
+        try:
+            stat = os.stat(path)
+            offset = self._vi_tri_bat_dau(path, stat)
+        except FileNotFoundError:
+            return 0, 0  # File bị xoá (retention) giữa lúc liệt kê và lúc đọc
+        if offset < 0:
+            return 0, 0
+        lines = calls = 0
+        position = offset
+        with _mo_file_log(path) as f:
+            if offset:
+                f.seek(offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    break  # Dòng đang được ghi dở, để lần sau
+                position += len(raw_line)
+                lines += 1
+                calls += self._xu_ly_dong(raw_line)
+                if lines % COMMIT_EVERY_LINES == 0:
+                    self._ghi_bo_dem(path, stat, position)
+        self._ghi_bo_dem(path, stat, position)
+        return lines, calls
+
+    def _ghi_bo_dem(self, path: str, stat: os.stat_result, position: int):
+        """Ghi các lời gọi/request chờ trong bộ đệm cùng vị trí đã đọc của file trong một transaction."""
+        self._conn.executemany("INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               self._calls_buffer)
+        self._conn.executemany("DELETE FROM pending WHERE interaction_id = ?",
+                               [(row[0],) for row in self._calls_buffer])
+        self._conn.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               [(interaction_id, *row) for interaction_id, row in self._pending_buffer.items()])
+        self._calls_buffer.clear()
+        self._pending_buffer.clear()
+        self._bo_sung_tu_request()
+        # Chỉ băm phần đầu đã đọc xong (file log đang ghi thì phần sau còn thay đổi)
+        head_length = min(HEAD_BYTES, position)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, inode, head_length, head_hash, offset) VALUES (?, ?, ?, ?, ?)",
+            (path, stat.st_ino, head_length, self._bam_dau_file(path, head_length), position),
+        )
+        self._conn.commit()
+
+    def _bo_sung_tu_request(self):
+        """Request được đọc sau kết quả của nó (hai file đọc lệch thứ tự): bổ sung vào lời gọi đã ghi."""
+        orphans = self._conn.execute(
+            "SELECT p.interaction_id, p.started, p.model, p.images, p.video_clips, p.video_seconds, p.characters, c.status "
+            "FROM pending p JOIN calls c ON c.interaction_id = p.interaction_id"
+        ).fetchall()
+        for interaction_id, started, model, images, video_clips, video_seconds, characters, status in orphans:
+            if status != STATUS_SUCCESS:
+                images = video_clips = video_seconds = characters = None
+            self._conn.execute(
+                "UPDATE calls SET started = ?, latency = COALESCE(latency, finished - ?), "
+                "model = CASE WHEN model = '' THEN ? ELSE model END, images = COALESCE(images, ?), "
+                "video_clips = COALESCE(video_clips, ?), video_seconds = COALESCE(video_seconds, ?), "
+                "characters = CASE WHEN input_tokens IS NULL AND output_tokens IS NULL THEN COALESCE(characters, ?) END "
+                "WHERE interaction_id = ?",
+                (started, started, model or "", images, video_clips, video_seconds, characters, interaction_id),
+            )
+            self._conn.execute("DELETE FROM pending WHERE interaction_id = ?", (interaction_id,))
+
+    def _xu_ly_dong(self, raw_line: bytes) -> int:
+        try:
+            record = json.loads(raw_line)
+            interaction_id = record["interaction_id"]
+            record_type = record["type"]
+        except (ValueError, KeyError, TypeError):
+            return 0  # Dòng hỏng (ví dụ bị cắt khi tiến trình dừng giữa chừng) hoặc không phải bản ghi tương tác
+        data = record.get("data") or {}
+        if record_type == "request":
+            payload = data.get("payload") if isinstance(data.get("payload"), dict) else {}
+            units = _don_vi_tu_request(record.get("api_function"), payload)
+            self._pending_buffer[interaction_id] = (
+                _doc_thoi_gian(record["timestamp"]), record.get("api_function"), payload.get("model"),
+                units["images"], units["video_clips"], units["video_seconds"], units["characters"],
+            )
+            return 0
+        if record_type not in RESULT_TYPES:
+            return 0
+        self._ghi_loi_goi(interaction_id, record, data)
+        return 1
+
+    def _lay_request_cho(self, interaction_id: str) -> tuple:
+        pending = self._pending_buffer.pop(interaction_id, None)
+        if pending is not None:
+            return pending[0], *pending[2:]
+        row = self._conn.execute(
+            "SELECT started, model, images, video_clips, video_seconds, characters FROM pending WHERE interaction_id = ?",
+            (interaction_id,),
+        ).fetchone()
+        return row or (None,) * 6
+
+    def _ghi_loi_goi(self, interaction_id: str, record: dict, data: dict):
+        started, request_model, images, video_clips, video_seconds, characters = self._lay_request_cho(interaction_id)
+        finished = _doc_thoi_gian(record["timestamp"])
+        latency = data.get("duration_seconds")
+        if latency is None and started is not None:
+            latency = finished - started
+
+        result = data.get("result")
+        if record["type"] == "response":
+            failed = isinstance(result, dict) and "error" in result
+            error_kind = "result_error" if failed else None
+        else:
+            failed, error_kind = True, record["type"]
+        input_tokens, output_tokens = _tim_usage(result)
+        if failed:
+            images = video_clips = video_seconds = characters = None
+        elif input_tokens is not None or output_tokens is not None:
+            characters = None  # Đã có số token thực tế, không tính phí theo ký tự nữa
+
+        self._calls_buffer.append((
+            interaction_id, record.get("api_function") or "", data.get("model") or request_model or "",
+            started, finished, record["timestamp"][:13], latency, STATUS_ERROR if failed else STATUS_SUCCESS,
+            error_kind, str(data["status_code"]) if data.get("status_code") is not None else None,
+            data.get("retries"), data.get("cache"), input_tokens, output_tokens, images, video_clips,
+            video_seconds, characters,
+        ))
+
+    # --- Báo cáo --- #
+    @staticmethod
+    def _dieu_kien(since: datetime.datetime = None, until: datetime.datetime = None, extra: str = None) -> tuple:
+        clauses, params = ["1 = 1"], []
+        if since is not None:
+            clauses.append("finished >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("finished < ?")
+            params.append(until.timestamp())
+        if extra:
+            clauses.append(extra)
+        return " AND ".join(clauses), params
+
+    def latency_percentiles(self, since=None, until=None, quantiles=DEFAULT_QUANTILES, include_cache_hits=False) -> list:
+        """
+        Độ trễ theo (api_function, model): số lời gọi và các phân vị (giây).
+        Lần trúng cache mặc định bị loại vì không phản ánh độ trễ của gateway.
+        """
+        where, params = self._dieu_kien(since, until, None if include_cache_hits else "(cache IS NULL OR cache != 'hit')")
+        groups = self._conn.execute(
+            f"SELECT api_function, model, COUNT(latency), AVG(latency), MAX(latency) FROM calls WHERE {where} "
+            "GROUP BY api_function, model ORDER BY api_function, model",
+            params,
+        ).fetchall()
+        rows = []
+        for api_function, model, count, mean, maximum in groups:
+            row = {"api_function": api_function, "model": model, "count": count, "mean": mean, "max": maximum}
+            group_where = f"{where} AND api_function = ? AND model = ?"
+            for q in quantiles:
+                row[f"p{q * 100:g}"] = (_tinh_phan_vi(self._conn, group_where, params + [api_function, model], count, q)
+                                        if count else None)
+            rows.append(row)
+        return rows
+
+    def error_rates(self, since=None, until=None) -> list:
+        """Tỉ lệ lỗi theo (api_function, model), kèm số lỗi HTTP / exception / lỗi trong kết quả."""
+        where, params = self._dieu_kien(since, until)
+        rows = self._conn.execute(
+            "SELECT api_function, model, COUNT(*), SUM(status = 'error'), SUM(COALESCE(error_kind = 'error_response', 0)), "
+            "SUM(COALESCE(error_kind = 'exception', 0)), SUM(COALESCE(error_kind = 'result_error', 0)), "
+            "SUM(COALESCE(retries, 0)) "
+            f"FROM calls WHERE {where} GROUP BY api_function, model ORDER BY api_function, model",
+            params,
+        ).fetchall()
+        return [
+            {"api_function": api_function, "model": model, "total": total, "errors": errors,
+             "error_rate": errors / total if total else 0.0, "http_errors": http_errors,
+             "exceptions": exceptions, "result_errors": result_errors, "retries": retries}
+            for api_function, model, total, errors, http_errors, exceptions, result_errors, retries in rows
+        ]
+
+    def throughput_per_hour(self, since=None, until=None) -> list:
+        """Số lời gọi, số lỗi và độ trễ trung bình theo từng giờ ("YYYY-MM-DDTHH", giờ địa phương của máy ghi log)."""
+        where, params = self._dieu_kien(since, until)
+        rows = self._conn.execute(
+            f"SELECT hour, COUNT(*), SUM(status = 'error'), AVG(latency) FROM calls WHERE {where} "
+            "GROUP BY hour ORDER BY hour",
+            params,
+        ).fetchall()
+        return [{"hour": hour, "calls": calls, "errors": errors, "mean_latency": mean} for hour, calls, errors, mean in rows]
+
+    def spend_per_model(self, prices: dict, since=None, until=None) -> list:
+        """
+        Chi phí ước tính theo model từ bảng giá. Lời gọi lỗi và lần trúng cache không bị tính phí.
+
+        Args:
+            prices (dict): {model: {"input_per_1m_tokens", "output_per_1m_tokens", "per_image",
+                           "per_video_second", "default_video_seconds", "per_1m_characters", "per_call"}}.
+        """
+        where, params = self._dieu_kien(since, until, "status = 'success' AND (cache IS NULL OR cache != 'hit')")
+        rows = self._conn.execute(
+            "SELECT model, COUNT(*), SUM(COALESCE(input_tokens, 0)), SUM(COALESCE(output_tokens, 0)), "
+            "SUM(COALESCE(images, 0)), SUM(COALESCE(video_seconds, 0)), "
+            "SUM(CASE WHEN video_seconds IS NULL THEN COALESCE(video_clips, 0) ELSE 0 END), "
+            f"SUM(COALESCE(characters, 0)) FROM calls WHERE {where} GROUP BY model ORDER BY model",
+            params,
+        ).fetchall()
+        result = []
+        for model, calls, input_tokens, output_tokens, images, video_seconds, clips_without_duration, characters in rows:
+            price = prices.get(model)
+            video_seconds += clips_without_duration * (price or {}).get("default_video_seconds", 0)
+            cost = None
+            if price is not None:
+                cost = (input_tokens * price.get("input_per_1m_tokens", 0) / 1e6
+                        + output_tokens * price.get("output_per_1m_tokens", 0) / 1e6
+                        + images * price.get("per_image", 0)
+                        + video_seconds * price.get("per_video_second", 0)
+                        + characters * price.get("per_1m_characters", 0) / 1e6
+                        + calls * price.get("per_call", 0))
+            result.append({"model": model, "calls": calls, "input_tokens": input_tokens, "output_tokens": output_tokens,
+                           "images": images, "video_seconds": video_seconds, "characters": characters, "cost": cost})
+        return result
+
+    def report(self, prices: dict = None, since=None, until=None) -> dict:
+        """Gộp mọi báo cáo vào một dict (dùng cho đầu ra --json của CLI)."""
+        return {
+            "latency": self.latency_percentiles(since, until),
+            "errors": self.error_rates(since, until),
+            "throughput": self.throughput_per_hour(since, until),
+            "spend": self.spend_per_model(prices or {}, since, until),
+        }
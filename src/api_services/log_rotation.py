@@ -0,0 +1,278 @@
+"""
+Lưu log tương tác API theo segment: xoay vòng theo ngày và theo kích thước, nén nền, giới hạn dung lượng.
+
+File đang ghi có tên theo ngày (`api_interactions_YYYY-MM-DD.log`), nên sang ngày mới thì log tự sang file mới.
+Khi file đang ghi vượt `max_bytes`, hoặc file của ngày cũ còn sót lại, nó được đổi tên thành segment đóng
+`api_interactions_YYYY-MM-DD.log.<n>`. Segment không bao giờ bị ghi thêm hay đổi tên lại. Một thread nền nén
+segment thành `.gz` (hoặc `.zst` nếu có `zstandard`) và áp dụng chính sách giữ log (số ngày, tổng dung lượng).
+
+An toàn khi nhiều tiến trình worker cùng ghi một thư mục log:
+- mỗi bản ghi được ghi bằng một lệnh `write` trên file mở với O_APPEND, nên các dòng không bị chen lẫn;
+- mỗi lần ghi giữ khoá chia sẻ (`fcntl.flock` LOCK_SH) trên file khoá chung, còn việc đổi tên file đang ghi thì
+  giữ khoá độc quyền (LOCK_EX). Tiến trình khác nhận ra file đã bị đổi tên (khác inode) ngay ở lần ghi sau và
+  mở file mới, nên không dòng nào bị ghi vào segment sau khi segment đã đóng.
+"""
+import datetime
+import gzip
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, chỉ an toàn khi một tiến trình ghi
+    fcntl = None
+
+DEFAULT_FILENAME_TEMPLATE = "api_interactions_%Y-%m-%d.log"
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_MAX_TOTAL_BYTES = 2 * 1024 ** 3
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", None: ""}
+LOCK_FILENAME = ".api_interactions.lock"
+
+
+@contextmanager
+def _khoa_lien_tien_trinh(lock_fd: int, exclusive: bool = False):
+    """
+    Giữ flock trên file khoá. flock gắn với open file description nên mỗi thread dùng khoá phải có fd riêng
+    (nếu dùng chung fd, LOCK_EX của thread này chỉ "chuyển đổi" khoá LOCK_SH của thread kia thay vì chờ).
+    """
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+
+def _nen_file(source: str, compression: str) -> str:
+    """Nén `source` thành file mới (ghi ra file tạm rồi đổi tên), giữ nguyên thời điểm sửa, xoá file gốc."""
+    target = source + COMPRESSION_EXTENSIONS[compression]
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    stat = os.stat(source)
+    with open(source, "rb") as src:
+        if compression == "zstd":
+            import zstandard
+            with open(tmp_path, "wb") as dst:
+                zstandard.ZstdCompressor(level=10).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, target)
+    try:
+        os.remove(source)
+    except FileNotFoundError:
+        pass  # Tiến trình khác vừa nén cùng segment
+    return target
+
+
+class RotatingCompressedFileHandler(logging.Handler):
+    """
+    Handler ghi log vào file theo ngày, xoay vòng theo kích thước, nén segment đã đóng ở thread nền.
+
+    Args:
+        log_dir (str): Thư mục log.
+        filename_template (str): Mẫu tên file đang ghi theo strftime (mặc định "api_interactions_%Y-%m-%d.log").
+        max_bytes (int): Kích thước tối đa của file đang ghi trước khi bị đóng thành segment (0: không giới hạn).
+        compression (str): "gzip", "zstd" (cần thư viện zstandard) hoặc None (không nén).
+        retention_days (float): Xoá segment cũ hơn số ngày này (None: không xoá theo tuổi).
+        max_total_bytes (int): Xoá segment cũ nhất cho tới khi tổng dung lượng log không vượt ngưỡng (None: không giới hạn).
+        clock (callable): Hàm trả về datetime hiện tại (để kiểm thử).
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        filename_template: str = DEFAULT_FILENAME_TEMPLATE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        compression: str = "gzip",
+        retention_days: float = DEFAULT_RETENTION_DAYS,
+        max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES,
+        clock=datetime.datetime.now,
+    ):
+        super().__init__()
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"compression phải là một trong {list(COMPRESSION_EXTENSIONS)}")
+        if compression == "zstd":
+            import zstandard  # noqa: F401  Báo lỗi ngay nếu thiếu thư viện, không đợi tới lần nén đầu tiên
+        self.log_dir = log_dir
+        self.filename_template = filename_template
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.clock = clock
+        prefix = filename_template.split("%", 1)[0]
+        self._family = re.compile(re.escape(prefix) + r".*\.log(\.\d+)?(\.gz|\.zst)?$")
+        self._segment = re.compile(r"\.log\.(\d+)(\.gz|\.zst)?$")
+
+        os.makedirs(log_dir, exist_ok=True)
+        lock_path = os.path.join(log_dir, LOCK_FILENAME)
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)  # Thread ghi log
+        self._sweeper_lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)  # Thread dọn dẹp
+        self._fd = None
+        self._path = None
+        self._size = 0
+
+        self._sweep_requested = threading.Event()
+        self._stopping = False
+        self._sweeper = threading.Thread(target=self._vong_lap_don_dep, name="log-rotation", daemon=True)
+        self._sweeper.start()
+        self._sweep_requested.set()  # Dọn segment còn sót từ lần chạy trước
+
+    # --- Ghi --- #
+    def _duong_dan_hien_tai(self) -> str:
+        return os.path.join(self.log_dir, self.clock().strftime(self.filename_template))
+
+    def _dong_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _dam_bao_file(self):
+        """Mở (lại) file đang ghi nếu sang ngày mới hoặc file đã bị tiến trình khác đổi tên thành segment."""
+        path = self._duong_dan_hien_tai()
+        if self._fd is not None and path == self._path:
+            try:
+                if os.stat(path).st_ino == os.fstat(self._fd).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+        if self._fd is not None and path != self._path:
+            self._sweep_requested.set()  # Sang ngày mới: file của ngày cũ cần được đóng và nén
+        self._dong_fd()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._path = path
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + "\n").encode("utf-8")
+            with _khoa_lien_tien_trinh(self._lock_fd):
+                self._dam_bao_file()
+                os.write(self._fd, data)
+                # Kích thước thật của file (gồm cả dòng do tiến trình khác ghi)
+                self._size = os.fstat(self._fd).st_size
+            if self.max_bytes and self._size >= self.max_bytes:
+                self._xoay_vong()
+        except Exception:
+            self.handleError(record)
+
+    def _segment_tiep_theo(self, path: str) -> str:
+        base = os.path.basename(path)
+        numbers = [0]
+        for name in os.listdir(self.log_dir):
+            if name.startswith(base + "."):
+                match = self._segment.search(name)
+                if match:
+                    numbers.append(int(match.group(1)))
+        return f"{path}.{max(numbers) + 1}"
+
+    def _dong_thanh_segment(self, path: str) -> bool:
+        """Đổi tên file `path` thành segment kế tiếp (phải giữ khoá độc quyền)."""
+        try:
+            os.rename(path, self._segment_tiep_theo(path))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _xoay_vong(self):
+        with _khoa_lien_tien_trinh(self._lock_fd, exclusive=True):
+            # Tiến trình khác có thể đã xoay vòng trước: chỉ đổi tên nếu file vẫn là file của mình và vẫn quá lớn
+            try:
+                stat = os.stat(self._path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and stat.st_ino == os.fstat(self._fd).st_ino and stat.st_size >= self.max_bytes:
+                self._dong_thanh_segment(self._path)
+            self._dong_fd()
+        self._sweep_requested.set()
+
+    # --- Dọn dẹp nền: đóng file ngày cũ, nén, giữ log --- #
+    def _vong_lap_don_dep(self):
+        while True:
+            self._sweep_requested.wait()
+            self._sweep_requested.clear()
+            # Đọc cờ dừng trước khi dọn: nếu close() đến giữa lượt dọn, vẫn còn một lượt cuối cho segment vừa đóng
+            stopping = self._stopping
+            try:
+                self.don_dep()
+            except Exception as e:
+                logging.getLogger(__name__).warning("Lỗi khi nén/dọn log: %s", e)
+            if stopping:
+                return
+
+    def _cac_file_log(self) -> list:
+        files = []
+        for name in os.listdir(self.log_dir):
+            if self._family.match(name):
+                path = os.path.join(self.log_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        return sorted(files)
+
+    def don_dep(self):
+        """
+        Đóng file của các ngày trước thành segment, nén segment chưa nén, rồi xoá segment theo số ngày
+        và tổng dung lượng. Chạy ở thread nền; có thể gọi trực tiếp.
+        """
+        current = self._duong_dan_hien_tai()
+        with _khoa_lien_tien_trinh(self._sweeper_lock_fd, exclusive=True):
+            for _, path, _ in self._cac_file_log():
+                if path.endswith(".log") and path != current:
+                    self._dong_thanh_segment(path)
+
+        if self.compression is not None:
+            for _, path, _ in self._cac_file_log():
+                if self._segment.search(path) and not path.endswith((".gz", ".zst")):
+                    try:
+                        _nen_file(path, self.compression)
+                    except FileNotFoundError:
+                        pass  # Tiến trình khác đã nén xong segment này
+
+        segments = [f for f in self._cac_file_log() if self._segment.search(f[1])]
+        if self.retention_days is not None:
+            cutoff = time.time() - self.retention_days * 86400
+            for mtime, path, _ in segments:
+                if mtime < cutoff:
+                    self._xoa(path)
+            segments = [f for f in segments if f[0] >= cutoff]
+        if self.max_total_bytes is not None:
+            # File đang ghi cũng tính vào tổng nhưng không bao giờ bị xoá; segment cũ nhất bị xoá trước
+            total = sum(size for _, _, size in self._cac_file_log())
+            for _, path, size in segments:
+                if total <= self.max_total_bytes:
+                    break
+                self._xoa(path)
+                total -= size
+
+    @staticmethod
+    def _xoa(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Đóng file và chờ thread nền nén xong các segment đang chờ."""
+        self.acquire()
+        try:
+            self._dong_fd()
+            if not self._stopping:
+                self._stopping = True
+                self._sweep_requested.set()
+                self._sweeper.join()
+                os.close(self._lock_fd)
+                os.close(self._sweeper_lock_fd)
+        finally:
+            self.release()
+        super().close()
@@ -0,0 +1,502 @@
+"""
+Số liệu hiệu năng cho từng lời gọi API của btc_api_client (cả bản đồng bộ lẫn async).
+
+Mỗi lời gọi do `log_api_call` mở ghi lại vào ngữ cảnh `ApiCallContext`:
+    - thời gian mở kết nối (TCP + TLS, 0 nếu dùng lại kết nối keep-alive),
+    - thời gian tới byte đầu tiên (TTFB: từ lúc gửi request tới khi nhận xong header phản hồi),
+    - thời gian tới token đầu tiên (TTFT) của phản hồi trò chuyện dạng luồng,
+    - tổng thời gian lời gọi, số lần thử lại,
+    - số byte thân request/phản hồi,
+    - thời gian giải mã (JSON, base64) và thời gian ghi file.
+
+Khi lời gọi kết thúc, các con số được gộp vào histogram của `MetricsRegistry`, gắn nhãn theo tên hàm
+và model. Registry xuất dữ liệu qua các exporter có thể thay thế:
+    - `SummaryExporter`: bảng tóm tắt p50/p95/p99 trong tiến trình,
+    - `PrometheusTextfileExporter`: file định dạng text của Prometheus (dùng với textfile collector
+      của node_exporter).
+
+Ví dụ:
+    registry = get_metrics_registry()
+    registry.add_exporter(PrometheusTextfileExporter("metrics/thucchien_api.prom"))
+    registry.start_export_loop(interval=15)
+    ...
+    print(format_summary(registry))
+"""
+import abc
+import atexit
+import bisect
+import datetime
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from src.api_services.call_context import current_call
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "thucchien_api"
+
+# Mốc histogram (giây) cho các khoảng thời gian: từ vài ms (kết nối, giải mã) tới vài phút (sinh video)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Mốc histogram (byte) cho kích thước thân request/phản hồi: từ 1 KiB tới 256 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 8)
+
+# Tên metric -> (mô tả, mốc histogram, thuộc tính tương ứng của ApiCallContext)
+HISTOGRAMS = {
+    "call_duration_seconds": ("Tổng thời gian một lời gọi API", LATENCY_BUCKETS, "duration"),
+    "connect_seconds": ("Thời gian mở kết nối TCP/TLS trong lời gọi", LATENCY_BUCKETS, "connect_seconds"),
+    "ttfb_seconds": ("Thời gian tới byte đầu tiên của phản hồi (lần gửi cuối)", LATENCY_BUCKETS, "ttfb_seconds"),
+    "ttft_seconds": ("Thời gian tới token đầu tiên của phản hồi trò chuyện dạng luồng", LATENCY_BUCKETS, "ttft_seconds"),
+    "request_bytes": ("Số byte thân request đã gửi", SIZE_BUCKETS, "request_bytes"),
+    "response_bytes": ("Số byte thân phản hồi đã nhận", SIZE_BUCKETS, "response_bytes"),
+    "decode_seconds": ("Thời gian giải mã JSON/base64 của phản hồi", LATENCY_BUCKETS, "decode_seconds"),
+    "write_seconds": ("Thời gian ghi file kết quả xuống đĩa", LATENCY_BUCKETS, "write_seconds"),
+    "retries": ("Số lần thử lại trong lời gọi", RETRY_BUCKETS, "retries"),
+}
+# Các metric chỉ có ý nghĩa khi lời gọi thực sự gửi request HTTP (không tính lần trúng cache / gộp)
+_HTTP_METRICS = ("connect_seconds", "ttfb_seconds", "request_bytes", "response_bytes")
+
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+STATUS_CACHE_HIT = "cache_hit"
+STATUS_COALESCED = "coalesced"
+
+
+# --- Ghi nhận từ tầng HTTP / giải mã --- #
+def ghi_nhan(field: str, value: float):
+    """Cộng dồn `value` vào thuộc tính `field` của lời gọi API hiện tại (bỏ qua nếu không có lời gọi nào)."""
+    call = current_call()
+    if call is not None:
+        setattr(call, field, (getattr(call, field) or 0) + value)
+
+
+@contextmanager
+def do_thoi_gian(field: str):
+    """Đo thời gian chạy của khối lệnh và cộng vào `field` (ví dụ "decode_seconds", "write_seconds")."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ghi_nhan(field, time.perf_counter() - start)
+
+
+def ghi_nhan_phan_hoi_http(response):
+    """
+    Ghi nhận một phản hồi của `requests` vừa nhận header: TTFB (`response.elapsed`), số byte thân request.
+    Số byte phản hồi được đọc lúc lời gọi kết thúc, khi thân phản hồi (kể cả dạng stream) đã được đọc xong.
+    """
+    call = current_call()
+    if call is None:
+        return
+    call.http_requests += 1
+    elapsed = getattr(response, "elapsed", None)
+    if isinstance(elapsed, datetime.timedelta):
+        call.ttfb_seconds = elapsed.total_seconds()
+    request = getattr(response, "request", None)
+    content_length = getattr(request, "headers", {}).get("Content-Length") if request is not None else None
+    if isinstance(content_length, str) and content_length.isdigit():
+        call.request_bytes += int(content_length)
+    call.pending_responses.append(response)
+
+
+def _so_byte_da_doc(response) -> int:
+    # urllib3 đếm số byte thân phản hồi đã đọc từ socket (trước khi giải nén)
+    tell = getattr(getattr(response, "raw", None), "tell", None)
+    if tell is not None:
+        try:
+            count = tell()
+        except Exception:
+            count = None
+        if isinstance(count, int):
+            return count
+    content = getattr(response, "_content", None)
+    return len(content) if isinstance(content, bytes) else 0
+
+
+def ket_thuc_lan_goi(call, duration: float):
+    """Chốt số liệu của lời gọi: tổng thời gian và số byte của các phản hồi `requests` đã nhận."""
+    call.duration = duration
+    for response in call.pending_responses:
+        call.response_bytes += _so_byte_da_doc(response)
+    call.pending_responses.clear()
+
+
+def trang_thai_lan_goi(call, result=None, error: BaseException = None) -> str:
+    """Nhãn trạng thái của lời gọi: lỗi (exception hoặc dict có "error"), trúng cache, được gộp, hay thành công."""
+    if error is not None or (isinstance(result, dict) and "error" in result):
+        return STATUS_ERROR
+    if call.cache_status == "hit":
+        return STATUS_CACHE_HIT
+    if call.coalesced:
+        return STATUS_COALESCED
+    return STATUS_SUCCESS
+
+
+def tao_trace_config():
+    """
+    `aiohttp.TraceConfig` ghi nhận thời gian kết nối, TTFB và số byte cho client async.
+    Các callback chạy trong task đang gửi request nên đọc được lời gọi API hiện tại qua contextvars.
+    """
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+        call = current_call()
+        if call is not None:
+            call.http_requests += 1
+
+    async def on_request_end(session, ctx, params):
+        call = current_call()
+        if call is not None:
+            call.ttfb_seconds = time.perf_counter() - ctx.start
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, ctx, params):
+        ghi_nhan("connect_seconds", time.perf_counter() - ctx.connect_start)
+
+    async def on_request_chunk_sent(session, ctx, params):
+        ghi_nhan("request_bytes", len(params.chunk))
+
+    async def on_response_chunk_received(session, ctx, params):
+        ghi_nhan("response_bytes", len(params.chunk))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+# --- Histogram và registry --- #
+class Histogram:
+    """Histogram với các mốc cố định (giống Prometheus: bucket "le" cộng dồn), kèm tổng, min, max."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Phần tử cuối là bucket +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Ước lượng phân vị bằng nội suy tuyến tính trong bucket chứa nó (như histogram_quantile của Prometheus)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else min(0.0, self.min)
+                upper = self.buckets[i]
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def cumulative_counts(self) -> list:
+        result, total = [], 0
+        for bucket_count in self.counts:
+            total += bucket_count
+            result.append(total)
+        return result
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    Nơi gộp số liệu của mọi lời gọi API thành histogram theo (tên metric, nhãn). An toàn khi dùng từ nhiều thread.
+
+    Args:
+        histograms (dict): Định nghĩa metric, mặc định là HISTOGRAMS (tên -> (mô tả, mốc, thuộc tính)).
+        enabled (bool): Tắt để bỏ qua hoàn toàn việc ghi nhận.
+    """
+
+    def __init__(self, histograms: dict = None, enabled: bool = True):
+        self.definitions = dict(histograms or HISTOGRAMS)
+        self.enabled = enabled
+        self.exporters = []
+        self._series = {}  # (tên metric, tuple nhãn đã sắp xếp) -> Histogram
+        self._lock = threading.Lock()
+        self._export_thread = None
+        self._export_stop = None
+        self._atexit_registered = False
+
+    # --- Ghi nhận --- #
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram(self.definitions[name][1])
+            histogram.observe(value)
+
+    def ghi_nhan_loi_goi(self, call, status: str):
+        """Đưa số liệu của một lời gọi đã kết thúc (xem `ket_thuc_lan_goi`) vào các histogram."""
+        if not self.enabled:
+            return
+        labels = {"function": call.api_function_name, "model": call.model or ""}
+        for name, (_, _, field) in self.definitions.items():
+            if name in _HTTP_METRICS and not call.http_requests:
+                continue
+            value = getattr(call, field, None)
+            if value is None:
+                continue
+            if name == "call_duration_seconds":
+                self.observe(name, value, status=status, **labels)
+            else:
+                self.observe(name, value, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    # --- Đọc số liệu --- #
+    def collect(self) -> list:
+        """Bản chụp mọi chuỗi số liệu: danh sách (tên metric, dict nhãn, bản sao Histogram)."""
+        with self._lock:
+            snapshot = []
+            for (name, labels), histogram in sorted(self._series.items()):
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count, copy.sum, copy.min, copy.max = histogram.count, histogram.sum, histogram.min, histogram.max
+                snapshot.append((name, dict(labels), copy))
+        return snapshot
+
+    def summary(self) -> dict:
+        """
+        Tóm tắt theo (tên hàm, model): {(function, model): {"calls": ..., "errors": ..., tên metric: {p50, p95, ...}}}.
+        Thời gian lời gọi được gộp qua mọi trạng thái; "errors" đếm số lời gọi có trạng thái lỗi.
+        """
+        result = {}
+        merged_durations = {}
+        for name, labels, histogram in self.collect():
+            key = (labels.get("function", ""), labels.get("model", ""))
+            row = result.setdefault(key, {"calls": 0, "errors": 0})
+            if name == "call_duration_seconds":
+                row["calls"] += histogram.count
+                if labels.get("status") == STATUS_ERROR:
+                    row["errors"] += histogram.count
+                merged = merged_durations.get(key)
+                if merged is None:
+                    merged_durations[key] = histogram
+                else:
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.count += histogram.count
+                    merged.sum += histogram.sum
+                    merged.min, merged.max = min(merged.min, histogram.min), max(merged.max, histogram.max)
+            else:
+                row[name] = histogram.summary()
+        for key, histogram in merged_durations.items():
+            result[key]["call_duration_seconds"] = histogram.summary()
+        return result
+
+    # --- Xuất dữ liệu --- #
+    def add_exporter(self, exporter):
+        """Thêm exporter (đối tượng có phương thức `export(registry)`). Dữ liệu được xuất lần cuối khi thoát chương trình."""
+        self.exporters.append(exporter)
+        if not self._atexit_registered:
+            atexit.register(self.export)
+            self._atexit_registered = True
+        return exporter
+
+    def remove_exporter(self, exporter):
+        if exporter in self.exporters:
+            self.exporters.remove(exporter)
+
+    def export(self):
+        """Gọi mọi exporter; lỗi của một exporter không ảnh hưởng tới các exporter khác."""
+        for exporter in list(self.exporters):
+            try:
+                exporter.export(self)
+            except Exception:
+                logger.exception("Lỗi khi xuất metrics bằng %s", type(exporter).__name__)
+
+    def start_export_loop(self, interval: float = 15.0):
+        """Xuất dữ liệu định kỳ mỗi `interval` giây trong một thread nền (daemon)."""
+        self.stop_export_loop()
+        stop = threading.Event()
+
+        def _vong_lap():
+            while not stop.wait(interval):
+                self.export()
+
+        self._export_stop = stop
+        self._export_thread = threading.Thread(target=_vong_lap, name="metrics-export", daemon=True)
+        self._export_thread.start()
+
+    def stop_export_loop(self):
+        if self._export_thread is not None:
+            self._export_stop.set()
+            self._export_thread.join()
+            self._export_thread = self._export_stop = None
+
+
+# --- Exporter --- #
+class MetricsExporter(abc.ABC):
+    """Giao diện exporter: nhận registry và đưa số liệu đi đâu đó (màn hình, file, hệ thống giám sát...)."""
+
+    @abc.abstractmethod
+    def export(self, registry: MetricsRegistry):
+        """Xuất số liệu hiện tại của `registry`."""
+
+
+def _dinh_dang_giay(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+
+
+def _dinh_dang_byte(value) -> str:
+    if value is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:.0f}{unit}"
+        value /= 1024
+    return f"{value:.1f}GiB"
+
+
+def format_summary(registry: MetricsRegistry) -> str:
+    """Bảng tóm tắt theo hàm và model: số lời gọi, lỗi, p50/p95/p99 thời gian, kết nối, TTFB, kích thước, giải mã, ghi file."""
+    header = (f"{'function':<38} {'model':<32} {'calls':>6} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'connect':>8} {'ttfb50':>8} {'resp50':>8} {'decode':>8} {'write':>8} {'retry':>6}")
+    lines = [header, "-" * len(header)]
+    for (function, model), row in sorted(registry.summary().items()):
+        duration = row.get("call_duration_seconds", {})
+        mean = lambda name: row.get(name, {}).get("mean")
+        lines.append(
+            f"{function:<38} {model or '-':<32} {row['calls']:>6} {row['errors']:>4} "
+            f"{_dinh_dang_giay(duration.get('p50')):>8} {_dinh_dang_giay(duration.get('p95')):>8} "
+            f"{_dinh_dang_giay(duration.get('p99')):>8} {_dinh_dang_giay(mean('connect_seconds')):>8} "
+            f"{_dinh_dang_giay(row.get('ttfb_seconds', {}).get('p50')):>8} "
+            f"{_dinh_dang_byte(row.get('response_bytes', {}).get('p50')):>8} "
+            f"{_dinh_dang_giay(mean('decode_seconds')):>8} {_dinh_dang_giay(mean('write_seconds')):>8} "
+            f"{mean('retries') or 0:>6.2f}"
+        )
+    return "\n".join(lines)
+
+
+class SummaryExporter(MetricsExporter):
+    """In bảng tóm tắt (xem `format_summary`) ra stream (mặc định stdout)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def export(self, registry: MetricsRegistry):
+        print(format_summary(registry), file=self.stream or sys.stdout)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _dinh_dang_so(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus(registry: MetricsRegistry, prefix: str = METRIC_PREFIX) -> str:
+    """Chuyển số liệu của registry sang định dạng text của Prometheus (histogram: _bucket, _sum, _count)."""
+    by_name = {}
+    for name, labels, histogram in registry.collect():
+        by_name.setdefault(name, []).append((labels, histogram))
+
+    lines = []
+    for name, series in by_name.items():
+        metric = f"{prefix}_{name}"
+        lines.append(f"# HELP {metric} {registry.definitions[name][0]}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, histogram in series:
+            label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items()))
+            separator = "," if label_text else ""
+            for bound, cumulative in zip(histogram.buckets + (math.inf,), histogram.cumulative_counts()):
+                lines.append(f'{metric}_bucket{{{label_text}{separator}le="{_dinh_dang_so(bound)}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {_dinh_dang_so(histogram.sum)}")
+            lines.append(f"{metric}_count{{{label_text}}} {histogram.count}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class PrometheusTextfileExporter(MetricsExporter):
+    """
+    Ghi số liệu ra file định dạng text của Prometheus. File được ghi vào file tạm rồi đổi tên (atomic),
+    nên textfile collector của node_exporter không bao giờ đọc phải file ghi dở.
+
+    Args:
+        file_path (str): Đường dẫn file .prom.
+        prefix (str): Tiền tố tên metric.
+    """
+
+    def __init__(self, file_path: str, prefix: str = METRIC_PREFIX):
+        self.file_path = file_path
+        self.prefix = prefix
+
+    def export(self, registry: MetricsRegistry):
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render_prometheus(registry, self.prefix))
+        os.replace(tmp_path, self.file_path)
+
+
+# --- Registry mặc định dùng chung --- #
+_default_registry = MetricsRegistry()
+_default_registry_lock = threading.Lock()
+_env_checked = False
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Trả về registry dùng chung. Nếu có biến môi trường THUCCHIEN_AI_METRICS_FILE, ở lần gọi đầu tiên
+    registry được gắn PrometheusTextfileExporter ghi ra file đó mỗi THUCCHIEN_AI_METRICS_INTERVAL giây (mặc định 15).
+    """
+    global _env_checked
+    if not _env_checked:
+        with _default_registry_lock:
+            if not _env_checked:
+                _env_checked = True
+                metrics_file = os.environ.get("THUCCHIEN_AI_METRICS_FILE")
+                if metrics_file:
+                    _default_registry.add_exporter(PrometheusTextfileExporter(metrics_file))
+                    _default_registry.start_export_loop(float(os.environ.get("THUCCHIEN_AI_METRICS_INTERVAL", 15)))
+    return _default_registry
+
+
+def set_metrics_registry(registry: MetricsRegistry):
+    global _default_registry, _env_checked
+    with _default_registry_lock:
+        _default_registry = registry
+        _env_checked = True
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import threading
+import time
+
+from src.api_services.call_context import ENDPOINT_FAMILIES
+
+logger = logging.getLogger(__name__)
+
+# Chi phí ước lượng (USD) cho mỗi lời gọi, dùng để từ chối sớm khi ngân sách còn lại không đủ.
+# Đây là giá ước lượng, hãy chỉnh theo bảng giá thực tế của gateway.
+DEFAULT_ESTIMATED_COSTS = {
+    "sinh_phan_hoi_tro_chuyen": 0.002,
+    "sinh_phan_hoi_tro_chuyen_theo_luong": 0.002,
+    "chuyen_am_thanh_thanh_van_ban": 0.005,
+    "sinh_hinh_anh": 0.04,
+    "sinh_hinh_anh_voi_chat": 0.04,
+    "sinh_sua_hinh_anh_voi_google_gemini": 0.04,
+    "tao_video": 3.2,
+    "chuyen_van_ban_thanh_giong_noi": 0.01,
+    "chuyen_van_ban_thanh_giong_noi_voi_google": 0.01,
+}
+
+
+class QuotaExceededError(Exception):
+    """Ngân sách còn lại của API key không đủ cho lời gọi, request bị từ chối trước khi gửi."""
+
+
+class RateLimitTimeout(Exception):
+    """Thời gian phải chờ token vượt quá `max_wait` đã cấu hình."""
+
+
+class TokenBucket:
+    """
+    Token bucket an toàn đa luồng, dùng được cả từ thread lẫn coroutine.
+
+    Mỗi lần lấy token sẽ "đặt chỗ" trước (số token có thể âm) rồi mới chờ ngoài khoá,
+    nhờ vậy các bên gọi được phục vụ theo thứ tự đến và không giữ khoá khi ngủ.
+
+    Args:
+        rate (float): Số token được nạp lại mỗi giây.
+        capacity (float): Số token tối đa (kích thước burst).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate phải lớn hơn 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0, max_wait: float = None) -> float:
+        """
+        Đặt chỗ `tokens` token và trả về số giây cần chờ trước khi được dùng.
+
+        Raises:
+            RateLimitTimeout: Nếu thời gian chờ vượt quá `max_wait` (khi đó không đặt chỗ).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(f"Cần chờ {wait:.2f}s để có token, vượt quá max_wait={max_wait}s")
+            self._tokens -= tokens
+            return wait
+
+    def release(self, tokens: float = 1.0):
+        """Trả lại `tokens` token đã đặt chỗ nhưng không dùng (ví dụ khi bucket khác ném RateLimitTimeout)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate + tokens)
+            self._updated = now
+
+    def acquire(self, tokens: float = 1.0, max_wait: float = None) -> float:
+        wait = self.reserve(tokens, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0, max_wait: float = None) -> float:
+        wait = self.reserve(tokens, max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    Điều tiết lời gọi theo nhóm endpoint (chat, images, video, audio) và kiểm soát ngân sách của API key.
+
+    - Mỗi nhóm có một token bucket riêng; ngoài ra có bucket chung cho toàn key (rpm_limit của gateway).
+    - Ngân sách còn lại được nạp từ `kiem_tra_chi_tieu()` (/key/info) và làm mới định kỳ; mỗi lời gọi
+      tốn phí bị trừ chi phí ước lượng, và bị từ chối bằng QuotaExceededError nếu không đủ ngân sách.
+    - Thời gian chờ của từng lời gọi được ghi vào ngữ cảnh lời gọi (xuất hiện trong log) và vào `stats()`.
+
+    Args:
+        family_limits (dict): {nhóm: (số request mỗi phút, burst)}. Nhóm không có cấu hình thì không bị giới hạn.
+        global_rpm (float): Giới hạn request/phút chung cho toàn key.
+        estimated_costs (dict): Chi phí ước lượng theo tên hàm, ghi đè DEFAULT_ESTIMATED_COSTS.
+        auto_seed (bool): Tự gọi /key/info để nạp rpm_limit và ngân sách ở lần dùng đầu tiên.
+        budget_refresh_interval (float): Chu kỳ (giây) làm mới ngân sách từ /key/info khi auto_seed bật.
+        max_wait (float): Thời gian chờ token tối đa; vượt quá thì ném RateLimitTimeout thay vì chờ.
+    """
+
+    def __init__(
+        self,
+        family_limits: dict = None,
+        global_rpm: float = None,
+        estimated_costs: dict = None,
+        auto_seed: bool = False,
+        budget_refresh_interval: float = 300.0,
+        max_wait: float = None,
+    ):
+        self.estimated_costs = {**DEFAULT_ESTIMATED_COSTS, **(estimated_costs or {})}
+        self.auto_seed = auto_seed
+        self.budget_refresh_interval = budget_refresh_interval
+        self.max_wait = max_wait
+
+        self._buckets = {}
+        for family, (rpm, burst) in (family_limits or {}).items():
+            self._buckets[family] = TokenBucket(rpm / 60.0, burst)
+        self._global_bucket = TokenBucket(global_rpm / 60.0, max(1.0, global_rpm / 60.0)) if global_rpm else None
+
+        self._remaining_budget = None
+        self._budget_checked_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {}
+
+    # --- Ngân sách --- #
+    def seed_from_key_info(self, key_info: dict):
+        """
+        Nạp giới hạn và ngân sách từ phản hồi của `kiem_tra_chi_tieu()`.
+        Hỗ trợ cả dạng {"info": {...}} lẫn dict phẳng với các trường spend, max_budget, rpm_limit.
+        """
+        info = key_info.get("info", key_info) if isinstance(key_info, dict) else {}
+        max_budget = info.get("max_budget")
+        spend = info.get("spend") or 0.0
+        rpm_limit = info.get("rpm_limit")
+        with self._lock:
+            self._remaining_budget = (max_budget - spend) if max_budget is not None else None
+            self._budget_checked_at = time.monotonic()
+            if rpm_limit:
+                self._global_bucket = TokenBucket(rpm_limit / 60.0, max(1.0, rpm_limit / 60.0))
+        logger.info("Đã nạp hạn mức từ /key/info: ngân sách còn lại=%s, rpm_limit=%s", self._remaining_budget, rpm_limit)
+
+    def refresh_budget(self):
+        """Gọi /key/info để làm mới ngân sách; chỉ một thread làm mới tại một thời điểm."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            from src.api_services.btc_api_client import kiem_tra_chi_tieu
+            self.seed_from_key_info(kiem_tra_chi_tieu())
+        except Exception as e:
+            logger.warning("Không làm mới được ngân sách từ /key/info: %s", e)
+            with self._lock:
+                self._budget_checked_at = time.monotonic()  # Tránh gọi lại liên tục khi gateway lỗi
+        finally:
+            self._refresh_lock.release()
+
+    def _budget_stale(self, family: str) -> bool:
+        if not self.auto_seed or family == "info":
+            return False
+        checked_at = self._budget_checked_at
+        return checked_at is None or time.monotonic() - checked_at > self.budget_refresh_interval
+
+    def _admit(self, api_function_name: str) -> float:
+        """Kiểm tra và trừ chi phí ước lượng; trả về số tiền đã trừ để hoàn lại nếu không lấy được token."""
+        cost = self.estimated_costs.get(api_function_name, 0.0)
+        with self._lock:
+            if self._remaining_budget is None or cost <= 0:
+                return 0.0
+            if self._remaining_budget < cost:
+                self._family_stats(ENDPOINT_FAMILIES.get(api_function_name, "default"))["rejected"] += 1
+                raise QuotaExceededError(
+                    f"Ngân sách còn lại ({self._remaining_budget:.4f}) không đủ cho {api_function_name} "
+                    f"(ước lượng {cost:.4f})."
+                )
+            self._remaining_budget -= cost
+            return cost
+
+    def _refund(self, cost: float):
+        if cost <= 0:
+            return
+        with self._lock:
+            if self._remaining_budget is not None:
+                self._remaining_budget += cost
+
+    # --- Token --- #
+    def _reserve(self, family: str) -> float:
+        """Đặt chỗ ở bucket chung và bucket của nhóm; nếu một bucket ném RateLimitTimeout, trả lại các chỗ đã đặt."""
+        wait = 0.0
+        reserved = []
+        try:
+            for bucket in (self._global_bucket, self._buckets.get(family)):
+                if bucket is not None:
+                    wait = max(wait, bucket.reserve(max_wait=self.max_wait))
+                    reserved.append(bucket)
+        except RateLimitTimeout:
+            for bucket in reserved:
+                bucket.release()
+            raise
+        return wait
+
+    def acquire(self, api_function_name: str, charge: bool = True) -> float:
+        """
+        Chờ tới lượt gửi request cho hàm `api_function_name` (dùng trong thread).
+
+        Args:
+            api_function_name (str): Tên hàm trong btc_api_client.
+            charge (bool): Kiểm tra và trừ ngân sách (chỉ lần gửi đầu tiên; lần thử lại không tính thêm).
+
+        Returns:
+            float: Số giây đã phải chờ.
+        """
+        family = ENDPOINT_FAMILIES.get(api_function_name, "default")
+        if self._budget_stale(family):
+            self.refresh_budget()
+        cost = self._admit(api_function_name) if charge else 0.0
+        try:
+            wait = self._reserve(family)
+            if wait > 0:
+                time.sleep(wait)
+        except BaseException:
+            self._refund(cost)  # Request không được gửi, không tính vào ngân sách
+            raise
+        self._record(family, wait)
+        return wait
+
+    async def acquire_async(self, api_function_name: str, charge: bool = True) -> float:
+        """Bản async của `acquire`, chờ bằng asyncio.sleep để không chặn event loop."""
+        family = ENDPOINT_FAMILIES.get(api_function_name, "default")
+        if self._budget_stale(family):
+            await asyncio.to_thread(self.refresh_budget)
+        cost = self._admit(api_function_name) if charge else 0.0
+        try:
+            wait = self._reserve(family)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._refund(cost)  # Request không được gửi (hết max_wait hoặc bị huỷ), không tính vào ngân sách
+            raise
+        self._record(family, wait)
+        return wait
+
+    # --- Thống kê --- #
+    def _family_stats(self, family: str) -> dict:
+        return self._stats.setdefault(family, {"calls": 0, "rejected": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0})
+
+    def _record(self, family: str, wait: float):
+        with self._lock:
+            stats = self._family_stats(family)
+            stats["calls"] += 1
+            stats["total_wait_seconds"] += wait
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+    def stats(self) -> dict:
+        """Thống kê theo nhóm: số lời gọi, số lần bị từ chối, tổng/max thời gian chờ, và ngân sách còn lại."""
+        with self._lock:
+            return {
+                "families": {family: dict(stats) for family, stats in self._stats.items()},
+                "remaining_budget": self._remaining_budget,
+            }
+
+
+# --- Bộ điều tiết mặc định dùng chung --- #
+_default_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _default_rate_limiter
+
+
+def set_rate_limiter(rate_limiter: RateLimiter):
+    global _default_rate_limiter
+    _default_rate_limiter = rate_limiter
+
+
+def configure_rate_limiter(**kwargs) -> RateLimiter:
+    """
+    Tạo bộ điều tiết mới và dùng cho mọi lời gọi btc_api_client (cả đồng bộ lẫn async), ví dụ:
+
+        configure_rate_limiter(family_limits={"images": (20, 5), "video": (4, 2)}, auto_seed=True)
+    """
+    rate_limiter = RateLimiter(**kwargs)
+    set_rate_limiter(rate_limiter)
+    return rate_limiter
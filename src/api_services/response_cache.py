@@ -0,0 +1,439 @@
+"""
+Cache trên đĩa cho các lời gọi sinh nội dung có tính xác định (cùng prompt, cùng tham số -> dùng lại kết quả).
+
+Khoá cache là sha256 của tên endpoint cùng toàn bộ tham số (model, prompt, ...) đã chuẩn hoá; `file_path`
+không nằm trong khoá, nên cùng một prompt lưu ra đường dẫn khác vẫn trúng cache. File kết quả (PNG/MP3/MP4)
+được lưu một lần theo sha256 nội dung trong `blobs/` rồi copy (hoặc hard-link nếu bật) ra `file_path` được yêu cầu.
+
+Cache là tuỳ chọn, mặc định tắt:
+
+    from src.api_services.response_cache import enable_response_cache
+    enable_response_cache(max_size_bytes=5 * 1024**3, default_ttl=7 * 86400)
+
+hoặc đặt biến môi trường THUCCHIEN_AI_CACHE_DIR.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from functools import wraps
+
+from src.api_services.call_context import current_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "cache/api_responses"
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024 ** 3
+# Tăng khi đổi cách tạo khoá hoặc định dạng kết quả để vô hiệu hoá cache cũ
+CACHE_KEY_VERSION = 1
+# Chuỗi dài hơn ngưỡng này trong `response_data` (thường là base64 của ảnh) không được lưu vào index
+MAX_INLINE_STRING_LENGTH = 4096
+LINK_MODES = ("hardlink", "copy")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    api_function TEXT NOT NULL,
+    result_json TEXT NOT NULL,
+    blob_hash TEXT REFERENCES blobs(hash),
+    artifact_path TEXT,
+    requested_path TEXT,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+"""
+
+
+def _bo_base64_lon(value):
+    """Thay các chuỗi rất dài (base64) bằng placeholder để index không phình to."""
+    if isinstance(value, dict):
+        return {k: _bo_base64_lon(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bo_base64_lon(v) for v in value]
+    if isinstance(value, str) and len(value) > MAX_INLINE_STRING_LENGTH:
+        return f"<đã lược bỏ {len(value)} ký tự, xem file trong cache>"
+    return value
+
+
+def duong_dan_dich(artifact_path: str, requested_path: str, file_path: str) -> str:
+    """
+    Đường dẫn file kết quả cho một lời gọi yêu cầu `file_path`, khi lời gọi gốc yêu cầu `requested_path`
+    và thực tế lưu ra `artifact_path`. Giữ nguyên quy ước đổi đuôi file của hàm gốc (ví dụ .wav -> .mp3).
+    """
+    if artifact_path == requested_path:
+        return file_path
+    return os.path.splitext(file_path)[0] + os.path.splitext(artifact_path)[1]
+
+
+def doi_duong_dan_ket_qua(result: dict, artifact_path: str, target: str):
+    result["file_path"] = target
+    if isinstance(result.get("message"), str):
+        result["message"] = result["message"].replace(artifact_path, target)
+
+
+def _sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache kết quả lời gọi API trên đĩa, có index sqlite, lưu file theo nội dung, LRU theo dung lượng và TTL.
+
+    Args:
+        cache_dir (str): Thư mục chứa index (`index.sqlite3`) và các file kết quả (`blobs/`).
+        max_size_bytes (int): Dung lượng tối đa; vượt quá thì xoá các mục ít được dùng gần đây nhất.
+        default_ttl (float): Thời gian sống (giây) mặc định của một mục; None là không hết hạn.
+        ttl_by_function (dict): TTL riêng theo tên hàm, ví dụ {"sinh_phan_hoi_tro_chuyen": 3600}.
+        link_mode (str): "copy" (mặc định) hoặc "hardlink" (rơi về copy nếu khác ổ đĩa). Với "hardlink", file kết
+            quả và blob là cùng một inode: ghi đè tại chỗ vào file kết quả sẽ sửa luôn blob, nên mỗi lần trúng cache
+            blob được kiểm tra lại sha256 (không chỉ kích thước) trước khi dùng.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        default_ttl: float = None,
+        ttl_by_function: dict = None,
+        link_mode: str = "copy",
+    ):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode phải là một trong {LINK_MODES}")
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.max_size_bytes = max_size_bytes
+        self.default_ttl = default_ttl
+        self.ttl_by_function = dict(ttl_by_function or {})
+        self.link_mode = link_mode
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        import sqlite3  # Chỉ cần khi cache được bật; không làm chậm việc import module
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    # --- Khoá --- #
+    @staticmethod
+    def make_key(api_function_name: str, arguments: dict) -> str:
+        """
+        Tạo khoá từ tên endpoint và các tham số (đã bỏ `file_path`), chuẩn hoá bằng JSON sắp xếp khoá.
+        """
+        canonical = json.dumps(
+            {"v": CACHE_KEY_VERSION, "endpoint": api_function_name, "arguments": arguments},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    # --- Đọc --- #
+    def get(self, key: str, file_path: str = None) -> dict:
+        """
+        Trả về kết quả đã cache (None nếu không có hoặc đã hết hạn). Nếu mục có file kết quả,
+        file được liên kết ra `file_path` và đường dẫn trong kết quả được cập nhật tương ứng.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.result_json, e.expires, e.artifact_path, e.requested_path, b.hash, b.path, b.size "
+                "FROM entries e LEFT JOIN blobs b ON e.blob_hash = b.hash WHERE e.key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            result_json, expires, artifact_path, requested_path, blob_hash, blob_path, blob_size = row
+            if expires is not None and expires <= now:
+                self._xoa_muc(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            if blob_path is not None and not self._blob_hop_le(blob_hash, blob_path, blob_size):
+                logger.warning("File cache %s bị thiếu hoặc hỏng, bỏ qua mục %s", blob_path, key)
+                self._xoa_muc(key)
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+
+        result = json.loads(result_json)
+        if blob_path is not None and file_path:
+            target = duong_dan_dich(artifact_path, requested_path, file_path)
+            self._lien_ket(blob_path, target)
+            doi_duong_dan_ket_qua(result, artifact_path, target)
+        return result
+
+    def _blob_hop_le(self, blob_hash: str, blob_path: str, blob_size: int) -> bool:
+        """Blob còn tồn tại và đúng kích thước; ở chế độ hardlink còn phải đúng sha256."""
+        if not os.path.exists(blob_path) or os.path.getsize(blob_path) != blob_size:
+            return False
+        return self.link_mode != "hardlink" or _sha256_file(blob_path) == blob_hash
+
+    def _lien_ket(self, blob_path: str, target: str):
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        if os.path.abspath(target) == os.path.abspath(blob_path):
+            return
+        if os.path.lexists(target):
+            os.remove(target)
+        if self.link_mode == "hardlink":
+            try:
+                os.link(blob_path, target)
+                return
+            except OSError:
+                pass  # Khác ổ đĩa hoặc hệ thống file không hỗ trợ hard link
+        shutil.copyfile(blob_path, target)
+
+    # --- Ghi --- #
+    def put(self, key: str, api_function_name: str, result: dict, requested_path: str = None):
+        """
+        Lưu kết quả của một lời gọi thành công. Nếu kết quả có `file_path` trỏ tới file tồn tại,
+        nội dung file được lưu vào `blobs/` theo sha256.
+        """
+        artifact_path = result.get("file_path") if isinstance(result, dict) else None
+        blob_hash = blob_path = blob_size = None
+        if artifact_path and os.path.isfile(artifact_path):
+            blob_hash = _sha256_file(artifact_path)
+            ext = os.path.splitext(artifact_path)[1]
+            blob_path = os.path.join(self.blob_dir, blob_hash[:2], blob_hash + ext)
+            blob_size = os.path.getsize(artifact_path)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+                shutil.copyfile(artifact_path, tmp_path)
+                os.replace(tmp_path, blob_path)  # Ghi nguyên tử, không để lại file dở dang
+        else:
+            artifact_path = None
+
+        stored = dict(result)
+        if "response_data" in stored:
+            stored["response_data"] = _bo_base64_lon(stored["response_data"])
+        result_json = json.dumps(stored, ensure_ascii=False, default=str)
+
+        now = time.time()
+        ttl = self.ttl_by_function.get(api_function_name, self.default_ttl)
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            if blob_hash is not None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, path, size) VALUES (?, ?, ?)", (blob_hash, blob_path, blob_size)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, api_function, result_json, blob_hash, artifact_path, "
+                "requested_path, created, last_access, expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, api_function_name, result_json, blob_hash, artifact_path, requested_path, now, now, expires),
+            )
+            self._stats["stores"] += 1
+            self._thu_hoi()
+            self._conn.commit()
+
+    # --- Dọn dẹp --- #
+    def _dung_luong(self) -> int:
+        entries_size, = self._conn.execute("SELECT COALESCE(SUM(LENGTH(result_json)), 0) FROM entries").fetchone()
+        blobs_size, = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return entries_size + blobs_size
+
+    def _xoa_muc(self, key: str):
+        row = self._conn.execute("SELECT blob_hash FROM entries WHERE key = ?", (key,)).fetchone()
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if row and row[0]:
+            # Chỉ xoá file khi không còn mục nào khác dùng chung nội dung này
+            still_used = self._conn.execute("SELECT 1 FROM entries WHERE blob_hash = ? LIMIT 1", (row[0],)).fetchone()
+            if not still_used:
+                blob = self._conn.execute("SELECT path FROM blobs WHERE hash = ?", (row[0],)).fetchone()
+                self._conn.execute("DELETE FROM blobs WHERE hash = ?", (row[0],))
+                if blob and os.path.exists(blob[0]):
+                    os.remove(blob[0])
+        self._conn.commit()
+
+    def _thu_hoi(self):
+        """Xoá mục hết hạn, rồi xoá theo LRU cho tới khi dung lượng về dưới max_size_bytes."""
+        now = time.time()
+        for key, in self._conn.execute("SELECT key FROM entries WHERE expires IS NOT NULL AND expires <= ?", (now,)).fetchall():
+            self._xoa_muc(key)
+            self._stats["expired"] += 1
+        while self._dung_luong() > self.max_size_bytes:
+            row = self._conn.execute("SELECT key FROM entries ORDER BY last_access ASC LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._xoa_muc(row[0])
+            self._stats["evictions"] += 1
+
+    def purge_expired(self):
+        with self._lock:
+            self._thu_hoi()
+            self._conn.commit()
+
+    def clear(self):
+        """Xoá toàn bộ cache (index và file)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM blobs")
+            self._conn.commit()
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+            os.makedirs(self.blob_dir, exist_ok=True)
+
+    def stats(self) -> dict:
+        """Số lần trúng/trượt/lưu/thu hồi/hết hạn, tỉ lệ trúng, số mục và dung lượng hiện tại."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"], = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            stats["size_bytes"] = self._dung_luong()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Cache mặc định dùng chung --- #
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_env_checked = False
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Trả về cache đang bật (None nếu tắt). Nếu chưa bật nhưng có biến môi trường THUCCHIEN_AI_CACHE_DIR,
+    cache được tạo tại thư mục đó ở lần gọi đầu tiên.
+    """
+    global _default_cache, _env_checked
+    if _default_cache is None and not _env_checked:
+        with _default_cache_lock:
+            if _default_cache is None and not _env_checked:
+                cache_dir = os.environ.get("THUCCHIEN_AI_CACHE_DIR")
+                if cache_dir:
+                    _default_cache = ResponseCache(cache_dir=cache_dir)
+                _env_checked = True
+    return _default_cache
+
+
+def enable_response_cache(**kwargs) -> ResponseCache:
+    """Bật cache cho các hàm sinh nội dung trong btc_api_client (cả đồng bộ lẫn async)."""
+    global _default_cache, _env_checked
+    cache = ResponseCache(**kwargs)
+    with _default_cache_lock:
+        if _default_cache is not None:
+            _default_cache.close()
+        _default_cache = cache
+        _env_checked = True
+    return cache
+
+
+def disable_response_cache():
+    global _default_cache, _env_checked
+    with _default_cache_lock:
+        if _default_cache is not None:
+            _default_cache.close()
+        _default_cache = None
+        _env_checked = True
+
+
+# --- Decorator --- #
+def _nen_cache(result) -> bool:
+    return isinstance(result, dict) and "error" not in result and result.get("success", True)
+
+
+def khoa_theo_file_path(extract):
+    """
+    Khai báo phần của `file_path` quyết định nội dung kết quả (ví dụ định dạng âm thanh suy ra từ đuôi file),
+    để khoá của response_cache và single_flight phân biệt các lời gọi chỉ khác phần đó. Đặt dưới `@cache_response`:
+
+        @cache_response
+        @khoa_theo_file_path(lambda file_path: resolve_output_path(file_path)[1])
+        def chuyen_van_ban_thanh_giong_noi_voi_google(...): ...
+    """
+    def decorator(func):
+        func.khoa_tu_file_path = extract
+        return func
+    return decorator
+
+
+def tao_khoa_yeu_cau(func, args, kwargs):
+    """
+    Trả về (khoá, file_path) của một lời gọi: khoá gồm tên hàm và mọi tham số trừ `file_path`
+    (cộng phần của `file_path` được khai báo bằng `khoa_theo_file_path`, nếu có).
+    """
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    file_path = arguments.pop("file_path", None)
+    extract = getattr(func, "khoa_tu_file_path", None)
+    if extract is not None and file_path is not None:
+        arguments["__file_path__"] = extract(file_path)
+    # Gộp **kwargs vào cùng cấp để thứ tự/ cách truyền tham số không ảnh hưởng tới khoá
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind == inspect.Parameter.VAR_KEYWORD:
+            arguments.update(arguments.pop(name, {}))
+    return ResponseCache.make_key(func.__name__, arguments), file_path
+
+
+def _ghi_trang_thai(status: str):
+    call = current_call()
+    if call is not None:
+        call.cache_status = status
+
+
+def cache_response(func):
+    """
+    Decorator dùng cache mặc định (nếu đang bật) cho một hàm API. Đặt bên dưới `@log_api_call`
+    để lời gọi trúng cache vẫn được ghi log (kèm "cache": "hit"). Hỗ trợ cả hàm đồng bộ và coroutine.
+    """
+    api_function_name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None:
+                return await func(*args, **kwargs)
+            import asyncio  # Đã được import sẵn khi có event loop đang chạy
+            key, file_path = tao_khoa_yeu_cau(func, args, kwargs)
+            cached = await asyncio.to_thread(cache.get, key, file_path)
+            if cached is not None:
+                _ghi_trang_thai("hit")
+                return cached
+            _ghi_trang_thai("miss")
+            result = await func(*args, **kwargs)
+            if _nen_cache(result):
+                await asyncio.to_thread(cache.put, key, api_function_name, result, file_path)
+            return result
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = get_response_cache()
+        if cache is None:
+            return func(*args, **kwargs)
+        key, file_path = tao_khoa_yeu_cau(func, args, kwargs)
+        cached = cache.get(key, file_path)
+        if cached is not None:
+            _ghi_trang_thai("hit")
+            return cached
+        _ghi_trang_thai("miss")
+        result = func(*args, **kwargs)
+        if _nen_cache(result):
+            cache.put(key, api_function_name, result, file_path)
+        return result
+
+    return wrapper
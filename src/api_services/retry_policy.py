@@ -0,0 +1,159 @@
+import datetime
+import email.utils
+import random
+import threading
+
+# Mã trạng thái tạm thời, đáng thử lại
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Mã trạng thái mà gateway từ chối request trước khi xử lý -> an toàn để gửi lại cả POST tốn phí
+REJECTED_BEFORE_PROCESSING_STATUS_CODES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Loại lỗi kết nối do tầng HTTP phân loại
+ERROR_CONNECT = "connect"      # Không mở được kết nối: request chắc chắn chưa được gửi
+ERROR_TRANSPORT = "transport"  # Lỗi sau khi đã gửi (reset, timeout đọc...): server có thể đã xử lý
+
+
+class RetryPolicy:
+    """
+    Chính sách thử lại cho một endpoint: số lần thử, đường cong backoff, jitter và tôn trọng Retry-After.
+
+    Thử lại có phân biệt tính idempotent:
+        - GET (kiểm tra trạng thái, tải video, kiểm tra chi tiêu) được thử lại với mọi lỗi tạm thời.
+        - POST sinh nội dung (tốn phí) chỉ được thử lại khi chắc chắn request chưa được xử lý
+          (không kết nối được, 429, 503), trừ khi bật `retry_non_idempotent`.
+
+    Args:
+        max_attempts (int): Tổng số lần gửi tối đa (1 = không thử lại).
+        backoff_base (float): Thời gian chờ (giây) trước lần thử lại đầu tiên.
+        backoff_factor (float): Hệ số nhân sau mỗi lần thử (2.0 = exponential, 1.0 = cố định).
+        backoff_max (float): Thời gian chờ tối đa giữa hai lần thử.
+        jitter (str): "full" (ngẫu nhiên trong [0, delay]), "equal" ([delay/2, delay]) hoặc "none".
+        retry_on_status (iterable): Các mã trạng thái được coi là tạm thời.
+        retry_non_idempotent (bool): Cho phép thử lại POST cả khi server có thể đã xử lý request.
+        respect_retry_after (bool): Dùng header Retry-After / retry-after-ms của server nếu có.
+        max_retry_after (float): Bỏ qua thử lại nếu server yêu cầu chờ lâu hơn giá trị này (giây).
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_base: float = 1.0,
+        backoff_factor: float = 2.0,
+        backoff_max: float = 30.0,
+        jitter: str = "full",
+        retry_on_status=RETRYABLE_STATUS_CODES,
+        retry_non_idempotent: bool = False,
+        respect_retry_after: bool = True,
+        max_retry_after: float = 120.0,
+    ):
+        if jitter not in ("full", "equal", "none"):
+            raise ValueError(f"jitter không hợp lệ: {jitter}")
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_on_status = frozenset(retry_on_status)
+        self.retry_non_idempotent = retry_non_idempotent
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, method: str, attempt: int, status_code: int = None, error_kind: str = None) -> bool:
+        """
+        Quyết định có gửi lại sau lần thử thứ `attempt` (bắt đầu từ 1) hay không.
+
+        Args:
+            method (str): Phương thức HTTP.
+            attempt (int): Số thứ tự của lần thử vừa thất bại.
+            status_code (int): Mã trạng thái HTTP nếu nhận được phản hồi.
+            error_kind (str): ERROR_CONNECT hoặc ERROR_TRANSPORT nếu lỗi ở tầng kết nối.
+        """
+        if attempt >= self.max_attempts:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS or self.retry_non_idempotent
+
+        if status_code is not None:
+            if status_code not in self.retry_on_status:
+                return False
+            return idempotent or status_code in REJECTED_BEFORE_PROCESSING_STATUS_CODES
+        if error_kind == ERROR_CONNECT:
+            return True
+        if error_kind == ERROR_TRANSPORT:
+            return idempotent
+        return False
+
+    def compute_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Thời gian chờ (giây) trước lần thử thứ `attempt + 1`."""
+        if self.respect_retry_after and retry_after is not None:
+            return max(0.0, retry_after)
+        delay = min(self.backoff_max, self.backoff_base * (self.backoff_factor ** (attempt - 1)))
+        if self.jitter == "full":
+            return random.uniform(0, delay)
+        if self.jitter == "equal":
+            return delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    def retry_after_too_long(self, retry_after: float) -> bool:
+        return self.respect_retry_after and retry_after is not None and retry_after > self.max_retry_after
+
+
+def parse_retry_after(headers) -> float:
+    """
+    Đọc thời gian chờ (giây) từ header `retry-after-ms` hoặc `Retry-After` (số giây hoặc HTTP-date).
+
+    Returns:
+        float: Số giây cần chờ, hoặc None nếu không có / không đọc được.
+    """
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+# --- Cấu hình theo endpoint (theo tên hàm trong btc_api_client) --- #
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+_retry_policies = {
+    # Trò chuyện / chuyển âm thanh thành văn bản: rẻ, gửi lại không gây hậu quả
+    "sinh_phan_hoi_tro_chuyen": RetryPolicy(retry_non_idempotent=True),
+    # Chỉ thử lại trước khi nhận header phản hồi; lỗi giữa luồng được trả về cho bên gọi
+    "sinh_phan_hoi_tro_chuyen_theo_luong": RetryPolicy(retry_non_idempotent=True),
+    "chuyen_am_thanh_thanh_van_ban": RetryPolicy(retry_non_idempotent=True),
+    # GET polling / tải xuống: thử lại thoải mái
+    "kiem_tra_trang_thai_video": RetryPolicy(max_attempts=6, backoff_base=2.0),
+    "tai_xuong_video_hoan_thanh": RetryPolicy(max_attempts=5, backoff_base=2.0),
+    "kiem_tra_chi_tieu": RetryPolicy(max_attempts=4),
+    # Sinh ảnh/video/giọng nói: POST tốn phí, chỉ thử lại khi request bị từ chối trước khi xử lý
+    "tao_video": RetryPolicy(max_attempts=4, backoff_base=5.0, backoff_max=60.0),
+}
+_retry_policies_lock = threading.Lock()
+
+
+def get_retry_policy(api_function_name: str = None) -> RetryPolicy:
+    """Trả về chính sách thử lại của endpoint (theo tên hàm), hoặc chính sách mặc định."""
+    return _retry_policies.get(api_function_name, DEFAULT_RETRY_POLICY)
+
+
+def set_retry_policy(api_function_name: str, policy: RetryPolicy):
+    """Đặt chính sách thử lại cho một endpoint, ví dụ set_retry_policy("sinh_hinh_anh", RetryPolicy(max_attempts=1))."""
+    with _retry_policies_lock:
+        _retry_policies[api_function_name] = policy
@@ -0,0 +1,187 @@
+"""
+Gộp các lời gọi sinh nội dung giống hệt nhau đang chạy đồng thời thành một lời gọi upstream duy nhất.
+
+Khi nhiều thread (hoặc task asyncio) cùng gọi, ví dụ, `sinh_hinh_anh` với cùng prompt và tham số,
+chỉ lời gọi đến đầu tiên ("leader") thực sự gửi request; các lời gọi còn lại chờ và nhận cùng kết quả
+(hoặc cùng exception). Nếu lời gọi chờ yêu cầu `file_path` khác, file kết quả được copy sang đường dẫn đó.
+Khoá gộp giống khoá của response_cache: tên hàm và mọi tham số trừ `file_path`.
+"""
+import copy
+import inspect
+import os
+import shutil
+import threading
+from functools import wraps
+
+from src.api_services.call_context import current_call
+from src.api_services.response_cache import doi_duong_dan_ket_qua, duong_dan_dich, tao_khoa_yeu_cau
+
+
+class _Flight:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncFlight:
+    def __init__(self, file_path: str, task):
+        self.file_path = file_path
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Bảng các lời gọi đang chạy theo khoá, dùng chung cho thread và asyncio.
+
+    Với asyncio, request chạy trong một task riêng; mỗi bên gọi chờ task qua `asyncio.shield`,
+    nên một bên bị huỷ không làm huỷ các bên còn lại. Task chỉ bị huỷ khi mọi bên gọi đều đã huỷ.
+
+    Args:
+        enabled (bool): Tắt để mọi lời gọi đi thẳng tới upstream.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    # --- Thread --- #
+    def do(self, key: str, file_path: str, fn):
+        """Chạy `fn()` nếu chưa có lời gọi nào cùng khoá; nếu có thì chờ và dùng lại kết quả của nó."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(file_path)
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if leader:
+            try:
+                flight.result = fn()
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        _danh_dau_gop()
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return _ket_qua_cho_ben_cho(flight.result, flight.file_path, file_path)
+
+    # --- asyncio --- #
+    async def do_async(self, key: str, file_path: str, coro_fn):
+        """Bản async của `do`; `coro_fn()` trả về coroutine thực hiện lời gọi."""
+        import asyncio  # Đã được import sẵn khi có event loop đang chạy; không import khi chỉ dùng bản đồng bộ
+        flight_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            flight = self._async_flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = _AsyncFlight(file_path, asyncio.ensure_future(coro_fn()))
+                self._async_flights[flight_key] = flight
+                flight.task.add_done_callback(lambda _: self._ket_thuc_async(flight_key, flight))
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+            flight.waiters += 1
+
+        if not leader:
+            _danh_dau_gop()
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = flight.waiters == 0
+            if abandoned:
+                flight.task.cancel()  # Không còn ai chờ kết quả
+            raise
+        with self._lock:
+            flight.waiters -= 1
+        if leader:
+            return result
+        return await asyncio.to_thread(_ket_qua_cho_ben_cho, result, flight.file_path, file_path)
+
+    def _ket_thuc_async(self, flight_key, flight):
+        with self._lock:
+            if self._async_flights.get(flight_key) is flight:
+                del self._async_flights[flight_key]
+
+    def stats(self) -> dict:
+        """Số lời gọi thực sự gửi đi (leaders) và số lời gọi đã được gộp vào lời gọi khác (coalesced)."""
+        with self._lock:
+            return dict(self._stats)
+
+
+def _danh_dau_gop():
+    call = current_call()
+    if call is not None:
+        call.coalesced = True
+
+
+def _ket_qua_cho_ben_cho(result, leader_file_path: str, file_path: str):
+    """Bản sao kết quả của leader cho một bên chờ, copy file kết quả nếu bên chờ yêu cầu đường dẫn khác."""
+    result = copy.deepcopy(result)
+    artifact_path = result.get("file_path") if isinstance(result, dict) else None
+    if not artifact_path or not file_path or file_path == leader_file_path:
+        return result
+    target = duong_dan_dich(artifact_path, leader_file_path, file_path)
+    if os.path.abspath(target) != os.path.abspath(artifact_path):
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        shutil.copyfile(artifact_path, target)
+    doi_duong_dan_ket_qua(result, artifact_path, target)
+    return result
+
+
+# --- Bảng gộp mặc định dùng chung --- #
+_default_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _default_single_flight
+
+
+def set_single_flight(single_flight: SingleFlight):
+    global _default_single_flight
+    _default_single_flight = single_flight
+
+
+def single_flight(func):
+    """
+    Decorator gộp các lời gọi đồng thời giống hệt nhau của một hàm API. Đặt ngay dưới `@log_api_call`
+    (trên `@cache_response`), mỗi lời gọi vẫn có log riêng, lời gọi được gộp có thêm "coalesced": true.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            flights = get_single_flight()
+            if not flights.enabled:
+                return await func(*args, **kwargs)
+            key, file_path = tao_khoa_yeu_cau(func, args, kwargs)
+            return await flights.do_async(key, file_path, lambda: func(*args, **kwargs))
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        flights = get_single_flight()
+        if not flights.enabled:
+            return func(*args, **kwargs)
+        key, file_path = tao_khoa_yeu_cau(func, args, kwargs)
+        return flights.do(key, file_path, lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,299 @@
+"""
+Giải mã base64 từ phản hồi JSON theo luồng, ghi thẳng xuống file mà không giữ cả phản hồi trong bộ nhớ.
+
+Phản hồi sinh ảnh/giọng nói chứa dữ liệu base64 nhiều MB (`b64_json`, `image_url.url` dạng data URL,
+`inlineData.data`). Thay vì `response.json()` rồi `base64.b64decode` cả chuỗi (mỗi ảnh tồn tại 3-4 bản
+trong bộ nhớ), `StreamingBase64Extractor` đọc JSON theo từng khối:
+
+- chuỗi base64 đầu tiên khớp được giải mã dần từng khối 4 ký tự và ghi xuống file;
+- các chuỗi base64 khác (ví dụ ảnh thứ 2 khi n > 1) được bỏ qua, không lưu lại;
+- phần còn lại của JSON (rất nhỏ) được giữ lại và trả về dưới dạng dict, trong đó chuỗi base64 được thay
+  bằng dạng rút gọn "...<50 ký tự cuối> (truncated)" giống như trong log.
+
+Bộ nhớ cần dùng vì vậy chỉ phụ thuộc kích thước khối đọc, không phụ thuộc kích thước ảnh hay số ảnh.
+"""
+import binascii
+import json
+import os
+import re
+import time
+
+STREAM_CHUNK_SIZE = 64 * 1024
+TAIL_CHARS = 50
+# Số byte tối đa đọc trước để nhận ra tiền tố "data:<mime>;base64," của data URL
+MAX_DATA_URL_HEADER = 256
+
+KIND_BASE64 = "base64"
+KIND_DATA_URL = "data_url"
+
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_STRUCTURAL = re.compile(rb'["{}\[\],:]')
+_WHITESPACE = b" \t\r\n"
+
+
+def default_target(path: tuple) -> str:
+    """
+    Xác định chuỗi nào trong phản hồi là dữ liệu base64 cần giải mã theo luồng, dựa trên đường dẫn khoá:
+    `data[i].b64_json` (sinh_hinh_anh), `...image_url.url` (sinh_hinh_anh_voi_chat, có thể là data URL),
+    `...inlineData.data` (Gemini ảnh và giọng nói).
+    """
+    if path and path[-1] == "b64_json":
+        return KIND_BASE64
+    if path[-2:] == ("inlineData", "data"):
+        return KIND_BASE64
+    if path[-2:] == ("image_url", "url"):
+        return KIND_DATA_URL
+    return None
+
+
+class _Base64Sink:
+    """Nhận nội dung thô (còn escape JSON) của một chuỗi và giải mã base64 ra file nếu được cấp file."""
+
+    def __init__(self, kind: str, opener=None):
+        self.kind = kind
+        self.mime_type = None
+        self.size = 0
+        self.write_seconds = 0.0
+        self._opener = opener
+        self._file = None
+        self._pending = bytearray()
+        self._tail = bytearray()
+        self._header = bytearray() if kind == KIND_DATA_URL else None
+        self._literal = None
+
+    @property
+    def is_literal(self) -> bool:
+        return self._literal is not None
+
+    def write(self, raw: bytes):
+        if self._literal is not None:
+            self._literal += raw
+        elif self._header is not None:
+            self._doc_tien_to(raw)
+        else:
+            self._giai_ma(raw)
+
+    def _doc_tien_to(self, raw: bytes):
+        self._header += raw
+        idx = self._header.find(b";base64,")
+        if idx >= 0 and self._header.startswith(b"data:"):
+            header, rest = bytes(self._header[:idx]), bytes(self._header[idx + len(b";base64,"):])
+            self._header = None
+            self.mime_type = json.loads(b'"' + header[len(b"data:"):] + b'"')
+            self._giai_ma(rest)
+        elif (len(self._header) >= 5 and not self._header.startswith(b"data:")) or len(self._header) > MAX_DATA_URL_HEADER:
+            # Không phải data URL base64 (ví dụ URL http thường): giữ nguyên chuỗi
+            self._literal, self._header = self._header, None
+
+    def _giai_ma(self, raw: bytes):
+        # Base64 trong JSON chỉ có thể chứa các escape "\/", "\n", "\r" hoặc "\uXXXX"
+        if b"\\" in raw:
+            raw = re.sub(rb"\\u([0-9a-fA-F]{4})", lambda m: chr(int(m.group(1), 16)).encode(), raw)
+            raw = raw.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+        data = raw.translate(None, _WHITESPACE)
+        if not data:
+            return
+        self._tail = (self._tail + data)[-TAIL_CHARS:]
+        if self._opener is None:
+            return
+        self._pending += data
+        usable = len(self._pending) // 4 * 4
+        if usable:
+            self._ghi(binascii.a2b_base64(bytes(self._pending[:usable])))
+            del self._pending[:usable]
+
+    def _ghi(self, decoded: bytes):
+        start = time.perf_counter()
+        if self._file is None:
+            self._file = self._opener()
+        self._file.write(decoded)
+        self.write_seconds += time.perf_counter() - start
+        self.size += len(decoded)
+
+    def finish(self) -> bytes:
+        """Kết thúc chuỗi và trả về chuỗi JSON (kèm dấu nháy) sẽ thay thế chuỗi gốc trong phần còn lại của phản hồi."""
+        if self._header is not None:
+            self._literal, self._header = self._header, None
+        if self._literal is not None:
+            return b'"' + bytes(self._literal) + b'"'
+        if self._opener is not None and self._pending:
+            padded = bytes(self._pending) + b"=" * (-len(self._pending) % 4)
+            self._ghi(binascii.a2b_base64(padded))
+            self._pending.clear()
+        if self._file is not None:
+            self._file.close()
+        truncated = "..." + self._tail.decode("ascii", errors="replace") + " (truncated)"
+        if self.mime_type is not None:
+            truncated = f"data:{self.mime_type};base64,{truncated}"
+        return json.dumps(truncated).encode("utf-8")
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+
+class StreamingBase64Extractor:
+    """
+    Bộ phân tích JSON dạng đẩy (push parser): gọi `feed()` với từng khối byte của phản hồi, rồi `close()`.
+
+    Chuỗi base64 đầu tiên khớp `target` được giải mã vào `file_path`; thông tin về nó nằm trong `artifact`
+    sau khi close() ({"path": đường dẫn khoá, "mime_type": mime của data URL nếu có, "size": số byte}).
+    `decode_seconds` và `write_seconds` là thời gian phân tích/giải mã và thời gian ghi file đã dùng trong `feed()`.
+
+    Args:
+        file_path (str): File nhận dữ liệu đã giải mã (thường là file tạm, hàm gọi tự đổi tên sau đó).
+        target (callable): Hàm nhận đường dẫn khoá (tuple) và trả về KIND_BASE64, KIND_DATA_URL hoặc None.
+    """
+
+    def __init__(self, file_path: str, target=default_target):
+        self.file_path = file_path
+        self.target = target
+        self.artifact = None
+        self.decode_seconds = 0.0
+        self.write_seconds = 0.0
+        self._skeleton = bytearray()
+        self._stack = []  # Mỗi phần tử: [True, khoá hiện tại, đang chờ khoá] cho object, [False, chỉ số] cho array
+        self._carry = b""
+        self._role = None  # None: ngoài chuỗi; "key", "keep" hoặc "sink" khi đang trong chuỗi
+        self._key = bytearray()
+        self._sink = None
+        self._sink_path = None
+        self._file_claimed = False
+
+    # --- Đường dẫn khoá --- #
+    def _duong_dan(self) -> tuple:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _mo_file(self):
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        return open(self.file_path, "wb")
+
+    # --- Chuỗi --- #
+    def _bat_dau_chuoi(self):
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top[0] and top[2]:
+            self._role = "key"
+            self._key.clear()
+            self._skeleton += b'"'
+            return
+        kind = self.target(self._duong_dan()) if top is not None else None
+        if kind is None:
+            self._role = "keep"
+            self._skeleton += b'"'
+            return
+        self._role = "sink"
+        opener = None
+        if not self._file_claimed:
+            opener = self._mo_file
+        self._sink = _Base64Sink(kind, opener)
+        self._sink_path = self._duong_dan()
+
+    def _noi_dung_chuoi(self, raw: bytes):
+        if self._role == "sink":
+            self._sink.write(raw)
+            if not self._file_claimed and self._sink.size:
+                self._file_claimed = True
+            return
+        if self._role == "key":
+            self._key += raw
+        self._skeleton += raw
+
+    def _ket_thuc_chuoi(self):
+        if self._role == "key":
+            self._stack[-1][1] = json.loads(b'"' + bytes(self._key) + b'"')
+            self._skeleton += b'"'
+        elif self._role == "keep":
+            self._skeleton += b'"'
+        else:
+            self._skeleton += self._sink.finish()
+            self._cong_thoi_gian_ghi(self._sink)
+            if self._sink.size and self.artifact is None:
+                self._file_claimed = True
+                self.artifact = {"path": self._sink_path, "mime_type": self._sink.mime_type, "size": self._sink.size}
+            self._sink = None
+        self._role = None
+
+    # --- Cấu trúc --- #
+    def _ky_tu_cau_truc(self, char: int):
+        if char == ord('"'):
+            self._bat_dau_chuoi()
+            return
+        self._skeleton.append(char)
+        top = self._stack[-1] if self._stack else None
+        if char == ord("{"):
+            self._stack.append([True, None, True])
+        elif char == ord("["):
+            self._stack.append([False, 0])
+        elif char in (ord("}"), ord("]")):
+            if not self._stack:
+                raise ValueError("Phản hồi JSON không hợp lệ: dấu đóng thừa")
+            self._stack.pop()
+        elif char == ord(":") and top is not None and top[0]:
+            top[2] = False
+        elif char == ord(",") and top is not None:
+            if top[0]:
+                top[2] = True
+            else:
+                top[1] += 1
+
+    def _cong_thoi_gian_ghi(self, sink: _Base64Sink):
+        self.write_seconds += sink.write_seconds
+        self.decode_seconds -= sink.write_seconds
+        sink.write_seconds = 0.0
+
+    def feed(self, chunk: bytes):
+        start = time.perf_counter()
+        try:
+            self._phan_tich(chunk)
+        finally:
+            self.decode_seconds += time.perf_counter() - start
+            if self._sink is not None:
+                self._cong_thoi_gian_ghi(self._sink)
+
+    def _phan_tich(self, chunk: bytes):
+        data = self._carry + chunk if self._carry else chunk
+        self._carry = b""
+        pos, end = 0, len(data)
+        while pos < end:
+            if self._role is not None:
+                match = _STRING_SPECIAL.search(data, pos)
+                if match is None:
+                    self._noi_dung_chuoi(data[pos:])
+                    return
+                i = match.start()
+                if i > pos:
+                    self._noi_dung_chuoi(data[pos:i])
+                if data[i] == ord('"'):
+                    self._ket_thuc_chuoi()
+                    pos = i + 1
+                    continue
+                # Escape: giữ nguyên cả cụm, nếu cụm bị cắt ở cuối khối thì chờ khối sau
+                escape_len = 6 if i + 1 < end and data[i + 1] == ord("u") else 2
+                if i + escape_len > end:
+                    self._carry = data[i:]
+                    return
+                self._noi_dung_chuoi(data[i:i + escape_len])
+                pos = i + escape_len
+            else:
+                match = _STRUCTURAL.search(data, pos)
+                if match is None:
+                    self._skeleton += data[pos:]
+                    return
+                i = match.start()
+                self._skeleton += data[pos:i]
+                self._ky_tu_cau_truc(data[i])
+                pos = i + 1
+
+    def close(self) -> dict:
+        """Kết thúc phân tích và trả về phản hồi JSON (dict) với các chuỗi base64 đã được rút gọn."""
+        if self._carry or self._role is not None or self._stack:
+            self.abort()
+            raise ValueError("Phản hồi JSON không đầy đủ")
+        return json.loads(bytes(self._skeleton))
+
+    def abort(self):
+        """Đóng và xoá file đang ghi dở (gọi khi có lỗi)."""
+        if self._sink is not None:
+            self._sink.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
@@ -0,0 +1,187 @@
+"""
+Gửi file lớn (âm thanh, ảnh) trong body JSON mà không đọc cả file vào bộ nhớ.
+
+Trước đây `chuyen_am_thanh_thanh_van_ban`, `tao_video` (ảnh đầu vào) và `sinh_sua_hinh_anh_voi_google_gemini`
+(`inline_data`) đọc cả file, base64 thành `str` rồi `json=payload`: mỗi đầu vào tồn tại dưới dạng bytes gốc,
+chuỗi base64 (x1,33) và body JSON đã mã hoá (x1,33), tức khoảng 2,7 lần kích thước file.
+
+Với `FileInput` đặt vào payload ở chỗ chuỗi base64, `StreamingJsonBody` sinh body theo luồng:
+
+- payload (trừ các FileInput) được `json.dumps` một lần, tách thành các đoạn JSON nhỏ quanh từng file;
+- nội dung file được đọc theo khối (bội số của 3 byte) vào một bộ đệm dùng lại và base64 từng khối
+  thẳng vào socket, nên bộ nhớ chỉ phụ thuộc kích thước khối;
+- độ dài body được tính trước từ kích thước file (gửi `Content-Length`, không cần chunked encoding);
+- body tua lại được (`seek(0)`) để http_client thử lại request.
+
+Ví dụ:
+    contents = [{"parts": [{"text": "Remove background"},
+                           {"inline_data": {"mime_type": "image/png", "data": FileInput("input.png")}}]}]
+    sinh_sua_hinh_anh_voi_google_gemini(contents, "outputs/edited.png")
+"""
+import base64
+import io
+import json
+import mimetypes
+import os
+from typing import NamedTuple
+
+# 48 KiB dữ liệu gốc -> 64 KiB base64 mỗi lần ghi xuống socket
+READ_CHUNK_SIZE = 3 * 16 * 1024
+
+
+class FileInput(NamedTuple):
+    """
+    Đánh dấu một chuỗi base64 trong payload sẽ được đọc từ file khi gửi.
+
+    Args:
+        path (str): Đường dẫn file.
+        mime_type (str): Kiểu MIME; mặc định đoán theo phần mở rộng (chỉ dùng cho data URL).
+        data_url (bool): True để gửi dạng "data:<mime>;base64,<...>" (ví dụ `audio_url.url`).
+    """
+    path: str
+    mime_type: str = None
+    data_url: bool = False
+
+    def prefix(self) -> bytes:
+        if not self.data_url:
+            return b""
+        mime_type = self.mime_type or mimetypes.guess_type(self.path)[0] or "application/octet-stream"
+        return f"data:{mime_type};base64,".encode("ascii")
+
+
+def _do_dai_base64(size: int) -> int:
+    return (size + 2) // 3 * 4
+
+
+def chua_file_input(value) -> bool:
+    """True nếu `value` (dict/list lồng nhau) có chứa FileInput."""
+    if isinstance(value, FileInput):
+        return True
+    if isinstance(value, dict):
+        return any(chua_file_input(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(chua_file_input(item) for item in value)
+    return False
+
+
+def _thay_file_input(value, files: list, token: str):
+    # Thay mỗi FileInput bằng chuỗi giữ chỗ "<token>:<i>" để json.dumps phần còn lại của payload
+    if isinstance(value, FileInput):
+        files.append(value)
+        return f"{token}:{len(files) - 1}"
+    if isinstance(value, dict):
+        return {key: _thay_file_input(item, files, token) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thay_file_input(item, files, token) for item in value]
+    return value
+
+
+class StreamingJsonBody(io.RawIOBase):
+    """
+    Body JSON dạng file (read/readinto/__len__/seek(0)) dùng làm `data=` cho requests và aiohttp.
+
+    Args:
+        payload (dict): Payload JSON, trong đó các chuỗi base64 được thay bằng FileInput.
+        chunk_size (int): Số byte file đọc mỗi lần (làm tròn xuống bội số của 3).
+
+    Raises:
+        FileNotFoundError: Khi một FileInput trỏ tới file không tồn tại (kiểm tra ngay khi tạo body).
+    """
+
+    def __init__(self, payload: dict, chunk_size: int = READ_CHUNK_SIZE):
+        super().__init__()
+        files = []
+        token = f"__file_input_{os.urandom(8).hex()}"
+        text = json.dumps(_thay_file_input(payload, files, token), ensure_ascii=False).encode("utf-8")
+
+        # Xen kẽ các đoạn JSON (bytes) và (FileInput, kích thước file)
+        self._parts = []
+        for i, file_input in enumerate(files):
+            before, text = text.split(f'"{token}:{i}"'.encode(), 1)
+            size = os.path.getsize(file_input.path)
+            self._parts += [before + b'"' + file_input.prefix(), (file_input, size), b'"']
+        self._parts.append(text)
+        self._length = sum(len(part) if isinstance(part, bytes) else _do_dai_base64(part[1]) for part in self._parts)
+
+        self._buffer = bytearray(max(3, chunk_size - chunk_size % 3))
+        self._position = 0
+        self._pending = memoryview(b"")
+        self._chunks = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Chỉ hỗ trợ tua lại từ đầu (`seek(0)`), đủ cho việc gửi lại request khi thử lại."""
+        if (offset, whence) != (0, io.SEEK_SET):
+            raise io.UnsupportedOperation("StreamingJsonBody chỉ hỗ trợ seek(0)")
+        self._dung_doc()
+        self._pending = memoryview(b"")
+        self._position = 0
+        return 0
+
+    def readinto(self, b) -> int:
+        if self._chunks is None:
+            self._chunks = self._sinh_cac_khoi()
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self._position += n
+        return n
+
+    def _sinh_cac_khoi(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            file_input, size = part
+            sent = 0
+            view = memoryview(self._buffer)
+            with open(file_input.path, "rb") as f:
+                while True:
+                    n = f.readinto(self._buffer)
+                    if not n:
+                        break
+                    sent += n
+                    yield base64.b64encode(view[:n])
+            if sent != size:
+                # Content-Length đã gửi theo kích thước cũ: gửi tiếp sẽ làm hỏng request
+                raise IOError(f"File {file_input.path} đổi kích thước trong lúc gửi ({size} -> {sent} byte)")
+
+    def _dung_doc(self):
+        # Đóng generator đang đọc dở (và file nó đang mở)
+        if self._chunks is not None:
+            self._chunks.close()
+            self._chunks = None
+
+    def close(self):
+        self._dung_doc()
+        super().close()
+
+
+def json_body(payload: dict, headers: dict) -> dict:
+    """
+    Tham số body cho `client.post(url, **json_body(payload, headers))`: payload không có FileInput được gửi
+    bằng `json=` như cũ; ngược lại là `data=StreamingJsonBody` kèm Content-Length.
+
+    Raises:
+        FileNotFoundError: Khi một FileInput trỏ tới file không tồn tại.
+    """
+    if not chua_file_input(payload):
+        return {"headers": headers, "json": payload}
+    body = StreamingJsonBody(payload)
+    return {"headers": {**headers, "Content-Length": str(len(body))}, "data": body}
@@ -0,0 +1,305 @@
+"""
+Chuyển âm thanh dài thành văn bản theo từng đoạn: cắt tại khoảng lặng, gửi các đoạn song song, ghép kết quả.
+
+`chuyen_am_thanh_thanh_van_ban` đọc cả file, base64 rồi gửi trong một request: bản ghi dài (cả bài hát, cả
+soundtrack của video) tạo ra request rất lớn và một lời gọi rất lâu. Ở đây:
+
+- file được giải mã một lần bằng ffmpeg thành PCM mono 16 kHz (ghi ra file tạm, đọc theo khối), đồng thời tính
+  mức âm lượng (dBFS) của từng khung 30 ms; chỉ mảng mức âm lượng nằm trong bộ nhớ;
+- điểm cắt được chọn tại khoảng lặng dài nhất trong cửa sổ [min_chunk_seconds, max_chunk_seconds] tính từ đầu
+  đoạn; không có khoảng lặng thì cắt tại khung nhỏ tiếng nhất, nên không đoạn nào dài quá max_chunk_seconds;
+- mỗi đoạn được mã hoá lại (mặc định MP3 64 kbps, nhỏ hơn nhiều so với file gốc) và chuyển thành văn bản song song;
+- prompt mặc định yêu cầu mô hình đánh dấu thời gian "[MM:SS]" cho từng câu, tính từ đầu đoạn; các mốc này
+  được cộng thêm thời điểm bắt đầu của đoạn để thành mốc tuyệt đối trong file gốc;
+- `iter_transcribe_chunks` trả về kết quả từng đoạn ngay khi đoạn đó xong (không theo thứ tự);
+  `transcribe_long_audio` gom lại theo thứ tự thời gian.
+
+    for partial in iter_transcribe_chunks("draft/Verse 1_.mp3"):
+        print(partial["index"], partial.get("text"))
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+import numpy as np
+
+from src.audio_processing.pcm_encoder import FORMAT_MP3, PcmFormat, encode_pcm, ffmpeg_exe
+
+ANALYSIS_FORMAT = PcmFormat(16000, 1, 2)
+FRAME_SECONDS = 0.03
+DEFAULT_MAX_CHUNK_SECONDS = 60.0
+DEFAULT_MIN_CHUNK_SECONDS = 20.0
+DEFAULT_SILENCE_DB = -40.0
+DEFAULT_MIN_SILENCE_SECONDS = 0.3
+DEFAULT_CHUNK_BITRATE = "64k"
+DEFAULT_PROMPT = (
+    "Please transcribe the following audio verbatim. Put each sentence on its own line, prefixed with its "
+    "start time as [MM:SS] measured from the beginning of this audio clip."
+)
+
+_TIMESTAMP = re.compile(r"^\s*\[(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:[.,](\d{1,3}))?\]\s*[-–:]?\s*(.*)$")
+
+
+class AudioChunk(NamedTuple):
+    """Một đoạn của file âm thanh gốc: thứ tự, thời điểm bắt đầu/kết thúc (giây) trong file gốc."""
+    index: int
+    start: float
+    end: float
+
+
+# --- Giải mã và phân tích âm lượng --- #
+def decode_to_pcm(audio_path: str, pcm_path: str, pcm_format: PcmFormat = ANALYSIS_FORMAT,
+                  frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+    """
+    Giải mã `audio_path` (mọi định dạng ffmpeg đọc được) thành PCM thô ở `pcm_path`, đọc theo khối.
+
+    Returns:
+        np.ndarray: Mức âm lượng (dBFS, RMS) của từng khung `frame_seconds`.
+    """
+    frame_bytes = int(pcm_format.sample_rate * frame_seconds) * pcm_format.channels * pcm_format.sample_width
+    block_bytes = frame_bytes * 256
+    levels = []
+    process = subprocess.Popen(
+        [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", audio_path, "-vn",
+         "-f", "s16le", "-ac", str(pcm_format.channels), "-ar", str(pcm_format.sample_rate), "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        with open(pcm_path, "wb") as pcm_file:
+            pending = b""
+            while True:
+                block = process.stdout.read(block_bytes)
+                if not block:
+                    break
+                pcm_file.write(block)
+                pending += block
+                usable = len(pending) - len(pending) % frame_bytes
+                if usable:
+                    levels.append(_muc_am_luong(pending[:usable], frame_bytes))
+                    pending = pending[usable:]
+            if pending:
+                levels.append(_muc_am_luong(pending + b"\0" * (frame_bytes - len(pending)), frame_bytes))
+        stderr = process.stderr.read()
+    finally:
+        process.stdout.close()
+        process.wait()
+        process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg lỗi (mã {process.returncode}): {stderr.decode(errors='replace').strip()}")
+    return np.concatenate(levels) if levels else np.zeros(0, np.float32)
+
+
+def _muc_am_luong(data: bytes, frame_bytes: int) -> np.ndarray:
+    samples = np.frombuffer(data, dtype="<i2").astype(np.float32).reshape(-1, frame_bytes // 2) / 32768.0
+    rms = np.sqrt(np.mean(samples * samples, axis=1))
+    return (20 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32)
+
+
+def plan_chunks(levels: np.ndarray, frame_seconds: float = FRAME_SECONDS,
+                max_chunk_seconds: float = DEFAULT_MAX_CHUNK_SECONDS,
+                min_chunk_seconds: float = DEFAULT_MIN_CHUNK_SECONDS,
+                silence_db: float = DEFAULT_SILENCE_DB,
+                min_silence_seconds: float = DEFAULT_MIN_SILENCE_SECONDS) -> list:
+    """
+    Chọn điểm cắt từ mức âm lượng từng khung.
+
+    Args:
+        levels (np.ndarray): dBFS của từng khung (xem decode_to_pcm).
+        frame_seconds (float): Độ dài mỗi khung.
+        max_chunk_seconds (float): Độ dài tối đa một đoạn.
+        min_chunk_seconds (float): Không cắt trước mốc này tính từ đầu đoạn (trừ đoạn cuối).
+        silence_db (float): Khung có mức âm lượng dưới ngưỡng này được coi là lặng.
+        min_silence_seconds (float): Khoảng lặng ngắn hơn không được dùng làm điểm cắt (trừ khi buộc phải cắt).
+
+    Returns:
+        list[AudioChunk]: Các đoạn liên tiếp phủ toàn bộ file.
+    """
+    total = len(levels)
+    max_frames = max(1, int(max_chunk_seconds / frame_seconds))
+    min_frames = min(max_frames, int(min_chunk_seconds / frame_seconds))
+    min_silence = max(1, int(min_silence_seconds / frame_seconds))
+    silent = levels < silence_db
+
+    cuts, start = [], 0
+    while total - start > max_frames:
+        window = slice(start + min_frames, start + max_frames + 1)
+        cut = _giua_khoang_lang_dai_nhat(silent[window], min_silence)
+        if cut is None:
+            cut = int(np.argmin(levels[window]))  # Không có khoảng lặng: cắt tại khung nhỏ tiếng nhất
+        cut += window.start
+        cuts.append(cut)
+        start = cut
+    bounds = [0] + cuts + [total]
+    return [AudioChunk(i, bounds[i] * frame_seconds, bounds[i + 1] * frame_seconds)
+            for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def _giua_khoang_lang_dai_nhat(silent: np.ndarray, min_length: int):
+    """Vị trí giữa của chuỗi khung lặng dài nhất (ít nhất `min_length` khung), ưu tiên chuỗi muộn hơn khi bằng nhau."""
+    padded = np.concatenate([[False], silent, [False]]).astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    best = None
+    for run_start, run_end in zip(changes[::2], changes[1::2]):
+        length = run_end - run_start
+        if length >= min_length and (best is None or length >= best[1] - best[0]):
+            best = (run_start, run_end)
+    return None if best is None else int((best[0] + best[1]) // 2)
+
+
+# --- Chuyển từng đoạn thành văn bản --- #
+def _ma_hoa_doan(pcm_path: str, chunk: AudioChunk, file_path: str, pcm_format: PcmFormat, bitrate: str):
+    bytes_per_frame = pcm_format.channels * pcm_format.sample_width
+    begin = int(round(chunk.start * pcm_format.sample_rate)) * bytes_per_frame
+    end = int(round(chunk.end * pcm_format.sample_rate)) * bytes_per_frame
+
+    def chunks():
+        with open(pcm_path, "rb") as f:
+            f.seek(begin)
+            remaining = end - begin
+            while remaining > 0:
+                block = f.read(min(remaining, 256 * 1024))
+                if not block:
+                    return
+                remaining -= len(block)
+                yield block
+
+    encode_pcm(chunks(), file_path, pcm_format, bitrate=bitrate)
+
+
+def _lay_noi_dung(response: dict) -> str:
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    content = response["choices"][0]["message"]["content"]
+    if isinstance(content, list):  # Một số mô hình trả về danh sách part
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content.strip()
+
+
+def parse_timestamped_text(text: str, chunk: AudioChunk) -> list:
+    """
+    Tách văn bản có mốc "[MM:SS]" / "[HH:MM:SS]" (tính từ đầu đoạn) thành các segment có mốc tuyệt đối.
+    Dòng không có mốc được nối vào segment trước đó; nếu không có mốc nào, cả đoạn là một segment.
+    """
+    segments = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = _TIMESTAMP.match(line)
+        if match:
+            hours, minutes, seconds, fraction, content = match.groups()
+            offset = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + float(f"0.{fraction or 0}")
+            start = min(chunk.start + offset, chunk.end)
+            segments.append({"start": start, "end": None, "text": content.strip(), "chunk": chunk.index})
+        elif segments:
+            segments[-1]["text"] = f"{segments[-1]['text']} {line.strip()}".strip()
+        else:
+            segments.append({"start": chunk.start, "end": None, "text": line.strip(), "chunk": chunk.index})
+    for current, following in zip(segments, segments[1:]):
+        current["end"] = following["start"]
+    if segments:
+        segments[-1]["end"] = chunk.end
+    return segments
+
+
+def iter_transcribe_chunks(audio_path: str, prompt: str = DEFAULT_PROMPT, model: str = "gemini-2.5-flash",
+                           max_workers: int = 4, max_chunk_seconds: float = DEFAULT_MAX_CHUNK_SECONDS,
+                           min_chunk_seconds: float = DEFAULT_MIN_CHUNK_SECONDS, silence_db: float = DEFAULT_SILENCE_DB,
+                           min_silence_seconds: float = DEFAULT_MIN_SILENCE_SECONDS, chunk_bitrate: str = DEFAULT_CHUNK_BITRATE,
+                           transcribe=None, **kwargs):
+    """
+    Cắt `audio_path` tại khoảng lặng và chuyển các đoạn thành văn bản song song; yield kết quả từng đoạn
+    ngay khi đoạn đó xong (thứ tự hoàn thành, không phải thứ tự thời gian).
+
+    Args:
+        audio_path (str): File âm thanh (hoặc video) cần chuyển thành văn bản.
+        prompt (str): Prompt cho mỗi đoạn (mặc định yêu cầu mốc thời gian [MM:SS] cho từng câu).
+        model (str): Mô hình dùng cho chuyen_am_thanh_thanh_van_ban.
+        max_workers (int): Số đoạn được gửi đồng thời.
+        max_chunk_seconds, min_chunk_seconds, silence_db, min_silence_seconds: Xem plan_chunks.
+        chunk_bitrate (str): Bitrate MP3 của mỗi đoạn gửi lên API.
+        transcribe (callable): Hàm (audio_file_path, prompt, model, **kwargs) -> phản hồi chat completion;
+                               mặc định btc_api_client.chuyen_am_thanh_thanh_van_ban.
+        **kwargs: Tham số bổ sung truyền vào payload của mỗi lời gọi.
+
+    Yields:
+        dict: {"index", "start", "end", "total_chunks", "text", "segments", "latency_seconds"}
+              hoặc {"index", "start", "end", "total_chunks", "error"} nếu đoạn đó lỗi.
+    """
+    if transcribe is None:
+        from src.api_services.btc_api_client import chuyen_am_thanh_thanh_van_ban as transcribe
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"File not found at {audio_path}")
+
+    work_dir = tempfile.mkdtemp(prefix="transcribe_")
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        pcm_path = os.path.join(work_dir, "audio.pcm")
+        levels = decode_to_pcm(audio_path, pcm_path)
+        chunks = plan_chunks(levels, FRAME_SECONDS, max_chunk_seconds, min_chunk_seconds, silence_db, min_silence_seconds)
+
+        def run_chunk(chunk: AudioChunk) -> dict:
+            result = {"index": chunk.index, "start": chunk.start, "end": chunk.end, "total_chunks": len(chunks)}
+            start = time.perf_counter()
+            chunk_path = os.path.join(work_dir, f"chunk_{chunk.index:04d}.{FORMAT_MP3}")
+            try:
+                _ma_hoa_doan(pcm_path, chunk, chunk_path, ANALYSIS_FORMAT, chunk_bitrate)
+                text = _lay_noi_dung(transcribe(audio_file_path=chunk_path, prompt=prompt, model=model, **kwargs))
+                result.update(text=text, segments=parse_timestamped_text(text, chunk))
+            except Exception as e:
+                result["error"] = str(e)
+            finally:
+                if os.path.exists(chunk_path):
+                    os.remove(chunk_path)
+            result["latency_seconds"] = time.perf_counter() - start
+            return result
+
+        futures = [executor.submit(run_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Người dùng dừng vòng lặp giữa chừng: huỷ các đoạn chưa chạy
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def transcribe_long_audio(audio_path: str, on_partial=None, **kwargs) -> dict:
+    """
+    Chuyển file âm thanh dài thành văn bản theo đoạn (xem iter_transcribe_chunks) và ghép theo thứ tự thời gian.
+
+    Args:
+        audio_path (str): File âm thanh cần chuyển thành văn bản.
+        on_partial (callable): Được gọi với kết quả từng đoạn ngay khi đoạn đó xong.
+        **kwargs: Tham số cho iter_transcribe_chunks.
+
+    Returns:
+        dict: {"success": bool, "text": toàn bộ văn bản, "segments": [{"start", "end", "text", "chunk"}],
+               "chunks": kết quả từng đoạn theo thứ tự, "failed_chunks": [...], "total_seconds"}.
+    """
+    start = time.perf_counter()
+    results = []
+    for partial in iter_transcribe_chunks(audio_path, **kwargs):
+        results.append(partial)
+        if on_partial is not None:
+            on_partial(partial)
+    results.sort(key=lambda result: result["index"])
+
+    failed = [result for result in results if "error" in result]
+    succeeded = [result for result in results if "error" not in result]
+    total_seconds = time.perf_counter() - start
+    print(f"Chuyển âm thanh dài thành văn bản: {len(results)} đoạn ({len(failed)} lỗi) trong {total_seconds:.1f}s.")
+    report = {
+        "success": not failed,
+        "text": "\n".join(result["text"] for result in succeeded if result["text"]),
+        "segments": [segment for result in succeeded for segment in result["segments"]],
+        "chunks": results,
+        "failed_chunks": failed,
+        "total_seconds": total_seconds,
+    }
+    if failed:
+        report["error"] = f"{len(failed)}/{len(results)} đoạn không chuyển được thành văn bản"
+    return report
@@ -0,0 +1,402 @@
+"""
+Đọc văn bản dài thành một file âm thanh: chia văn bản theo câu, tổng hợp các đoạn song song, rồi ghép liền mạch.
+
+Gửi cả bài (ví dụ lời dẫn 80 giây của bản tin trong prompt_garden/example_sx_video_ban_tin_truyen_hinh.txt) trong
+một request TTS vừa chậm vừa dễ hỏng: một lỗi mạng là phải đọc lại từ đầu. Pipeline này:
+
+- chia văn bản tại ranh giới câu (không cắt ở "2/9/2025", "TP. Hồ Chí Minh", số thập phân...) thành các đoạn
+  không quá `max_chars` ký tự; đoạn văn (dòng trống) luôn là ranh giới đoạn;
+- tổng hợp các đoạn song song trên ThreadPoolExecutor (mỗi đoạn là một lời gọi API, đi qua rate limiter
+  và retry của http_client như mọi lời gọi khác);
+- lưu mỗi đoạn đã tổng hợp vào `cache_dir` dưới dạng WAV, khoá theo (backend, giọng, định dạng, nội dung đoạn):
+  sửa một câu rồi chạy lại chỉ tổng hợp lại (các) đoạn quanh câu đó;
+- ghép các đoạn theo thứ tự ngay khi đoạn kế tiếp có kết quả: cắt khoảng lặng ở hai đầu mỗi đoạn, rồi chèn
+  khoảng nghỉ `pause_ms` (có fade ngắn để không bị "click") hoặc crossfade `crossfade_ms`, và đẩy thẳng PCM
+  vào bộ mã hoá của pcm_encoder (WAV/MP3/Opus theo đuôi file). Chỉ một đoạn nằm trong bộ nhớ tại một thời điểm.
+
+Ranh giới đoạn được chọn theo nội dung: ngoài giới hạn độ dài, đoạn luôn kết thúc sau những câu có hash rơi vào
+1/BOUNDARY_EVERY giá trị. Nhờ vậy sửa một câu chỉ có thể làm xô lệch cách chia giữa hai điểm cắt bao quanh nó,
+không ảnh hưởng tới cách chia (và khoá cache) của các đoạn phía sau.
+
+    tts = LongTextTts(google_tts_backend(voice_name="Kore"), cache_dir="outputs/tts_cache")
+    report = tts.synthesize(script_text, "outputs/ban_tin/loi_dan.mp3")
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from src.audio_processing.pcm_encoder import PcmFormat, ffmpeg_exe, open_encoder
+
+DEFAULT_MAX_CHARS = 600
+DEFAULT_CACHE_DIR = "outputs/tts_cache"
+BOUNDARY_EVERY = 4
+SILENCE_THRESHOLD = 0.01  # Tỉ lệ so với biên độ tối đa; mẫu nhỏ hơn được coi là lặng
+SILENCE_MARGIN_MS = 20  # Giữ lại một chút khoảng lặng quanh giọng nói khi cắt
+EDGE_FADE_MS = 5
+
+# Từ viết tắt kết thúc bằng dấu chấm không phải là cuối câu
+ABBREVIATIONS = {"tp", "tt", "ts", "ths", "pgs", "gs", "bs", "ks", "q", "p", "st", "mr", "mrs", "dr", "v.v", "vs", "no"}
+_SENTENCE_END = re.compile(r'[.!?…]+["”’)\]]*(?=\s)')
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_CLAUSE_END = re.compile(r"[,;:](?=\s)")
+
+
+# --- Chia văn bản --- #
+def _la_cuoi_cau(text: str, end: int) -> bool:
+    """Dấu câu kết thúc ở `end` có phải cuối câu không (bỏ qua từ viết tắt và chữ thường ngay sau dấu chấm)."""
+    if text[end - 1] == "." and text[end - 2:end] != "..":
+        word = re.search(r"([\w.]+)\.$", text[:end])
+        if word and word.group(1).lower() in ABBREVIATIONS:
+            return False
+    following = text[end:].lstrip()
+    return not following or not following[0].islower()
+
+
+def _tach_cau(paragraph: str) -> list:
+    sentences = []
+    for line in paragraph.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        start = 0
+        for match in _SENTENCE_END.finditer(line):
+            if _la_cuoi_cau(line, match.end()):
+                sentences.append(line[start:match.end()].strip())
+                start = match.end()
+        if line[start:].strip():
+            sentences.append(line[start:].strip())
+    return sentences
+
+
+def _cat_cau_dai(sentence: str, max_chars: int) -> list:
+    """
+    Câu dài hơn `max_chars` được cắt tại dấu phẩy/chấm phẩy, nếu vẫn dài thì tại khoảng trắng; một từ dài hơn
+    `max_chars` (URL, chuỗi không dấu cách) bị cắt cứng thành các khúc `max_chars` ký tự.
+    """
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces, start = [], 0
+    for match in _CLAUSE_END.finditer(sentence):
+        pieces.append(sentence[start:match.end()].strip())
+        start = match.end()
+    pieces.append(sentence[start:].strip())
+
+    parts, current = [], ""
+    for piece in pieces:
+        words = piece.split() if len(piece) > max_chars else [piece]
+        words = [word[i:i + max_chars] for word in words for i in range(0, len(word), max_chars)]
+        for word in words:
+            candidate = f"{current} {word}".strip()
+            if current and len(candidate) > max_chars:
+                parts.append(current)
+                candidate = word
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _la_diem_cat(sentence: str) -> bool:
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=2).digest()[0] % BOUNDARY_EVERY == 0
+
+
+def split_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> list:
+    """
+    Chia văn bản thành các đoạn để tổng hợp giọng nói, mỗi đoạn gồm các câu liên tiếp và không quá `max_chars` ký tự.
+
+    Args:
+        text (str): Văn bản cần đọc.
+        max_chars (int): Số ký tự tối đa mỗi đoạn.
+
+    Returns:
+        list[str]: Các đoạn theo thứ tự, không đoạn nào dài quá `max_chars`; nối lại bằng khoảng trắng cho ra toàn bộ
+                   nội dung văn bản (từ dài hơn `max_chars` bị cắt cứng nên có thêm khoảng trắng ở chỗ cắt).
+    """
+    chunks = []
+    for paragraph in _PARAGRAPH.split(text):
+        current = []
+        for sentence in _tach_cau(paragraph):
+            for piece in _cat_cau_dai(sentence, max_chars):
+                if current and len(" ".join(current + [piece])) > max_chars:
+                    chunks.append(" ".join(current))
+                    current = []
+                current.append(piece)
+                if _la_diem_cat(piece):
+                    chunks.append(" ".join(current))
+                    current = []
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+# --- Backend TTS --- #
+class TtsBackend(NamedTuple):
+    """
+    Cách tổng hợp một đoạn: `synthesize(text, file_path)` ghi âm thanh vào `file_path` (đuôi `extension`),
+    trả về đường dẫn file thực sự được ghi và nâng exception nếu lỗi. `identity` mô tả mô hình/giọng/cấu hình, dùng làm một phần khoá cache.
+    """
+    identity: str
+    synthesize: object
+    extension: str = ".wav"
+
+
+def _kiem_tra_ket_qua(result: dict) -> str:
+    if not result.get("success"):
+        raise RuntimeError(f"{result.get('error', 'Lỗi không xác định')}: {result.get('details', '')}".rstrip(": "))
+    return result["file_path"]
+
+
+def google_tts_backend(model: str = "gemini-2.5-flash-preview-tts", voice_name: str = "Kore",
+                       style_instruction: str = None, generation_config: dict = None) -> TtsBackend:
+    """
+    Backend dùng `chuyen_van_ban_thanh_giong_noi_voi_google` (PCM được ghi thẳng thành WAV, không nén lại).
+
+    Args:
+        model (str): Mô hình TTS của Gemini.
+        voice_name (str): Giọng dựng sẵn (bỏ qua nếu truyền generation_config).
+        style_instruction (str): Chỉ dẫn giọng đọc đặt trước mỗi đoạn, ví dụ "Đọc như phát thanh viên bản tin:".
+                                 Nên dùng cùng một chỉ dẫn cho mọi đoạn để giọng đọc đồng nhất.
+        generation_config (dict): Cấu hình sinh đầy đủ (ví dụ nhiều người nói).
+    """
+    config = generation_config or {
+        "responseModalities": ["AUDIO"],
+        "speechConfig": {"voiceConfig": {"prebuiltVoiceConfig": {"voiceName": voice_name}}},
+    }
+
+    def synthesize(text: str, file_path: str) -> str:
+        from src.api_services.btc_api_client import chuyen_van_ban_thanh_giong_noi_voi_google
+        prompt = f"{style_instruction} {text}" if style_instruction else text
+        return _kiem_tra_ket_qua(chuyen_van_ban_thanh_giong_noi_voi_google(
+            model=model, contents=[{"parts": [{"text": prompt}]}], file_path=file_path, generation_config=config))
+
+    identity = json.dumps(["google", model, style_instruction, config], sort_keys=True, ensure_ascii=False)
+    return TtsBackend(identity, synthesize, ".wav")
+
+
+def openai_tts_backend(model: str = "gemini-2.5-flash-preview-tts", voice: str = "Zephyr", **kwargs) -> TtsBackend:
+    """Backend dùng `chuyen_van_ban_thanh_giong_noi` (endpoint /audio/speech); `kwargs` được truyền vào payload."""
+
+    def synthesize(text: str, file_path: str) -> str:
+        from src.api_services.btc_api_client import chuyen_van_ban_thanh_giong_noi
+        return _kiem_tra_ket_qua(chuyen_van_ban_thanh_giong_noi(
+            model=model, input_text=text, voice=voice, file_path=file_path, **kwargs))
+
+    identity = json.dumps(["openai", model, voice, kwargs], sort_keys=True, ensure_ascii=False)
+    return TtsBackend(identity, synthesize, ".mp3")
+
+
+# --- Đọc/chuẩn hoá âm thanh của từng đoạn --- #
+def _chuan_hoa_wav(source: str, target: str, pcm_format: PcmFormat):
+    """Đưa file âm thanh của một đoạn về WAV PCM đúng `pcm_format` (đổi tên nếu đã đúng, nếu không thì dùng ffmpeg)."""
+    try:
+        with wave.open(source, "rb") as wav:
+            matches = (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == tuple(pcm_format)
+    except (wave.Error, EOFError):
+        matches = False
+    if matches:
+        os.replace(source, target)
+        return
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp.wav"
+    try:
+        completed = subprocess.run(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", "-i", source, "-c:a", "pcm_s16le",
+             "-ar", str(pcm_format.sample_rate), "-ac", str(pcm_format.channels), tmp_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"ffmpeg lỗi (mã {completed.returncode}): {completed.stderr.decode(errors='replace').strip()}")
+        os.replace(tmp_path, target)
+    finally:
+        for path in (tmp_path, source):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _doc_wav(path: str, channels: int) -> np.ndarray:
+    with wave.open(path, "rb") as wav:
+        frames = wav.readframes(wav.getnframes())
+    return np.frombuffer(frames, dtype="<i2").reshape(-1, channels).astype(np.float32)
+
+
+def _cat_khoang_lang(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    loud = np.flatnonzero(np.abs(samples).max(axis=1) > SILENCE_THRESHOLD * 32767)
+    if loud.size == 0:
+        return samples[:0]
+    margin = int(sample_rate * SILENCE_MARGIN_MS / 1000)
+    return samples[max(0, loud[0] - margin):loud[-1] + 1 + margin]
+
+
+def _fade(samples: np.ndarray, length: int) -> np.ndarray:
+    length = min(length, len(samples) // 2)
+    if length:
+        ramp = np.linspace(0.0, 1.0, length, dtype=np.float32)[:, None]
+        samples = samples.copy()
+        samples[:length] *= ramp
+        samples[-length:] *= ramp[::-1]
+    return samples
+
+
+class _BoGhep:
+    """Ghép các đoạn theo thứ tự và đẩy PCM vào bộ mã hoá; chỉ giữ lại phần đuôi cần cho crossfade."""
+
+    def __init__(self, encoder, pcm_format: PcmFormat, pause_ms: float, crossfade_ms: float, trim_silence: bool):
+        self.encoder = encoder
+        self.pcm_format = pcm_format
+        self.trim_silence = trim_silence
+        self.pause = np.zeros((int(pcm_format.sample_rate * pause_ms / 1000), pcm_format.channels), np.float32)
+        self.crossfade = int(pcm_format.sample_rate * crossfade_ms / 1000)
+        self.edge_fade = int(pcm_format.sample_rate * EDGE_FADE_MS / 1000)
+        self._tail = None
+
+    def _ghi(self, samples: np.ndarray):
+        if len(samples):
+            self.encoder.write(np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes())
+
+    def them(self, path: str):
+        samples = _doc_wav(path, self.pcm_format.channels)
+        if self.trim_silence:
+            samples = _cat_khoang_lang(samples, self.pcm_format.sample_rate)
+        if not len(samples):
+            return
+        if not self.crossfade:
+            if self._tail is not None:
+                self._ghi(self.pause)
+            self._tail = True
+            self._ghi(_fade(samples, self.edge_fade))
+            return
+        if self._tail is not None:
+            overlap = min(len(self._tail), len(samples), self.crossfade)
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+            self._ghi(self._tail[:len(self._tail) - overlap])
+            self._ghi(self._tail[len(self._tail) - overlap:] * (1 - ramp) + samples[:overlap] * ramp)
+            samples = samples[overlap:]
+        keep = min(self.crossfade, len(samples))
+        self._ghi(samples[:len(samples) - keep])
+        self._tail = samples[len(samples) - keep:]
+
+    def ket_thuc(self):
+        if self.crossfade and self._tail is not None:
+            self._ghi(self._tail)
+        self._tail = None
+
+
+# --- Pipeline --- #
+class LongTextTts:
+    """
+    Tổng hợp giọng nói cho văn bản dài theo từng đoạn song song, có cache theo đoạn, rồi ghép thành một file.
+
+    Args:
+        backend (TtsBackend): Cách tổng hợp một đoạn (google_tts_backend, openai_tts_backend hoặc tự định nghĩa).
+        cache_dir (str): Thư mục lưu WAV của từng đoạn đã tổng hợp.
+        max_chars (int): Số ký tự tối đa mỗi đoạn.
+        max_workers (int): Số đoạn được tổng hợp đồng thời.
+        pause_ms (float): Khoảng nghỉ chèn giữa hai đoạn (bỏ qua khi crossfade_ms > 0).
+        crossfade_ms (float): Độ dài crossfade giữa hai đoạn; 0 để dùng khoảng nghỉ.
+        trim_silence (bool): Cắt khoảng lặng ở hai đầu mỗi đoạn trước khi ghép, để khoảng nghỉ đều nhau.
+        pcm_format (PcmFormat): Định dạng PCM dùng khi ghép (mọi đoạn được đưa về định dạng này, 16-bit).
+    """
+
+    def __init__(self, backend: TtsBackend, cache_dir: str = DEFAULT_CACHE_DIR, max_chars: int = DEFAULT_MAX_CHARS,
+                 max_workers: int = 4, pause_ms: float = 250, crossfade_ms: float = 0, trim_silence: bool = True,
+                 pcm_format: PcmFormat = PcmFormat()):
+        if pcm_format.sample_width != 2:
+            raise ValueError("LongTextTts chỉ ghép PCM 16-bit")
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.max_chars = max_chars
+        self.max_workers = max(1, max_workers)
+        self.pause_ms = pause_ms
+        self.crossfade_ms = crossfade_ms
+        self.trim_silence = trim_silence
+        self.pcm_format = pcm_format
+
+    def split(self, text: str) -> list:
+        return split_text(text, self.max_chars)
+
+    def chunk_path(self, chunk_text: str) -> str:
+        """File cache của một đoạn: khoá theo backend, định dạng PCM và nội dung đoạn."""
+        key = hashlib.sha256(json.dumps([self.backend.identity, list(self.pcm_format), chunk_text],
+                                        ensure_ascii=False).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _tong_hop_doan(self, chunk_text: str) -> dict:
+        path = self.chunk_path(chunk_text)
+        if os.path.exists(path):
+            return {"path": path, "cached": True, "seconds": 0.0}
+        start = time.perf_counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # File tạm riêng cho mỗi lần gọi; backend có thể đổi đuôi file (ví dụ Gemini ghi theo đuôi .wav)
+        tmp_path = os.path.join(self.cache_dir, f"{os.path.basename(path)}.{uuid.uuid4().hex}{self.backend.extension}")
+        output_path = self.backend.synthesize(chunk_text, tmp_path)
+        _chuan_hoa_wav(output_path, path, self.pcm_format)
+        return {"path": path, "cached": False, "seconds": time.perf_counter() - start}
+
+    def synthesize(self, text: str, file_path: str, bitrate: str = None) -> dict:
+        """
+        Đọc `text` thành `file_path` (.wav, .mp3, .opus/.ogg).
+
+        Returns:
+            dict: {"success": True, "file_path", "chunks", "synthesized", "cached", "audio": thống kê mã hoá,
+                   "total_seconds"} hoặc {"error", "failed_chunks": [{"index", "text", "error"}], ...}.
+                  Khi có đoạn lỗi, file đầu ra không được tạo; các đoạn thành công vẫn nằm trong cache.
+        """
+        start = time.perf_counter()
+        chunks = self.split(text)
+        if not chunks:
+            return {"error": "Văn bản rỗng, không có gì để đọc."}
+
+        def run_chunk(chunk_text: str) -> dict:
+            try:
+                return self._tong_hop_doan(chunk_text)
+            except Exception as e:
+                return {"error": str(e)}
+
+        failed, stats = [], {"synthesized": 0, "cached": 0}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(run_chunk, chunks)
+            encoder = None
+            try:
+                # Ghép theo thứ tự ngay khi đoạn kế tiếp xong; gặp đoạn lỗi thì huỷ file đầu ra nhưng vẫn chờ
+                # các đoạn còn lại để chúng được lưu vào cache cho lần chạy sau.
+                for index, (chunk_text, result) in enumerate(zip(chunks, results)):
+                    if "error" in result:
+                        failed.append({"index": index, "text": chunk_text, "error": result["error"]})
+                        if encoder is not None:
+                            encoder.abort()
+                        continue
+                    stats["cached" if result["cached"] else "synthesized"] += 1
+                    if failed:
+                        continue
+                    if encoder is None:
+                        encoder = open_encoder(file_path, self.pcm_format, bitrate=bitrate)
+                        joiner = _BoGhep(encoder, self.pcm_format, self.pause_ms, self.crossfade_ms, self.trim_silence)
+                    joiner.them(result["path"])
+                if failed:
+                    return {"error": f"{len(failed)}/{len(chunks)} đoạn không tổng hợp được", "failed_chunks": failed,
+                            "chunks": len(chunks), **stats, "total_seconds": time.perf_counter() - start}
+                joiner.ket_thuc()
+                audio_info = encoder.close()
+            except BaseException:
+                if encoder is not None:
+                    encoder.abort()
+                raise
+
+        total_seconds = time.perf_counter() - start
+        print(f"Đọc văn bản dài: {len(chunks)} đoạn ({stats['synthesized']} tổng hợp mới, {stats['cached']} từ cache), "
+              f"{audio_info['duration_seconds']:.1f}s âm thanh trong {total_seconds:.1f}s.")
+        return {"success": True, "message": f"File âm thanh đã được lưu vào: {file_path}", "file_path": file_path,
+                "chunks": len(chunks), **stats, "audio": audio_info, "total_seconds": total_seconds}
+
+
+def build_long_narration(text: str, file_path: str, backend: TtsBackend = None, **kwargs) -> dict:
+    """Đọc văn bản dài thành một file âm thanh. Mặc định dùng Gemini TTS; tham số bổ sung được truyền cho LongTextTts."""
+    return LongTextTts(backend or google_tts_backend(), **kwargs).synthesize(text, file_path)
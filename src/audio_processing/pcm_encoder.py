@@ -0,0 +1,328 @@
+"""
+Mã hoá PCM thô (đầu ra TTS của Gemini, `audio/L16;codec=pcm;rate=24000`) sang WAV/MP3/Opus theo luồng.
+
+Thay vì nạp toàn bộ waveform vào `pydub.AudioSegment` rồi export (ffmpeg chỉ được gọi sau khi đã có đủ dữ liệu),
+PCM được đẩy vào bộ mã hoá theo từng khối ngay khi có:
+
+- WAV: mã hoá trong tiến trình bằng module `wave` (chỉ ghi header + dữ liệu, không tốn CPU);
+- MP3/Opus: một tiến trình ffmpeg sống suốt quá trình mã hoá, nhận PCM qua stdin (libmp3lame/libopus).
+
+Tần số lấy mẫu, số kênh và độ sâu bit được đọc từ mime type thay vì giả định 24 kHz mono:
+
+    pcm_format = parse_pcm_mime_type("audio/L16;codec=pcm;rate=24000")
+    with open_encoder("outputs/doc.mp3", pcm_format) as encoder:
+        for chunk in pcm_chunks:
+            encoder.write(chunk)
+
+File đầu ra được ghi vào file tạm rồi đổi tên khi mã hoá xong, nên không bao giờ còn file dở dang.
+"""
+import abc
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+import wave
+from typing import NamedTuple
+
+DEFAULT_SAMPLE_RATE = 24000
+DEFAULT_CHANNELS = 1
+READ_CHUNK_SIZE = 256 * 1024
+
+# Độ sâu bit theo mime type. Gemini trả PCM little-endian dù RFC 3551 quy định L16 là big-endian.
+PCM_SAMPLE_WIDTHS = {"audio/l16": 2, "audio/l24": 3, "audio/pcm": 2}
+FFMPEG_PCM_FORMATS = {2: "s16le", 3: "s24le"}
+
+FORMAT_WAV = "wav"
+FORMAT_MP3 = "mp3"
+FORMAT_OPUS = "opus"
+OUTPUT_EXTENSIONS = {".wav": FORMAT_WAV, ".mp3": FORMAT_MP3, ".opus": FORMAT_OPUS, ".ogg": FORMAT_OPUS}
+DEFAULT_BITRATES = {FORMAT_MP3: "128k", FORMAT_OPUS: "48k"}
+# Tham số ffmpeg cho từng định dạng nén (muxer chỉ định rõ vì file tạm không có đuôi chuẩn)
+FFMPEG_CODEC_ARGS = {
+    FORMAT_MP3: ["-c:a", "libmp3lame", "-f", "mp3"],
+    FORMAT_OPUS: ["-c:a", "libopus", "-application", "voip", "-f", "ogg"],
+}
+
+
+class PcmFormat(NamedTuple):
+    """Thông số của luồng PCM thô (little-endian, các kênh xen kẽ)."""
+    sample_rate: int = DEFAULT_SAMPLE_RATE
+    channels: int = DEFAULT_CHANNELS
+    sample_width: int = 2  # Số byte mỗi mẫu
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.channels * self.sample_width
+
+
+def parse_pcm_mime_type(mime_type: str = None) -> PcmFormat:
+    """
+    Đọc thông số PCM từ mime type, ví dụ "audio/L16;codec=pcm;rate=24000" hoặc "audio/L16;rate=16000;channels=2".
+
+    Args:
+        mime_type (str): Mime type của dữ liệu âm thanh. None: dùng mặc định của Gemini TTS (L16, 24 kHz, mono).
+
+    Returns:
+        PcmFormat: Tần số lấy mẫu, số kênh và số byte mỗi mẫu.
+
+    Raises:
+        ValueError: Nếu mime type không phải PCM thô hoặc tham số không hợp lệ.
+    """
+    if not mime_type:
+        return PcmFormat()
+    base, *params = [part.strip() for part in mime_type.split(";")]
+    sample_width = PCM_SAMPLE_WIDTHS.get(base.lower())
+    if sample_width is None:
+        raise ValueError(f"Không phải dữ liệu PCM thô: {mime_type}")
+    values = {}
+    for param in params:
+        key, _, value = param.partition("=")
+        values[key.strip().lower()] = value.strip()
+    try:
+        sample_rate = int(values.get("rate", DEFAULT_SAMPLE_RATE))
+        channels = int(values.get("channels", DEFAULT_CHANNELS))
+    except ValueError:
+        raise ValueError(f"Tham số PCM không hợp lệ trong mime type: {mime_type}") from None
+    if sample_rate <= 0 or channels <= 0:
+        raise ValueError(f"Tham số PCM không hợp lệ trong mime type: {mime_type}")
+    return PcmFormat(sample_rate, channels, sample_width)
+
+
+def resolve_output_path(file_path: str, default_format: str = FORMAT_MP3) -> tuple:
+    """
+    Trả về (đường dẫn đầu ra, định dạng) theo đuôi file: .wav, .mp3, .opus/.ogg được giữ nguyên;
+    đuôi khác (ví dụ .pcm hoặc không có đuôi) được đổi sang đuôi của `default_format`.
+    """
+    root, extension = os.path.splitext(file_path)
+    output_format = OUTPUT_EXTENSIONS.get(extension.lower())
+    if output_format is not None:
+        return file_path, output_format
+    return root + "." + default_format, default_format
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_exe() -> str:
+    """
+    ffmpeg trên PATH, nếu không có thì dùng bản đi kèm imageio-ffmpeg (phụ thuộc của moviepy). Chỉ dò một lần;
+    dùng chung cho mọi module gọi ffmpeg (audio_processing, long_video_pipeline).
+    """
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+# --- Bộ mã hoá --- #
+class _PcmEncoder(abc.ABC):
+    """
+    Lớp cơ sở: nhận PCM qua `write()`, ghi file tạm cạnh `file_path` và đổi tên khi `close()`.
+    Dùng được như context manager: thoát bình thường thì close(), có exception thì abort().
+    """
+
+    output_format = None
+
+    def __init__(self, file_path: str, pcm_format: PcmFormat):
+        self.file_path = file_path
+        self.pcm_format = pcm_format
+        self.bytes_in = 0
+        self.encode_seconds = 0.0
+        self.stats = None  # Thống kê sau khi close()
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self._tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        self._closed = False
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.bytes_in / self.pcm_format.bytes_per_second
+
+    def write(self, pcm: bytes):
+        start = time.perf_counter()
+        self._ghi(pcm)
+        self.bytes_in += len(pcm)
+        self.encode_seconds += time.perf_counter() - start
+
+    def close(self) -> dict:
+        """Kết thúc mã hoá, đổi tên file tạm thành `file_path` và trả về thống kê."""
+        if self._closed:
+            raise RuntimeError("Bộ mã hoá đã đóng")
+        self._closed = True
+        start = time.perf_counter()
+        try:
+            self._ket_thuc()
+            os.replace(self._tmp_path, self.file_path)
+        except BaseException:
+            self._xoa_file_tam()
+            raise
+        self.encode_seconds += time.perf_counter() - start
+        self.stats = {
+            "file_path": self.file_path,
+            "format": self.output_format,
+            "sample_rate": self.pcm_format.sample_rate,
+            "channels": self.pcm_format.channels,
+            "duration_seconds": self.duration_seconds,
+            "bytes_in": self.bytes_in,
+            "bytes_out": os.path.getsize(self.file_path),
+            "encode_seconds": self.encode_seconds,
+        }
+        return self.stats
+
+    def abort(self):
+        """Huỷ mã hoá và xoá file tạm."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._huy()
+        finally:
+            self._xoa_file_tam()
+
+    def _xoa_file_tam(self):
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            if not self._closed:
+                self.close()
+        else:
+            self.abort()
+
+    @abc.abstractmethod
+    def _ghi(self, pcm: bytes):
+        """Mã hoá một khối PCM vào file tạm."""
+
+    @abc.abstractmethod
+    def _ket_thuc(self):
+        """Hoàn tất file tạm (ghi nốt header/dữ liệu còn đệm) trước khi đổi tên."""
+
+    @abc.abstractmethod
+    def _huy(self):
+        """Dừng mã hoá và giải phóng tài nguyên; file tạm được xoá sau đó."""
+
+
+class WavEncoder(_PcmEncoder):
+    """Ghi WAV trong tiến trình: header được ghi trước rồi cập nhật độ dài khi close()."""
+
+    output_format = FORMAT_WAV
+
+    def __init__(self, file_path: str, pcm_format: PcmFormat):
+        super().__init__(file_path, pcm_format)
+        self._wav = wave.open(self._tmp_path, "wb")
+        self._wav.setnchannels(pcm_format.channels)
+        self._wav.setsampwidth(pcm_format.sample_width)
+        self._wav.setframerate(pcm_format.sample_rate)
+
+    def _ghi(self, pcm: bytes):
+        self._wav.writeframesraw(pcm)
+
+    def _ket_thuc(self):
+        self._wav.close()
+
+    def _huy(self):
+        self._wav.close()
+
+
+class FfmpegEncoder(_PcmEncoder):
+    """
+    Mã hoá MP3/Opus bằng một tiến trình ffmpeg nhận PCM qua stdin trong suốt quá trình ghi.
+
+    Args:
+        file_path (str): File đầu ra.
+        pcm_format (PcmFormat): Thông số PCM đầu vào.
+        output_format (str): FORMAT_MP3 hoặc FORMAT_OPUS.
+        bitrate (str): Bitrate đầu ra cho ffmpeg (mặc định 128k cho MP3, 48k cho Opus).
+    """
+
+    def __init__(self, file_path: str, pcm_format: PcmFormat, output_format: str = FORMAT_MP3, bitrate: str = None):
+        if output_format not in FFMPEG_CODEC_ARGS:
+            raise ValueError(f"output_format phải là một trong {list(FFMPEG_CODEC_ARGS)}")
+        if pcm_format.sample_width not in FFMPEG_PCM_FORMATS:
+            raise ValueError(f"Không hỗ trợ PCM {pcm_format.sample_width * 8}-bit")
+        super().__init__(file_path, pcm_format)
+        self.output_format = output_format
+        # stderr ghi ra file tạm: nếu dùng PIPE mà không đọc, ffmpeg có thể bị chặn khi in nhiều lỗi
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", FFMPEG_PCM_FORMATS[pcm_format.sample_width], "-ar", str(pcm_format.sample_rate),
+             "-ac", str(pcm_format.channels), "-i", "pipe:0",
+             *FFMPEG_CODEC_ARGS[output_format], "-b:a", bitrate or DEFAULT_BITRATES[output_format],
+             self._tmp_path],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr,
+        )
+
+    def _loi_ffmpeg(self) -> RuntimeError:
+        self._stderr.seek(0)
+        message = self._stderr.read().decode(errors="replace").strip()
+        return RuntimeError(f"ffmpeg lỗi (mã {self._process.returncode}): {message}")
+
+    def _ghi(self, pcm: bytes):
+        try:
+            self._process.stdin.write(pcm)
+        except BrokenPipeError:
+            self._process.wait()
+            raise self._loi_ffmpeg() from None
+
+    def _ket_thuc(self):
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            if self._process.wait() != 0:
+                raise self._loi_ffmpeg()
+        finally:
+            self._stderr.close()
+
+    def _huy(self):
+        self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+
+
+def open_encoder(file_path: str, pcm_format: PcmFormat, output_format: str = None, bitrate: str = None) -> _PcmEncoder:
+    """
+    Mở bộ mã hoá theo luồng cho `file_path`.
+
+    Args:
+        file_path (str): File đầu ra.
+        pcm_format (PcmFormat): Thông số PCM đầu vào (xem parse_pcm_mime_type).
+        output_format (str): "wav", "mp3" hoặc "opus". None: suy ra từ đuôi file (mặc định mp3).
+        bitrate (str): Bitrate cho MP3/Opus (bỏ qua với WAV).
+
+    Returns:
+        Bộ mã hoá có `write(pcm)`, `close()` (trả về thống kê) và `abort()`.
+    """
+    if output_format is None:
+        output_format = OUTPUT_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), FORMAT_MP3)
+    if output_format == FORMAT_WAV:
+        return WavEncoder(file_path, pcm_format)
+    return FfmpegEncoder(file_path, pcm_format, output_format, bitrate)
+
+
+def doc_file_theo_khoi(path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """Đọc file PCM theo từng khối (không nạp cả file vào bộ nhớ)."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def encode_pcm(chunks, file_path: str, pcm_format: PcmFormat, output_format: str = None, bitrate: str = None) -> dict:
+    """
+    Mã hoá một chuỗi khối PCM (iterable bytes) thành `file_path`; trả về thống kê của bộ mã hoá
+    (định dạng, thời lượng, số byte vào/ra, thời gian mã hoá).
+    """
+    with open_encoder(file_path, pcm_format, output_format, bitrate) as encoder:
+        for chunk in chunks:
+            encoder.write(chunk)
+    return encoder.stats
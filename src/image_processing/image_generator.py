@@ -1,7 +1,59 @@
 import os
-import base64
+import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 from src.api_services.btc_api_client import sinh_hinh_anh
+from src.api_services import btc_api_client_async
+from src.api_services.rate_limiter import TokenBucket
+
+# --- Prompt cho từng trang truyện tranh --- #
+PAGE_COVER_PROMPT = """Vietnamese national flag, red with a yellow star, flying proudly above Ba Dinh Square in Hanoi during a grand national day celebration. The flag is waving majestically against a clear blue sky. Below, a glimpse of Ba Dinh Square, conveying a sense of solemnity and festive atmosphere. Professional photography style, high quality, vibrant colors, majestic, patriotic."""
+
+PAGE_TWO_PROMPTS = [
+    """Historical photo of Ho Chi Minh reading the Declaration of Independence at Ba Dinh Square in Hanoi, September 2, 1945. Black and white or sepia tone, capturing the solemn and historic moment. Crowds of people listening attentively.""",
+    """A montage or timeline of images representing Vietnam's 80 years of development: soldiers marching during wartime, workers building infrastructure, farmers in rice fields, modern cityscapes with skyscrapers. Bright and evolving colors, showing progress and resilience.""",
+]
+
+PAGE_THREE_PROMPTS = [
+    """A wide shot of Ba Dinh Square in Hanoi, crowded with people and various military and civilian forces gathering for a national day celebration. The atmosphere is solemn and expectant. Flags and banners are visible. Bright daylight.""",
+    """A traditional torch relay ceremony in Vietnam, with a torch being carried by a person in official attire. The torch represents the revolutionary fire and the will for independence. Focus on the torch and the solemnity of the moment.""",
+    """A solemn flag-raising ceremony at Ba Dinh Square. Leaders of the Party and State, along with the entire populace, stand at attention, saluting the Vietnamese national flag as it is raised. Respectful and patriotic atmosphere. Clear blue sky.""",
+]
+
+PAGE_FOUR_PROMPTS = [
+    """A high-angle shot of a Vietnamese political leader delivering a speech at Ba Dinh Square during a national celebration. The leader is at a podium, with a large banner or screen behind emphasizing 80 years of independence and national development. The crowd is respectfully listening. Formal and inspiring atmosphere.""",
+    """A military parade at Ba Dinh Square in Hanoi. The Vietnamese People's Army marching in formation, showing strength and solemnity. Soldiers in crisp uniforms, carrying flags and weapons. Majestic and powerful scene, clear day.""",
+    """A police parade at Ba Dinh Square in Hanoi. The Vietnamese People's Public Security Force marching in formation, demonstrating order and discipline. Officers in their distinctive uniforms. Reflecting their role in maintaining peace and order.""",
+]
+
+PAGE_FIVE_PROMPTS = [
+    """A grand military parade at Ba Dinh Square in Hanoi, featuring various branches of the Vietnamese armed forces: Navy sailors, Air Force personnel, Border Guards, and Coast Guard units, marching in perfect synchronization. Emphasize their determination to protect national sovereignty. Bright, clear day.""",
+    """A vibrant civilian parade at Ba Dinh Square, with various social organizations and people from all walks of life: workers, farmers, youth, women, intellectuals, marching together with flags, flowers, and banners. Show unity and collective effort in national development. Joyful and patriotic atmosphere.""",
+    """A formation of military helicopters flying over Ba Dinh Square, carrying large Party and National flags. The helicopters are soaring gracefully against a clear blue sky, creating a majestic and patriotic spectacle. Professional aerial photography.""",
+]
+
+EVEREST_PROMPT = """Vietnamese national flag flying proudly on the summit of Mount Everest, red flag with yellow star, waving in strong mountain winds, snow-capped peaks in background, dramatic mountain landscape, clear blue sky, professional photography style, high quality, patriotic and majestic atmosphere."""
+
+
+def _xu_ly_ket_qua_sinh_anh(response: dict, output_filename: str) -> dict:
+    if response.get("success"):
+        if "url" in response:
+            print(f"\nĐã nhận được URL hình ảnh: {response['url']}")
+            print("Bạn có thể tải hình ảnh từ URL này.")
+            return {"success": True, "url": response["url"]}
+        print(f"Hình ảnh đã được lưu vào: {output_filename}")
+        return {"success": True, "filepath": output_filename}
+    elif "error" in response:
+        print(f"\nĐã xảy ra lỗi khi sinh ảnh: {response['error']}")
+        if "details" in response:
+            print(f"Chi tiết: {response['details']}")
+        return {"error": response['error'], "details": response.get("details")}
+    else:
+        print("\nKhông nhận được phản hồi hợp lệ cho việc sinh ảnh.")
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+        return {"error": "Không nhận được phản hồi hợp lệ cho việc sinh ảnh.", "details": response}
 
 
 def generate_and_save_image(
@@ -22,7 +74,7 @@ def generate_and_save_image(
         n (int): Số lượng hình ảnh muốn sinh (mặc định là 1).
 
     Returns:
-        dict: Phản hồi JSON từ ThucChien.AI chứa dữ liệu hình ảnh hoặc thông báo lỗi.
+        dict: Kết quả {"success": True, "filepath"/"url": ...} hoặc {"error": ..., "details": ...}.
     """
     print(f"Đang yêu cầu sinh ảnh với prompt: \"{prompt}\"")
     print(f"Mô hình: {model}, Tỷ lệ khung hình: {aspect_ratio}")
@@ -30,46 +82,46 @@ def generate_and_save_image(
     try:
         response = sinh_hinh_anh(
             prompt=prompt,
+            file_path=output_filename,
             model=model,
             n=n,
             aspect_ratio=aspect_ratio
         )
+        return _xu_ly_ket_qua_sinh_anh(response, output_filename)
 
-        if "data" in response and response["data"]:
-            first_image_data = response["data"][0]
-            if "b64_json" in first_image_data and first_image_data["b64_json"]:
-                image_b64 = first_image_data["b64_json"]
-                print(f"\nĐã nhận được dữ liệu hình ảnh Base64 (dài {len(image_b64)} ký tự).")
-                
-                try:
-                    image_bytes = base64.b64decode(image_b64)
-                    os.makedirs(os.path.dirname(output_filename), exist_ok=True)
-                    with open(output_filename, "wb") as f:
-                        f.write(image_bytes)
-                    print(f"Hình ảnh đã được lưu vào: {output_filename}")
-                    return {"success": True, "filepath": output_filename}
-                except Exception as e:
-                    print(f"Không thể giải mã hoặc lưu hình ảnh: {e}")
-                    return {"error": f"Không thể giải mã hoặc lưu hình ảnh: {e}"}
-
-            elif "url" in first_image_data and first_image_data["url"]:
-                image_url = first_image_data["url"]
-                print(f"\nĐã nhận được URL hình ảnh: {image_url}")
-                print("Bạn có thể tải hình ảnh từ URL này.")
-                return {"success": True, "url": image_url}
-            else:
-                print("\nPhản hồi hình ảnh không chứa b64_json hoặc url hợp lệ.")
-                print(json.dumps(response, indent=2, ensure_ascii=False))
-                return {"error": "Phản hồi hình ảnh không chứa b64_json hoặc url hợp lệ.", "details": response}
-        elif "error" in response:
-            print(f"\nĐã xảy ra lỗi khi sinh ảnh: {response['error']}")
-            if "details" in response:
-                print(f"Chi tiết: {response['details']}")
-            return {"error": response['error'], "details": response.get("details")}
-        else:
-            print("\nKhông nhận được phản hồi hợp lệ cho việc sinh ảnh.")
-            print(json.dumps(response, indent=2, ensure_ascii=False))
-            return {"error": "Không nhận được phản hồi hợp lệ cho việc sinh ảnh.", "details": response}
+    except ValueError as e:
+        print(f"Lỗi cấu hình: {e}")
+        return {"error": f"Lỗi cấu hình: {e}"}
+    except Exception as e:
+        print(f"Lỗi không mong muốn: {e}")
+        return {"error": f"Lỗi không mong muốn: {e}"}
+
+
+async def agenerate_and_save_image(
+    prompt: str,
+    output_filename: str,
+    model: str = "imagen-4",
+    aspect_ratio: str = "16:9",
+    n: int = 1
+) -> dict:
+    """
+    Bản async của `generate_and_save_image`, dùng để sinh nhiều khung hình cùng lúc với asyncio.gather.
+
+    Returns:
+        dict: Kết quả {"success": True, "filepath"/"url": ...} hoặc {"error": ..., "details": ...}.
+    """
+    print(f"Đang yêu cầu sinh ảnh với prompt: \"{prompt}\"")
+    print(f"Mô hình: {model}, Tỷ lệ khung hình: {aspect_ratio}")
+
+    try:
+        response = await btc_api_client_async.sinh_hinh_anh(
+            prompt=prompt,
+            file_path=output_filename,
+            model=model,
+            n=n,
+            aspect_ratio=aspect_ratio
+        )
+        return _xu_ly_ket_qua_sinh_anh(response, output_filename)
 
     except ValueError as e:
         print(f"Lỗi cấu hình: {e}")
@@ -78,57 +130,115 @@ def generate_and_save_image(
         print(f"Lỗi không mong muốn: {e}")
         return {"error": f"Lỗi không mong muốn: {e}"}
 
+
+# --- Sinh ảnh theo lô với số worker giới hạn --- #
+class ImageJob(NamedTuple):
+    """Một yêu cầu sinh ảnh trong lô: (prompt, đường dẫn lưu, mô hình, tỷ lệ khung hình)."""
+    prompt: str
+    output_filename: str
+    model: str = "imagen-4"
+    aspect_ratio: str = "16:9"
+
+
+def generate_images_batch(jobs: list, max_workers: int = 4, requests_per_minute: float = None) -> dict:
+    """
+    Sinh nhiều hình ảnh song song với số worker giới hạn, phù hợp cho cả trang truyện lẫn cả cuốn truyện vài trăm khung hình.
+
+    Args:
+        jobs (list): Danh sách ImageJob hoặc tuple (prompt, output_filename[, model[, aspect_ratio]]).
+        max_workers (int): Số request sinh ảnh chạy đồng thời tối đa.
+        requests_per_minute (float): Nếu đặt, giãn cách thời điểm gửi request để không vượt quá giới hạn
+                                     của API (ví dụ rpm_limit của key). Mặc định không giới hạn.
+
+    Returns:
+        dict: {"results": [...], "succeeded": int, "failed": int, "total_seconds": float}.
+              `results` giữ đúng thứ tự của `jobs`; mỗi phần tử là kết quả của generate_and_save_image
+              bổ sung "output_filename" và "latency_seconds".
+    """
+    jobs = [job if isinstance(job, ImageJob) else ImageJob(*job) for job in jobs]
+    pacer = TokenBucket(requests_per_minute / 60.0, capacity=1) if requests_per_minute else None
+
+    def run_job(job: ImageJob) -> dict:
+        if pacer is not None:
+            pacer.acquire()
+        start = time.perf_counter()
+        try:
+            result = generate_and_save_image(job.prompt, job.output_filename, model=job.model, aspect_ratio=job.aspect_ratio)
+        except Exception as e:
+            result = {"error": f"Lỗi không mong muốn: {e}"}
+        result["output_filename"] = job.output_filename
+        result["latency_seconds"] = time.perf_counter() - start
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(run_job, jobs))
+    total_seconds = time.perf_counter() - start
+
+    succeeded = sum(1 for result in results if result.get("success"))
+    print(f"Hoàn tất lô {len(jobs)} ảnh trong {total_seconds:.2f}s: {succeeded} thành công, {len(jobs) - succeeded} lỗi.")
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(jobs) - succeeded,
+        "total_seconds": total_seconds,
+    }
+
+
+async def agenerate_frames(prompts: list[str], output_filenames: list[str], model: str = "imagen-4",
+                           aspect_ratio: str = "16:9") -> list[dict]:
+    """
+    Sinh đồng thời nhiều khung hình, kết quả trả về theo đúng thứ tự đầu vào.
+    Huỷ coroutine này sẽ huỷ toàn bộ các request đang chạy.
+    """
+    return await asyncio.gather(*(
+        agenerate_and_save_image(prompt, output_filename, model=model, aspect_ratio=aspect_ratio)
+        for prompt, output_filename in zip(prompts, output_filenames)
+    ))
+
 def generate_page_cover(output_filename: str):
-    prompt = """Vietnamese national flag, red with a yellow star, flying proudly above Ba Dinh Square in Hanoi during a grand national day celebration. The flag is waving majestically against a clear blue sky. Below, a glimpse of Ba Dinh Square, conveying a sense of solemnity and festive atmosphere. Professional photography style, high quality, vibrant colors, majestic, patriotic."""
     model = "imagen-4"
     aspect_ratio = "16:9"
     return generate_and_save_image(
-        prompt=prompt,
+        prompt=PAGE_COVER_PROMPT,
         output_filename=output_filename,
         model=model,
         aspect_ratio=aspect_ratio
     )
 
-def generate_page_two_frames(output_filename_frame1: str, output_filename_frame2: str):
-    prompt_frame1 = """Historical photo of Ho Chi Minh reading the Declaration of Independence at Ba Dinh Square in Hanoi, September 2, 1945. Black and white or sepia tone, capturing the solemn and historic moment. Crowds of people listening attentively."""
-    prompt_frame2 = """A montage or timeline of images representing Vietnam's 80 years of development: soldiers marching during wartime, workers building infrastructure, farmers in rice fields, modern cityscapes with skyscrapers. Bright and evolving colors, showing progress and resilience."""
+def generate_page_two_frames(output_filename_frame1: str, output_filename_frame2: str, max_workers: int = 2):
+    return _generate_page_frames(PAGE_TWO_PROMPTS, [output_filename_frame1, output_filename_frame2], max_workers)
+
+def generate_page_three_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str, max_workers: int = 3):
+    return _generate_page_frames(PAGE_THREE_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3], max_workers)
 
-    generate_and_save_image(prompt_frame1, output_filename_frame1)
-    generate_and_save_image(prompt_frame2, output_filename_frame2)
+def generate_page_four_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str, max_workers: int = 3):
+    return _generate_page_frames(PAGE_FOUR_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3], max_workers)
 
-def generate_page_three_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
-    prompt_frame1 = """A wide shot of Ba Dinh Square in Hanoi, crowded with people and various military and civilian forces gathering for a national day celebration. The atmosphere is solemn and expectant. Flags and banners are visible. Bright daylight."""
-    prompt_frame2 = """A traditional torch relay ceremony in Vietnam, with a torch being carried by a person in official attire. The torch represents the revolutionary fire and the will for independence. Focus on the torch and the solemnity of the moment."""
-    prompt_frame3 = """A solemn flag-raising ceremony at Ba Dinh Square. Leaders of the Party and State, along with the entire populace, stand at attention, saluting the Vietnamese national flag as it is raised. Respectful and patriotic atmosphere. Clear blue sky."""
+def generate_page_five_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str, max_workers: int = 3):
+    return _generate_page_frames(PAGE_FIVE_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3], max_workers)
 
-    generate_and_save_image(prompt_frame1, output_filename_frame1)
-    generate_and_save_image(prompt_frame2, output_filename_frame2)
-    generate_and_save_image(prompt_frame3, output_filename_frame3)
+def _generate_page_frames(prompts: list[str], output_filenames: list[str], max_workers: int) -> dict:
+    jobs = [ImageJob(prompt, output_filename) for prompt, output_filename in zip(prompts, output_filenames)]
+    return generate_images_batch(jobs, max_workers=max_workers)
 
-def generate_page_four_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
-    prompt_frame1 = """A high-angle shot of a Vietnamese political leader delivering a speech at Ba Dinh Square during a national celebration. The leader is at a podium, with a large banner or screen behind emphasizing 80 years of independence and national development. The crowd is respectfully listening. Formal and inspiring atmosphere."""
-    prompt_frame2 = """A military parade at Ba Dinh Square in Hanoi. The Vietnamese People's Army marching in formation, showing strength and solemnity. Soldiers in crisp uniforms, carrying flags and weapons. Majestic and powerful scene, clear day."""
-    prompt_frame3 = """A police parade at Ba Dinh Square in Hanoi. The Vietnamese People's Public Security Force marching in formation, demonstrating order and discipline. Officers in their distinctive uniforms. Reflecting their role in maintaining peace and order."""
+async def agenerate_page_two_frames(output_filename_frame1: str, output_filename_frame2: str):
+    return await agenerate_frames(PAGE_TWO_PROMPTS, [output_filename_frame1, output_filename_frame2])
 
-    generate_and_save_image(prompt_frame1, output_filename_frame1)
-    generate_and_save_image(prompt_frame2, output_filename_frame2)
-    generate_and_save_image(prompt_frame3, output_filename_frame3)
+async def agenerate_page_three_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
+    return await agenerate_frames(PAGE_THREE_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3])
 
-def generate_page_five_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
-    prompt_frame1 = """A grand military parade at Ba Dinh Square in Hanoi, featuring various branches of the Vietnamese armed forces: Navy sailors, Air Force personnel, Border Guards, and Coast Guard units, marching in perfect synchronization. Emphasize their determination to protect national sovereignty. Bright, clear day."""
-    prompt_frame2 = """A vibrant civilian parade at Ba Dinh Square, with various social organizations and people from all walks of life: workers, farmers, youth, women, intellectuals, marching together with flags, flowers, and banners. Show unity and collective effort in national development. Joyful and patriotic atmosphere."""
-    prompt_frame3 = """A formation of military helicopters flying over Ba Dinh Square, carrying large Party and National flags. The helicopters are soaring gracefully against a clear blue sky, creating a majestic and patriotic spectacle. Professional aerial photography."""
+async def agenerate_page_four_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
+    return await agenerate_frames(PAGE_FOUR_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3])
 
-    generate_and_save_image(prompt_frame1, output_filename_frame1)
-    generate_and_save_image(prompt_frame2, output_filename_frame2)
-    generate_and_save_image(prompt_frame3, output_filename_frame3)
+async def agenerate_page_five_frames(output_filename_frame1: str, output_filename_frame2: str, output_filename_frame3: str):
+    return await agenerate_frames(PAGE_FIVE_PROMPTS, [output_filename_frame1, output_filename_frame2, output_filename_frame3])
 
 def generate_vietnam_flag_on_everest(output_filename: str):
-    prompt = """Vietnamese national flag flying proudly on the summit of Mount Everest, red flag with yellow star, waving in strong mountain winds, snow-capped peaks in background, dramatic mountain landscape, clear blue sky, professional photography style, high quality, patriotic and majestic atmosphere."""
     model = "imagen-4"
     aspect_ratio = "16:9"
     return generate_and_save_image(
-        prompt=prompt,
+        prompt=EVEREST_PROMPT,
         output_filename=output_filename,
         model=model,
         aspect_ratio=aspect_ratio
@@ -1,31 +1,26 @@
 import xml.etree.ElementTree as ET
-import base64
 import os
-import io
-from PIL import Image, ImageDraw, ImageOps
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from src.image_processing.svg_rasterizer import get_rasterizer
+from src.image_processing.svg_template import EmbedOptions, load_svg_template
 
 def svg_to_png_bytes(svg_text, width=512, height=512):
-    try:
-        import cairosvg
-        return cairosvg.svg2png(bytestring=svg_text.encode('utf-8'),
-                                output_width=width, output_height=height)
-    except Exception:
-        # fallback vẽ lại bằng Pillow
-        img = Image.new("RGBA", (width, height), (240, 240, 242, 255))
-        draw = ImageDraw.Draw(img)
-        draw.ellipse((196, 60, 316, 180), fill=(255, 215, 181, 255), outline=(0, 0, 0, 255), width=2)
-        draw.rounded_rectangle((176, 180, 336, 380), radius=20, fill=(209, 213, 219, 255), outline=(0, 0, 0, 255), width=2)
-        shirt_poly = [(176, 260), (256, 220), (336, 260), (336, 360), (256, 380), (176, 360)]
-        draw.polygon(shirt_poly, fill=(31, 119, 180, 255), outline=(0, 0, 0, 255))
-        draw.line((176, 200, 140, 260, 176, 300), fill=(0, 0, 0, 255), width=10)
-        draw.line((336, 200, 372, 260, 336, 300), fill=(0, 0, 0, 255), width=10)
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        return buf.getvalue()
-
-def fill_svg_with_content(input_svg_path: str, output_svg_path: str, image_path: str, title: str, description: str):
+    """
+    Chuyển SVG sang PNG bằng rasterizer dùng chung (backend chọn một lần, có cache theo hash SVG).
+
+    Raises:
+        RasterBackendUnavailable: Khi không có backend nào dùng được (không còn vẽ ảnh thay thế).
+    """
+    return get_rasterizer().render(svg_text, width, height)
+
+def fill_svg_with_content(input_svg_path: str, output_svg_path: str, image_path: str, title: str, description: str,
+                          embed: EmbedOptions = None) -> dict:
     """
     Điền nội dung vào file SVG: thay thế placeholder text và chèn ảnh base64.
+    Template được biên dịch một lần và cache (xem svg_template.load_svg_template).
 
     Args:
         input_svg_path (str): Đường dẫn đến file SVG mẫu.
@@ -33,142 +28,165 @@ def fill_svg_with_content(input_svg_path: str, output_svg_path: str, image_path:
         image_path (str): Đường dẫn đến file ảnh sẽ được chèn vào SVG.
         title (str): Tiêu đề sẽ thay thế PLACEHOLDER_TITLE.
         description (str): Mô tả sẽ thay thế PLACEHOLDER_DESC.
+        embed (EmbedOptions): Nếu đặt, ảnh được thu nhỏ vừa rect và mã hoá lại trước khi nhúng.
+
+    Returns:
+        dict: {"success": True, "output_svg_path": ...} hoặc {"error": ...}.
     """
-    try:
-        tree = ET.parse(input_svg_path)
-        root = tree.getroot()
-
-        # Thêm namespace xlink nếu chưa có
-        if "xmlns:xlink" not in root.attrib:
-            root.attrib["xmlns:xlink"] = "http://www.w3.org/1999/xlink"
-
-        # Thay nội dung text
-        for text_elem in root.findall(".//{http://www.w3.org/2000/svg}text"):
-            if text_elem.text == "PLACEHOLDER_TITLE":
-                text_elem.text = title
-            elif text_elem.text == "PLACEHOLDER_DESC":
-                text_elem.text = description
-
-        # Chèn ảnh base64
-        for rect in root.findall(".//{http://www.w3.org/2000/svg}rect"):
-            if rect.attrib.get("id") == "photo1":
-                # Kiểm tra nếu file ảnh tồn tại
-                if not os.path.exists(image_path):
-                    raise FileNotFoundError(f"File ảnh không tồn tại: {image_path}")
-
-                with open(image_path, "rb") as img_file:
-                    img_data = base64.b64encode(img_file.read()).decode()
-                
-                image_elem = ET.Element("{http://www.w3.org/2000/svg}image", {
-                    "x": rect.attrib["x"],
-                    "y": rect.attrib["y"],
-                    "width": rect.attrib["width"],
-                    "height": rect.attrib["height"],
-                    "{http://www.w3.org/1999/xlink}href": f"data:image/png;base64,{img_data}"
-                })
-                # Thay thế rect bằng image_elem
-                root.remove(rect)
-                root.append(image_elem)
-                break # Chỉ thay thế rect đầu tiên có id="photo1"
-
-        # Đảm bảo thư mục đầu ra tồn tại
-        os.makedirs(os.path.dirname(output_svg_path), exist_ok=True)
-        tree.write(output_svg_path, encoding="utf-8", xml_declaration=True)
+    job = SvgRenderJob(input_svg_path, output_svg_path,
+                       texts={"PLACEHOLDER_TITLE": title, "PLACEHOLDER_DESC": description},
+                       images={"photo1": image_path}, embed=embed)
+    result = _render_svg_job(job)
+    if result.get("success"):
         print(f"✅ SVG đã được chèn ảnh và text thành công vào: {output_svg_path}")
-
-    except FileNotFoundError as e:
-        print(f"❌ Lỗi: {e}")
-    except Exception as e:
-        print(f"❌ Lỗi khi xử lý SVG: {e}")
-
-def fill_complex_svg_with_data(input_svg_path: str, output_svg_path: str, data: dict):
+        _in_muc_giam(result["source_image_bytes"], result["embedded_image_bytes"], embed)
+    else:
+        print(f"❌ {result['error']}")
+    return result
+
+def _ve_bieu_do(chart_attrs: dict) -> str:
+    """Nhóm cột biểu đồ thay cho rect id="chart" (giữ nguyên logic từ file gốc)."""
+    bars = [
+        {"x": 420, "height": 200},
+        {"x": 520, "height": 150},
+        {"x": 620, "height": 250}
+    ]
+    g = ET.Element("g", {"id": "chart_data"})
+    for bar in bars:
+        y = float(chart_attrs["y"]) + float(chart_attrs["height"]) - bar["height"]
+        ET.SubElement(g, "rect", {
+            "x": str(bar["x"]),
+            "y": str(y),
+            "width": "50",
+            "height": str(bar["height"]),
+            "fill": "#c00"
+        })
+    return ET.tostring(g, encoding="unicode")
+
+def fill_complex_svg_with_data(input_svg_path: str, output_svg_path: str, data: dict,
+                               embed: EmbedOptions = None) -> dict:
     """
     Điền dữ liệu phức tạp vào file SVG: thay thế tiêu đề, phụ đề, timeline và chèn nhiều ảnh.
+    Template được biên dịch một lần và cache (xem svg_template.load_svg_template).
 
     Args:
         input_svg_path (str): Đường dẫn đến file SVG mẫu.
         output_svg_path (str): Đường dẫn để lưu file SVG đã điền nội dung.
         data (dict): Dictionary chứa dữ liệu để điền vào SVG, bao gồm 'title', 'subtitle', 'photos', 'timeline'.
+        embed (EmbedOptions): Nếu đặt, ảnh được thu nhỏ vừa rect và mã hoá lại trước khi nhúng.
+
+    Returns:
+        dict: {"success": True, "output_svg_path": ...} hoặc {"error": ...}.
     """
-    try:
-        tree = ET.parse(input_svg_path)
-        root = tree.getroot()
-        root.attrib["xmlns:xlink"] = "http://www.w3.org/1999/xlink"
-
-        # Hàm chèn ảnh (base64 để độc lập)
-        def replace_rect_with_image(root_elem, rect_id, image_path):
-            for rect in root_elem.findall(".//{http://www.w3.org/2000/svg}rect"):
-                if rect.attrib.get("id") == rect_id:
-                    if not os.path.exists(image_path):
-                        raise FileNotFoundError(f"File ảnh không tồn tại: {image_path}")
-                    with open(image_path, "rb") as img_file:
-                        img_data = base64.b64encode(img_file.read()).decode()
-                    image_elem = ET.Element("{http://www.w3.org/2000/svg}image", {
-                        "x": rect.attrib["x"],
-                        "y": rect.attrib["y"],
-                        "width": rect.attrib["width"],
-                        "height": rect.attrib["height"],
-                        "{http://www.w3.org/1999/xlink}href": f"data:image/png;base64,{img_data}"
-                    })
-                    root_elem.remove(rect)
-                    root_elem.append(image_elem)
-                    return True
-            return False
-
-        # 1. Thay text tiêu đề & phụ đề
-        for elem in root.findall(".//{http://www.w3.org/2000/svg}text"):
-            _id = elem.attrib.get("id", "")
-            if _id == "title" and "title" in data:
-                elem.text = data["title"]
-            elif _id == "subtitle" and "subtitle" in data:
-                elem.text = data["subtitle"]
-
-        # 2. Thay timeline text
-        if "timeline" in data:
-            for i, text in enumerate(data["timeline"], start=1):
-                for elem in root.findall(f".//{{http://www.w3.org/2000/svg}}text[@id='timeline{i}']"):
-                    elem.text = text
-
-        # 3. Thay ảnh
-        if "photos" in data:
-            for i, img_path in enumerate(data["photos"], start=1):
-                replace_rect_with_image(root, f"photo{i}", img_path)
-
-        # 4. (Tuỳ chọn) Vẽ biểu đồ động vào vùng chart (giữ nguyên logic từ file gốc)
-        for rect in root.findall(".//{http://www.w3.org/2000/svg}rect"):
-            if rect.attrib.get("id") == "chart":
-                g = ET.Element("{http://www.w3.org/2000/svg}g", {"id": "chart_data"})
-                bars = [
-                    {"x": 420, "height": 200},
-                    {"x": 520, "height": 150},
-                    {"x": 620, "height": 250}
-                ]
-                for bar in bars:
-                    y = float(rect.attrib["y"]) + float(rect.attrib["height"]) - bar["height"]
-                    bar_elem = ET.Element("{http://www.w3.org/2000/svg}rect", {
-                        "x": str(bar["x"]),
-                        "y": str(y),
-                        "width": "50",
-                        "height": str(bar["height"]),
-                        "fill": "#c00"
-                    })
-                    g.append(bar_elem)
-                root.remove(rect)
-                root.append(g)
-
-        # Ghi kết quả
-        os.makedirs(os.path.dirname(output_svg_path), exist_ok=True)
-        tree.write(output_svg_path, encoding="utf-8", xml_declaration=True)
+    result = _render_svg_job(SvgRenderJob.from_complex_data(input_svg_path, output_svg_path, data, embed=embed))
+    if result.get("success"):
         print(f"✅ SVG phức tạp đã được chèn ảnh, text và biểu đồ vào: {output_svg_path}")
+        _in_muc_giam(result["source_image_bytes"], result["embedded_image_bytes"], embed)
+    else:
+        print(f"❌ {result['error']}")
+    return result
 
+# --- Render SVG theo lô trên process pool --- #
+class SvgRenderJob(NamedTuple):
+    """
+    Một trang SVG cần render trong lô: (template, đường dẫn lưu, dữ liệu).
+    `texts`, `images`, `replacements`, `embed` có ý nghĩa như trong SvgTemplate.iter_render; hàm trong
+    `replacements` phải khai báo ở cấp module để gửi được sang process khác.
+    """
+    input_svg_path: str
+    output_svg_path: str
+    texts: dict = None
+    images: dict = None
+    replacements: dict = None
+    embed: EmbedOptions = None
+
+    @classmethod
+    def from_complex_data(cls, input_svg_path: str, output_svg_path: str, data: dict,
+                          embed: EmbedOptions = None) -> "SvgRenderJob":
+        """Job tương đương `fill_complex_svg_with_data` (tiêu đề, phụ đề, timeline{i}, photo{i}, biểu đồ)."""
+        # 1. Tiêu đề & phụ đề, 2. timeline
+        texts = {key: data[key] for key in ("title", "subtitle") if key in data}
+        for i, text in enumerate(data.get("timeline", []), start=1):
+            texts[f"timeline{i}"] = text
+        # 3. Ảnh (base64 để độc lập), chèn đúng vị trí rect photo{i}
+        images = {f"photo{i}": img_path for i, img_path in enumerate(data.get("photos", []), start=1)}
+        # 4. (Tuỳ chọn) Vẽ biểu đồ động vào vùng chart
+        return cls(input_svg_path, output_svg_path, texts=texts, images=images, replacements={"chart": _ve_bieu_do},
+                   embed=embed)
+
+
+def _render_svg_job(job: SvgRenderJob) -> dict:
+    """Render một job; lỗi được trả về trong kết quả thay vì ném ra (chạy được trong process worker)."""
+    start = time.perf_counter()
+    stats = {}
+    try:
+        load_svg_template(job.input_svg_path).write(job.output_svg_path, texts=job.texts, images=job.images,
+                                                    replacements=job.replacements, embed=job.embed, stats=stats)
+        result = {"success": True,
+                  "source_image_bytes": stats.get("source_bytes", 0),
+                  "embedded_image_bytes": stats.get("embedded_bytes", 0)}
     except FileNotFoundError as e:
-        print(f"❌ Lỗi: {e}")
+        result = {"error": f"Lỗi: {e}"}
     except Exception as e:
-        print(f"❌ Lỗi khi xử lý SVG: {e}")
+        result = {"error": f"Lỗi khi xử lý SVG: {e}"}
+    result["output_svg_path"] = job.output_svg_path
+    result["latency_seconds"] = time.perf_counter() - start
+    return result
+
+
+def _in_muc_giam(source_bytes: int, embedded_bytes: int, embed: EmbedOptions):
+    if embed is not None and source_bytes:
+        print(f"   Ảnh nhúng ({embed.format}, q={embed.quality}, x{embed.scale:g}): "
+              f"{source_bytes / 1e6:.2f} MB -> {embedded_bytes / 1e6:.2f} MB "
+              f"(giảm {100 * (1 - embedded_bytes / source_bytes):.0f}%)")
+
+
+def render_svg_batch(jobs: list, max_workers: int = None) -> dict:
+    """
+    Render nhiều trang SVG song song trên ProcessPoolExecutor. Mỗi worker giữ cache template đã biên dịch và cache
+    ảnh đã mã hoá base64 (svg_template.encode_image) của riêng nó; các job liền nhau được gửi theo cụm tới cùng một
+    worker nên những trang dùng chung template/ảnh chỉ parse và mã hoá một lần cho mỗi worker.
+
+    Args:
+        jobs (list): Danh sách SvgRenderJob hoặc tuple (input_svg_path, output_svg_path[, texts[, images[, replacements]]]).
+        max_workers (int): Số process tối đa (mặc định bằng số CPU). 1 thì render ngay trong process hiện tại.
+
+    Returns:
+        dict: {"results": [...], "succeeded": int, "failed": int, "total_seconds": float}.
+              `results` giữ đúng thứ tự của `jobs`; mỗi phần tử là {"success": True, "source_image_bytes",
+              "embedded_image_bytes"} hoặc {"error": ...}, kèm "output_svg_path" và "latency_seconds".
+              Thêm "source_image_bytes"/"embedded_image_bytes": tổng số byte ảnh gốc/ảnh đã nhúng của các job thành công.
+    """
+    jobs = [job if isinstance(job, SvgRenderJob) else SvgRenderJob(*job) for job in jobs]
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [_render_svg_job(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_render_svg_job, jobs, chunksize=chunksize))
+    total_seconds = time.perf_counter() - start
+
+    succeeded = sum(1 for result in results if result.get("success"))
+    source_bytes = sum(result.get("source_image_bytes", 0) for result in results)
+    embedded_bytes = sum(result.get("embedded_image_bytes", 0) for result in results)
+    print(f"Hoàn tất lô {len(jobs)} trang SVG trong {total_seconds:.2f}s: {succeeded} thành công, {len(jobs) - succeeded} lỗi.")
+    _in_muc_giam(source_bytes, embedded_bytes, next((job.embed for job in jobs if job.embed is not None), None))
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(jobs) - succeeded,
+        "total_seconds": total_seconds,
+        "source_image_bytes": source_bytes,
+        "embedded_image_bytes": embedded_bytes,
+    }
 
 def edit_image_with_svg_mask(input_svg_text: str, mask_svg_text: str, output_image_path: str, new_color: tuple = (220, 30, 70), width: int = 512, height: int = 512):
     """
     Chuyển đổi SVG thành PNG, sau đó chỉnh sửa một vùng ảnh dựa trên mask SVG và lưu lại.
+    Nhiều vùng/màu trên cùng một ảnh: dùng `edit_image_with_svg_masks` (ảnh gốc chỉ rasterize một lần).
 
     Args:
         input_svg_text (str): Chuỗi SVG cho hình ảnh gốc.
@@ -178,20 +196,31 @@ def edit_image_with_svg_mask(input_svg_text: str, mask_svg_text: str, output_ima
         width (int): Chiều rộng của ảnh.
         height (int): Chiều cao của ảnh.
     """
-    try:
-        input_png_bytes = svg_to_png_bytes(input_svg_text, width, height)
-        mask_png_bytes = svg_to_png_bytes(mask_svg_text, width, height)
+    return edit_image_with_svg_masks(input_svg_text, [(mask_svg_text, new_color)], output_image_path, width, height)
 
-        input_img = Image.open(io.BytesIO(input_png_bytes)).convert("RGB")
-        mask_img = Image.open(io.BytesIO(mask_png_bytes)).convert("L")
+def edit_image_with_svg_masks(input_svg_text: str, edits: list, output_image_path: str, width: int = 512, height: int = 512) -> dict:
+    """
+    Tô nhiều vùng của ảnh SVG trong một lượt (xem svg_mask_editor.SvgMaskEditor) và lưu lại.
 
-        color_layer = Image.new("RGB", input_img.size, new_color)
-        alpha_mask = mask_img.point(lambda p: 255 if p > 128 else 0)
-        edited = Image.composite(color_layer, input_img, alpha_mask)
+    Args:
+        input_svg_text (str): Chuỗi SVG cho hình ảnh gốc.
+        edits (list): Danh sách MaskEdit hoặc tuple (mask, color[, opacity[, feather[, threshold]]]); mask là
+                      chuỗi SVG, mảng (H, W) hoặc hình chữ nhật (x0, y0, x1, y1).
+        output_image_path (str): Đường dẫn để lưu file ảnh đã chỉnh sửa.
+        width (int): Chiều rộng của ảnh.
+        height (int): Chiều cao của ảnh.
+
+    Returns:
+        dict: {"success": True, "output_image_path": ...} hoặc {"error": ...}.
+    """
+    from src.image_processing.svg_mask_editor import SvgMaskEditor
 
-        os.makedirs(os.path.dirname(output_image_path), exist_ok=True)
-        edited.save(output_image_path, quality=95)
+    try:
+        editor = SvgMaskEditor(input_svg_text, width, height)
+        editor.save(editor.apply(edits), output_image_path)
         print(f"✅ Ảnh đã được chỉnh sửa và lưu vào: {output_image_path}")
+        return {"success": True, "output_image_path": output_image_path}
 
     except Exception as e:
         print(f"❌ Lỗi khi chỉnh sửa ảnh với mask SVG: {e}")
+        return {"error": f"Lỗi khi chỉnh sửa ảnh với mask SVG: {e}"}
@@ -0,0 +1,204 @@
+"""
+Tô màu nhiều vùng của một ảnh theo mask, tính toàn bộ trên mảng NumPy.
+
+`edit_image_with_svg_mask` trước đây rasterize cả ảnh gốc lẫn mask ở mỗi lần gọi, lọc ngưỡng mask bằng
+`mask_img.point(lambda p: ...)` (gọi lambda Python cho từng mức xám) và chỉ tô được một vùng, một màu mỗi lần.
+`SvgMaskEditor`:
+
+- rasterize ảnh gốc (SVG) một lần và giữ dạng mảng float32; mọi lần `apply` sau đó dùng lại mảng này;
+- nhận nhiều vùng cùng lúc: mask SVG (rasterize qua svg_rasterizer, có cache theo hash), mảng NumPy (H, W),
+  hoặc hình chữ nhật (x0, y0, x1, y1); alpha của mỗi mask được tính một lần rồi nhớ lại;
+- alpha mềm: `threshold=None` dùng luôn độ xám của mask, `feather` làm mềm mép (blur gần Gaussian bằng ba lần
+  box blur trên tổng tích luỹ);
+- ghép mọi vùng trong một lượt, chỉ trong khung bao chung của các vùng: vùng mép cứng dùng bản đồ chỉ số vùng
+  uint8 + bảng màu; alpha mềm dùng tích luỹ (1 - alpha) phía sau mỗi lớp thay vì lặp qua ảnh cho từng màu.
+
+Ví dụ:
+    editor = SvgMaskEditor(base_svg_text, width=512, height=512)
+    image = editor.apply([MaskEdit(shirt_mask_svg, (220, 30, 70)), MaskEdit((0, 0, 512, 40), (0, 0, 0), opacity=0.5, feather=4)])
+    editor.save(image, "outputs/edited/ao_do.png")
+"""
+import io
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+
+class MaskEdit(NamedTuple):
+    """
+    Một vùng cần tô.
+
+    Attributes:
+        mask: SVG (str), mảng (H, W) (bool, 0-255 hoặc 0-1), hoặc hình chữ nhật (x0, y0, x1, y1) theo pixel.
+        color (tuple): Màu RGB mới.
+        opacity (float): Độ phủ tối đa của màu (0-1).
+        feather (float): Độ mềm của mép vùng (độ lệch chuẩn, pixel); 0 là mép cứng.
+        threshold (int): Ngưỡng độ xám (0-255) để coi là thuộc vùng; None thì dùng độ xám làm alpha mềm.
+    """
+    mask: object
+    color: tuple
+    opacity: float = 1.0
+    feather: float = 0.0
+    threshold: int = 128
+
+
+def _box_blur(alpha: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Trung bình trượt cửa sổ 2*radius+1 dọc một trục bằng tổng tích luỹ (lặp lại giá trị ở biên)."""
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius + 1, radius)
+    cumulative = np.cumsum(np.pad(alpha, pad, mode="edge"), axis=axis, dtype=np.float64)
+    size = alpha.shape[axis]
+    upper = np.take(cumulative, np.arange(2 * radius + 1, 2 * radius + 1 + size), axis=axis)
+    lower = np.take(cumulative, np.arange(0, size), axis=axis)
+    return ((upper - lower) / (2 * radius + 1)).astype(np.float32)
+
+
+def feather_alpha(alpha: np.ndarray, sigma: float) -> np.ndarray:
+    """Làm mềm alpha xấp xỉ Gaussian độ lệch chuẩn `sigma` (ba lần box blur theo mỗi trục)."""
+    radius = max(1, round(sigma - 0.5))
+    for _ in range(3):
+        alpha = _box_blur(_box_blur(alpha, radius, axis=0), radius, axis=1)
+    return alpha
+
+
+class SvgMaskEditor:
+    """
+    Bộ chỉnh sửa cho một ảnh gốc cố định.
+
+    Args:
+        base: Ảnh gốc: SVG (str), mảng (H, W, 3) uint8 hoặc PIL Image.
+        width (int), height (int): Kích thước rasterize khi `base` là SVG.
+        rasterizer: SvgRasterizer dùng để rasterize SVG; mặc định rasterizer dùng chung (get_rasterizer).
+
+    Raises:
+        RasterBackendUnavailable: Khi cần rasterize SVG mà không có backend dùng được.
+    """
+
+    def __init__(self, base, width: int = 512, height: int = 512, rasterizer=None):
+        self.width, self.height = width, height
+        self._rasterizer = rasterizer
+        self._regions = {}  # khoá của mask SVG/hình chữ nhật -> (alpha, khung bao, alpha chỉ gồm 0/1)
+        if isinstance(base, str):
+            base = self._rasterize(base, "RGB")
+        self.base = np.asarray(base.convert("RGB") if hasattr(base, "convert") else base, dtype=np.uint8)
+        if self.base.ndim != 3 or self.base.shape[2] != 3:
+            raise ValueError(f"Ảnh gốc phải có dạng (H, W, 3), nhận được {self.base.shape}")
+        self.height, self.width = self.base.shape[:2]
+
+    def _rasterize(self, svg_text: str, mode: str):
+        from PIL import Image
+
+        if self._rasterizer is None:
+            from src.image_processing.svg_rasterizer import get_rasterizer
+            self._rasterizer = get_rasterizer()
+        png = self._rasterizer.render(svg_text, self.width, self.height)
+        return Image.open(io.BytesIO(png)).convert(mode)
+
+    # --- Alpha của từng vùng --- #
+    def alpha(self, edit: MaskEdit) -> np.ndarray:
+        """Alpha float32 (H, W) trong [0, 1] của vùng (chưa nhân opacity); mask SVG/hình chữ nhật được nhớ lại."""
+        return self._vung(edit)[0]
+
+    def _vung(self, edit: MaskEdit) -> tuple:
+        """(alpha, khung bao (y0, y1, x0, x1) của phần alpha > 0, alpha chỉ gồm 0/1 hay không)."""
+        mask = edit.mask
+        if isinstance(mask, str):
+            key = ("svg", mask, edit.threshold, edit.feather)
+        elif isinstance(mask, tuple) and len(mask) == 4:
+            key = ("rect", mask, edit.feather)
+        else:
+            key = None
+        if key is not None and key in self._regions:
+            return self._regions[key]
+
+        binary = edit.threshold is not None
+        if isinstance(mask, str):
+            alpha = self._alpha_tu_do_xam(np.asarray(self._rasterize(mask, "L")), edit.threshold)
+        elif key is not None:
+            x0, y0, x1, y1 = (int(round(v)) for v in mask)
+            alpha = np.zeros((self.height, self.width), dtype=np.float32)
+            alpha[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = 1.0
+            binary = True
+        else:
+            values = np.asarray(mask)
+            if values.shape != (self.height, self.width):
+                raise ValueError(f"Mask phải có dạng {(self.height, self.width)}, nhận được {values.shape}")
+            if values.dtype == bool:
+                alpha, binary = values.astype(np.float32), True
+            elif values.dtype == np.uint8 or values.max(initial=0) > 1:
+                alpha = self._alpha_tu_do_xam(values, edit.threshold)
+            else:
+                alpha, binary = values.astype(np.float32), False
+
+        if edit.feather > 0:
+            alpha, binary = feather_alpha(alpha, edit.feather), False
+        rows, cols = np.flatnonzero(alpha.any(axis=1)), np.flatnonzero(alpha.any(axis=0))
+        box = (rows[0], rows[-1] + 1, cols[0], cols[-1] + 1) if rows.size else None
+        region = (alpha, box, binary)
+        if key is not None:
+            self._regions[key] = region
+        return region
+
+    @staticmethod
+    def _alpha_tu_do_xam(gray: np.ndarray, threshold: int) -> np.ndarray:
+        if threshold is None:
+            return gray.astype(np.float32) / 255.0
+        return (gray > threshold).astype(np.float32)
+
+    # --- Ghép --- #
+    def apply(self, edits: list) -> np.ndarray:
+        """
+        Tô mọi vùng trong một lượt, theo thứ tự (vùng sau phủ lên vùng trước). Chỉ phần ảnh trong khung bao chung
+        của các vùng được tính lại.
+
+        - Mọi vùng đều mép cứng, phủ kín (opacity 1): mỗi pixel lấy màu của vùng trên cùng chứa nó, dựng bằng một
+          bản đồ chỉ số vùng uint8 rồi tra bảng màu, không cần số thực.
+        - Trường hợp chung: phủ lần lượt `out = out * (1 - a_i) + c_i * a_i` tương đương với
+          `out = base * T_0 + sum_i c_i * a_i * T_{i+1}` trong đó `T_i = prod_{j >= i} (1 - a_j)`, tính cho mọi
+          vùng cùng lúc bằng tích luỹ ngược trên mảng (N, H, W).
+
+        Args:
+            edits (list): Danh sách MaskEdit hoặc tuple (mask, color[, opacity[, feather[, threshold]]]).
+
+        Returns:
+            np.ndarray: Ảnh kết quả (H, W, 3) uint8.
+        """
+        edits = [edit if isinstance(edit, MaskEdit) else MaskEdit(*edit) for edit in edits]
+        regions = [self._vung(edit) for edit in edits]
+        boxes = [box for _, box, _ in regions if box is not None]
+        result = self.base.copy()
+        if not boxes:
+            return result
+        y0, y1 = min(box[0] for box in boxes), max(box[1] for box in boxes)
+        x0, x1 = min(box[2] for box in boxes), max(box[3] for box in boxes)
+        crop = result[y0:y1, x0:x1]
+
+        if len(edits) < 256 and all(binary and edit.opacity >= 1 for (_, _, binary), edit in zip(regions, edits)):
+            labels = np.zeros(crop.shape[:2], dtype=np.uint8)
+            for index, (alpha, box, _) in enumerate(regions, start=1):
+                if box is not None:
+                    labels[alpha[y0:y1, x0:x1] > 0] = index
+            palette = np.asarray([(0, 0, 0)] + [edit.color for edit in edits], dtype=np.uint8)
+            selected = labels > 0
+            crop[selected] = palette[labels[selected]]
+            return result
+
+        alphas = np.stack([alpha[y0:y1, x0:x1] * np.float32(np.clip(edit.opacity, 0.0, 1.0))
+                           for (alpha, _, _), edit in zip(regions, edits)])
+        colors = np.asarray([edit.color for edit in edits], dtype=np.float32)
+        # remaining[i] = T_i: phần còn nhìn thấy của những gì nằm dưới lớp i sau khi phủ lớp i và các lớp trên
+        remaining = np.cumprod((1.0 - alphas)[::-1], axis=0)[::-1]
+        visible = np.empty_like(alphas)
+        visible[:-1] = alphas[:-1] * remaining[1:]
+        visible[-1] = alphas[-1]
+        blended = crop * remaining[0][..., None] + np.tensordot(visible, colors, axes=([0], [0]))
+        crop[...] = np.clip(np.rint(blended), 0, 255).astype(np.uint8)
+        return result
+
+    def save(self, image: np.ndarray, output_image_path: str, quality: int = 95):
+        """Ghi mảng ảnh (H, W, 3) uint8 ra file (định dạng theo đuôi file)."""
+        from PIL import Image
+
+        os.makedirs(os.path.dirname(output_image_path) or ".", exist_ok=True)
+        Image.fromarray(image).save(output_image_path, quality=quality)
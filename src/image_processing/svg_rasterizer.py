@@ -0,0 +1,456 @@
+"""
+Chuyển SVG sang PNG với thông lượng cao.
+
+`svg_to_png_bytes` trước đây import `cairosvg` ở mỗi lần gọi và, khi có bất kỳ lỗi nào, lặng lẽ vẽ một hình người
+que cố định bằng Pillow: vừa chậm vừa sai khi chạy số lượng lớn. `SvgRasterizer`:
+
+- chọn backend một lần (cairosvg, rồi tới CLI rsvg-convert, resvg; hoặc backend tự đăng ký bằng
+  `register_backend`). Không có backend nào dùng được thì ném `RasterBackendUnavailable` kèm lý do của từng
+  backend và ghi log, không bao giờ trả về ảnh giả;
+- giữ sẵn các worker đã nạp backend trong ProcessPoolExecutor (`warm_up`), nhận cả lô SVG;
+- cho chọn kích thước đầu ra (width/height, thiếu một chiều thì giữ tỉ lệ của SVG) và hệ số `scale`;
+- cache PNG theo (hash SVG, kích thước, backend): LRU trong bộ nhớ giới hạn theo số byte, tuỳ chọn thêm thư mục
+  `cache_dir` dùng chung giữa các lần chạy. SVG trùng nhau trong một lô chỉ được rasterize một lần.
+
+Ví dụ:
+    with SvgRasterizer(max_workers=4) as rasterizer:
+        report = rasterizer.render_batch([RasterJob(svg, "outputs/pages/1.png"), ...], scale=2)
+        print(report["pages_per_second"])
+"""
+import collections
+import hashlib
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ORDER = ("cairosvg", "rsvg-convert", "resvg")
+DEFAULT_SIZE = (512, 512)  # Khi SVG không khai báo width/height hay viewBox
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+BACKEND_TIMEOUT_SECONDS = 60
+_WARM_UP_SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="2" height="2"><rect width="2" height="2"/></svg>'
+
+
+class RasterBackendUnavailable(RuntimeError):
+    """Không có backend chuyển SVG sang PNG nào dùng được (hoặc backend được chỉ định không dùng được)."""
+
+
+class RasterBackend(NamedTuple):
+    """Backend đã sẵn sàng: `render(svg_bytes, width, height) -> bytes PNG`."""
+    name: str
+    render: object
+
+
+class RasterJob(NamedTuple):
+    """Một SVG cần rasterize trong lô; `output_path` đặt thì PNG được ghi ra file thay vì trả về trong kết quả."""
+    svg: str
+    output_path: str = None
+    width: int = None
+    height: int = None
+    scale: float = None
+
+
+# --- Backend --- #
+def _cairosvg_backend() -> RasterBackend:
+    import cairosvg  # Ném OSError nếu thiếu thư viện libcairo
+
+    def render(svg_bytes: bytes, width: int, height: int) -> bytes:
+        return cairosvg.svg2png(bytestring=svg_bytes, output_width=width, output_height=height)
+
+    return RasterBackend("cairosvg", render)
+
+
+def _cli_backend(name: str, build_args) -> RasterBackend:
+    exe = shutil.which(name)
+    if exe is None:
+        raise FileNotFoundError(f"không tìm thấy lệnh {name} trong PATH")
+
+    def render(svg_bytes: bytes, width: int, height: int) -> bytes:
+        completed = subprocess.run([exe, *build_args(width, height)], input=svg_bytes, capture_output=True,
+                                   timeout=BACKEND_TIMEOUT_SECONDS)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name} lỗi (mã {completed.returncode}): "
+                               f"{completed.stderr.decode('utf-8', 'replace').strip()}")
+        return completed.stdout
+
+    return RasterBackend(name, render)
+
+
+_BACKEND_FACTORIES = {
+    "cairosvg": _cairosvg_backend,
+    "rsvg-convert": lambda: _cli_backend("rsvg-convert", lambda w, h: ["-f", "png", "-w", str(w), "-h", str(h)]),
+    "resvg": lambda: _cli_backend("resvg", lambda w, h: ["-w", str(w), "-h", str(h), "-", "-c"]),
+}
+
+
+def register_backend(name: str, factory, first: bool = True):
+    """
+    Đăng ký backend mới. `factory()` trả về RasterBackend hoặc ném lỗi nếu backend không dùng được trên máy này.
+    Backend mới được thử trước các backend sẵn có nếu `first`. Worker của process pool tìm backend theo tên,
+    nên cần đăng ký ở cấp module (trước khi tạo SvgRasterizer).
+    """
+    global BACKEND_ORDER
+    _BACKEND_FACTORIES[name] = factory
+    order = [backend for backend in BACKEND_ORDER if backend != name]
+    BACKEND_ORDER = tuple([name, *order] if first else [*order, name])
+    reset_backends()
+
+
+_resolved = {}  # tên backend yêu cầu (None: tự chọn) -> RasterBackend hoặc RasterBackendUnavailable
+_resolved_lock = threading.Lock()
+
+
+def reset_backends():
+    """Quên kết quả dò backend đã nhớ (kể cả lỗi), ví dụ sau khi cài libcairo/resvg mà không khởi động lại process."""
+    with _resolved_lock:
+        _resolved.clear()
+
+
+def resolve_backend(name: str = None) -> RasterBackend:
+    """
+    Backend dùng được đầu tiên theo BACKEND_ORDER (hoặc đúng backend `name`). Kết quả, kể cả khi thất bại, được nhớ
+    cho cả process: không import lại / dò lại PATH ở mỗi lần gọi (gọi `reset_backends` để dò lại).
+
+    Raises:
+        RasterBackendUnavailable: Kèm lý do từng backend đã thử không dùng được.
+    """
+    with _resolved_lock:
+        if name not in _resolved:
+            _resolved[name] = _chon_backend(name)
+        outcome = _resolved[name]
+    if isinstance(outcome, RasterBackendUnavailable):
+        raise RasterBackendUnavailable(str(outcome))
+    return outcome
+
+
+def _chon_backend(name: str):
+    names = (name,) if name else BACKEND_ORDER
+    failures = []
+    for candidate in names:
+        factory = _BACKEND_FACTORIES.get(candidate)
+        if factory is None:
+            failures.append(f"{candidate}: backend không tồn tại")
+            continue
+        try:
+            backend = factory()
+            backend.render(_WARM_UP_SVG, 2, 2)
+        except Exception as e:
+            reason = str(e).strip().splitlines()[0] if str(e).strip() else ""
+            failures.append(f"{candidate}: {type(e).__name__}: {reason}")
+            continue
+        logger.info("Backend chuyển SVG sang PNG: %s", backend.name)
+        return backend
+    message = "Không có backend chuyển SVG sang PNG nào dùng được (" + "; ".join(failures) + ")"
+    logger.error(message)
+    return RasterBackendUnavailable(message)
+
+
+# --- Kích thước đầu ra --- #
+def _do_dai(value: str):
+    match = re.match(r"\s*([0-9.]+)\s*(px)?\s*$", value or "")
+    return float(match.group(1)) if match else None
+
+
+def kich_thuoc_svg(svg_bytes: bytes) -> tuple:
+    """
+    Kích thước nội tại (rộng, cao) theo width/height của thẻ gốc, hoặc theo viewBox; mặc định DEFAULT_SIZE.
+    Chỉ parse tới thẻ mở của phần tử gốc.
+    """
+    try:
+        root = next(ET.iterparse(io.BytesIO(svg_bytes), events=("start",)))[1]
+    except (ET.ParseError, StopIteration):
+        return DEFAULT_SIZE
+    width, height = _do_dai(root.get("width")), _do_dai(root.get("height"))
+    view_box = (root.get("viewBox") or "").replace(",", " ").split()
+    if len(view_box) == 4:
+        box_width, box_height = float(view_box[2]), float(view_box[3])
+        if width is None and height is None:
+            width, height = box_width, box_height
+        elif width is None and box_height:
+            width = height * box_width / box_height
+        elif height is None and box_width:
+            height = width * box_height / box_width
+    if not width or not height:
+        return DEFAULT_SIZE
+    return width, height
+
+
+def output_size(svg_bytes: bytes, width: int = None, height: int = None, scale: float = 1.0) -> tuple:
+    """Kích thước pixel đầu ra: thiếu width hoặc height thì giữ tỉ lệ của SVG; nhân với `scale`."""
+    if width is None or height is None:
+        intrinsic_width, intrinsic_height = kich_thuoc_svg(svg_bytes)
+        if width is None and height is None:
+            width, height = intrinsic_width, intrinsic_height
+        elif width is None:
+            width = height * intrinsic_width / intrinsic_height
+        else:
+            height = width * intrinsic_height / intrinsic_width
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# --- Worker của process pool --- #
+_worker_backend = None
+
+
+def _khoi_tao_worker(backend_name: str):
+    global _worker_backend
+    _worker_backend = resolve_backend(backend_name)
+
+
+def _raster_trong_worker(svg_bytes: bytes, width: int, height: int) -> bytes:
+    return _worker_backend.render(svg_bytes, width, height)
+
+
+def _cho_worker_san_sang() -> int:
+    return os.getpid()
+
+
+class SvgRasterizer:
+    """
+    Dịch vụ chuyển SVG sang PNG: backend chọn một lần, worker giữ nóng trong process pool, cache theo hash SVG.
+
+    Args:
+        backend (str): Tên backend bắt buộc dùng; mặc định backend dùng được đầu tiên theo BACKEND_ORDER.
+        max_workers (int): Số process rasterize (mặc định bằng số CPU). 1 thì rasterize ngay trong process hiện tại.
+        cache_bytes (int): Giới hạn tổng số byte PNG giữ trong cache bộ nhớ (0 để tắt).
+        cache_dir (str): Nếu đặt, PNG còn được lưu ra thư mục này và dùng lại giữa các lần chạy.
+
+    Raises:
+        RasterBackendUnavailable: Ngay khi khởi tạo nếu không có backend dùng được.
+    """
+
+    def __init__(self, backend: str = None, max_workers: int = None, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 cache_dir: str = None):
+        self.backend = resolve_backend(backend)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_bytes = cache_bytes
+        self.cache_dir = cache_dir
+        self._cache = collections.OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    # --- Process pool --- #
+    def _pool(self):
+        if self.max_workers <= 1:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_khoi_tao_worker,
+                                                     initargs=(self.backend.name,))
+            return self._executor
+
+    def warm_up(self) -> int:
+        """Khởi động trước mọi worker (mỗi worker nạp backend một lần); trả về số process đã sẵn sàng."""
+        pool = self._pool()
+        if pool is None:
+            return 1
+        futures = [pool.submit(_cho_worker_san_sang) for _ in range(self.max_workers * 2)]
+        return len({future.result() for future in futures})
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    # --- Cache --- #
+    def _khoa(self, svg_bytes: bytes, size: tuple) -> str:
+        digest = hashlib.sha256(svg_bytes).hexdigest()
+        return f"{digest}_{size[0]}x{size[1]}_{self.backend.name}"
+
+    def _lay_cache(self, key: str):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.png")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    png = f.read()
+                self._luu_bo_nho(key, png)
+                return png
+        return None
+
+    def _luu_bo_nho(self, key: str, png: bytes):
+        if len(png) > self.cache_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = png
+            self._cached_bytes += len(png)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def _luu_cache(self, key: str, png: bytes):
+        self._luu_bo_nho(key, png)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, f"{key}.png")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+
+    # --- Rasterize --- #
+    def render(self, svg_text, width: int = None, height: int = None, scale: float = 1.0) -> bytes:
+        """
+        Rasterize một SVG ngay trong process hiện tại (có cache).
+
+        Args:
+            svg_text (str | bytes): Nội dung SVG.
+            width (int), height (int): Kích thước đầu ra; thiếu một chiều thì giữ tỉ lệ của SVG.
+            scale (float): Hệ số nhân kích thước (ví dụ 2 cho màn hình HiDPI).
+
+        Returns:
+            bytes: Ảnh PNG.
+        """
+        svg_bytes = svg_text.encode("utf-8") if isinstance(svg_text, str) else svg_text
+        size = output_size(svg_bytes, width, height, scale)
+        key = self._khoa(svg_bytes, size)
+        png = self._lay_cache(key)
+        if png is None:
+            png = self.backend.render(svg_bytes, *size)
+            self._luu_cache(key, png)
+        return png
+
+    def render_batch(self, jobs: list, width: int = None, height: int = None, scale: float = 1.0) -> dict:
+        """
+        Rasterize cả lô trên các worker của process pool. SVG đã có trong cache hoặc trùng nhau trong lô chỉ
+        được rasterize một lần; lỗi của từng SVG được trả về trong kết quả, không làm hỏng cả lô.
+
+        Args:
+            jobs (list): Danh sách RasterJob, chuỗi SVG, hoặc tuple (svg, output_path[, width[, height[, scale]]]).
+            width (int), height (int), scale (float): Giá trị mặc định cho các job không tự đặt.
+
+        Returns:
+            dict: {"results": [...], "succeeded", "failed", "cache_hits", "total_seconds", "pages_per_second"}.
+                  `results` giữ đúng thứ tự của `jobs`; mỗi phần tử là {"success": True, "png"/"output_path",
+                  "width", "height", "cached"} hoặc {"error": ...}.
+        """
+        start = time.perf_counter()
+        jobs = [RasterJob(job) if isinstance(job, (str, bytes)) else
+                job if isinstance(job, RasterJob) else RasterJob(*job) for job in jobs]
+
+        plans, pending = [], {}
+        for job in jobs:
+            svg_bytes = job.svg.encode("utf-8") if isinstance(job.svg, str) else job.svg
+            size = output_size(svg_bytes, job.width if job.width is not None else width,
+                               job.height if job.height is not None else height,
+                               job.scale if job.scale is not None else scale)
+            key = self._khoa(svg_bytes, size)
+            png = self._lay_cache(key)
+            plans.append((job, key, size, png))
+            if png is None and key not in pending:
+                pending[key] = (svg_bytes, size)
+
+        rendered = self._rasterize(pending)
+        results = []
+        for job, key, size, png in plans:
+            cached = png is not None
+            outcome = png if cached else rendered[key]
+            if isinstance(outcome, Exception):
+                results.append({"error": f"Lỗi khi chuyển SVG sang PNG: {outcome}"})
+                continue
+            result = {"success": True, "width": size[0], "height": size[1], "cached": cached}
+            if job.output_path:
+                try:
+                    os.makedirs(os.path.dirname(job.output_path) or ".", exist_ok=True)
+                    with open(job.output_path, "wb") as f:
+                        f.write(outcome)
+                except OSError as e:
+                    results.append({"error": f"Lỗi khi ghi file PNG: {e}", "output_path": job.output_path})
+                    continue
+                result["output_path"] = job.output_path
+            else:
+                result["png"] = outcome
+            results.append(result)
+
+        total_seconds = time.perf_counter() - start
+        succeeded = sum(1 for result in results if result.get("success"))
+        cache_hits = sum(1 for result in results if result.get("cached"))
+        pages_per_second = len(jobs) / total_seconds if total_seconds > 0 else 0.0
+        print(f"Hoàn tất lô {len(jobs)} SVG -> PNG ({self.backend.name}) trong {total_seconds:.2f}s: "
+              f"{succeeded} thành công, {len(jobs) - succeeded} lỗi, {cache_hits} từ cache, "
+              f"{pages_per_second:.1f} trang/s.")
+        return {
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(jobs) - succeeded,
+            "cache_hits": cache_hits,
+            "total_seconds": total_seconds,
+            "pages_per_second": pages_per_second,
+        }
+
+    def _rasterize(self, pending: dict) -> dict:
+        """key -> bytes PNG hoặc Exception của SVG đó."""
+        outcomes = {}
+        pool = self._pool() if len(pending) > 1 else None
+        if pool is None:
+            for key, (svg_bytes, size) in pending.items():
+                try:
+                    outcomes[key] = self.backend.render(svg_bytes, *size)
+                except Exception as e:
+                    outcomes[key] = e
+        else:
+            futures = {key: pool.submit(_raster_trong_worker, svg_bytes, *size)
+                       for key, (svg_bytes, size) in pending.items()}
+            for key, future in futures.items():
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    outcomes[key] = e
+        for key, outcome in outcomes.items():
+            if isinstance(outcome, Exception):
+                logger.warning("Không chuyển được SVG %s sang PNG: %s", key[:12], outcome)
+            else:
+                self._luu_cache(key, outcome)
+        return outcomes
+
+
+# --- Rasterizer dùng chung --- #
+_default_rasterizer = None
+_default_rasterizer_lock = threading.Lock()
+
+
+def get_rasterizer() -> SvgRasterizer:
+    """
+    Trả về rasterizer dùng chung, tạo lười (lazy) ở lần gọi đầu tiên.
+
+    Raises:
+        RasterBackendUnavailable: Khi không có backend dùng được. Lỗi được nhớ (xem `resolve_backend`): các lần gọi
+            sau ném lại cùng lỗi mà không dò lại, cho tới khi gọi `reset_backends()` hoặc `register_backend()`.
+    """
+    global _default_rasterizer
+    if _default_rasterizer is None:
+        with _default_rasterizer_lock:
+            if _default_rasterizer is None:
+                _default_rasterizer = SvgRasterizer()
+    return _default_rasterizer
+
+
+def set_rasterizer(rasterizer: SvgRasterizer):
+    """Thay rasterizer dùng chung. Rasterizer cũ sẽ được đóng."""
+    global _default_rasterizer
+    with _default_rasterizer_lock:
+        old_rasterizer, _default_rasterizer = _default_rasterizer, rasterizer
+    if old_rasterizer is not None and old_rasterizer is not rasterizer:
+        old_rasterizer.close()
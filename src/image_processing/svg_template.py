@@ -0,0 +1,416 @@
+"""
+Template SVG biên dịch một lần, render nhiều lần.
+
+`fill_svg_with_content` / `fill_complex_svg_with_data` trước đây `ET.parse` lại template ở mỗi lần gọi và quét
+`root.findall(".//text")`, `.//rect` cho từng mục timeline, từng ảnh: điền một template tốn O(số slot x số node),
+chưa kể serialize cả cây. Với hàng nghìn biến thể infographic, `SvgTemplate`:
+
+- parse template một lần, đánh chỉ mục mọi placeholder: phần tử có `id` (thay cả phần tử, ví dụ rect -> ảnh,
+  rect -> biểu đồ) và nội dung của `<text>` (theo `id` hoặc theo chính nội dung, ví dụ "PLACEHOLDER_TITLE");
+- serialize cây một lần thành danh sách đoạn tĩnh xen kẽ điểm đánh dấu của slot;
+- mỗi lần render chỉ nối các đoạn tĩnh với giá trị mới (đã escape), không sao chép hay serialize lại cây.
+
+Ảnh nhúng được mã hoá base64 qua `encode_image`: nhớ đệm LRU theo (đường dẫn, mtime, kích thước) và phát hiện kiểu
+MIME từ chữ ký file, nên nhiều trang dùng chung ảnh chỉ đọc/mã hoá ảnh một lần. Với `embed=EmbedOptions(...)`, ảnh
+được thu nhỏ về kích thước rect x hệ số DPI và mã hoá lại (WebP/JPEG/PNG) trước khi nhúng: ảnh 777x518 vào ô 300x200
+không còn mang theo toàn bộ độ phân giải gốc.
+
+Ví dụ:
+    template = load_svg_template("data/svg_templates/complex.svg")
+    svg_text = template.render(texts={"title": "80 năm", "timeline1": "1945"},
+                               images={"photo1": "data/images/1.jpg"})
+    template.write("outputs/generated_svgs/page.svg", texts=..., images=...)
+"""
+import base64
+import collections
+import functools
+import hashlib
+import io
+import math
+import mimetypes
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import NamedTuple
+from xml.sax.saxutils import escape, quoteattr
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_DECLARATION = "<?xml version='1.0' encoding='utf-8'?>\n"
+IMAGE_CACHE_SIZE = 64  # Số ảnh đã mã hoá base64 giữ trong bộ nhớ (mỗi process)
+
+# Chữ ký đầu file -> kiểu MIME
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+# Serialize SVG với namespace mặc định (<svg xmlns=...>) thay vì tiền tố ns0:
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+# Loại đoạn trong template đã biên dịch
+_STATIC, _BEGIN, _END, _TEXT = range(4)
+
+
+def _ten_cuc_bo(name: str) -> str:
+    return name.rsplit("}", 1)[-1]
+
+
+def doan_mime_anh(header: bytes, image_path: str = "") -> str:
+    """Kiểu MIME của ảnh theo chữ ký đầu file; không nhận ra thì đoán theo đuôi file (mặc định image/png)."""
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.lstrip()[:5] in (b"<?xml", b"<svg "):
+        return "image/svg+xml"
+    return mimetypes.guess_type(image_path)[0] or "image/png"
+
+
+@functools.lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def _ma_hoa_anh(image_path: str, mtime_ns: int, size: int) -> tuple:
+    with open(image_path, "rb") as img_file:
+        data = img_file.read()
+    return doan_mime_anh(data[:16], image_path), base64.b64encode(data).decode()
+
+
+def encode_image(image_path: str) -> tuple:
+    """
+    Mã hoá base64 một file ảnh, có nhớ đệm LRU theo (đường dẫn, mtime, kích thước): nhiều trang nhúng cùng một ảnh
+    chỉ đọc và mã hoá ảnh đó một lần; sửa file thì mã hoá lại.
+
+    Returns:
+        tuple: (kiểu MIME phát hiện từ nội dung file, dữ liệu base64).
+
+    Raises:
+        FileNotFoundError: Khi file ảnh không tồn tại.
+    """
+    try:
+        stat = os.stat(image_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File ảnh không tồn tại: {image_path}") from None
+    return _ma_hoa_anh(os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+
+
+# --- Thu nhỏ/mã hoá lại ảnh trước khi nhúng --- #
+class EmbedOptions(NamedTuple):
+    """
+    Tuỳ chọn thu nhỏ ảnh trước khi nhúng.
+
+    Attributes:
+        format (str): "webp", "jpeg" hoặc "png".
+        quality (int): Chất lượng mã hoá (1-100) cho WebP/JPEG.
+        scale (float): Hệ số DPI: ảnh được thu nhỏ để vừa khung (width x scale, height x scale) của rect.
+        cache_dir (str): Nếu đặt, ảnh đã thu nhỏ được lưu ra thư mục này để dùng lại giữa các process và lần chạy.
+    """
+    format: str = "webp"
+    quality: int = 80
+    scale: float = 2.0
+    cache_dir: str = None
+
+
+# format -> (tên định dạng của Pillow, kiểu MIME, đuôi file)
+_EMBED_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+}
+_RESIZE_CACHE = collections.OrderedDict()
+_RESIZE_CACHE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=IMAGE_CACHE_SIZE * 4)
+def _bam_anh(image_path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as img_file:
+        for block in iter(lambda: img_file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _kich_thuoc_dich(attrs: dict, scale: float):
+    """Khung pixel (rộng, cao) của rect x scale; None nếu rect không có kích thước tuyệt đối (ví dụ "100%")."""
+    try:
+        width, height = float(attrs["width"]), float(attrs["height"])
+    except (KeyError, ValueError):
+        return None
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def _ma_hoa_lai(image_path: str, box: tuple, options: EmbedOptions) -> bytes:
+    from PIL import Image, ImageOps
+
+    pil_format = _EMBED_FORMATS[options.format][0]
+    with Image.open(image_path) as img:
+        # JPEG: giải mã thẳng ở độ phân giải gần khung đích thay vì giải mã cả ảnh rồi mới thu nhỏ
+        img.draft(None, box)
+        img = ImageOps.exif_transpose(img)
+        # Giữ tỉ lệ như preserveAspectRatio mặc định (xMidYMid meet) của <image>; không phóng to
+        img.thumbnail(box, Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        buf = io.BytesIO()
+        if pil_format == "PNG":
+            img.save(buf, format=pil_format, optimize=True)
+        else:
+            img.save(buf, format=pil_format, quality=options.quality)
+    return buf.getvalue()
+
+
+def embed_resized_image(image_path: str, attrs: dict, options: EmbedOptions) -> tuple:
+    """
+    Ảnh đã thu nhỏ vừa rect (`attrs`) và mã hoá lại theo `options`, có cache theo
+    (hash nội dung ảnh gốc, kích thước đích, định dạng, chất lượng). Nếu bản mã hoá lại không nhỏ hơn file gốc,
+    hoặc rect không có kích thước tuyệt đối, ảnh gốc được nhúng nguyên vẹn.
+
+    Returns:
+        tuple: (kiểu MIME, dữ liệu base64, số byte ảnh gốc, số byte ảnh được nhúng).
+
+    Raises:
+        FileNotFoundError: Khi file ảnh không tồn tại.
+        ValueError: Khi `options.format` không được hỗ trợ.
+    """
+    if options.format not in _EMBED_FORMATS:
+        raise ValueError(f"Định dạng nhúng không hỗ trợ: {options.format} (chọn một trong {', '.join(_EMBED_FORMATS)})")
+    try:
+        stat = os.stat(image_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File ảnh không tồn tại: {image_path}") from None
+    box = _kich_thuoc_dich(attrs, options.scale)
+    if box is None:
+        return (*encode_image(image_path), stat.st_size, stat.st_size)
+
+    source_hash = _bam_anh(os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+    key = (source_hash, box, options.format, options.quality)
+    with _RESIZE_CACHE_LOCK:
+        if key in _RESIZE_CACHE:
+            _RESIZE_CACHE.move_to_end(key)
+            return _RESIZE_CACHE[key]
+
+    _, mime_type, extension = _EMBED_FORMATS[options.format]
+    cache_path = None
+    data = None
+    if options.cache_dir:
+        cache_path = os.path.join(options.cache_dir,
+                                  f"{source_hash[:32]}_{box[0]}x{box[1]}_q{options.quality}.{extension}")
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                data = f.read()
+    if data is None:
+        data = _ma_hoa_lai(image_path, box, options)
+        if cache_path:
+            os.makedirs(options.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+
+    if len(data) < stat.st_size:
+        value = (mime_type, base64.b64encode(data).decode(), stat.st_size, len(data))
+    else:
+        value = (*encode_image(image_path), stat.st_size, stat.st_size)
+    with _RESIZE_CACHE_LOCK:
+        _RESIZE_CACHE[key] = value
+        while len(_RESIZE_CACHE) > IMAGE_CACHE_SIZE:
+            _RESIZE_CACHE.popitem(last=False)
+    return value
+
+
+def image_fragment(attrs: dict, image_path: str, mime_type: str = None, embed: EmbedOptions = None,
+                   stats: dict = None) -> str:
+    """
+    Thẻ `<image>` nhúng ảnh base64 với cùng vị trí/kích thước (x, y, width, height) của phần tử bị thay.
+    `mime_type` mặc định được phát hiện từ nội dung file (JPEG được ghi là image/jpeg, không phải image/png).
+    Có `embed` thì ảnh được thu nhỏ/mã hoá lại trước (xem `embed_resized_image`); `stats` (nếu có) được cộng dồn
+    "images", "source_bytes", "embedded_bytes".
+
+    Raises:
+        FileNotFoundError: Khi file ảnh không tồn tại.
+    """
+    if embed is None:
+        detected_mime, img_data = encode_image(image_path)
+        source_bytes = embedded_bytes = os.path.getsize(image_path) if stats is not None else 0
+    else:
+        detected_mime, img_data, source_bytes, embedded_bytes = embed_resized_image(image_path, attrs, embed)
+    if stats is not None:
+        stats["images"] = stats.get("images", 0) + 1
+        stats["source_bytes"] = stats.get("source_bytes", 0) + source_bytes
+        stats["embedded_bytes"] = stats.get("embedded_bytes", 0) + embedded_bytes
+    geometry = "".join(f" {name}={quoteattr(attrs[name])}" for name in ("x", "y", "width", "height") if name in attrs)
+    return f'<image{geometry} xlink:href="data:{mime_type or detected_mime};base64,{img_data}" />'
+
+
+class SvgTemplate:
+    """
+    Template SVG đã biên dịch. An toàn khi render đồng thời từ nhiều thread (không có trạng thái thay đổi).
+
+    Args:
+        root (ET.Element): Phần tử gốc của template (bị sửa trong lúc biên dịch, không dùng lại được).
+
+    Attributes:
+        element_slots (dict): id -> danh sách chỉ số slot phần tử (thay cả phần tử).
+        text_slots (dict): id hoặc nội dung text (đã strip) -> danh sách chỉ số slot nội dung text.
+    """
+
+    def __init__(self, root: ET.Element):
+        token = f"slot{os.urandom(6).hex()}"
+        self.element_slots = {}
+        self.text_slots = {}
+        self._element_attrs = []
+        self._text_defaults = []
+
+        parents = {child: parent for parent in root.iter() for child in parent}
+        for elem in list(root.iter()):
+            elem_id = elem.get("id")
+            if elem_id and elem is not root:
+                self._danh_dau_phan_tu(elem, parents[elem], elem_id, token)
+            if _ten_cuc_bo(elem.tag) == "text":
+                self._danh_dau_text(elem, elem_id, token)
+
+        text = ET.tostring(root, encoding="unicode")
+        # Ảnh nhúng dùng xlink:href, nên gốc phải khai báo namespace xlink
+        root_start = text[:text.index(">")]
+        if "xmlns:xlink=" not in root_start:
+            text = f'{root_start} xmlns:xlink="{XLINK_NS}"{text[len(root_start):]}'
+        self._ops = self._bien_dich(XML_DECLARATION + text, token)
+
+    @classmethod
+    def from_file(cls, svg_path: str) -> "SvgTemplate":
+        return cls(ET.parse(svg_path).getroot())
+
+    @classmethod
+    def from_string(cls, svg_text: str) -> "SvgTemplate":
+        return cls(ET.fromstring(svg_text))
+
+    # --- Biên dịch --- #
+    def _danh_dau_phan_tu(self, elem: ET.Element, parent: ET.Element, elem_id: str, token: str):
+        # Điểm bắt đầu nằm ở cuối text/tail ngay trước phần tử, điểm kết thúc ở đầu tail của nó
+        index = len(self._element_attrs)
+        self._element_attrs.append({_ten_cuc_bo(k): v for k, v in elem.attrib.items()})
+        self.element_slots.setdefault(elem_id, []).append(index)
+        position = list(parent).index(elem)
+        begin = f"@@{token}:B{index}@@"
+        if position == 0:
+            parent.text = (parent.text or "") + begin
+        else:
+            previous = parent[position - 1]
+            previous.tail = (previous.tail or "") + begin
+        elem.tail = f"@@{token}:E{index}@@" + (elem.tail or "")
+
+    def _danh_dau_text(self, elem: ET.Element, elem_id: str, token: str):
+        index = len(self._text_defaults)
+        original = elem.text or ""
+        self._text_defaults.append(escape(original))
+        for key in {elem_id, original.strip()} - {None, ""}:
+            self.text_slots.setdefault(key, []).append(index)
+        elem.text = f"@@{token}:T{index}@@"
+
+    @staticmethod
+    def _bien_dich(text: str, token: str) -> list:
+        """Danh sách (loại, giá trị, vị trí nhảy): nhảy từ điểm bắt đầu tới ngay sau điểm kết thúc khi thay phần tử."""
+        ops = []
+        begins = {}
+        parts = re.split(rf"@@{token}:([BET])(\d+)@@", text)
+        for i, part in enumerate(parts):
+            if i % 3 == 0:
+                if part:
+                    ops.append([_STATIC, part, None])
+            elif i % 3 == 1:
+                kind, index = part, int(parts[i + 1])
+                if kind == "B":
+                    begins[index] = len(ops)
+                    ops.append([_BEGIN, index, None])
+                elif kind == "E":
+                    ops[begins[index]][2] = len(ops) + 1
+                    ops.append([_END, index, None])
+                else:
+                    ops.append([_TEXT, index, None])
+        return [tuple(op) for op in ops]
+
+    # --- Render --- #
+    def _gan_gia_tri(self, texts: dict, images: dict, replacements: dict, image_mime_type: str,
+                     embed: EmbedOptions, stats: dict):
+        text_values = {}
+        for key, value in (texts or {}).items():
+            for index in self.text_slots.get(key, ()):
+                text_values[index] = escape(str(value))
+        element_values = {}
+        for key, fragment in (replacements or {}).items():
+            for index in self.element_slots.get(key, ()):
+                element_values[index] = fragment
+        for key, image_path in (images or {}).items():
+            for index in self.element_slots.get(key, ()):
+                element_values[index] = functools.partial(image_fragment, image_path=image_path,
+                                                          mime_type=image_mime_type, embed=embed, stats=stats)
+        return text_values, element_values
+
+    def iter_render(self, texts: dict = None, images: dict = None, replacements: dict = None,
+                    image_mime_type: str = None, embed: EmbedOptions = None, stats: dict = None):
+        """
+        Sinh lần lượt các đoạn của tài liệu SVG đã điền dữ liệu. Khoá không có trong template bị bỏ qua.
+
+        Args:
+            texts (dict): id hoặc nội dung text gốc (ví dụ "PLACEHOLDER_TITLE") -> nội dung mới.
+            images (dict): id của phần tử (thường là rect) -> đường dẫn ảnh, nhúng base64 đúng vị trí rect.
+            replacements (dict): id -> đoạn SVG (str) hoặc hàm nhận thuộc tính của phần tử gốc và trả về đoạn SVG.
+            image_mime_type (str): Kiểu MIME ghi vào data URL của ảnh; mặc định phát hiện từ nội dung file.
+            embed (EmbedOptions): Nếu đặt, thu nhỏ/mã hoá lại ảnh vừa kích thước rect trước khi nhúng.
+            stats (dict): Nếu đặt, được cộng dồn số ảnh và số byte ảnh gốc/ảnh nhúng ("images", "source_bytes",
+                          "embedded_bytes").
+        """
+        text_values, element_values = self._gan_gia_tri(texts, images, replacements, image_mime_type, embed, stats)
+        ops = self._ops
+        position, end = 0, len(ops)
+        while position < end:
+            kind, value, jump = ops[position]
+            position += 1
+            if kind == _STATIC:
+                yield value
+            elif kind == _TEXT:
+                yield text_values.get(value, self._text_defaults[value])
+            elif kind == _BEGIN and value in element_values:
+                fragment = element_values[value]
+                yield fragment(self._element_attrs[value]) if callable(fragment) else fragment
+                position = jump
+
+    def render(self, texts: dict = None, images: dict = None, replacements: dict = None,
+               image_mime_type: str = None, embed: EmbedOptions = None, stats: dict = None) -> str:
+        """Trả về tài liệu SVG (str) đã điền dữ liệu; tham số giống `iter_render`."""
+        return "".join(self.iter_render(texts, images, replacements, image_mime_type, embed, stats))
+
+    def write(self, output_svg_path: str, texts: dict = None, images: dict = None, replacements: dict = None,
+              image_mime_type: str = None, embed: EmbedOptions = None, stats: dict = None):
+        """
+        Ghi tài liệu đã điền dữ liệu ra file theo từng đoạn (không ghép cả tài liệu trong bộ nhớ).
+        Ghi vào file tạm rồi đổi tên, nên khi lỗi (ví dụ thiếu ảnh) không để lại file SVG dở dang.
+        """
+        os.makedirs(os.path.dirname(output_svg_path) or ".", exist_ok=True)
+        tmp_path = f"{output_svg_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for piece in self.iter_render(texts, images, replacements, image_mime_type, embed, stats):
+                    f.write(piece)
+            os.replace(tmp_path, output_svg_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+@functools.lru_cache(maxsize=64)
+def _nap_template(svg_path: str, mtime_ns: int, size: int) -> SvgTemplate:
+    return SvgTemplate.from_file(svg_path)
+
+
+def load_svg_template(svg_path: str) -> SvgTemplate:
+    """Template đã biên dịch của file SVG; được cache theo (đường dẫn, mtime, kích thước), sửa file thì biên dịch lại."""
+    stat = os.stat(svg_path)
+    return _nap_template(os.path.abspath(svg_path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,288 @@
+"""
+Pipeline tạo video dài từ nhiều clip Veo 8 giây nối tiếp nhau (xem src/tasks/videos_gen/sinh_video_dai.md).
+
+Mỗi clip có thể "nối tiếp" một clip khác (`depends_on`): khung hình cuối của clip cha được dùng làm ảnh đầu vào
+cho clip con, nên chuyển cảnh liền mạch. Các clip không phụ thuộc nhau (ví dụ các cảnh khác nhau) được tạo
+song song, chỉ các clip trong cùng một chuỗi mới phải chờ nhau:
+
+    scenes = [
+        ["Cinematic shot of a neon city at night, rain reflections", "The camera moves forward into an alley"],
+        ["Sunrise over Ha Long Bay, drone shot", "The boat sails between limestone islands"],
+    ]
+    report = build_long_video(scenes_to_clips(scenes), "outputs/long_video/final.mp4")
+
+Trạng thái được lưu trong `work_dir` (mặc định cạnh file đầu ra): chạy lại sẽ bỏ qua các clip đã tải về,
+tiếp tục theo dõi các clip đang tạo, và chỉ nối lại khi danh sách clip thay đổi. Các clip được nối bằng
+ffmpeg concat demuxer (`-c copy`): dữ liệu được đọc và ghi tuần tự, không nạp clip nào vào bộ nhớ.
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+from typing import NamedTuple
+
+from src.audio_processing.pcm_encoder import ffmpeg_exe
+from src.video_processing.video_job_orchestrator import STATUS_DOWNLOADED, VideoJobOrchestrator, VideoJobSpec
+
+
+class ClipSpec(NamedTuple):
+    """
+    Một clip trong video dài. Thứ tự trong danh sách truyền vào build_long_video là thứ tự khi nối.
+
+    `depends_on` là clip_id của clip đứng trước trong cùng chuỗi; `image_path` là ảnh đầu vào cho clip
+    mở đầu một chuỗi (bỏ qua nếu có depends_on).
+    """
+    clip_id: str
+    prompt: str
+    depends_on: str = None
+    image_path: str = None
+    model: str = "veo-3.0-generate-001"
+    negative_prompt: str = None
+    aspect_ratio: str = "16:9"
+    resolution: str = None
+    person_generation: str = None
+
+
+def scenes_to_clips(scenes: list, **clip_kwargs) -> list:
+    """
+    Chuyển danh sách cảnh (mỗi cảnh là danh sách prompt) thành ClipSpec: các clip trong một cảnh nối tiếp nhau,
+    các cảnh độc lập với nhau. clip_id có dạng "canh_01_clip_02".
+    """
+    clips = []
+    for scene_idx, prompts in enumerate(scenes, start=1):
+        previous = None
+        for clip_idx, prompt in enumerate(prompts, start=1):
+            clip_id = f"canh_{scene_idx:02d}_clip_{clip_idx:02d}"
+            clips.append(ClipSpec(clip_id, prompt, depends_on=previous, **clip_kwargs))
+            previous = clip_id
+    return clips
+
+
+# --- ffmpeg --- #
+async def _chay_ffmpeg(*args: str):
+    process = await asyncio.create_subprocess_exec(
+        ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", *args,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg lỗi (mã {process.returncode}): {stderr.decode(errors='replace').strip()}")
+
+
+async def trich_xuat_khung_hinh_cuoi(video_path: str, image_path: str, tail_seconds: float = 0.5):
+    """
+    Lưu khung hình cuối của video ra file ảnh. Chỉ giải mã `tail_seconds` cuối video (-sseof) thay vì cả clip.
+    """
+    os.makedirs(os.path.dirname(image_path) or ".", exist_ok=True)
+    await _chay_ffmpeg("-sseof", f"-{tail_seconds}", "-i", video_path, "-update", "1", "-q:v", "1", image_path)
+    if not os.path.exists(image_path):
+        raise RuntimeError(f"Không trích xuất được khung hình cuối của {video_path}")
+
+
+async def noi_video(clip_paths: list, output_path: str, trim_start_seconds: dict = None):
+    """
+    Nối các clip (cùng codec/độ phân giải, như các clip Veo) bằng concat demuxer mà không mã hoá lại.
+
+    Args:
+        clip_paths (list): Đường dẫn các clip theo thứ tự.
+        output_path (str): File video đầu ra.
+        trim_start_seconds (dict): {đường dẫn clip: số giây bỏ ở đầu} để cắt phần trùng với clip trước.
+                                   Với `-c copy`, điểm cắt được làm tròn tới keyframe gần nhất.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    list_path = output_path + ".concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for clip_path in clip_paths:
+            escaped = os.path.abspath(clip_path).replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+            inpoint = (trim_start_seconds or {}).get(clip_path)
+            if inpoint:
+                f.write(f"inpoint {inpoint}\n")
+    tmp_path = output_path + ".tmp" + os.path.splitext(output_path)[1]
+    try:
+        await _chay_ffmpeg("-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-movflags", "+faststart", tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        for path in (list_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# --- Pipeline --- #
+def _kiem_tra_phu_thuoc(clips: list):
+    ids = [clip.clip_id for clip in clips]
+    if len(set(ids)) != len(ids):
+        raise ValueError("clip_id phải là duy nhất")
+    by_id = {clip.clip_id: clip for clip in clips}
+    for clip in clips:
+        seen = set()
+        current = clip
+        while current.depends_on is not None:
+            if current.depends_on not in by_id:
+                raise ValueError(f"Clip {current.clip_id} phụ thuộc clip không tồn tại: {current.depends_on}")
+            if current.clip_id in seen:
+                raise ValueError(f"Phụ thuộc vòng tại clip {current.clip_id}")
+            seen.add(current.clip_id)
+            current = by_id[current.depends_on]
+
+
+class LongVideoPipeline:
+    """
+    Tạo các clip theo đồ thị phụ thuộc với mức song song tối đa, rồi nối thành một video.
+
+    Args:
+        clips (list): Danh sách ClipSpec theo thứ tự nối.
+        output_path (str): File video cuối cùng.
+        work_dir (str): Thư mục chứa clip, khung hình trích xuất và file trạng thái
+                        (mặc định "<output_path không đuôi>_work").
+        overlap_seconds (float): Số giây bỏ ở đầu mỗi clip nối tiếp khi ghép, để khung hình đầu
+                                 (trùng khung hình cuối của clip trước) không bị lặp lại.
+        **orchestrator_kwargs: Tham số cho VideoJobOrchestrator (poll_initial, max_concurrent_submits, ...).
+    """
+
+    def __init__(self, clips: list, output_path: str, work_dir: str = None, overlap_seconds: float = 0.0,
+                 **orchestrator_kwargs):
+        _kiem_tra_phu_thuoc(clips)
+        self.clips = list(clips)
+        self.output_path = output_path
+        self.work_dir = work_dir or os.path.splitext(output_path)[0] + "_work"
+        self.overlap_seconds = overlap_seconds
+        self.orchestrator_kwargs = orchestrator_kwargs
+        self.checkpoint_file = os.path.join(self.work_dir, "pipeline.json")
+        self._timings = {}
+
+    def clip_path(self, clip_id: str) -> str:
+        return os.path.join(self.work_dir, "clips", f"{clip_id}.mp4")
+
+    def frame_path(self, clip_id: str, version: str) -> str:
+        """Khung hình cuối của clip, gắn với `version` (video_id) để clip được tạo lại không dùng khung hình cũ."""
+        return os.path.join(self.work_dir, "frames", f"{clip_id}_{version}_last.png")
+
+    # --- Checkpoint --- #
+    def _doc_checkpoint(self) -> dict:
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _ghi_checkpoint(self, checkpoint: dict):
+        os.makedirs(self.work_dir, exist_ok=True)
+        tmp_path = self.checkpoint_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.checkpoint_file)
+
+    # --- Chạy --- #
+    async def _tao_clip(self, clip: ClipSpec, orchestrator: VideoJobOrchestrator, done: dict) -> dict:
+        timing = self._timings.setdefault(clip.clip_id, {})
+        image = None
+        if clip.depends_on is not None:
+            start = time.perf_counter()
+            parent = await done[clip.depends_on]
+            timing["wait_parent_seconds"] = time.perf_counter() - start
+            if parent["status"] != STATUS_DOWNLOADED:
+                return {"job_id": clip.clip_id, "status": "skipped",
+                        "error": f"Clip phụ thuộc {clip.depends_on} không tạo được"}
+            frame = self.frame_path(clip.depends_on, parent.get("video_id") or parent["spec_hash"])
+            start = time.perf_counter()
+            if not os.path.exists(frame):
+                await trich_xuat_khung_hinh_cuoi(self.clip_path(clip.depends_on), frame)
+            timing["extract_frame_seconds"] = time.perf_counter() - start
+            image = await asyncio.to_thread(_doc_anh_base64, frame)
+        elif clip.image_path:
+            image = await asyncio.to_thread(_doc_anh_base64, clip.image_path)
+
+        spec = VideoJobSpec(
+            job_id=clip.clip_id,
+            prompt=clip.prompt,
+            output_path=self.clip_path(clip.clip_id),
+            model=clip.model,
+            image=image,
+            negative_prompt=clip.negative_prompt,
+            aspect_ratio=clip.aspect_ratio,
+            resolution=clip.resolution,
+            person_generation=clip.person_generation,
+        )
+        start = time.perf_counter()
+        result = await orchestrator.submit(spec)
+        timing["generate_seconds"] = time.perf_counter() - start
+        return result
+
+    async def arun(self) -> dict:
+        """
+        Tạo mọi clip và nối thành video.
+
+        Returns:
+            dict: {"success": bool, "output_path", "clips": {clip_id: trạng thái}, "timings": {...}}.
+                  `timings` gồm thời gian tạo clip (tổng thời gian thực), nối video, tổng, và chi tiết từng clip
+                  (chờ clip cha, trích khung hình, tạo + tải về).
+        """
+        total_start = time.perf_counter()
+        checkpoint = self._doc_checkpoint()
+        self._timings = {}
+
+        start = time.perf_counter()
+        async with VideoJobOrchestrator(os.path.join(self.work_dir, "jobs.json"), **self.orchestrator_kwargs) as orchestrator:
+            loop = asyncio.get_running_loop()
+            done = {clip.clip_id: loop.create_future() for clip in self.clips}
+
+            async def run_clip(clip):
+                try:
+                    result = await self._tao_clip(clip, orchestrator, done)
+                except Exception as e:
+                    result = {"job_id": clip.clip_id, "status": "failed", "error": str(e)}
+                done[clip.clip_id].set_result(result)
+                return result
+
+            results = await asyncio.gather(*(run_clip(clip) for clip in self.clips))
+        generation_seconds = time.perf_counter() - start
+
+        clips = {result["job_id"]: result for result in results}
+        succeeded = all(result["status"] == STATUS_DOWNLOADED for result in results)
+        report = {"success": False, "output_path": self.output_path, "clips": clips}
+
+        stitch_seconds = 0.0
+        if succeeded:
+            clip_paths = [self.clip_path(clip.clip_id) for clip in self.clips]
+            stitch_key = [[path, os.path.getsize(path)] for path in clip_paths]
+            if checkpoint.get("stitched") == stitch_key and os.path.exists(self.output_path):
+                print(f"Video {self.output_path} đã được nối từ cùng danh sách clip, bỏ qua bước nối.")
+            else:
+                trim = {}
+                if self.overlap_seconds:
+                    trim = {self.clip_path(clip.clip_id): self.overlap_seconds for clip in self.clips if clip.depends_on}
+                start = time.perf_counter()
+                await noi_video(clip_paths, self.output_path, trim)
+                stitch_seconds = time.perf_counter() - start
+                checkpoint["stitched"] = stitch_key
+            report["success"] = True
+        else:
+            failed = [clip_id for clip_id, result in clips.items() if result["status"] != STATUS_DOWNLOADED]
+            report["error"] = f"Không nối video vì các clip sau chưa tạo được: {failed}"
+
+        report["timings"] = {
+            "generation_seconds": generation_seconds,
+            "stitch_seconds": stitch_seconds,
+            "total_seconds": time.perf_counter() - total_start,
+            "clips": self._timings,
+        }
+        checkpoint["last_run"] = report["timings"]
+        self._ghi_checkpoint(checkpoint)
+        print(f"Pipeline video dài: tạo clip {generation_seconds:.1f}s, nối {stitch_seconds:.1f}s, "
+              f"tổng {report['timings']['total_seconds']:.1f}s.")
+        return report
+
+    def run(self) -> dict:
+        return asyncio.run(self.arun())
+
+
+def _doc_anh_base64(image_path: str) -> dict:
+    mime_type = "image/jpeg" if image_path.lower().endswith((".jpg", ".jpeg")) else "image/png"
+    with open(image_path, "rb") as f:
+        return {"bytesBase64Encoded": base64.b64encode(f.read()).decode("utf-8"), "mimeType": mime_type}
+
+
+def build_long_video(clips: list, output_path: str, **kwargs) -> dict:
+    """Tạo video dài từ danh sách ClipSpec. Tham số bổ sung được truyền cho LongVideoPipeline."""
+    return LongVideoPipeline(clips, output_path, **kwargs).run()
@@ -0,0 +1,335 @@
+"""
+Điều phối nhiều tác vụ tạo video Veo cùng lúc: gửi yêu cầu, theo dõi trạng thái, tải video về.
+
+Thay cho vòng lặp `while not video_completed` chờ cố định 10 giây trong notebook tao_video:
+
+    specs = [VideoJobSpec("canh_01", prompt_1, "outputs/videos/canh_01.mp4"),
+             VideoJobSpec("canh_02", prompt_2, "outputs/videos/canh_02.mp4")]
+    summary = run_video_jobs(specs, state_file="outputs/videos/jobs.json")
+
+- Mọi tác vụ được kiểm tra trạng thái từ một bộ lập lịch duy nhất, khoảng chờ tăng dần (adaptive backoff)
+  theo từng tác vụ thay vì cố định.
+- Video được tải về ngay khi tác vụ tương ứng hoàn thành, không chờ các tác vụ khác.
+- Trạng thái (operation_name, video_id, ...) được ghi ra `state_file` sau mỗi lần thay đổi; chạy lại với
+  cùng file trạng thái sẽ tiếp tục theo dõi các tác vụ đang chạy mà không gửi lại yêu cầu (không tốn phí lần nữa),
+  và tải lại các video đã tạo xong nhưng chưa tải được. Chỉ tác vụ bị Veo báo lỗi hoặc quá hạn mới được gửi lại.
+"""
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import time
+from typing import NamedTuple
+
+from src.api_services.btc_api_client_async import (
+    kiem_tra_trang_thai_video,
+    tai_xuong_video_hoan_thanh,
+    tao_video,
+)
+
+STATUS_SUBMITTED = "submitted"
+STATUS_COMPLETED = "completed"
+STATUS_DOWNLOADED = "downloaded"
+STATUS_FAILED = "failed"
+
+
+class VideoJobSpec(NamedTuple):
+    """Mô tả một video cần tạo. `job_id` là khoá trong file trạng thái, phải duy nhất."""
+    job_id: str
+    prompt: str
+    output_path: str
+    model: str = "veo-3.0-generate-001"
+    image: dict = None
+    negative_prompt: str = None
+    aspect_ratio: str = "16:9"
+    resolution: str = None
+    person_generation: str = None
+    extra: dict = None
+
+
+def trich_xuat_video_id(status_response: dict) -> str:
+    """
+    Lấy video_id từ phản hồi của kiem_tra_trang_thai_video khi tác vụ đã xong (None nếu không có video).
+    Ví dụ uri ".../files/fw30jj2nse1z:download?alt=media" -> "fw30jj2nse1z".
+    """
+    samples = status_response.get("response", {}).get("generateVideoResponse", {}).get("generatedSamples", [])
+    if samples and "uri" in samples[0].get("video", {}):
+        return samples[0]["video"]["uri"].split("/")[-1].split(":")[0]
+    return None
+
+
+def _hash_spec(spec: VideoJobSpec) -> str:
+    # Không đưa ảnh base64 vào JSON để hash nhanh; vẫn phân biệt được ảnh khác nhau
+    data = spec._asdict()
+    data.pop("output_path")
+    if spec.image:
+        data["image"] = hashlib.sha256(json.dumps(spec.image, sort_keys=True).encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class VideoJobOrchestrator:
+    """
+    Bộ điều phối tác vụ video, dùng trong một event loop:
+
+        async with VideoJobOrchestrator("jobs.json") as orchestrator:
+            results = await asyncio.gather(*(orchestrator.submit(spec) for spec in specs))
+
+    Args:
+        state_file (str): File JSON lưu trạng thái các tác vụ để tiếp tục sau khi tiến trình bị dừng.
+        max_concurrent_submits (int): Số yêu cầu tao_video gửi đồng thời tối đa.
+        poll_initial (float): Thời gian chờ (giây) trước lần kiểm tra trạng thái đầu tiên.
+        poll_factor (float): Hệ số tăng khoảng chờ sau mỗi lần kiểm tra mà tác vụ chưa xong.
+        poll_max (float): Khoảng chờ tối đa giữa hai lần kiểm tra.
+        max_poll_errors (int): Số lần kiểm tra lỗi liên tiếp tối đa trước khi coi tác vụ là thất bại.
+        job_timeout (float): Thời gian tối đa (giây) kể từ lúc gửi yêu cầu tới khi tác vụ hoàn thành.
+    """
+
+    def __init__(
+        self,
+        state_file: str,
+        max_concurrent_submits: int = 4,
+        poll_initial: float = 15.0,
+        poll_factor: float = 1.5,
+        poll_max: float = 60.0,
+        max_poll_errors: int = 5,
+        job_timeout: float = 1800.0,
+    ):
+        self.state_file = state_file
+        self.poll_initial = poll_initial
+        self.poll_factor = poll_factor
+        self.poll_max = poll_max
+        self.max_poll_errors = max_poll_errors
+        self.job_timeout = job_timeout
+        self._max_concurrent_submits = max_concurrent_submits
+
+        self._state = self._doc_trang_thai()
+        self._heap = []
+        self._futures = {}
+        self._tasks = set()
+        self._wake = None
+        self._submit_semaphore = None
+        self._scheduler = None
+
+    # --- Trạng thái --- #
+    def _doc_trang_thai(self) -> dict:
+        if os.path.exists(self.state_file):
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _ghi_trang_thai(self):
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)  # Không để file trạng thái dở dang nếu tiến trình bị dừng
+
+    def _cap_nhat(self, job_id: str, **fields):
+        self._state[job_id].update(fields)
+        self._ghi_trang_thai()
+
+    # --- Vòng đời --- #
+    async def __aenter__(self):
+        self._wake = asyncio.Event()
+        self._submit_semaphore = asyncio.Semaphore(self._max_concurrent_submits)
+        self._scheduler = asyncio.create_task(self._lap_lich())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._scheduler.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._scheduler, *self._tasks, return_exceptions=True)
+
+    def _chay_nen(self, job_id: str, coro):
+        task = asyncio.create_task(self._bao_ve(job_id, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _bao_ve(self, job_id: str, coro):
+        """Lỗi không lường trước trong một bước nền đánh dấu tác vụ thất bại, để submit() không phải chờ mãi."""
+        try:
+            await coro
+        except Exception as e:
+            # Giữ operation_name/video_id để lần chạy sau tiếp tục từ bước đang dở
+            self._state[job_id].update(status=STATUS_FAILED, error=f"Lỗi không mong đợi: {e!r}")
+            try:
+                self._ghi_trang_thai()
+            except Exception as write_error:
+                print(f"[{job_id}] Không ghi được file trạng thái: {write_error}")
+            self._ket_thuc(job_id)
+
+    def _hen_kiem_tra(self, job_id: str, delay: float):
+        heapq.heappush(self._heap, (time.time() + delay, job_id))
+        self._wake.set()
+
+    def _ket_thuc(self, job_id: str):
+        future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            future.set_result(dict(self._state[job_id], job_id=job_id))
+
+    # --- Gửi yêu cầu --- #
+    async def submit(self, spec: VideoJobSpec) -> dict:
+        """
+        Đưa một video vào hàng đợi và chờ tới khi video được tải về (hoặc thất bại).
+
+        Returns:
+            dict: Trạng thái cuối của tác vụ, gồm "status" ("downloaded" hoặc "failed"), "output_path",
+                  "operation_name", "video_id", "error" (nếu có) và các mốc thời gian.
+
+        Raises:
+            ValueError: Khi một tác vụ cùng `job_id` đang chạy.
+        """
+        if spec.job_id in self._futures:
+            raise ValueError(f"Tác vụ {spec.job_id} đang chạy, job_id phải là duy nhất")
+        future = asyncio.get_running_loop().create_future()
+        self._futures[spec.job_id] = future
+        spec_hash = _hash_spec(spec)
+        state = self._state.get(spec.job_id)
+
+        if state is not None and state.get("spec_hash") == spec_hash:
+            state["output_path"] = spec.output_path
+            if state["status"] == STATUS_DOWNLOADED and os.path.exists(spec.output_path):
+                self._ket_thuc(spec.job_id)
+            elif state.get("video_id"):
+                print(f"[{spec.job_id}] Tiếp tục tải video {state['video_id']}")
+                self._chay_nen(spec.job_id, self._tai_xuong(spec.job_id))
+            elif state.get("operation_name"):
+                print(f"[{spec.job_id}] Tiếp tục theo dõi {state['operation_name']}")
+                state.update(status=STATUS_SUBMITTED, poll_errors=0, poll_interval=self.poll_initial)
+                self._hen_kiem_tra(spec.job_id, 0)
+            else:
+                self._chay_nen(spec.job_id, self._gui_yeu_cau(spec))
+        else:
+            self._state[spec.job_id] = {"spec_hash": spec_hash, "output_path": spec.output_path, "status": None}
+            self._chay_nen(spec.job_id, self._gui_yeu_cau(spec))
+        return await future
+
+    async def run(self, specs: list) -> dict:
+        """
+        Chạy toàn bộ `specs` và trả về {"results": [...], "succeeded", "failed", "total_seconds"},
+        `results` giữ đúng thứ tự của `specs`.
+
+        Raises:
+            ValueError: Khi `specs` có job_id trùng nhau.
+        """
+        ids = [spec.job_id for spec in specs]
+        if len(set(ids)) != len(ids):
+            raise ValueError("job_id phải là duy nhất")
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.submit(spec) for spec in specs))
+        total_seconds = time.perf_counter() - start
+        succeeded = sum(1 for result in results if result["status"] == STATUS_DOWNLOADED)
+        print(f"Hoàn tất {len(specs)} video trong {total_seconds:.1f}s: {succeeded} thành công, {len(specs) - succeeded} lỗi.")
+        return {"results": results, "succeeded": succeeded, "failed": len(specs) - succeeded, "total_seconds": total_seconds}
+
+    async def _gui_yeu_cau(self, spec: VideoJobSpec):
+        try:
+            async with self._submit_semaphore:
+                response = await tao_video(
+                    model=spec.model,
+                    prompt=spec.prompt,
+                    image=spec.image,
+                    negative_prompt=spec.negative_prompt,
+                    aspect_ratio=spec.aspect_ratio,
+                    resolution=spec.resolution,
+                    person_generation=spec.person_generation,
+                    **(spec.extra or {}),
+                )
+        except Exception as e:
+            self._cap_nhat(spec.job_id, status=STATUS_FAILED, error=f"Lỗi khi gửi yêu cầu tạo video: {e}")
+            self._ket_thuc(spec.job_id)
+            return
+        operation_name = response.get("name") if isinstance(response, dict) else None
+        if not operation_name:
+            self._cap_nhat(spec.job_id, status=STATUS_FAILED, error=f"Phản hồi không có operation name: {response}")
+            self._ket_thuc(spec.job_id)
+            return
+        print(f"[{spec.job_id}] Đã gửi yêu cầu: {operation_name}")
+        self._cap_nhat(spec.job_id, status=STATUS_SUBMITTED, operation_name=operation_name,
+                       submitted_at=time.time(), polls=0, poll_errors=0, poll_interval=self.poll_initial, error=None)
+        self._hen_kiem_tra(spec.job_id, self.poll_initial)
+
+    # --- Lập lịch kiểm tra trạng thái --- #
+    async def _lap_lich(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                self._chay_nen(job_id, self._kiem_tra(job_id))
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _kiem_tra(self, job_id: str):
+        state = self._state[job_id]
+        try:
+            status_response = await kiem_tra_trang_thai_video(operation_name=state["operation_name"])
+        except Exception as e:
+            poll_errors = state.get("poll_errors", 0) + 1
+            if poll_errors >= self.max_poll_errors:
+                self._cap_nhat(job_id, status=STATUS_FAILED, error=f"Kiểm tra trạng thái lỗi {poll_errors} lần liên tiếp: {e}")
+                self._ket_thuc(job_id)
+            else:
+                self._cap_nhat(job_id, poll_errors=poll_errors)
+                self._hen_kiem_tra(job_id, state["poll_interval"])
+            return
+
+        polls = state.get("polls", 0) + 1
+        if status_response.get("done"):
+            video_id = trich_xuat_video_id(status_response)
+            if "error" in status_response or not video_id:
+                error = status_response.get("error") or "Tác vụ hoàn thành nhưng không có video nào được tạo."
+                # Bỏ operation_name để lần chạy sau gửi lại yêu cầu mới
+                self._cap_nhat(job_id, status=STATUS_FAILED, polls=polls, error=error, operation_name=None)
+                self._ket_thuc(job_id)
+                return
+            print(f"[{job_id}] Video đã hoàn thành sau {polls} lần kiểm tra, bắt đầu tải về.")
+            self._cap_nhat(job_id, status=STATUS_COMPLETED, video_id=video_id, polls=polls, completed_at=time.time())
+            await self._tai_xuong(job_id)
+            return
+
+        if time.time() - state.get("submitted_at", time.time()) > self.job_timeout:
+            self._cap_nhat(job_id, status=STATUS_FAILED, polls=polls, error=f"Quá thời gian chờ {self.job_timeout}s",
+                           operation_name=None)
+            self._ket_thuc(job_id)
+            return
+        interval = min(self.poll_max, state["poll_interval"] * self.poll_factor)
+        self._cap_nhat(job_id, polls=polls, poll_errors=0, poll_interval=interval)
+        self._hen_kiem_tra(job_id, state["poll_interval"])
+
+    async def _tai_xuong(self, job_id: str):
+        state = self._state[job_id]
+        try:
+            result = await tai_xuong_video_hoan_thanh(state["video_id"], state["output_path"])
+        except Exception as e:
+            result = {"error": str(e)}
+        if result.get("success"):
+            print(f"[{job_id}] Đã tải video về {state['output_path']}")
+            self._cap_nhat(job_id, status=STATUS_DOWNLOADED, downloaded_at=time.time(), error=None)
+        else:
+            # Giữ video_id để lần chạy sau tải lại mà không phải tạo lại video
+            self._cap_nhat(job_id, status=STATUS_FAILED, error=f"Lỗi khi tải video: {result.get('error')}")
+        self._ket_thuc(job_id)
+
+
+async def arun_video_jobs(specs: list, state_file: str, **kwargs) -> dict:
+    """Bản async của `run_video_jobs`."""
+    async with VideoJobOrchestrator(state_file, **kwargs) as orchestrator:
+        return await orchestrator.run(specs)
+
+
+def run_video_jobs(specs: list, state_file: str, **kwargs) -> dict:
+    """
+    Tạo và tải về nhiều video song song. Tham số bổ sung được truyền cho VideoJobOrchestrator.
+
+    Returns:
+        dict: {"results": [...], "succeeded": int, "failed": int, "total_seconds": float}.
+    """
+    return asyncio.run(arun_video_jobs(specs, state_file, **kwargs))
@@ -0,0 +1,20 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import pytest
+
+from src.api_services import btc_api_client
+
+
+@pytest.fixture(scope="session", autouse=True)
+def api_log_dir(tmp_path_factory):
+    """
+    Ghi log tương tác API của cả phiên test vào thư mục tạm thay vì `logs/api_interactions` trong repo.
+    Handler file được gắn ở lần gọi API đầu tiên và giữ nguyên cho tới hết phiên, nên thư mục phải sống cùng phiên.
+    """
+    log_dir = str(tmp_path_factory.mktemp("api_interactions"))
+    patcher = pytest.MonkeyPatch()
+    patcher.setattr(btc_api_client, "LOG_DIR", log_dir)
+    yield log_dir
+    patcher.undo()
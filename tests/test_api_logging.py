@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import json
+import logging
+from unittest.mock import patch
+
+from src.api_services import btc_api_client
+from src.api_services.api_logging import JsonMessageFormatter, rut_gon_cho_log
+
+
+def test_rut_gon_cho_log_khong_sua_du_lieu_goc():
+    """
+    Base64 dài (kể cả data URL) được rút gọn, khoá bí mật bị che, dữ liệu gốc giữ nguyên.
+    """
+    b64 = "A" * 20000 + "TAIL"
+    data = {
+        "data": [{"b64_json": b64}],
+        "choices": [{"message": {"images": [{"image_url": {"url": "data:image/png;base64," + b64}}]}}],
+        "headers": {"Authorization": "Bearer secret"},
+        "text": "ngắn",
+    }
+    original = json.dumps(data)
+
+    redacted = rut_gon_cho_log(data)
+
+    assert json.dumps(data) == original
+    assert redacted["data"][0]["b64_json"] == "..." + b64[-50:] + " (truncated)"
+    assert redacted["choices"][0]["message"]["images"][0]["image_url"]["url"].startswith("data:image/png;base64,...")
+    assert redacted["headers"]["Authorization"] == "***"
+    assert redacted["text"] == "ngắn"
+
+
+def test_log_api_call_khong_sua_ket_qua_tra_ve():
+    """
+    Decorator trả về đúng kết quả của hàm (không bị rút gọn base64), log chỉ chứa bản rút gọn.
+    """
+    b64 = "B" * 50000
+    logged = []
+
+    @btc_api_client.log_api_call
+    def fake_image(prompt, file_path):
+        return {"success": True, "response_data": {"data": [{"b64_json": b64}]}}
+
+    with patch.object(btc_api_client, "log_api_interaction",
+                      side_effect=lambda t, name, data, iid, level=None: logged.append((t, data))):
+        result = fake_image("p", "out/x.png")
+
+    assert result["response_data"]["data"][0]["b64_json"] == b64
+    assert logged[1][1]["result"]["response_data"]["data"][0]["b64_json"].endswith(" (truncated)")
+
+
+def test_json_message_formatter():
+    """
+    Bản ghi có msg dạng dict chỉ được chuyển thành JSON khi formatter (ở thread nền) xử lý.
+    """
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, {"type": "request", "data": {"a": "ă"}}, None, None)
+    assert JsonMessageFormatter("%(message)s").format(record) == '{"type": "request", "data": {"a": "ă"}}'
+
+
+def test_log_api_khong_day_dict_len_root_logger():
+    """
+    Bản ghi API (msg dạng dict) không lan lên handler của root logger.
+    """
+    records = []
+
+    class _Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    root_handler = _Collect()
+    logging.getLogger().addHandler(root_handler)
+    try:
+        btc_api_client.log_api_interaction("request", "kiem_tra_chi_tieu", {"a": 1}, "id-1")
+    finally:
+        logging.getLogger().removeHandler(root_handler)
+
+    assert records == []
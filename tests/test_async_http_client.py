@@ -0,0 +1,186 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.api_services import btc_api_client, btc_api_client_async
+from src.api_services.async_http_client import AsyncThucChienHttpClient, set_async_http_client
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+
+KEY_INFO = {"key": "sk-test", "info": {"spend": 1.5, "max_budget": 10.0}}
+CHAT_RESPONSE = {"id": "c1", "choices": [{"index": 0, "message": {"role": "assistant", "content": "Xin chào"}}]}
+VIDEO_BYTES = b"mp4-" * 1000
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+    stream_started = threading.Event()
+
+    def _gui_json(self, data: dict, delay: float = 0.0):
+        with _StubHandler.lock:
+            _StubHandler.active += 1
+            _StubHandler.max_active = max(_StubHandler.max_active, _StubHandler.active)
+        try:
+            time.sleep(delay)
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with _StubHandler.lock:
+                _StubHandler.active -= 1
+
+    def do_GET(self):
+        if self.path == "/key/info":
+            self._gui_json(KEY_INFO, delay=0.05)
+        elif "slow" in self.path:
+            # Gửi một phần rồi treo, để client bị huỷ giữa lúc tải
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(VIDEO_BYTES) * 10))
+            self.end_headers()
+            self.wfile.write(VIDEO_BYTES)
+            self.wfile.flush()
+            _StubHandler.stream_started.set()
+            time.sleep(2)
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(VIDEO_BYTES)))
+            self.end_headers()
+            self.wfile.write(VIDEO_BYTES)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._gui_json(CHAT_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_server():
+    _StubHandler.active = _StubHandler.max_active = 0
+    _StubHandler.stream_started = threading.Event()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_semaphore_gioi_han_so_loi_goi_dong_thoi_theo_nhom(setup_api_key, stub_server):
+    """
+    Với giới hạn 2 cho nhóm "info", 6 lời gọi đồng thời chỉ có tối đa 2 request cùng lúc tới server;
+    nhóm khác không bị giới hạn theo nhóm "info".
+    """
+    client = AsyncThucChienHttpClient(base_url=stub_server, concurrency_limits={"info": 2})
+    set_async_http_client(client)
+
+    async def run():
+        try:
+            results = await asyncio.gather(*(btc_api_client_async.kiem_tra_chi_tieu() for _ in range(6)))
+            return results, client.limit("info")._value
+        finally:
+            await client.close()
+
+    try:
+        results, free_slots = asyncio.run(run())
+    finally:
+        set_async_http_client(None)
+
+    assert results == [KEY_INFO] * 6
+    assert _StubHandler.max_active == 2
+    assert free_slots == 2
+
+
+def test_huy_tai_xuong_giai_phong_slot_va_xoa_file_do_dang(setup_api_key, stub_server, tmp_path):
+    """
+    Huỷ task đang tải video: slot của nhóm "video" được trả lại và không còn file dở dang trong thư mục đích.
+    """
+    client = AsyncThucChienHttpClient(base_url=stub_server, concurrency_limits={"video": 1})
+    set_async_http_client(client)
+    file_path = str(tmp_path / "videos" / "slow.mp4")
+
+    async def run():
+        try:
+            task = asyncio.create_task(btc_api_client_async.tai_xuong_video_hoan_thanh("slow", file_path))
+            await asyncio.to_thread(_StubHandler.stream_started.wait, 5)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            free_slots = client.limit("video")._value
+            # Slot đã được trả lại: lần tải tiếp theo với giới hạn 1 không bị chặn
+            result = await asyncio.wait_for(
+                btc_api_client_async.tai_xuong_video_hoan_thanh("fast", str(tmp_path / "videos" / "fast.mp4")), 2)
+            return free_slots, result
+        finally:
+            await client.close()
+
+    try:
+        free_slots, result = asyncio.run(run())
+    finally:
+        set_async_http_client(None)
+
+    assert free_slots == 1
+    assert result["success"]
+    assert os.listdir(tmp_path / "videos") == ["fast.mp4"]
+
+
+def test_ban_dong_bo_va_async_tra_ve_cung_ket_qua(setup_api_key, stub_server, tmp_path):
+    """
+    Hàm async trả về cùng giá trị với hàm đồng bộ cùng tên (JSON, dict kết quả và nội dung file tải về).
+    """
+    messages = [{"role": "user", "content": "hi"}]
+    set_http_client(ThucChienHttpClient(base_url=stub_server))
+    try:
+        sync_results = [
+            btc_api_client.kiem_tra_chi_tieu(),
+            btc_api_client.sinh_phan_hoi_tro_chuyen(messages),
+            btc_api_client.tai_xuong_video_hoan_thanh("v1", str(tmp_path / "video.mp4")),
+        ]
+    finally:
+        set_http_client(None)
+    sync_bytes = (tmp_path / "video.mp4").read_bytes()
+    os.remove(tmp_path / "video.mp4")
+
+    client = AsyncThucChienHttpClient(base_url=stub_server)
+    set_async_http_client(client)
+
+    async def run():
+        try:
+            return [
+                await btc_api_client_async.kiem_tra_chi_tieu(),
+                await btc_api_client_async.sinh_phan_hoi_tro_chuyen(messages),
+                await btc_api_client_async.tai_xuong_video_hoan_thanh("v1", str(tmp_path / "video.mp4")),
+            ]
+        finally:
+            await client.close()
+
+    try:
+        async_results = asyncio.run(run())
+    finally:
+        set_async_http_client(None)
+
+    assert async_results == sync_results
+    assert sync_results[:2] == [KEY_INFO, CHAT_RESPONSE]
+    assert (tmp_path / "video.mp4").read_bytes() == sync_bytes == VIDEO_BYTES
@@ -0,0 +1,163 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.api_services import btc_api_client, btc_api_client_async
+from src.api_services.async_http_client import AsyncThucChienHttpClient, set_async_http_client
+from src.api_services.chat_stream import ChatStreamAccumulator, SseDecoder
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+from src.api_services.metrics import MetricsRegistry, get_metrics_registry, set_metrics_registry
+
+DELTAS = ["Xin ", "chào ", "Việt Nam!"]
+USAGE = {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}
+DELAY = 0.2
+
+
+def _su_kien() -> list:
+    events = [{"id": "c1", "model": "gemini-2.5-flash", "choices": [{"index": 0, "delta": {"role": "assistant"}}]}]
+    events += [{"id": "c1", "choices": [{"index": 0, "delta": {"content": text}}]} for text in DELTAS]
+    events.append({"id": "c1", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    events.append({"id": "c1", "choices": [], "usage": USAGE})
+    return [f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode() for event in events] + [b"data: [DONE]\n\n"]
+
+
+class _SseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    payloads = []
+
+    def do_POST(self):
+        _SseHandler.payloads.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for data in _su_kien():
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+            time.sleep(DELAY / 4)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_server():
+    _SseHandler.payloads = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SseHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def registry():
+    old_registry = get_metrics_registry()
+    registry = MetricsRegistry()
+    set_metrics_registry(registry)
+    yield registry
+    set_metrics_registry(old_registry)
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    records = []
+    monkeypatch.setattr(btc_api_client, "log_api_interaction",
+                        lambda kind, name, data, interaction_id, level=None: records.append((kind, name, data)))
+    return records
+
+
+def test_giai_ma_sse_bi_cat_tuy_y_va_gop_chunk():
+    """
+    Dữ liệu SSE bị cắt ở bất kỳ byte nào (kể cả giữa ký tự UTF-8) vẫn được tách đúng sự kiện;
+    các chunk được gộp thành phản hồi cùng dạng với chat.completion.
+    """
+    raw = b": keep-alive\r\n\r\n" + b"".join(_su_kien())
+    decoder, accumulator, deltas = SseDecoder(), ChatStreamAccumulator(), []
+    events = []
+    for i in range(len(raw)):
+        events += decoder.feed(raw[i:i + 1])
+    events += decoder.flush()
+    assert events[-1] == "[DONE]"
+    for data in events[:-1]:
+        deltas.append(accumulator.add(json.loads(data)))
+    assert [d for d in deltas if d] == DELTAS
+
+    response = accumulator.response()
+    assert response["id"] == "c1" and response["model"] == "gemini-2.5-flash" and response["usage"] == USAGE
+    assert response["choices"] == [{"index": 0, "message": {"role": "assistant", "content": "".join(DELTAS)},
+                                    "finish_reason": "stop"}]
+
+
+def test_luong_dong_bo_tra_delta_som_va_ghi_log_khi_ket_thuc(setup_api_key, stub_server, registry, logged):
+    """
+    Delta đầu tiên tới trước khi server gửi xong; log response (kèm usage, ttft) chỉ được ghi khi luồng kết thúc;
+    dừng giữa chừng thì phản hồi được đánh dấu incomplete.
+    """
+    set_http_client(ThucChienHttpClient(base_url=stub_server))
+    try:
+        start = time.perf_counter()
+        stream = btc_api_client.sinh_phan_hoi_tro_chuyen_theo_luong([{"role": "user", "content": "hi"}])
+        received = []
+        for delta in stream:
+            received.append((delta, time.perf_counter() - start))
+            if len(received) == 1:
+                assert [kind for kind, _, _ in logged] == ["request"]
+        assert [d for d, _ in received] == DELTAS
+        assert received[0][1] < received[-1][1] - DELAY / 2
+        assert _SseHandler.payloads[0]["stream"] is True
+
+        kind, name, data = logged[-1]
+        assert (kind, name) == ("response", "sinh_phan_hoi_tro_chuyen_theo_luong")
+        assert data["result"]["usage"] == USAGE and data["ttft_seconds"] == pytest.approx(stream.time_to_first_token, abs=1e-3)
+        assert stream.response["choices"][0]["message"]["content"] == "".join(DELTAS)
+
+        with btc_api_client.sinh_phan_hoi_tro_chuyen_theo_luong([{"role": "user", "content": "hi"}]) as stream:
+            assert next(iter(stream)) == DELTAS[0]
+        assert stream.response["incomplete"] is True and stream.response["choices"][0]["message"]["content"] == DELTAS[0]
+    finally:
+        set_http_client(None)
+
+    row = registry.summary()[("sinh_phan_hoi_tro_chuyen_theo_luong", "gemini-2.5-flash")]
+    assert row["calls"] == 2 and row["ttft_seconds"]["count"] == 2
+    assert row["call_duration_seconds"]["max"] > row["ttft_seconds"]["max"]
+
+
+def test_luong_async(setup_api_key, stub_server, registry, logged):
+    """
+    Bản async trả về delta theo thứ tự, gộp usage và ghi nhận TTFT, số byte phản hồi của luồng.
+    """
+    async def run():
+        client = AsyncThucChienHttpClient(base_url=stub_server)
+        set_async_http_client(client)
+        try:
+            stream = await btc_api_client_async.sinh_phan_hoi_tro_chuyen_theo_luong(
+                [{"role": "user", "content": "hi"}], model="gpt-4o")
+            async with stream:
+                return [delta async for delta in stream], stream
+        finally:
+            await client.close()
+            set_async_http_client(None)
+
+    deltas, stream = asyncio.run(run())
+    assert deltas == DELTAS and stream.response["usage"] == USAGE and "incomplete" not in stream.response
+    assert logged[-1][0] == "response" and logged[-1][2]["result"]["usage"] == USAGE
+
+    row = registry.summary()[("sinh_phan_hoi_tro_chuyen_theo_luong", "gpt-4o")]
+    assert row["ttft_seconds"]["count"] == 1 and row["response_bytes"]["sum"] == sum(map(len, _su_kien()))
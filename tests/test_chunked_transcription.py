@@ -0,0 +1,101 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+from src.audio_processing.chunked_transcription import (
+    AudioChunk,
+    iter_transcribe_chunks,
+    plan_chunks,
+    transcribe_long_audio,
+)
+
+RATE = 16000
+
+
+def _ghi_wav(path: str, pieces: list):
+    """pieces: danh sách (số giây, có tiếng hay không)."""
+    samples = []
+    for seconds, voiced in pieces:
+        n = int(seconds * RATE)
+        samples.append((8000 * np.sin(np.arange(n) * 0.2)).astype("<i2") if voiced else np.zeros(n, "<i2"))
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(np.concatenate(samples).tobytes())
+
+
+def test_chon_diem_cat_tai_khoang_lang():
+    """
+    Điểm cắt nằm giữa khoảng lặng dài nhất trong cửa sổ cho phép; không có khoảng lặng thì cắt ở max_chunk_seconds.
+    """
+    levels = np.full(1000, -10.0)  # 1000 khung x 0,1s = 100s
+    levels[240:260] = -60  # Lặng 24-26s
+    levels[300:305] = -60  # Lặng ngắn 30-30,5s
+    chunks = plan_chunks(levels, frame_seconds=0.1, max_chunk_seconds=40, min_chunk_seconds=10,
+                         min_silence_seconds=0.5)
+    assert chunks[0] == AudioChunk(0, 0.0, 25.0)
+    assert all(c.end - c.start <= 40 for c in chunks)
+    assert chunks[-1].end == pytest.approx(100.0)
+    assert all(a.end == b.start for a, b in zip(chunks, chunks[1:]))
+
+
+def test_chuyen_thanh_van_ban_theo_doan_va_cong_moc_thoi_gian(tmp_path):
+    """
+    Các đoạn được gửi song song; mốc [MM:SS] trong từng đoạn được cộng thời điểm bắt đầu đoạn;
+    kết quả từng đoạn được trả về ngay khi xong và bản ghép theo đúng thứ tự thời gian.
+    """
+    audio_path = str(tmp_path / "long.wav")
+    _ghi_wav(audio_path, [(8, True), (1, False), (8, True), (1, False), (8, True)])
+    calls, release_first = [], threading.Event()
+
+    def fake_transcribe(audio_file_path, prompt, model, **kwargs):
+        calls.append(os.path.getsize(audio_file_path))
+        if "chunk_0000" in audio_file_path:
+            release_first.wait(5)  # Đoạn đầu xong sau cùng
+        return {"choices": [{"message": {"content": "[00:01] câu một của đoạn\n[00:05.5] câu hai\ntiếp câu hai"}}]}
+
+    partials = []
+
+    def on_partial(partial):
+        partials.append(partial["index"])
+        if len(partials) == 2:
+            release_first.set()
+
+    report = transcribe_long_audio(audio_path, on_partial=on_partial, transcribe=fake_transcribe, max_workers=3,
+                                   max_chunk_seconds=12, min_chunk_seconds=4)
+
+    assert report["success"] and len(report["chunks"]) == 3 and partials[-1] == 0
+    starts = [chunk["start"] for chunk in report["chunks"]]
+    assert starts[0] == 0 and starts[1] == pytest.approx(8.5, abs=0.05) and starts[2] == pytest.approx(17.5, abs=0.05)
+    segments = report["segments"]
+    assert [round(s["start"] - starts[s["chunk"]], 2) for s in segments] == [1.0, 5.5] * 3
+    assert segments[1]["text"] == "câu hai tiếp câu hai" and segments[1]["end"] == report["chunks"][0]["end"]
+    assert all(size < os.path.getsize(audio_path) / 2 for size in calls)
+
+
+def test_doan_loi_duoc_bao_cao_va_dung_giua_chung(tmp_path):
+    """
+    Đoạn lỗi được trả về dưới dạng kết quả có "error"; dừng vòng lặp giữa chừng không để lại file tạm.
+    """
+    audio_path = str(tmp_path / "long.wav")
+    _ghi_wav(audio_path, [(6, True), (1, False), (6, True)])
+
+    def fake_transcribe(audio_file_path, prompt, model, **kwargs):
+        if "0000" in audio_file_path:
+            raise RuntimeError("HTTP 500")
+        return {"choices": [{"message": {"content": "xin chào"}}]}
+
+    report = transcribe_long_audio(audio_path, transcribe=fake_transcribe, max_chunk_seconds=8, min_chunk_seconds=2)
+    assert not report["success"] and [c["index"] for c in report["failed_chunks"]] == [0]
+    assert report["text"] == "xin chào" and report["segments"][0]["start"] == report["chunks"][1]["start"]
+
+    iterator = iter_transcribe_chunks(audio_path, transcribe=fake_transcribe, max_chunk_seconds=8, min_chunk_seconds=2)
+    next(iterator)
+    iterator.close()
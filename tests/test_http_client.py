@@ -0,0 +1,111 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.api_services import btc_api_client
+from src.api_services.http_client import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    ThucChienHttpClient,
+    configure_http_client,
+    get_http_client,
+    set_http_client,
+)
+
+
+class _KeyInfoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    client_ports = []
+
+    def do_GET(self):
+        _KeyInfoHandler.client_ports.append(self.client_address[1])
+        body = json.dumps({"info": {"spend": 0.0}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_server():
+    _KeyInfoHandler.client_ports = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeyInfoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_cac_loi_goi_dung_chung_session_va_ket_noi(setup_api_key, stub_server):
+    """
+    Các lời gọi liên tiếp qua btc_api_client dùng cùng một client, cùng session và cùng kết nối TCP keep-alive.
+    """
+    client = configure_http_client(base_url=stub_server)
+    try:
+        for _ in range(3):
+            assert btc_api_client.kiem_tra_chi_tieu() == {"info": {"spend": 0.0}}
+        assert get_http_client() is client
+    finally:
+        set_http_client(None)
+
+    assert len(_KeyInfoHandler.client_ports) == 3
+    assert len(set(_KeyInfoHandler.client_ports)) == 1
+
+
+def test_timeout_mac_dinh_va_ghi_de():
+    """
+    Request không truyền timeout dùng (connect, read) mặc định của client; timeout truyền vào được giữ nguyên.
+    """
+    client = ThucChienHttpClient(base_url="https://stub.local")
+    custom = ThucChienHttpClient(base_url="https://stub.local", connect_timeout=1.0, read_timeout=2.0)
+    response = MagicMock(status_code=200)
+    with patch.object(client.session, "request", return_value=response) as mock_request, \
+         patch.object(custom.session, "request", return_value=response) as mock_custom:
+        client.get(client.url("/key/info"))
+        client.get(client.url("/key/info"), timeout=5)
+        custom.post(custom.url("/chat/completions"), json={})
+
+    assert mock_request.call_args_list[0].kwargs["timeout"] == (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+    assert mock_request.call_args_list[1].kwargs["timeout"] == 5
+    assert mock_custom.call_args.kwargs["timeout"] == (1.0, 2.0)
+    client.close()
+    custom.close()
+
+
+def test_thay_client_dung_chung_dong_client_cu():
+    """
+    `configure_http_client`/`set_http_client` thay client dùng chung và đóng client cũ;
+    đặt None thì lần gọi sau tạo lại client mặc định.
+    """
+    first = configure_http_client(base_url="https://first.local")
+    with patch.object(first, "close", wraps=first.close) as mock_close:
+        second = configure_http_client(base_url="https://second.local", pool_maxsize=4)
+        mock_close.assert_called_once()
+    assert get_http_client() is second and second.url("/x") == "https://second.local/x"
+
+    with patch.object(second, "close") as mock_close:
+        set_http_client(second)  # Đặt lại cùng client thì không đóng
+        mock_close.assert_not_called()
+
+    set_http_client(None)
+    default = get_http_client()
+    assert default is not second and default is get_http_client()
+    set_http_client(None)
@@ -0,0 +1,56 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import threading
+import time
+from unittest.mock import patch
+
+from src.image_processing import image_generator
+from src.image_processing.image_generator import ImageJob, generate_images_batch
+
+
+def test_generate_images_batch_giu_thu_tu_va_loi_tung_job():
+    """
+    Kết quả phải theo đúng thứ tự đầu vào dù các job hoàn thành theo thứ tự khác, và lỗi của một job không làm hỏng cả lô.
+    """
+    def fake_generate(prompt, output_filename, model="imagen-4", aspect_ratio="16:9"):
+        time.sleep(0.05 if prompt == "cham" else 0.0)
+        if prompt == "loi":
+            raise RuntimeError("API lỗi")
+        return {"success": True, "filepath": output_filename}
+
+    jobs = [("cham", "out/1.png"), ImageJob("nhanh", "out/2.png"), ("loi", "out/3.png", "imagen-4", "1:1")]
+    with patch.object(image_generator, "generate_and_save_image", side_effect=fake_generate):
+        report = generate_images_batch(jobs, max_workers=3)
+
+    assert [r["output_filename"] for r in report["results"]] == ["out/1.png", "out/2.png", "out/3.png"]
+    assert report["results"][0]["success"] and report["results"][1]["success"]
+    assert "API lỗi" in report["results"][2]["error"]
+    assert report["succeeded"] == 2 and report["failed"] == 1
+    assert report["results"][0]["latency_seconds"] >= 0.05
+    assert report["total_seconds"] > 0
+
+
+def test_generate_images_batch_gioi_han_so_worker():
+    """
+    Số job chạy đồng thời không được vượt quá max_workers.
+    """
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def fake_generate(prompt, output_filename, model="imagen-4", aspect_ratio="16:9"):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        return {"success": True, "filepath": output_filename}
+
+    jobs = [(f"prompt {i}", f"out/{i}.png") for i in range(20)]
+    with patch.object(image_generator, "generate_and_save_image", side_effect=fake_generate):
+        report = generate_images_batch(jobs, max_workers=4)
+
+    assert report["succeeded"] == 20
+    assert state["peak"] <= 4
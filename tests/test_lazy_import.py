@@ -0,0 +1,54 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import json
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(__file__, "../.."))
+
+
+def _chay(tmp_path, code: str) -> dict:
+    script = f"import json, os, sys\nsys.path.insert(0, {ROOT!r})\n" + code
+    completed = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+                               check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_khong_nap_phu_thuoc_nang_va_khong_gan_handler(tmp_path):
+    """
+    Import btc_api_client không import requests/pydub/dotenv, không tạo thư mục log và không gắn handler.
+    """
+    result = _chay(tmp_path, (
+        "from src.api_services import btc_api_client\n"
+        "print(json.dumps({'loaded': [m for m in ('requests', 'pydub', 'dotenv') if m in sys.modules],\n"
+        "                  'handlers': len(btc_api_client.logger.handlers), 'logs': os.path.exists('logs')}))\n"
+    ))
+    assert result == {"loaded": [], "handlers": 0, "logs": False}
+
+
+def test_loi_goi_dau_tien_nap_env_va_gan_handler_mot_lan(tmp_path):
+    """
+    Lời gọi API đầu tiên mới nạp .env và gắn handler ghi log (tạo thư mục log); các lời gọi sau không gắn thêm.
+    """
+    result = _chay(tmp_path, (
+        "from src.api_services import btc_api_client\n"
+        "os.environ['THUCCHIEN_AI_API_KEY'] = 'test_key'\n"
+        "keys = [btc_api_client._lay_api_key() for _ in range(3)]\n"
+        "print(json.dumps({'keys': keys, 'dotenv': 'dotenv' in sys.modules,\n"
+        "                  'handlers': len(btc_api_client.logger.handlers), 'logs': os.path.isdir('logs/api_interactions')}))\n"
+    ))
+    assert result == {"keys": ["test_key"] * 3, "dotenv": True, "handlers": 1, "logs": True}
+
+
+def test_import_svg_handler_khong_nap_numpy(tmp_path):
+    """
+    Import svg_handler không import numpy/PIL; chỉ bộ ghép mask (svg_mask_editor) mới cần numpy.
+    """
+    result = _chay(tmp_path, (
+        "from src.image_processing import svg_handler\n"
+        "before = [m for m in ('numpy', 'PIL') if m in sys.modules]\n"
+        "from src.image_processing import svg_mask_editor\n"
+        "print(json.dumps({'before': before, 'after': 'numpy' in sys.modules}))\n"
+    ))
+    assert result == {"before": [], "after": True}
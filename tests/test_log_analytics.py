@@ -0,0 +1,121 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import datetime
+import gzip
+import json
+
+import pytest
+
+from src.api_services.log_analytics import LogIndex
+
+BASE_TIME = datetime.datetime(2025, 10, 18, 9, 0, 0)
+
+
+def _dong(interaction_id: str, record_type: str, seconds: float, api_function: str, data: dict) -> str:
+    return json.dumps({
+        "timestamp": (BASE_TIME + datetime.timedelta(seconds=seconds)).isoformat(),
+        "interaction_id": interaction_id,
+        "type": record_type,
+        "api_function": api_function,
+        "data": data,
+    }, ensure_ascii=False) + "\n"
+
+
+def _loi_goi_chat(i: int, start: float, latency: float) -> str:
+    return (_dong(f"chat-{i}", "request", start, "sinh_phan_hoi_tro_chuyen", {"payload": {"model": "gemini-2.5-flash"}})
+            + _dong(f"chat-{i}", "response", start + latency, "sinh_phan_hoi_tro_chuyen",
+                    {"status": "success", "result": {"usage": {"prompt_tokens": 1000, "completion_tokens": 500}},
+                     "retries": 0}))
+
+
+def test_bao_cao_do_tre_loi_va_chi_phi(tmp_path):
+    """
+    Ghép request/response theo interaction_id, tính p50/p95/p99, tỉ lệ lỗi, số lời gọi theo giờ và chi phí.
+    """
+    lines = [_loi_goi_chat(i, i * 10, latency=i + 1) for i in range(10)]
+    lines.append(_dong("img-1", "request", 3700, "sinh_hinh_anh", {"payload": {"prompt": "cat", "n": 2}}))
+    lines.append(_dong("img-1", "response", 3705, "sinh_hinh_anh",
+                       {"status": "success", "result": {"success": True}, "model": "imagen-4", "duration_seconds": 4.5}))
+    lines.append(_dong("img-2", "request", 3710, "sinh_hinh_anh", {"payload": {"model": "imagen-4"}}))
+    lines.append(_dong("img-2", "error_response", 3711, "sinh_hinh_anh", {"status": "error", "status_code": 500}))
+    (tmp_path / "api_interactions_2025-10-18.log").write_text("".join(lines), encoding="utf-8")
+
+    with LogIndex(log_dir=str(tmp_path)) as index:
+        assert index.update()["calls"] == 12
+        latency = {(r["api_function"], r["model"]): r for r in index.latency_percentiles()}
+        chat = latency[("sinh_phan_hoi_tro_chuyen", "gemini-2.5-flash")]
+        assert (chat["count"], chat["p50"], chat["p95"], chat["p99"]) == (10, 5, 10, 10)
+        assert latency[("sinh_hinh_anh", "imagen-4")]["max"] == 4.5  # duration_seconds được ưu tiên
+
+        errors = {r["api_function"]: r for r in index.error_rates()}
+        assert errors["sinh_hinh_anh"]["error_rate"] == 0.5 and errors["sinh_hinh_anh"]["http_errors"] == 1
+
+        assert [(r["hour"], r["calls"]) for r in index.throughput_per_hour()] == [("2025-10-18T09", 10), ("2025-10-18T10", 2)]
+
+        prices = {"gemini-2.5-flash": {"input_per_1m_tokens": 0.3, "output_per_1m_tokens": 2.5},
+                  "imagen-4": {"per_image": 0.04}}
+        spend = {r["model"]: r for r in index.spend_per_model(prices)}
+        assert spend["gemini-2.5-flash"]["cost"] == pytest.approx(10 * (1000 * 0.3 + 500 * 2.5) / 1e6)
+        assert spend["imagen-4"]["images"] == 2 and spend["imagen-4"]["cost"] == pytest.approx(0.08)
+
+
+def test_cap_nhat_tang_dan_va_ghep_qua_nhieu_file(tmp_path):
+    """
+    Lần cập nhật sau chỉ đọc phần mới ghi thêm (bỏ qua dòng ghi dở); request và response nằm ở hai file vẫn được ghép.
+    """
+    log_file = tmp_path / "api_interactions_2025-10-18.log"
+    first = _loi_goi_chat(0, 0, latency=2) + _dong("video-1", "request", 5, "tao_video",
+                                                   {"payload": {"model": "veo-3.0-generate-001", "duration_seconds": 8}})
+    log_file.write_text(first, encoding="utf-8")
+
+    with LogIndex(log_dir=str(tmp_path)) as index:
+        assert index.update() == {"files": 1, "lines": 3, "calls": 1}
+        assert index.update() == {"files": 0, "lines": 0, "calls": 0}
+
+        partial = _loi_goi_chat(1, 20, latency=3)
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(partial[:-10])  # Dòng cuối đang được ghi dở
+        assert index.update() == {"files": 1, "lines": 1, "calls": 0}
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(partial[-10:])
+        assert index.update() == {"files": 1, "lines": 1, "calls": 1}
+
+        # Segment đã xoay vòng và nén chứa kết quả của request video ở file trước
+        with gzip.open(tmp_path / "api_interactions_2025-10-19.log.1.gz", "wt", encoding="utf-8") as f:
+            f.write(_dong("video-1", "response", 65, "tao_video", {"status": "success", "result": {"name": "op"}}))
+        assert index.update()["calls"] == 1
+        spend = {r["model"]: r for r in index.spend_per_model({"veo-3.0-generate-001": {"per_video_second": 0.4}})}
+        assert spend["veo-3.0-generate-001"]["cost"] == pytest.approx(3.2)
+        latency = {r["api_function"]: r for r in index.latency_percentiles()}
+        assert latency["tao_video"]["p50"] == pytest.approx(60)
+
+
+def test_segment_doi_ten_va_nen_khong_bi_quet_lai(tmp_path):
+    """
+    Segment bị đổi tên (.log -> .log.1) rồi nén (.log.1.gz) được nhận ra theo nội dung: chỉ đọc phần chưa đọc,
+    không quét lại; file tạm của bước nén bị bỏ qua; chỉ mục không giữ mục của đường dẫn cũ.
+    """
+    log_file = tmp_path / "api_interactions_2025-10-18.log"
+    log_file.write_text(_loi_goi_chat(0, 0, latency=1), encoding="utf-8")
+    with LogIndex(log_dir=str(tmp_path)) as index:
+        assert index.update() == {"files": 1, "lines": 2, "calls": 1}
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(_loi_goi_chat(1, 10, latency=1))  # Ghi thêm trước khi xoay vòng, chưa được đọc
+
+        segment = tmp_path / "api_interactions_2025-10-18.log.1"
+        os.rename(log_file, segment)
+        log_file.write_text(_loi_goi_chat(2, 20, latency=1), encoding="utf-8")
+        (tmp_path / "api_interactions_2025-10-18.log.1.gz.123.tmp").write_bytes(b"\x1f\x8b dang ghi do")
+        assert index.update() == {"files": 2, "lines": 4, "calls": 2}
+
+        with open(segment, "rb") as src, gzip.open(str(segment) + ".gz", "wb") as dst:
+            dst.write(src.read())
+        os.remove(segment)
+        assert index.update() == {"files": 0, "lines": 0, "calls": 0}
+        assert index.update() == {"files": 0, "lines": 0, "calls": 0}
+
+        paths = sorted(os.path.basename(p) for (p,) in index._conn.execute("SELECT path FROM files"))
+        assert paths == ["api_interactions_2025-10-18.log", "api_interactions_2025-10-18.log.1.gz"]
+        assert index._conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0] == 3
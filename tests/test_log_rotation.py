@@ -0,0 +1,98 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import datetime
+import gzip
+import json
+import logging
+import subprocess
+import time
+
+from src.api_services.log_rotation import RotatingCompressedFileHandler
+
+ROOT = os.path.abspath(os.path.join(__file__, "../.."))
+
+
+def _doc_tat_ca_dong(log_dir) -> list:
+    lines = []
+    for name in sorted(os.listdir(log_dir)):
+        path = os.path.join(log_dir, name)
+        if name.endswith(".gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+        elif ".log" in name:
+            with open(path, encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+    return lines
+
+
+def _ghi(handler: logging.Handler, message: str):
+    handler.handle(logging.makeLogRecord({"msg": message, "levelno": logging.INFO, "levelname": "INFO"}))
+
+
+def test_xoay_vong_theo_kich_thuoc_va_nen_segment(tmp_path):
+    """
+    File đang ghi vượt max_bytes được đóng thành segment .log.<n> và nén .gz ở thread nền; không mất dòng nào.
+    """
+    handler = RotatingCompressedFileHandler(str(tmp_path), max_bytes=2000)
+    for i in range(200):
+        _ghi(handler, json.dumps({"i": i, "pad": "x" * 40}))
+    handler.close()
+
+    names = os.listdir(tmp_path)
+    today = datetime.datetime.now().strftime("api_interactions_%Y-%m-%d.log")
+    segments = [n for n in names if n.startswith(today + ".")]
+    assert len(segments) >= 5 and all(n.endswith(".gz") for n in segments)
+    assert os.path.getsize(tmp_path / today) < 2000
+    assert sorted(json.loads(line)["i"] for line in _doc_tat_ca_dong(tmp_path)) == list(range(200))
+
+
+def test_sang_ngay_moi_va_chinh_sach_giu_log(tmp_path):
+    """
+    Sang ngày mới thì ghi sang file mới và file ngày cũ được nén; segment quá hạn hoặc vượt tổng dung lượng bị xoá.
+    """
+    old = tmp_path / "api_interactions_2020-01-01.log.1.gz"
+    old.write_bytes(b"x" * 100)
+    os.utime(old, (time.time() - 10 * 86400,) * 2)
+
+    now = [datetime.datetime(2025, 10, 18, 23, 59, 59)]
+    handler = RotatingCompressedFileHandler(str(tmp_path), clock=lambda: now[0], retention_days=7,
+                                            max_total_bytes=None)
+    _ghi(handler, "hôm qua")
+    now[0] = datetime.datetime(2025, 10, 19, 0, 0, 1)
+    _ghi(handler, "hôm nay")
+    handler.close()
+
+    assert not old.exists()
+    assert (tmp_path / "api_interactions_2025-10-19.log").read_text(encoding="utf-8") == "hôm nay\n"
+    with gzip.open(tmp_path / "api_interactions_2025-10-18.log.1.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "hôm qua\n"
+
+    handler = RotatingCompressedFileHandler(str(tmp_path), clock=lambda: now[0], max_total_bytes=1)
+    handler.close()
+    assert sorted(n for n in os.listdir(tmp_path) if ".log" in n) == ["api_interactions_2025-10-19.log"]
+
+
+def test_nhieu_tien_trinh_ghi_dong_thoi(tmp_path):
+    """
+    Nhiều tiến trình cùng ghi và xoay vòng một thư mục log: không dòng nào bị mất, lặp hay chen lẫn.
+    """
+    script = (
+        "import sys, logging\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+        "from src.api_services.log_rotation import RotatingCompressedFileHandler\n"
+        "worker = sys.argv[1]\n"
+        f"handler = RotatingCompressedFileHandler({str(tmp_path)!r}, max_bytes=20000)\n"
+        "for i in range(500):\n"
+        "    handler.handle(logging.makeLogRecord({'msg': f'{worker}-{i}-' + 'y' * 60}))\n"
+        "handler.close()\n"
+    )
+    workers = [subprocess.Popen([sys.executable, "-c", script, str(w)]) for w in range(4)]
+    assert all(p.wait(timeout=60) == 0 for p in workers)
+
+    # Dọn lần cuối (nén segment do tiến trình khác vừa đóng) rồi đọc lại toàn bộ
+    RotatingCompressedFileHandler(str(tmp_path)).close()
+    lines = _doc_tat_ca_dong(tmp_path)
+    assert sorted(lines) == sorted(f"{w}-{i}-" + "y" * 60 for w in range(4) for i in range(500))
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
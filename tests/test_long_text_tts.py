@@ -0,0 +1,123 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from src.audio_processing.long_text_tts import LongTextTts, TtsBackend, split_text
+
+RATE = 24000
+SENTENCES = [f"Câu số {i} nói về hoạt động kỷ niệm 80 năm Quốc khánh 2/9/2025 tại TP. Hồ Chí Minh." for i in range(12)]
+
+
+class _FakeTts:
+    """Backend giả: mỗi đoạn là 0,1s lặng + 10ms âm cho mỗi ký tự + 0,1s lặng; ghi lại các đoạn được gọi."""
+
+    def __init__(self, fail_on: str = None, delay: float = 0.02):
+        self.calls = []
+        self.fail_on = fail_on
+        self.delay = delay
+        self.active = self.max_active = 0
+        self._lock = threading.Lock()
+
+    def synthesize(self, text: str, file_path: str) -> str:
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if self.fail_on and self.fail_on in text:
+            raise RuntimeError("lỗi mạng")
+        voiced = (8000 * np.sin(np.arange(len(text) * RATE // 100) * 0.1)).astype("<i2")
+        silence = np.zeros(RATE // 10, "<i2")
+        with wave.open(file_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(RATE)
+            wav.writeframes(np.concatenate([silence, voiced, silence]).tobytes())
+        return file_path
+
+    def backend(self) -> TtsBackend:
+        return TtsBackend("fake", self.synthesize)
+
+
+def _thoi_luong(path: str) -> float:
+    with wave.open(path) as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def test_chia_van_ban_theo_cau_va_on_dinh_khi_sua():
+    """
+    Không cắt ở "TP." hay "2/9/2025", mỗi đoạn không quá max_chars; sửa một câu không làm đổi các đoạn
+    nằm ngoài hai điểm cắt theo nội dung bao quanh nó.
+    """
+    text = " ".join(SENTENCES) + "\n\nĐoạn văn thứ hai. Kết thúc bản tin!"
+    chunks = split_text(text, max_chars=250)
+    assert " ".join(chunks) == text.replace("\n\n", " ")
+    assert all(len(chunk) <= 250 for chunk in chunks)
+    assert chunks[-1].endswith("Đoạn văn thứ hai. Kết thúc bản tin!") and chunks[-1].startswith("Đoạn")
+
+    edited = split_text(text.replace("Câu số 2 nói", "Câu số 2 (đã sửa) nói"), max_chars=250)
+    assert edited[0] == chunks[0] and edited[-3:] == chunks[-3:]
+
+
+def test_tu_dai_hon_max_chars_bi_cat_cung():
+    """
+    Một từ dài hơn max_chars (ví dụ URL) bị cắt thành các khúc max_chars ký tự thay vì tạo đoạn quá dài.
+    """
+    url = "https://thucchien.ai/" + "a" * 120
+    chunks = split_text(f"Xem tại {url} nhé.", max_chars=50)
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == f"Xem tại {url} nhé.".replace(" ", "")
+
+
+def test_tong_hop_song_song_ghep_va_cache_theo_doan(tmp_path):
+    """
+    Các đoạn được tổng hợp song song và ghép theo thứ tự với khoảng nghỉ; chạy lại sau khi sửa một câu
+    chỉ tổng hợp lại đoạn đã đổi.
+    """
+    fake = _FakeTts()
+    tts = LongTextTts(fake.backend(), cache_dir=str(tmp_path / "cache"), max_chars=200, max_workers=4, pause_ms=200)
+    text = " ".join(SENTENCES)
+    output = str(tmp_path / "doc.wav")
+
+    report = tts.synthesize(text, output)
+    assert report["success"] and report["synthesized"] == report["chunks"] == len(fake.calls) > 2
+    assert fake.max_active > 1
+    # Lặng ở hai đầu mỗi đoạn bị cắt (giữ lề 20ms), giữa các đoạn là 200ms nghỉ
+    chunks = tts.split(text)
+    expected = sum(len(c) * 0.01 + 0.04 for c in chunks) + 0.2 * (len(chunks) - 1)
+    assert _thoi_luong(output) == pytest.approx(expected, abs=0.01 * len(chunks))
+
+    fake.calls.clear()
+    edited = text.replace("Câu số 5 nói", "Câu số năm nói")
+    report = tts.synthesize(edited, str(tmp_path / "doc.mp3"))
+    assert report["success"] and report["synthesized"] == len(fake.calls) == 1
+    assert "Câu số năm nói" in fake.calls[0] and report["audio"]["format"] == "mp3"
+
+
+def test_doan_loi_khong_tao_file_nhung_giu_cache(tmp_path):
+    """
+    Một đoạn lỗi thì không tạo file đầu ra và báo đoạn lỗi; lần chạy sau chỉ tổng hợp lại đoạn đó.
+    """
+    fake = _FakeTts(fail_on="Câu số 7")
+    tts = LongTextTts(fake.backend(), cache_dir=str(tmp_path / "cache"), max_chars=200, crossfade_ms=30)
+    text = " ".join(SENTENCES)
+    output = str(tmp_path / "doc.wav")
+
+    report = tts.synthesize(text, output)
+    assert "error" in report and [c["index"] for c in report["failed_chunks"]] == \
+        [i for i, c in enumerate(tts.split(text)) if "Câu số 7" in c]
+    assert not os.path.exists(output) and not [n for n in os.listdir(tmp_path) if n != "cache"]
+
+    fake.fail_on, fake.calls = None, []
+    report = tts.synthesize(text, output)
+    assert report["success"] and len(fake.calls) == 1 and "Câu số 7" in fake.calls[0]
+    assert os.path.exists(output)
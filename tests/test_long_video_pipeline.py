@@ -0,0 +1,98 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import shutil
+import subprocess
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.video_processing import video_job_orchestrator
+from src.video_processing.long_video_pipeline import ClipSpec, LongVideoPipeline, ffmpeg_exe, scenes_to_clips
+
+
+@pytest.fixture(scope="module")
+def sample_clip(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clips") / "sample.mp4")
+    subprocess.run([ffmpeg_exe(), "-loglevel", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=64x48:rate=8:duration=1",
+                    "-pix_fmt", "yuv420p", path], check=True)
+    return path
+
+
+def _fake_api(sample_clip, submitted):
+    async def fake_submit(model, prompt, image=None, **kwargs):
+        submitted.append((prompt, image is not None))
+        await asyncio.sleep(0.01)
+        return {"name": f"op/{len(submitted)}"}
+
+    async def fake_status(operation_name):
+        uri = f"https://stub.local/files/{operation_name.split('/')[-1]}:download"
+        return {"done": True, "response": {"generateVideoResponse": {"generatedSamples": [{"video": {"uri": uri}}]}}}
+
+    async def fake_download(video_id, file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        shutil.copyfile(sample_clip, file_path)
+        return {"success": True, "file_path": file_path}
+
+    return (patch.object(video_job_orchestrator, "tao_video", AsyncMock(side_effect=fake_submit)),
+            patch.object(video_job_orchestrator, "kiem_tra_trang_thai_video", AsyncMock(side_effect=fake_status)),
+            patch.object(video_job_orchestrator, "tai_xuong_video_hoan_thanh", AsyncMock(side_effect=fake_download)))
+
+
+def test_pipeline_song_song_theo_canh_va_noi_video(sample_clip, tmp_path):
+    """
+    Hai cảnh chạy song song; clip nối tiếp nhận khung hình cuối của clip trước; chạy lại không gửi lại yêu cầu.
+    """
+    clips = scenes_to_clips([["a1", "a2"], ["b1", "b2"]])
+    output_path = str(tmp_path / "final.mp4")
+    submitted = []
+
+    patches = _fake_api(sample_clip, submitted)
+    with patches[0], patches[1], patches[2]:
+        report = LongVideoPipeline(clips, output_path, poll_initial=0.01).run()
+
+    assert report["success"], report
+    assert sorted(submitted) == [("a1", False), ("a2", True), ("b1", False), ("b2", True)]
+    # Hai clip mở đầu cảnh được gửi trước mọi clip nối tiếp
+    assert {prompt for prompt, _ in submitted[:2]} == {"a1", "b1"}
+    assert os.path.getsize(output_path) > os.path.getsize(sample_clip)
+    frames = os.listdir(tmp_path / "final_work" / "frames")
+    assert len([name for name in frames if name.startswith("canh_01_clip_01_")]) == 1
+    assert set(report["timings"]["clips"]["canh_02_clip_02"]) == {"wait_parent_seconds", "extract_frame_seconds", "generate_seconds"}
+
+    submitted.clear()
+    patches = _fake_api(sample_clip, submitted)
+    with patches[0], patches[1], patches[2]:
+        report = LongVideoPipeline(clips, output_path, poll_initial=0.01).run()
+    assert report["success"] and submitted == []
+    assert report["timings"]["stitch_seconds"] == 0.0
+
+
+def test_phu_thuoc_khong_hop_le():
+    """
+    Phụ thuộc tới clip không tồn tại hoặc phụ thuộc vòng bị từ chối ngay khi tạo pipeline.
+    """
+    with pytest.raises(ValueError):
+        LongVideoPipeline([ClipSpec("a", "p", depends_on="x")], "out.mp4")
+    with pytest.raises(ValueError):
+        LongVideoPipeline([ClipSpec("a", "p", depends_on="b"), ClipSpec("b", "p", depends_on="a")], "out.mp4")
+
+
+def test_clip_cha_tao_lai_thi_trich_lai_khung_hinh(sample_clip, tmp_path):
+    """
+    Khi clip cha được tạo lại (video_id mới), clip con lấy khung hình cuối của clip mới thay vì dùng lại file cũ.
+    """
+    output_path = str(tmp_path / "final.mp4")
+    frames_dir = tmp_path / "final_work" / "frames"
+    submitted = []  # Dùng chung giữa hai lần chạy để operation (và video_id) không trùng nhau
+    for parent_prompt in ("a1", "a1 sửa lại"):
+        clips = [ClipSpec("a", parent_prompt), ClipSpec("b", "b", depends_on="a")]
+        patches = _fake_api(sample_clip, submitted)
+        with patches[0], patches[1], patches[2]:
+            report = LongVideoPipeline(clips, output_path, poll_initial=0.01).run()
+        assert report["success"], report
+        frame = frames_dir / f"a_{report['clips']['a']['video_id']}_last.png"
+        assert os.path.exists(frame)
+    assert len(os.listdir(frames_dir)) == 2
@@ -0,0 +1,163 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.api_services import btc_api_client, btc_api_client_async
+from src.api_services.async_http_client import AsyncThucChienHttpClient, set_async_http_client
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+from src.api_services.metrics import (
+    Histogram,
+    MetricsExporter,
+    MetricsRegistry,
+    PrometheusTextfileExporter,
+    format_summary,
+    get_metrics_registry,
+    render_prometheus,
+    set_metrics_registry,
+)
+
+CHAT_BODY = json.dumps({"choices": [{"message": {"content": "xin chào " * 200}}]}).encode()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(CHAT_BODY)))
+        self.end_headers()
+        self.wfile.write(CHAT_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def registry():
+    old_registry = get_metrics_registry()
+    registry = MetricsRegistry()
+    set_metrics_registry(registry)
+    yield registry
+    set_metrics_registry(old_registry)
+
+
+def test_histogram_phan_vi_va_dinh_dang_prometheus():
+    """
+    Phân vị được nội suy trong bucket; file Prometheus có bucket cộng dồn, +Inf, _sum và _count.
+    """
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    assert histogram.quantile(0.99) == 10
+    assert histogram.cumulative_counts() == [1, 3, 4, 5]
+
+    registry = MetricsRegistry()
+    registry.observe("request_bytes", 2048, function="sinh_hinh_anh", model='imagen "4"')
+    text = render_prometheus(registry)
+    assert "# TYPE thucchien_api_request_bytes histogram" in text
+    assert 'thucchien_api_request_bytes_bucket{function="sinh_hinh_anh",model="imagen \\"4\\"",le="1024"} 0' in text
+    assert 'thucchien_api_request_bytes_bucket{function="sinh_hinh_anh",model="imagen \\"4\\"",le="+Inf"} 1' in text
+    assert 'thucchien_api_request_bytes_count{function="sinh_hinh_anh",model="imagen \\"4\\""} 1' in text
+
+
+def test_loi_goi_dong_bo_ghi_nhan_ket_noi_ttfb_va_so_byte(setup_api_key, stub_server, registry, tmp_path):
+    """
+    Lời gọi thật qua HTTP: lần đầu tốn thời gian kết nối, lần sau dùng lại kết nối keep-alive;
+    số byte phản hồi, TTFB, thời gian giải mã được gộp theo hàm và model, rồi xuất ra file Prometheus.
+    """
+    set_http_client(ThucChienHttpClient(base_url=stub_server))
+    try:
+        for _ in range(3):
+            btc_api_client.sinh_phan_hoi_tro_chuyen([{"role": "user", "content": "hi"}], model="gemini-2.5-flash")
+    finally:
+        set_http_client(None)
+
+    row = registry.summary()[("sinh_phan_hoi_tro_chuyen", "gemini-2.5-flash")]
+    assert row["calls"] == 3 and row["errors"] == 0
+    assert row["response_bytes"]["min"] == len(CHAT_BODY)
+    assert row["request_bytes"]["min"] > 0
+    assert row["connect_seconds"]["max"] > 0 and row["connect_seconds"]["min"] == 0
+    assert row["ttfb_seconds"]["count"] == 3 and row["decode_seconds"]["count"] == 3
+    assert "sinh_phan_hoi_tro_chuyen" in format_summary(registry)
+
+    exporter = registry.add_exporter(PrometheusTextfileExporter(str(tmp_path / "metrics" / "api.prom")))
+    registry.export()
+    registry.remove_exporter(exporter)
+    text = (tmp_path / "metrics" / "api.prom").read_text(encoding="utf-8")
+    assert ('thucchien_api_call_duration_seconds_count{function="sinh_phan_hoi_tro_chuyen",'
+            'model="gemini-2.5-flash",status="success"} 3') in text
+
+
+def test_loi_goi_async_ghi_nhan_qua_trace_config(setup_api_key, stub_server, registry):
+    """
+    Client async ghi nhận TTFB, số byte qua aiohttp TraceConfig; lời gọi lỗi được gắn nhãn status="error".
+    """
+    async def run():
+        client = AsyncThucChienHttpClient(base_url=stub_server)
+        set_async_http_client(client)
+        try:
+            await btc_api_client_async.sinh_phan_hoi_tro_chuyen([{"role": "user", "content": "hi"}], model="gpt-4o")
+            with pytest.raises(Exception):
+                await btc_api_client_async.kiem_tra_trang_thai_video("operations/khong-ton-tai")
+        finally:
+            await client.close()
+            set_async_http_client(None)
+
+    asyncio.run(run())
+
+    summary = registry.summary()
+    row = summary[("sinh_phan_hoi_tro_chuyen", "gpt-4o")]
+    assert row["response_bytes"]["sum"] == len(CHAT_BODY)
+    assert row["ttfb_seconds"]["count"] == 1 and row["connect_seconds"]["max"] > 0
+    assert summary[("kiem_tra_trang_thai_video", "")]["errors"] == 1
+
+
+def test_exporter_loi_duoc_log_khong_chan_exporter_khac(caplog):
+    """
+    Exporter ném lỗi được ghi log kèm traceback; các exporter khác vẫn chạy. Exporter thiếu export() không tạo được.
+    """
+    class _Hong(MetricsExporter):
+        def export(self, registry):
+            raise OSError("disk full")
+
+    class _Dem(MetricsExporter):
+        calls = 0
+
+        def export(self, registry):
+            _Dem.calls += 1
+
+    registry = MetricsRegistry()
+    registry.exporters.extend([_Hong(), _Dem()])
+    with caplog.at_level("ERROR", logger="src.api_services.metrics"):
+        registry.export()
+
+    assert _Dem.calls == 1
+    assert "_Hong" in caplog.text and "disk full" in caplog.text
+    with pytest.raises(TypeError):
+        type("_ThieuExport", (MetricsExporter,), {})()
@@ -0,0 +1,74 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import base64
+import json
+import math
+import struct
+import wave
+
+import pytest
+
+from src.api_services import btc_api_client
+from src.audio_processing.pcm_encoder import PcmFormat, encode_pcm, open_encoder, parse_pcm_mime_type
+
+
+def _sine_pcm(seconds: float, sample_rate: int, channels: int = 1) -> bytes:
+    samples = (int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(int(seconds * sample_rate)))
+    return b"".join(struct.pack("<h", s) * channels for s in samples)
+
+
+def test_doc_thong_so_tu_mime_type():
+    """
+    Tần số lấy mẫu, số kênh, độ sâu bit được đọc từ mime type; thiếu mime type thì dùng mặc định của Gemini.
+    """
+    assert parse_pcm_mime_type("audio/L16;codec=pcm;rate=24000") == PcmFormat(24000, 1, 2)
+    assert parse_pcm_mime_type("audio/l24; rate=48000; channels=2") == PcmFormat(48000, 2, 3)
+    assert parse_pcm_mime_type(None) == PcmFormat(24000, 1, 2)
+    with pytest.raises(ValueError):
+        parse_pcm_mime_type("audio/mpeg")
+
+
+@pytest.mark.parametrize("extension, magic", [(".wav", b"RIFF"), (".mp3", None), (".opus", b"OggS")])
+def test_ma_hoa_theo_luong_moi_dinh_dang(tmp_path, extension, magic):
+    """
+    PCM được đẩy vào bộ mã hoá theo từng khối (kể cả khối cắt giữa mẫu); file tạm được đổi tên khi xong.
+    """
+    pcm = _sine_pcm(1.0, 16000, channels=2)
+    file_path = str(tmp_path / ("out" + extension))
+    stats = encode_pcm((pcm[i:i + 1001] for i in range(0, len(pcm), 1001)), file_path, PcmFormat(16000, 2, 2))
+
+    assert stats["duration_seconds"] == pytest.approx(1.0) and stats["bytes_in"] == len(pcm)
+    assert os.listdir(tmp_path) == ["out" + extension]
+    header = open(file_path, "rb").read(4)
+    assert header.startswith(magic) if magic else (header[:3] == b"ID3" or header[0] == 0xFF)
+    if extension == ".wav":
+        with wave.open(file_path) as wav:
+            assert (wav.getframerate(), wav.getnchannels(), wav.readframes(wav.getnframes())) == (16000, 2, pcm)
+
+    with pytest.raises(RuntimeError):
+        with open_encoder(str(tmp_path / "loi.mp3"), PcmFormat(16000, 1, 2)) as encoder:
+            encoder.write(pcm[:100])
+            raise RuntimeError("huỷ giữa chừng")
+    assert os.listdir(tmp_path) == ["out" + extension]
+
+
+def test_tts_google_dung_mime_type_cua_phan_hoi(tmp_path):
+    """
+    Phản hồi TTS được giải mã theo luồng và mã hoá theo rate trong mimeType, không cố định 24 kHz.
+    """
+    pcm = _sine_pcm(0.5, 16000)
+    body = json.dumps({"candidates": [{"content": {"parts": [{"inlineData": {
+        "mimeType": "audio/L16;codec=pcm;rate=16000", "data": base64.b64encode(pcm).decode()}}]}}]}).encode()
+    file_path = str(tmp_path / "speech.wav")
+
+    chunks = (body[i:i + 4096] for i in range(0, len(body), 4096))
+    response_data, artifact, tmp_pcm = btc_api_client._giai_ma_stream(chunks, file_path)
+    result = btc_api_client._hoan_tat_giong_noi_google_stream(response_data, artifact, tmp_pcm, file_path)
+
+    assert result["success"] and result["file_path"] == file_path
+    assert result["audio"]["duration_seconds"] == pytest.approx(0.5)
+    assert not os.path.exists(tmp_pcm)
+    with wave.open(file_path) as wav:
+        assert wav.getframerate() == 16000 and wav.readframes(wav.getnframes()) == pcm
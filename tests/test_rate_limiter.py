@@ -0,0 +1,88 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from src.api_services.rate_limiter import QuotaExceededError, RateLimiter, RateLimitTimeout, TokenBucket
+
+
+def test_token_bucket_gian_cach_giua_cac_thread():
+    """
+    Với 20 token/giây và burst 1, 6 lời gọi từ nhiều thread phải trải dài ít nhất ~0.25 giây.
+    """
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        waits = list(executor.map(lambda _: bucket.acquire(), range(6)))
+    assert time.monotonic() - start >= 0.24
+    assert sorted(waits)[0] == 0.0 and max(waits) >= 0.24
+
+
+def test_token_bucket_async_va_max_wait():
+    """
+    Bản async chờ bằng asyncio.sleep; vượt quá max_wait thì ném RateLimitTimeout mà không tiêu token.
+    """
+    bucket = TokenBucket(rate=10.0, capacity=1)
+
+    async def run():
+        return await asyncio.gather(*(bucket.acquire_async() for _ in range(3)))
+
+    waits = asyncio.run(run())
+    assert max(waits) == pytest.approx(0.2, abs=0.05)
+    with pytest.raises(RateLimitTimeout):
+        bucket.reserve(max_wait=0.01)
+
+
+def test_rate_limiter_tu_choi_khi_het_ngan_sach():
+    """
+    Ngân sách được nạp từ /key/info; lời gọi tốn phí bị từ chối ngay khi ngân sách còn lại không đủ.
+    """
+    limiter = RateLimiter(estimated_costs={"sinh_hinh_anh": 1.0})
+    limiter.seed_from_key_info({"info": {"spend": 8.5, "max_budget": 10.0, "rpm_limit": 600}})
+
+    limiter.acquire("sinh_hinh_anh")
+    with pytest.raises(QuotaExceededError):
+        limiter.acquire("sinh_hinh_anh")
+    # Lời gọi không tốn phí (kiểm tra trạng thái) vẫn được phép
+    limiter.acquire("kiem_tra_trang_thai_video")
+
+    stats = limiter.stats()
+    assert stats["remaining_budget"] == pytest.approx(0.5)
+    assert stats["families"]["images"] == {"calls": 1, "rejected": 1, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def test_rate_limiter_tu_lam_moi_ngan_sach():
+    """
+    Khi bật auto_seed, ngân sách được nạp từ kiem_tra_chi_tieu ở lần dùng đầu tiên.
+    """
+    limiter = RateLimiter(auto_seed=True)
+    key_info = {"info": {"spend": 0.0, "max_budget": 5.0}}
+    with patch("src.api_services.btc_api_client.kiem_tra_chi_tieu", return_value=key_info) as mock_key_info:
+        limiter.acquire("sinh_phan_hoi_tro_chuyen")
+        limiter.acquire("sinh_phan_hoi_tro_chuyen")
+    assert mock_key_info.call_count == 1
+    assert limiter.stats()["remaining_budget"] == pytest.approx(5.0 - 2 * 0.002)
+
+
+def test_rate_limiter_hoan_lai_khi_het_max_wait():
+    """
+    Bucket của nhóm ném RateLimitTimeout: token đã đặt ở bucket chung và chi phí đã trừ đều được hoàn lại.
+    """
+    limiter = RateLimiter(family_limits={"images": (60, 1)}, global_rpm=60, max_wait=0.01,
+                          estimated_costs={"sinh_hinh_anh": 1.0})
+    limiter.seed_from_key_info({"info": {"spend": 0.0, "max_budget": 10.0}})
+    limiter._global_bucket = TokenBucket(rate=1.0, capacity=2)
+
+    limiter.acquire("sinh_hinh_anh")
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("sinh_hinh_anh")
+
+    assert limiter.stats()["remaining_budget"] == pytest.approx(9.0)
+    # Bucket chung còn nguyên token thứ hai, lời gọi nhóm khác không phải chờ
+    assert limiter.acquire("sinh_phan_hoi_tro_chuyen") == 0.0
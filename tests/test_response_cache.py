@@ -0,0 +1,193 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import base64
+import json
+import struct
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.api_services import btc_api_client, btc_api_client_async
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+from src.api_services.response_cache import (ResponseCache, disable_response_cache, enable_response_cache,
+                                             tao_khoa_yeu_cau)
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = enable_response_cache(cache_dir=str(tmp_path / "cache"))
+    yield cache
+    disable_response_cache()
+
+
+def _image_response(content: bytes):
+    response = MagicMock()
+    response.status_code = 200
+    body = json.dumps({"data": [{"b64_json": base64.b64encode(content).decode()}]}).encode()
+    response.iter_content.side_effect = lambda chunk_size=1: iter([body])
+    return response
+
+
+def test_sinh_hinh_anh_trung_cache_khong_goi_lai_api(setup_api_key, cache, tmp_path):
+    """
+    Lần gọi thứ hai với cùng prompt và tham số không gửi request, file được liên kết ra đường dẫn mới.
+    """
+    client = ThucChienHttpClient(base_url="https://stub.local")
+    set_http_client(client)
+    try:
+        with patch.object(client.session, "request", return_value=_image_response(b"png-bytes")) as mock_request:
+            first = btc_api_client.sinh_hinh_anh("a cat", str(tmp_path / "out" / "a.png"))
+            start = time.monotonic()
+            second = btc_api_client.sinh_hinh_anh("a cat", str(tmp_path / "out" / "b.png"))
+            elapsed = time.monotonic() - start
+            btc_api_client.sinh_hinh_anh("a dog", str(tmp_path / "out" / "c.png"))
+    finally:
+        set_http_client(None)
+
+    assert mock_request.call_count == 2
+    assert first["success"] and second["success"]
+    assert second["file_path"] == str(tmp_path / "out" / "b.png")
+    assert (tmp_path / "out" / "b.png").read_bytes() == b"png-bytes"
+    assert "b64_json" in second["response_data"]["data"][0]
+    assert elapsed < 0.5
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_cache_doi_duoi_file_nhu_ham_goc(setup_api_key, cache, tmp_path):
+    """
+    Khi hàm gốc đổi đuôi file (TTS Google luôn lưu .mp3), lần trúng cache cũng trả về đường dẫn .mp3.
+    """
+    calls = []
+
+    async def fake_tts(model, contents, file_path, generation_config=None, **kwargs):
+        calls.append(file_path)
+        final_path = os.path.splitext(file_path)[0] + ".mp3"
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        with open(final_path, "wb") as f:
+            f.write(b"mp3-bytes")
+        return {"success": True, "message": f"Đã lưu tại: {final_path}", "file_path": final_path}
+
+    wrapped = btc_api_client_async.cache_response(fake_tts)
+    contents = [{"parts": [{"text": "Xin chào"}]}]
+
+    async def run():
+        await wrapped("tts", contents, str(tmp_path / "a.wav"))
+        return await wrapped("tts", contents, file_path=str(tmp_path / "b.wav"))
+
+    result = asyncio.run(run())
+    expected = str(tmp_path / "b.mp3")
+    assert len(calls) == 1
+    assert result["file_path"] == expected and expected in result["message"]
+    assert open(expected, "rb").read() == b"mp3-bytes"
+
+
+def test_lru_va_ttl(tmp_path):
+    """
+    Mục hết hạn bị coi là trượt; khi vượt dung lượng, mục ít được dùng gần đây nhất bị xoá trước.
+    """
+    cache = ResponseCache(cache_dir=str(tmp_path / "cache"), max_size_bytes=250,
+                          ttl_by_function={"ngan_han": 0.01})
+    cache.put("short", "ngan_han", {"choices": []})
+    time.sleep(0.02)
+    assert cache.get("short") is None
+
+    for key in ("k1", "k2"):
+        cache.put(key, "sinh_phan_hoi_tro_chuyen", {"content": key * 40})
+    cache.get("k1")  # k1 vừa được dùng, k2 sẽ bị thu hồi
+    cache.put("k3", "sinh_phan_hoi_tro_chuyen", {"content": "k3" * 40})
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None and cache.get("k3") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expired"] == 1
+    assert stats["size_bytes"] <= 250
+    cache.close()
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "hardlink"])
+def test_ghi_de_file_ket_qua_khong_lam_hong_cache(tmp_path, link_mode):
+    """
+    Ghi đè tại chỗ (cùng kích thước) vào file đã lấy từ cache: chế độ copy không ảnh hưởng blob; chế độ hardlink
+    phát hiện blob hỏng bằng sha256 và coi là trượt thay vì trả về nội dung sai.
+    """
+    cache = ResponseCache(cache_dir=str(tmp_path / "cache"), link_mode=link_mode)
+    source = tmp_path / "src.png"
+    source.write_bytes(b"AAAA")
+    cache.put("k", "sinh_hinh_anh", {"success": True, "file_path": str(source)}, requested_path=str(source))
+
+    target = tmp_path / "out" / "a.png"
+    assert cache.get("k", str(target))["file_path"] == str(target)
+    with open(target, "r+b") as f:
+        f.write(b"BBBB")
+
+    hit = cache.get("k", str(tmp_path / "out" / "b.png"))
+    if link_mode == "copy":
+        assert (tmp_path / "out" / "b.png").read_bytes() == b"AAAA"
+    else:
+        assert hit is None
+    cache.close()
+
+
+def test_luu_bytes_khong_ghi_tai_cho(tmp_path):
+    """
+    `_luu_bytes` thay file bằng file mới (đổi tên) thay vì ghi tại chỗ, nên file hard-link tới blob không bị sửa.
+    """
+    blob = tmp_path / "blob"
+    blob.write_bytes(b"AAAA")
+    target = tmp_path / "out" / "a.png"
+    target.parent.mkdir()
+    os.link(blob, target)
+
+    btc_api_client._luu_bytes(str(target), b"BBBB")
+
+    assert target.read_bytes() == b"BBBB" and blob.read_bytes() == b"AAAA"
+    assert os.listdir(target.parent) == ["a.png"]
+
+
+def _tts_response():
+    pcm = b"".join(struct.pack("<h", (i * 97) % 8000) for i in range(2400))
+    body = json.dumps({"candidates": [{"content": {"parts": [{"inlineData": {
+        "mimeType": "audio/L16;codec=pcm;rate=24000", "data": base64.b64encode(pcm).decode()}}]}}]}).encode()
+    response = MagicMock()
+    response.status_code = 200
+    response.iter_content.side_effect = lambda chunk_size=1: iter([body])
+    return response
+
+
+def test_tts_google_khac_dinh_dang_khong_trung_cache(setup_api_key, cache, tmp_path):
+    """
+    Định dạng TTS Gemini theo đuôi file nằm trong khoá: gọi .wav rồi .mp3 cùng văn bản phải mã hoá lại thành MP3
+    (không copy WAV sang b.mp3); gọi lại .wav thì trúng cache.
+    """
+    contents = [{"parts": [{"text": "Xin chào"}]}]
+    client = ThucChienHttpClient(base_url="https://stub.local")
+    set_http_client(client)
+    try:
+        with patch.object(client.session, "request", side_effect=lambda *a, **k: _tts_response()) as mock_request:
+            btc_api_client.chuyen_van_ban_thanh_giong_noi_voi_google("tts", contents, str(tmp_path / "a.wav"))
+            mp3 = btc_api_client.chuyen_van_ban_thanh_giong_noi_voi_google("tts", contents, str(tmp_path / "b.mp3"))
+            btc_api_client.chuyen_van_ban_thanh_giong_noi_voi_google("tts", contents, str(tmp_path / "c.wav"))
+    finally:
+        set_http_client(None)
+
+    assert mp3["success"] and mp3["file_path"] == str(tmp_path / "b.mp3")
+    header = (tmp_path / "b.mp3").read_bytes()[:3]
+    assert header == b"ID3" or header[0] == 0xFF
+    assert (tmp_path / "c.wav").read_bytes()[:4] == b"RIFF"
+    assert mock_request.call_count == 2
+
+    async_tts = btc_api_client_async.chuyen_van_ban_thanh_giong_noi_voi_google
+    keys = {tao_khoa_yeu_cau(async_tts, ("tts", contents, path), {})[0] for path in ("a.wav", "b.mp3", "c.ogg")}
+    assert len(keys) == 3
@@ -0,0 +1,137 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import email.utils
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from src.api_services import btc_api_client
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+from src.api_services.retry_policy import (
+    ERROR_CONNECT,
+    ERROR_TRANSPORT,
+    RetryPolicy,
+    parse_retry_after,
+    set_retry_policy,
+    get_retry_policy,
+)
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_client():
+    client = ThucChienHttpClient(base_url="https://stub.local")
+    set_http_client(client)
+    yield client
+    set_http_client(None)
+
+
+def _mock_response(status_code: int, json_data: dict = None, headers: dict = None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.text = json.dumps(json_data or {})
+    response.json.return_value = json_data or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(f"{status_code} Error", response=response)
+    else:
+        response.raise_for_status.return_value = None
+    return response
+
+
+def test_should_retry_phan_biet_idempotent():
+    """
+    GET được thử lại với mọi lỗi tạm thời; POST chỉ khi request chắc chắn chưa được xử lý.
+    """
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry("GET", 1, status_code=502)
+    assert policy.should_retry("GET", 1, error_kind=ERROR_TRANSPORT)
+    assert policy.should_retry("POST", 1, status_code=429)
+    assert policy.should_retry("POST", 1, status_code=503)
+    assert policy.should_retry("POST", 1, error_kind=ERROR_CONNECT)
+    assert not policy.should_retry("POST", 1, status_code=502)
+    assert not policy.should_retry("POST", 1, error_kind=ERROR_TRANSPORT)
+    assert not policy.should_retry("GET", 1, status_code=400)
+    assert not policy.should_retry("GET", 3, status_code=503)
+    assert RetryPolicy(retry_non_idempotent=True).should_retry("POST", 1, status_code=502)
+
+
+def test_compute_delay_backoff_va_retry_after():
+    """
+    Backoff tăng theo cấp số nhân, bị chặn bởi backoff_max, và Retry-After được ưu tiên.
+    """
+    policy = RetryPolicy(backoff_base=1.0, backoff_factor=2.0, backoff_max=5.0, jitter="none")
+    assert [policy.compute_delay(i) for i in range(1, 5)] == [1.0, 2.0, 4.0, 5.0]
+    assert policy.compute_delay(1, retry_after=7.5) == 7.5
+    jittered = RetryPolicy(backoff_base=4.0, jitter="equal").compute_delay(1)
+    assert 2.0 <= jittered <= 4.0
+
+
+def test_parse_retry_after():
+    """
+    Đọc được Retry-After dạng số giây, HTTP-date và retry-after-ms.
+    """
+    assert parse_retry_after({"Retry-After": "12"}) == 12.0
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    http_date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after({"Retry-After": http_date}) <= 31
+    assert parse_retry_after({"Retry-After": "không hợp lệ"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_sinh_phan_hoi_tro_chuyen_thu_lai_sau_429(setup_api_key, stub_client):
+    """
+    Khi gateway trả về 429 kèm Retry-After, client chờ đúng thời gian đó rồi gửi lại và decorator ghi nhận số lần thử lại.
+    """
+    client = stub_client
+    responses = [
+        _mock_response(429, headers={"Retry-After": "0.01"}),
+        _mock_response(200, {"choices": [{"message": {"content": "ok"}}]}),
+    ]
+    logged = []
+
+    def capture_log(interaction_type, api_function_name, data, interaction_id, level=None):
+        logged.append((interaction_type, data))
+
+    with patch.object(client.session, "request", side_effect=responses) as mock_request, \
+         patch.object(btc_api_client, "log_api_interaction", side_effect=capture_log):
+        result = btc_api_client.sinh_phan_hoi_tro_chuyen([{"role": "user", "content": "hi"}])
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert mock_request.call_count == 2
+    assert logged[-1][0] == "response" and logged[-1][1]["retries"] == 1
+
+
+def test_sinh_hinh_anh_khong_gui_lai_khi_502(setup_api_key, stub_client):
+    """
+    POST sinh ảnh (tốn phí) không được gửi lại khi gặp 502 vì server có thể đã xử lý request.
+    """
+    client = stub_client
+    with patch.object(client.session, "request", return_value=_mock_response(502)) as mock_request:
+        with pytest.raises(requests.exceptions.HTTPError):
+            btc_api_client.sinh_hinh_anh("prompt", "out/img.png")
+    assert mock_request.call_count == 1
+
+
+def test_set_retry_policy_theo_endpoint():
+    """
+    Có thể cấu hình chính sách riêng cho từng endpoint.
+    """
+    original = get_retry_policy("sinh_hinh_anh")
+    try:
+        custom = RetryPolicy(max_attempts=1)
+        set_retry_policy("sinh_hinh_anh", custom)
+        assert get_retry_policy("sinh_hinh_anh") is custom
+    finally:
+        set_retry_policy("sinh_hinh_anh", original)
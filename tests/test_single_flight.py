@@ -0,0 +1,101 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.api_services.single_flight import SingleFlight, set_single_flight, single_flight
+
+
+@pytest.fixture
+def flights():
+    flights = SingleFlight()
+    set_single_flight(flights)
+    yield flights
+    set_single_flight(SingleFlight())
+
+
+def test_cac_thread_cung_yeu_cau_chi_goi_mot_lan(flights, tmp_path):
+    """
+    5 thread cùng sinh một ảnh: chỉ một lời gọi upstream, mỗi thread nhận file tại đường dẫn của mình.
+    """
+    calls = []
+
+    @single_flight
+    def fake_image(prompt, file_path, model="imagen-4"):
+        calls.append(file_path)
+        time.sleep(0.1)
+        with open(file_path, "wb") as f:
+            f.write(b"png")
+        return {"success": True, "message": f"Đã lưu: {file_path}", "file_path": file_path}
+
+    paths = [str(tmp_path / f"{i}.png") for i in range(5)]
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda p: fake_image("cover", p), paths))
+
+    assert len(calls) == 1
+    assert [r["file_path"] for r in results] == paths
+    assert all(open(p, "rb").read() == b"png" for p in paths)
+    assert flights.stats() == {"leaders": 1, "coalesced": 4}
+
+
+def test_loi_duoc_truyen_cho_moi_ben_cho(flights):
+    """
+    Nếu lời gọi upstream lỗi, mọi lời gọi đang chờ đều nhận cùng exception.
+    """
+    started = threading.Event()
+
+    @single_flight
+    def failing(prompt):
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("upstream 500")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(failing, "p")]
+        started.wait()
+        futures += [executor.submit(failing, "p") for _ in range(2)]
+        errors = [f.exception() for f in futures]
+
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert flights.stats()["coalesced"] == 2
+
+
+def test_async_huy_mot_ben_khong_anh_huong_ben_con_lai(flights):
+    """
+    Huỷ lời gọi leader không huỷ request chung khi vẫn còn bên chờ; huỷ hết thì request bị huỷ.
+    """
+    calls = []
+
+    @single_flight
+    async def fake_chat(messages, model="gemini-2.5-flash"):
+        calls.append(model)
+        await asyncio.sleep(0.1)
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+    async def run():
+        messages = [{"role": "user", "content": "hi"}]
+        leader = asyncio.create_task(fake_chat(messages))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(fake_chat(messages))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+
+        lone = asyncio.create_task(fake_chat(messages, model="other"))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lone
+        return leader.cancelled(), result
+
+    leader_cancelled, result = asyncio.run(run())
+    assert leader_cancelled
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert calls == ["gemini-2.5-flash", "other"]
+    assert flights.stats() == {"leaders": 2, "coalesced": 1}
@@ -0,0 +1,67 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import base64
+import json
+
+import pytest
+
+from src.api_services.streaming_decode import StreamingBase64Extractor
+
+
+def _feed(body: bytes, file_path: str, chunk_size: int):
+    extractor = StreamingBase64Extractor(file_path)
+    for i in range(0, len(body), chunk_size):
+        extractor.feed(body[i:i + chunk_size])
+    return extractor.close(), extractor.artifact
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 4096])
+def test_giai_ma_b64_json_voi_moi_kich_thuoc_khoi(tmp_path, chunk_size):
+    """
+    Ảnh đầu tiên được giải mã đúng dù khối bị cắt ở bất kỳ đâu (kể cả giữa escape "\\/");
+    ảnh thứ hai bị bỏ qua và phần JSON còn lại giữ nguyên.
+    """
+    image = os.urandom(3000)
+    b64 = base64.b64encode(image).decode()
+    body = json.dumps({"created": 1, "data": [{"b64_json": b64}, {"b64_json": b64}],
+                       "note": "a \"quoted\" é value"}).replace("/", "\\/").encode()
+    file_path = str(tmp_path / "out.png")
+
+    response_data, artifact = _feed(body, file_path, chunk_size)
+
+    assert open(file_path, "rb").read() == image
+    assert artifact == {"path": ("data", 0, "b64_json"), "mime_type": None, "size": len(image)}
+    assert response_data["note"] == "a \"quoted\" é value"
+    assert response_data["data"][1]["b64_json"] == "..." + b64[-50:] + " (truncated)"
+
+
+def test_data_url_va_url_thuong(tmp_path):
+    """
+    Data URL được giải mã và lấy mime type; URL http thường được giữ nguyên, không tạo file.
+    """
+    image = os.urandom(500)
+    data_url = "data:image/jpeg;base64," + base64.b64encode(image).decode()
+    body = json.dumps({"choices": [{"message": {"images": [{"image_url": {"url": data_url}}]}}]}).encode()
+    response_data, artifact = _feed(body, str(tmp_path / "a.bin"), 5)
+    assert artifact["mime_type"] == "image/jpeg"
+    assert open(tmp_path / "a.bin", "rb").read() == image
+    assert response_data["choices"][0]["message"]["images"][0]["image_url"]["url"].startswith("data:image/jpeg;base64,...")
+
+    body = json.dumps({"choices": [{"message": {"images": [{"image_url": {"url": "https://cdn/x.png"}}]}}]}).encode()
+    response_data, artifact = _feed(body, str(tmp_path / "b.bin"), 5)
+    assert artifact is None and not os.path.exists(tmp_path / "b.bin")
+    assert response_data["choices"][0]["message"]["images"][0]["image_url"]["url"] == "https://cdn/x.png"
+
+
+def test_json_cut_ngang_bi_tu_choi(tmp_path):
+    """
+    Phản hồi bị cắt giữa chừng gây ValueError và file dở dang bị xoá.
+    """
+    body = json.dumps({"candidates": [{"content": {"parts": [{"inlineData": {"mimeType": "audio/L16", "data": "QUJD" * 100}}]}}]}).encode()
+    extractor = StreamingBase64Extractor(str(tmp_path / "x.pcm"))
+    extractor.feed(body[:200])
+    with pytest.raises(ValueError):
+        extractor.close()
+    assert not os.path.exists(tmp_path / "x.pcm")
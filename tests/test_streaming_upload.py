@@ -0,0 +1,125 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import base64
+import json
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.api_services import btc_api_client, btc_api_client_async
+from src.api_services.async_http_client import AsyncThucChienHttpClient, set_async_http_client
+from src.api_services.http_client import ThucChienHttpClient, set_http_client
+from src.api_services.retry_policy import RetryPolicy, get_retry_policy, set_retry_policy
+from src.api_services.streaming_upload import FileInput, StreamingJsonBody
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    bodies = []
+    fail_first = False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _StubHandler.bodies.append(json.loads(body))
+        if _StubHandler.fail_first:
+            _StubHandler.fail_first = False
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        reply = b'{"choices": [{"message": {"content": "ok"}}]}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def setup_api_key():
+    os.environ["THUCCHIEN_AI_API_KEY"] = "fake_api_key_for_testing"
+    yield
+    del os.environ["THUCCHIEN_AI_API_KEY"]
+
+
+@pytest.fixture
+def stub_server():
+    _StubHandler.bodies = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_body_giong_json_dumps_va_bo_nho_khong_phu_thuoc_kich_thuoc_file(tmp_path):
+    """
+    Body sinh theo luồng giải mã ra đúng payload (kể cả data URL và ký tự Unicode), độ dài khớp `len()`,
+    tua lại được và bộ nhớ đỉnh khi đọc file 8 MB chỉ cỡ một khối.
+    """
+    data = os.urandom(8 * 1024 * 1024 + 1)
+    image_path = tmp_path / "anh.png"
+    image_path.write_bytes(data)
+    payload = {"prompt": "Ảnh \"chân dung\"", "image": {"bytesBase64Encoded": FileInput(str(image_path))},
+               "audio": FileInput(str(image_path), data_url=True)}
+    body = StreamingJsonBody(payload, chunk_size=1000)
+
+    tracemalloc.start()
+    while body.read(64 * 1024):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert body.tell() == len(body) and peak < 512 * 1024
+
+    body.seek(0)
+    decoded = json.loads(body.read())
+    assert decoded["prompt"] == payload["prompt"]
+    assert base64.b64decode(decoded["image"]["bytesBase64Encoded"]) == data
+    assert decoded["audio"].startswith("data:image/png;base64,")
+    assert base64.b64decode(decoded["audio"].split(",", 1)[1]) == data
+
+
+def test_chuyen_am_thanh_gui_file_theo_luong_va_thu_lai(setup_api_key, stub_server, tmp_path):
+    """
+    Bản đồng bộ và async gửi file âm thanh theo luồng; khi bị 503 body được tua lại và gửi đủ ở lần thử lại.
+    File không tồn tại vẫn trả về lỗi như trước.
+    """
+    audio_path = tmp_path / "giong_noi.mp3"
+    audio_path.write_bytes(os.urandom(300001))
+    expected_url = "data:audio/mp3;base64," + base64.b64encode(audio_path.read_bytes()).decode()
+
+    original = get_retry_policy("chuyen_am_thanh_thanh_van_ban")
+    set_retry_policy("chuyen_am_thanh_thanh_van_ban", RetryPolicy(backoff_base=0.01, retry_non_idempotent=True))
+    set_http_client(ThucChienHttpClient(base_url=stub_server))
+    try:
+        _StubHandler.fail_first = True
+        result = btc_api_client.chuyen_am_thanh_thanh_van_ban(str(audio_path), prompt="Chép lại")
+        assert result["choices"][0]["message"]["content"] == "ok"
+        assert len(_StubHandler.bodies) == 2
+        for body in _StubHandler.bodies:
+            assert body["messages"][0]["content"][1]["audio_url"]["url"] == expected_url
+
+        async def chay_async():
+            set_async_http_client(AsyncThucChienHttpClient(base_url=stub_server))
+            try:
+                return await btc_api_client_async.chuyen_am_thanh_thanh_van_ban(str(audio_path))
+            finally:
+                await btc_api_client_async.get_async_http_client().close()
+
+        _StubHandler.fail_first = True
+        assert asyncio.run(chay_async())["choices"][0]["message"]["content"] == "ok"
+        assert _StubHandler.bodies[-1]["messages"][0]["content"][1]["audio_url"]["url"] == expected_url
+
+        assert "error" in btc_api_client.chuyen_am_thanh_thanh_van_ban(str(tmp_path / "khong_co.mp3"))
+    finally:
+        set_retry_policy("chuyen_am_thanh_thanh_van_ban", original)
+        set_http_client(None)
+        set_async_http_client(None)
@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import base64
+import xml.etree.ElementTree as ET
+
+from src.image_processing import svg_template
+from src.image_processing.svg_handler import SvgRenderJob, render_svg_batch
+from src.image_processing.svg_template import SVG_NS, XLINK_NS, encode_image
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+COMPLEX_SVG = os.path.join(DATA_DIR, "svg_templates", "complex.svg")
+JPEG_PATH = os.path.join(DATA_DIR, "images", "1.jpg")
+PNG_PATH = os.path.join(DATA_DIR, "images", "input.png")
+
+
+def _href_anh(svg_path) -> list:
+    root = ET.parse(svg_path).getroot()
+    return [image.get(f"{{{XLINK_NS}}}href") for image in root.iter(f"{{{SVG_NS}}}image")]
+
+
+def test_lo_tren_process_pool_giu_thu_tu_va_tra_loi_theo_job(tmp_path):
+    """
+    Các job được render trên nhiều process, kết quả đúng thứ tự; job lỗi (ảnh không tồn tại) trả về "error"
+    mà không làm hỏng các job khác; ảnh JPEG được ghi đúng kiểu MIME.
+    """
+    jobs = [
+        SvgRenderJob.from_complex_data(COMPLEX_SVG, str(tmp_path / f"trang_{i}.svg"),
+                                       {"title": f"Trang {i}", "photos": [JPEG_PATH, PNG_PATH]})
+        for i in range(6)
+    ]
+    jobs[3] = SvgRenderJob.from_complex_data(COMPLEX_SVG, str(tmp_path / "loi.svg"),
+                                             {"photos": [str(tmp_path / "khong_co.jpg")]})
+    report = render_svg_batch(jobs, max_workers=2)
+
+    assert report["succeeded"] == 5 and report["failed"] == 1
+    assert [r["output_svg_path"] for r in report["results"]] == [job.output_svg_path for job in jobs]
+    assert "khong_co.jpg" in report["results"][3]["error"] and not os.path.exists(tmp_path / "loi.svg")
+
+    root = ET.parse(tmp_path / "trang_5.svg").getroot()
+    assert root.find(f".//{{{SVG_NS}}}text[@id='title']").text == "Trang 5"
+    jpeg_href, png_href = _href_anh(tmp_path / "trang_5.svg")
+    with open(JPEG_PATH, "rb") as f:
+        assert jpeg_href == "data:image/jpeg;base64," + base64.b64encode(f.read()).decode()
+    assert png_href.startswith("data:image/png;base64,")
+
+
+def test_anh_duoc_ma_hoa_mot_lan_va_ma_hoa_lai_khi_file_doi(tmp_path):
+    """Nhiều trang dùng chung một ảnh chỉ đọc/mã hoá ảnh một lần; sửa file (mtime đổi) thì mã hoá lại."""
+    image_path = tmp_path / "anh.jpg"
+    image_path.write_bytes(b"\xff\xd8\xff\xe0 cu")
+    svg_template._ma_hoa_anh.cache_clear()
+
+    jobs = [(COMPLEX_SVG, str(tmp_path / f"trang_{i}.svg"), None, {"photo1": str(image_path)}) for i in range(5)]
+    assert render_svg_batch(jobs, max_workers=1)["succeeded"] == 5
+    info = svg_template._ma_hoa_anh.cache_info()
+    assert (info.misses, info.hits) == (1, 4)
+
+    image_path.write_bytes(b"\x89PNG\r\n\x1a\n moi")
+    os.utime(image_path, ns=(0, 0))
+    assert encode_image(str(image_path)) == ("image/png", base64.b64encode(image_path.read_bytes()).decode())
+    assert svg_template._ma_hoa_anh.cache_info().misses == 2
@@ -0,0 +1,97 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import base64
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+from PIL import Image
+
+from src.image_processing import svg_template
+from src.image_processing.svg_handler import SvgRenderJob, render_svg_batch
+from src.image_processing.svg_template import SVG_NS, XLINK_NS, EmbedOptions, SvgTemplate, encode_image
+
+JPEG_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "images", "1.jpg")
+TEMPLATE = f"""<svg xmlns="{SVG_NS}" width="800" height="600">
+  <rect id="photo1" x="10" y="10" width="300" height="200" />
+  <rect id="nen" width="100%" height="100%" />
+</svg>"""
+
+
+@pytest.fixture
+def dem_ma_hoa(monkeypatch):
+    calls = []
+    original = svg_template._ma_hoa_lai
+
+    def ma_hoa_lai(image_path, box, options):
+        calls.append((box, options.format))
+        return original(image_path, box, options)
+
+    monkeypatch.setattr(svg_template, "_ma_hoa_lai", ma_hoa_lai)
+    svg_template._RESIZE_CACHE.clear()
+    return calls
+
+
+def _anh_nhung(svg_text: str) -> tuple:
+    href = ET.fromstring(svg_text).find(f"{{{SVG_NS}}}image").get(f"{{{XLINK_NS}}}href")
+    mime_type, data = href[len("data:"):].split(";base64,")
+    return mime_type, Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+def test_thu_nho_vua_rect_va_dung_lai_cache(tmp_path, dem_ma_hoa):
+    """
+    Ảnh 777x518 được thu nhỏ vừa khung 300x200 x2 (giữ tỉ lệ) và nhúng dạng WebP; render lại (kể cả qua
+    render_svg_batch) dùng lại bản đã mã hoá, đổi định dạng thì mã hoá lại; số byte giảm được báo cáo.
+    """
+    template = SvgTemplate.from_string(TEMPLATE)
+    stats = {}
+    mime_type, image = _anh_nhung(template.render(images={"photo1": JPEG_PATH}, embed=EmbedOptions(), stats=stats))
+    assert mime_type == "image/webp" and image.format == "WEBP" and image.size == (600, 400)
+    assert stats["images"] == 1 and stats["source_bytes"] == os.path.getsize(JPEG_PATH)
+    assert stats["embedded_bytes"] < stats["source_bytes"] / 2
+
+    template.render(images={"photo1": JPEG_PATH}, embed=EmbedOptions())
+    mime_type, image = _anh_nhung(template.render(images={"photo1": JPEG_PATH},
+                                                  embed=EmbedOptions(format="jpeg", quality=60, scale=1)))
+    assert mime_type == "image/jpeg" and image.size == (300, 200)
+    assert dem_ma_hoa == [((600, 400), "webp"), ((300, 200), "jpeg")]
+
+    svg_path = tmp_path / "mau.svg"
+    svg_path.write_text(TEMPLATE, encoding="utf-8")
+    jobs = [SvgRenderJob(str(svg_path), str(tmp_path / f"trang_{i}.svg"), images={"photo1": JPEG_PATH},
+                         embed=EmbedOptions()) for i in range(3)]
+    report = render_svg_batch(jobs, max_workers=1)
+    assert report["succeeded"] == 3 and len(dem_ma_hoa) == 2
+    assert report["embedded_image_bytes"] == 3 * stats["embedded_bytes"]
+    assert report["source_image_bytes"] == 3 * stats["source_bytes"]
+
+
+def test_cache_thu_muc_va_giu_anh_goc_khi_khong_nho_hon(tmp_path, dem_ma_hoa):
+    """
+    Bản thu nhỏ được lưu vào cache_dir và dùng lại ở process khác (cache bộ nhớ trống); ảnh đã nhỏ hơn khung
+    mà mã hoá lại không nhỏ hơn, hoặc rect không có kích thước tuyệt đối, thì nhúng nguyên ảnh gốc.
+    """
+    options = EmbedOptions(format="jpeg", cache_dir=str(tmp_path / "cache"))
+    template = SvgTemplate.from_string(TEMPLATE)
+    first = template.render(images={"photo1": JPEG_PATH}, embed=options)
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    svg_template._RESIZE_CACHE.clear()
+    assert template.render(images={"photo1": JPEG_PATH}, embed=options) == first
+    assert len(dem_ma_hoa) == 1
+
+    tiny_path = tmp_path / "nho.png"
+    Image.new("RGB", (4, 4), (200, 0, 0)).save(tiny_path)
+    original = encode_image(str(tiny_path))
+    stats = {}
+    svg_text = template.render(images={"photo1": str(tiny_path), "nen": JPEG_PATH},
+                               embed=EmbedOptions(format="webp", quality=100), stats=stats)
+    hrefs = [image.get(f"{{{XLINK_NS}}}href") for image in ET.fromstring(svg_text).iter(f"{{{SVG_NS}}}image")]
+    assert hrefs[0] == f"data:{original[0]};base64,{original[1]}"
+    assert hrefs[1] == "data:image/jpeg;base64," + encode_image(JPEG_PATH)[1]
+    assert stats["source_bytes"] == stats["embedded_bytes"]
+
+    with pytest.raises(ValueError):
+        template.render(images={"photo1": JPEG_PATH}, embed=EmbedOptions(format="avif"))
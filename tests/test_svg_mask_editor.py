@@ -0,0 +1,109 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import io
+import re
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.image_processing import svg_rasterizer
+from src.image_processing.svg_handler import edit_image_with_svg_masks
+from src.image_processing.svg_mask_editor import MaskEdit, SvgMaskEditor
+from src.image_processing.svg_rasterizer import RasterBackend, SvgRasterizer, register_backend, set_rasterizer
+
+RENDERED = []
+
+
+def _backend_hinh_chu_nhat():
+    """Backend thử nghiệm: vẽ các <rect x y width height fill> lên nền đen bằng Pillow."""
+    def render(svg_bytes, width, height):
+        RENDERED.append(svg_bytes)
+        image = Image.new("RGB", (width, height), "#000000")
+        for x, y, w, h, fill in re.findall(rb'<rect x="(\d+)" y="(\d+)" width="(\d+)" height="(\d+)" fill="(#\w+)"',
+                                           svg_bytes):
+            image.paste(fill.decode(), (int(x), int(y), int(x) + int(w), int(y) + int(h)))
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        return buf.getvalue()
+    return RasterBackend("rect-test", render)
+
+
+def _svg(*rects) -> str:
+    body = "".join(f'<rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{fill}"/>' for x, y, w, h, fill in rects)
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="48">{body}</svg>'
+
+
+@pytest.fixture
+def rect_backend():
+    order, factories = svg_rasterizer.BACKEND_ORDER, dict(svg_rasterizer._BACKEND_FACTORIES)
+    register_backend("rect-test", _backend_hinh_chu_nhat)
+    RENDERED.clear()
+    yield
+    set_rasterizer(None)
+    svg_rasterizer.BACKEND_ORDER = order
+    svg_rasterizer._BACKEND_FACTORIES.clear()
+    svg_rasterizer._BACKEND_FACTORIES.update(factories)
+    svg_rasterizer._resolved.clear()
+
+
+def test_ghep_mot_luot_giong_phu_lan_luot():
+    """Ghép nhiều vùng/màu trong một lượt cho kết quả như phủ lần lượt từng màu (kể cả opacity và alpha mềm)."""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8)
+    soft = rng.random((40, 50)).astype(np.float32)
+    gray = rng.integers(0, 256, size=(40, 50), dtype=np.uint8)
+    edits = [
+        MaskEdit(soft, (255, 0, 0)),
+        MaskEdit((5, 5, 30, 25), (0, 255, 0), opacity=0.5),
+        MaskEdit(gray, (0, 0, 255)),
+        (gray, (10, 20, 30), 0.8, 0.0, None),
+    ]
+    result = SvgMaskEditor(base).apply(edits)
+
+    expected = base.astype(np.float64)
+    rect = np.zeros((40, 50))
+    rect[5:25, 5:30] = 0.5
+    for alpha, color in [(soft, (255, 0, 0)), (rect, (0, 255, 0)), (gray > 128, (0, 0, 255)),
+                         (gray / 255.0 * 0.8, (10, 20, 30))]:
+        alpha = np.asarray(alpha, dtype=np.float64)[..., None]
+        expected = expected * (1 - alpha) + np.asarray(color) * alpha
+    assert result.dtype == np.uint8 and np.abs(result.astype(int) - np.rint(expected)).max() <= 1
+
+
+def test_feather_lam_mem_mep_vung():
+    """feather làm mép vùng chuyển dần; giữa vùng vẫn phủ kín, xa vùng giữ nguyên ảnh gốc."""
+    base = np.zeros((60, 60, 3), dtype=np.uint8)
+    editor = SvgMaskEditor(base)
+    alpha = editor.alpha(MaskEdit((20, 20, 40, 40), (255, 255, 255), feather=3))
+    assert alpha[30, 30] == pytest.approx(1.0, abs=0.01) and alpha[0, 0] == pytest.approx(0.0, abs=1e-6)
+    assert 0.3 < alpha[30, 20] < 0.7
+    assert alpha.sum() == pytest.approx(400, rel=0.01)
+
+    result = editor.apply([MaskEdit((20, 20, 40, 40), (255, 255, 255), feather=3)])
+    row = result[30, :, 0]
+    assert row[0] == 0 and row[30] == 255 and np.all(np.diff(row[10:30].astype(int)) >= 0)
+
+
+def test_anh_goc_chi_rasterize_mot_lan(rect_backend, tmp_path):
+    """
+    Nhiều lần chỉnh sửa cùng một ảnh gốc chỉ rasterize ảnh gốc một lần, mỗi mask SVG một lần;
+    edit_image_with_svg_masks tô nhiều vùng và lưu file.
+    """
+    base_svg = _svg((0, 0, 64, 48, "#808080"))
+    mask_left, mask_right = _svg((0, 0, 32, 48, "#ffffff")), _svg((32, 0, 32, 48, "#ffffff"))
+    editor = SvgMaskEditor(base_svg, 64, 48, rasterizer=SvgRasterizer(max_workers=1, cache_bytes=0))
+    for color in [(255, 0, 0), (0, 255, 0), (0, 0, 255)]:
+        image = editor.apply([(mask_left, color), (mask_right, (255, 255, 255), 0.5)])
+        assert tuple(image[10, 10]) == color and tuple(image[10, 50]) == (192, 192, 192)
+    # Lần thử backend khi chọn + ảnh gốc + hai mask
+    assert len(RENDERED) == 4
+
+    output_path = tmp_path / "out" / "anh.png"
+    result = edit_image_with_svg_masks(base_svg, [(mask_left, (255, 0, 0)), (mask_right, (0, 0, 255))],
+                                       str(output_path), 64, 48)
+    assert result == {"success": True, "output_image_path": str(output_path)}
+    saved = Image.open(output_path)
+    assert saved.getpixel((10, 10)) == (255, 0, 0) and saved.getpixel((50, 10)) == (0, 0, 255)
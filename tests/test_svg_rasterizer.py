@@ -0,0 +1,111 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import io
+import re
+
+import pytest
+from PIL import Image
+
+from src.image_processing import svg_rasterizer
+from src.image_processing.svg_handler import svg_to_png_bytes
+from src.image_processing.svg_rasterizer import (RasterBackend, RasterBackendUnavailable, RasterJob, SvgRasterizer,
+                                                 register_backend, reset_backends, resolve_backend, set_rasterizer)
+
+RENDERED = []
+
+
+def _backend_pillow():
+    """Backend thử nghiệm: tô cả ảnh bằng màu fill của phần tử đầu tiên; SVG chứa "LOI" thì báo lỗi."""
+    def render(svg_bytes, width, height):
+        if b"LOI" in svg_bytes:
+            raise ValueError("SVG hỏng")
+        RENDERED.append((width, height))
+        color = re.search(rb'fill="(#[0-9a-f]{6})"', svg_bytes)
+        buf = io.BytesIO()
+        Image.new("RGB", (width, height), color.group(1).decode() if color else "#000000").save(buf, format="PNG")
+        return buf.getvalue()
+    return RasterBackend("pillow-test", render)
+
+
+def _svg(color: str, width: str = 'width="200" height="100"') -> str:
+    return f'<svg xmlns="http://www.w3.org/2000/svg" {width}><rect fill="{color}" width="10" height="10"/></svg>'
+
+
+@pytest.fixture
+def backends():
+    """Khôi phục danh sách backend và kết quả đã chọn sau mỗi test."""
+    order, factories = svg_rasterizer.BACKEND_ORDER, dict(svg_rasterizer._BACKEND_FACTORIES)
+    reset_backends()
+    RENDERED.clear()
+    yield
+    set_rasterizer(None)
+    svg_rasterizer.BACKEND_ORDER = order
+    svg_rasterizer._BACKEND_FACTORIES.clear()
+    svg_rasterizer._BACKEND_FACTORIES.update(factories)
+    reset_backends()
+
+
+def test_khong_co_backend_la_loi_ro_rang(backends):
+    """
+    Không backend nào dùng được thì svg_to_png_bytes ném RasterBackendUnavailable kèm lý do từng backend
+    (không vẽ ảnh thay thế); kết quả dò backend được nhớ, không thử lại ở mỗi lần gọi cho tới khi reset_backends().
+    """
+    attempts = []
+
+    def hong():
+        attempts.append(1)
+        raise OSError("thiếu thư viện libcairo")
+
+    svg_rasterizer._BACKEND_FACTORIES.clear()
+    svg_rasterizer.BACKEND_ORDER = ()
+    register_backend("hong", hong)
+    set_rasterizer(None)
+    for _ in range(2):
+        with pytest.raises(RasterBackendUnavailable, match="hong: OSError: thiếu thư viện libcairo"):
+            svg_to_png_bytes(_svg("#ff0000"))
+    assert len(attempts) == 1
+    reset_backends()
+    with pytest.raises(RasterBackendUnavailable):
+        resolve_backend()
+    assert len(attempts) == 2
+
+    register_backend("pillow-test", _backend_pillow, first=False)
+    assert resolve_backend().name == "pillow-test"
+    png = svg_to_png_bytes(_svg("#ff0000"), 64, 32)
+    assert Image.open(io.BytesIO(png)).size == (64, 32)
+
+
+def test_lo_tren_process_pool_kich_thuoc_va_cache(backends, tmp_path):
+    """
+    Lô chạy trên worker đã khởi động sẵn: kích thước theo width/height/scale (giữ tỉ lệ khi thiếu một chiều),
+    SVG trùng chỉ rasterize một lần, lỗi trả về theo từng job; lô sau và rasterizer mới dùng cache_dir thì lấy từ cache.
+    """
+    register_backend("pillow-test", _backend_pillow)
+    jobs = [
+        RasterJob(_svg("#ff0000"), str(tmp_path / "do.png")),
+        RasterJob(_svg("#00ff00", 'viewBox="0 0 40 30"'), width=80),
+        RasterJob(_svg("#0000ff"), scale=2),
+        _svg("#ff0000"),
+        _svg("LOI"),
+    ]
+    with SvgRasterizer(max_workers=2, cache_dir=str(tmp_path / "cache")) as rasterizer:
+        assert rasterizer.warm_up() >= 1
+        report = rasterizer.render_batch(jobs)
+        results = report["results"]
+        assert report["succeeded"] == 4 and report["failed"] == 1 and "SVG hỏng" in results[4]["error"]
+        assert Image.open(tmp_path / "do.png").getpixel((0, 0)) == (255, 0, 0)
+        assert (results[1]["width"], results[1]["height"]) == (80, 60)
+        assert Image.open(io.BytesIO(results[2]["png"])).size == (400, 200)
+        assert results[3]["png"] == (tmp_path / "do.png").read_bytes()
+        assert report["pages_per_second"] > 0
+        # Process hiện tại chỉ chạy lần thử backend khi chọn; các SVG được rasterize trong worker
+        assert RENDERED == [(2, 2)]
+
+        again = rasterizer.render_batch(jobs[:4])
+        assert again["cache_hits"] == 4
+
+    with SvgRasterizer(max_workers=1, cache_dir=str(tmp_path / "cache")) as rasterizer:
+        assert rasterizer.render_batch(jobs[:4])["cache_hits"] == 4
+        assert RENDERED == [(2, 2)]
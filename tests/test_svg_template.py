@@ -0,0 +1,71 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import base64
+import xml.etree.ElementTree as ET
+
+from src.image_processing.svg_handler import fill_complex_svg_with_data
+from src.image_processing.svg_template import SVG_NS, XLINK_NS, SvgTemplate, load_svg_template
+
+TEMPLATE = f"""<svg xmlns="{SVG_NS}" width="400" height="300">
+  <text id="title" x="10" y="20">PLACEHOLDER_TITLE</text>
+  <g><rect id="photo1" x="5" y="30" width="100" height="80" /><text x="1" y="2">PLACEHOLDER_DESC</text></g>
+  <rect id="footer" x="0" y="280" width="400" height="20" />
+</svg>"""
+
+
+def test_render_thay_text_anh_va_giu_vi_tri(tmp_path):
+    """
+    Text được escape, ảnh nhúng base64 đúng chỗ rect (có namespace xlink), slot không điền giữ nguyên;
+    template dùng lại nhiều lần cho kết quả độc lập.
+    """
+    image_path = tmp_path / "anh.png"
+    image_path.write_bytes(b"\x89PNG fake")
+    template = SvgTemplate.from_string(TEMPLATE)
+
+    svg_text = template.render(texts={"title": "A < B & C", "PLACEHOLDER_DESC": "Mô tả"},
+                               images={"photo1": str(image_path)})
+    root = ET.fromstring(svg_text)
+    texts = root.findall(f".//{{{SVG_NS}}}text")
+    assert [t.text for t in texts] == ["A < B & C", "Mô tả"]
+    group = root.find(f"{{{SVG_NS}}}g")
+    image = group[0]
+    assert image.tag == f"{{{SVG_NS}}}image" and image.get("width") == "100"
+    assert image.get(f"{{{XLINK_NS}}}href") == "data:image/png;base64," + base64.b64encode(b"\x89PNG fake").decode()
+    assert root.find(f".//{{{SVG_NS}}}rect[@id='footer']") is not None
+
+    default = ET.fromstring(template.render(replacements={"footer": "<circle r='1' />"}))
+    assert [t.text for t in default.findall(f".//{{{SVG_NS}}}text")] == ["PLACEHOLDER_TITLE", "PLACEHOLDER_DESC"]
+    assert default.find(f".//{{{SVG_NS}}}rect[@id='footer']") is None
+    assert default.find(f"{{{SVG_NS}}}circle") is not None
+
+
+def test_load_svg_template_cache_theo_mtime(tmp_path):
+    """Template được biên dịch một lần; sửa file thì lần nạp sau biên dịch lại."""
+    svg_path = tmp_path / "mau.svg"
+    svg_path.write_text(TEMPLATE, encoding="utf-8")
+    template = load_svg_template(str(svg_path))
+    assert load_svg_template(str(svg_path)) is template
+
+    svg_path.write_text(TEMPLATE.replace("PLACEHOLDER_TITLE", "TIEU_DE_MOI"), encoding="utf-8")
+    os.utime(svg_path, ns=(0, 0))
+    reloaded = load_svg_template(str(svg_path))
+    assert reloaded is not template and "TIEU_DE_MOI" in reloaded.text_slots
+
+
+def test_fill_complex_svg_with_data(tmp_path):
+    """fill_complex_svg_with_data điền tiêu đề, timeline, ảnh và vẽ biểu đồ vào vùng chart."""
+    template_path = os.path.join(os.path.dirname(__file__), "..", "data", "svg_templates", "complex.svg")
+    image_path = tmp_path / "anh.jpg"
+    image_path.write_bytes(b"jpeg")
+    output_path = tmp_path / "out" / "complex.svg"
+    fill_complex_svg_with_data(template_path, str(output_path),
+                               {"title": "80 năm", "timeline": ["1945", "1975"], "photos": [str(image_path)]})
+
+    root = ET.parse(output_path).getroot()
+    assert root.find(f".//{{{SVG_NS}}}text[@id='title']").text == "80 năm"
+    assert root.find(f".//{{{SVG_NS}}}text[@id='timeline2']").text == "1975"
+    assert root.find(f".//{{{SVG_NS}}}rect[@id='photo1']") is None
+    assert len(root.findall(f".//{{{SVG_NS}}}image")) == 1
+    assert len(root.findall(f".//{{{SVG_NS}}}g[@id='chart_data']/{{{SVG_NS}}}rect")) == 3
@@ -0,0 +1,117 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(__file__, "../..")))
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.video_processing import video_job_orchestrator
+from src.video_processing.video_job_orchestrator import VideoJobSpec, _hash_spec, arun_video_jobs, run_video_jobs
+
+
+def _done(video_id: str) -> dict:
+    uri = f"https://stub.local/v1beta/files/{video_id}:download?alt=media"
+    return {"done": True, "response": {"generateVideoResponse": {"generatedSamples": [{"video": {"uri": uri}}]}}}
+
+
+def _fake_download():
+    async def download(video_id, file_path):
+        with open(file_path, "wb") as f:
+            f.write(video_id.encode())
+        return {"success": True, "file_path": file_path}
+    return AsyncMock(side_effect=download)
+
+
+def test_theo_doi_nhieu_video_va_tai_ve_khi_xong(tmp_path):
+    """
+    Hai video được gửi, theo dõi song song với khoảng chờ tăng dần và tải về ngay khi từng video xong.
+    """
+    state_file = str(tmp_path / "jobs.json")
+    specs = [VideoJobSpec("a", "prompt a", str(tmp_path / "a.mp4")),
+             VideoJobSpec("b", "prompt b", str(tmp_path / "b.mp4"))]
+    statuses = {"op/a": [{"done": False}, _done("vid_a")],
+                "op/b": [{"done": False}, {"done": False}, {"done": True, "error": {"message": "RAI filtered"}}]}
+
+    async def fake_status(operation_name):
+        return statuses[operation_name].pop(0)
+
+    async def fake_submit(model, prompt, **kwargs):
+        return {"name": "op/" + prompt.split()[-1]}
+
+    with patch.object(video_job_orchestrator, "tao_video", AsyncMock(side_effect=fake_submit)), \
+         patch.object(video_job_orchestrator, "kiem_tra_trang_thai_video", AsyncMock(side_effect=fake_status)) as mock_status, \
+         patch.object(video_job_orchestrator, "tai_xuong_video_hoan_thanh", _fake_download()):
+        summary = run_video_jobs(specs, state_file, poll_initial=0.01, poll_factor=2.0, poll_max=0.05)
+
+    assert summary["succeeded"] == 1 and summary["failed"] == 1
+    assert [r["job_id"] for r in summary["results"]] == ["a", "b"]
+    assert summary["results"][1]["error"] == {"message": "RAI filtered"}
+    assert mock_status.call_count == 5
+    assert open(tmp_path / "a.mp4", "rb").read() == b"vid_a"
+    state = json.load(open(state_file))
+    assert state["a"]["status"] == "downloaded" and state["a"]["video_id"] == "vid_a"
+
+
+def test_tiep_tuc_tu_file_trang_thai_khong_gui_lai(tmp_path):
+    """
+    Tác vụ đã có operation_name trong file trạng thái được theo dõi tiếp mà không gọi lại tao_video.
+    """
+    state_file = str(tmp_path / "jobs.json")
+    spec = VideoJobSpec("a", "prompt a", str(tmp_path / "a.mp4"))
+    with open(state_file, "w") as f:
+        json.dump({"a": {"spec_hash": _hash_spec(spec), "output_path": spec.output_path, "status": "submitted",
+                         "operation_name": "op/a", "submitted_at": 0, "polls": 3}}, f)
+
+    mock_submit = AsyncMock()
+    with patch.object(video_job_orchestrator, "tao_video", mock_submit), \
+         patch.object(video_job_orchestrator, "kiem_tra_trang_thai_video", AsyncMock(return_value=_done("vid_a"))), \
+         patch.object(video_job_orchestrator, "tai_xuong_video_hoan_thanh", _fake_download()):
+        summary = run_video_jobs([spec], state_file, poll_initial=0.01)
+
+    mock_submit.assert_not_called()
+    assert summary["results"][0]["status"] == "downloaded"
+    assert summary["results"][0]["polls"] == 4
+
+
+def test_loi_bat_ngo_danh_dau_that_bai_khong_treo(tmp_path):
+    """
+    Lỗi không lường trước trong bước nền (phản hồi None, ghi file trạng thái lỗi) kết thúc tác vụ là thất bại
+    thay vì để run_video_jobs chờ mãi.
+    """
+    specs = [VideoJobSpec("a", "prompt a", str(tmp_path / "a.mp4")),
+             VideoJobSpec("b", "prompt b", str(tmp_path / "b.mp4"))]
+    original_update = video_job_orchestrator.VideoJobOrchestrator._cap_nhat
+
+    def failing_update(self, job_id, **fields):
+        if job_id == "b" and fields.get("status") == "submitted":
+            raise OSError("disk full")
+        return original_update(self, job_id, **fields)
+
+    async def fake_submit(model, prompt, **kwargs):
+        return {"name": "op/" + prompt.split()[-1]}
+
+    with patch.object(video_job_orchestrator, "tao_video", AsyncMock(side_effect=fake_submit)), \
+         patch.object(video_job_orchestrator, "kiem_tra_trang_thai_video", AsyncMock(return_value=None)), \
+         patch.object(video_job_orchestrator.VideoJobOrchestrator, "_cap_nhat", failing_update):
+        summary = asyncio.run(asyncio.wait_for(
+            arun_video_jobs(specs, str(tmp_path / "jobs.json"), poll_initial=0.01), timeout=5))
+
+    assert summary["failed"] == 2
+    assert "AttributeError" in summary["results"][0]["error"]
+    assert "disk full" in summary["results"][1]["error"]
+
+
+def test_job_id_trung_bi_tu_choi(tmp_path):
+    """
+    Hai spec cùng job_id bị từ chối trước khi gửi yêu cầu nào.
+    """
+    specs = [VideoJobSpec("a", "prompt 1", str(tmp_path / "1.mp4")),
+             VideoJobSpec("a", "prompt 2", str(tmp_path / "2.mp4"))]
+    mock_submit = AsyncMock()
+    with patch.object(video_job_orchestrator, "tao_video", mock_submit):
+        with pytest.raises(ValueError):
+            run_video_jobs(specs, str(tmp_path / "jobs.json"))
+    mock_submit.assert_not_called()